@@ -0,0 +1,72 @@
+"""
+RepeatProcessor.analyze_repeats 的基准：后缀自动机版本 vs 原来的立方级实现（tests/repeat_oracle.py）。
+
+    python benchmarks/enforce_repeat_bench.py
+    python benchmarks/enforce_repeat_bench.py --sizes 50 200 1000 --parts 25 --long 100 200
+
+只分析最后四条助手回复，所以耗时取决于回复长度而不是历史条数；
+--long 额外测几组长回复（每条回复的片段数），立方级实现在这里最慢。
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "tests"))
+
+from core.session.enforce_repeat import RepeatProcessor
+from repeat_oracle import CubicRepeatProcessor
+
+PHRASES = [
+    "她轻轻地笑了笑，", "眼神中闪过一丝狡黠。", "“你真的这么想吗？”", "窗外的雨还在下着，", "他沉默了片刻，",
+    "我会一直陪着你的。", "*握紧了你的手*", "心跳不由得加快了几分……", "The wind howled outside. ",
+    "She smiled softly, ", "“Are you sure?” ", "~", "——",
+]
+FILLER = "的一是了我不人在他有这个上们来到时大地为子中你说生国年着就那和要她出也得里后自以会"
+
+
+def history(seed: int, n_msgs: int, parts: int) -> list:
+    rng = random.Random(seed)
+    messages = [{"role": "system", "content": "sys"}]
+    for _ in range(n_msgs // 2):
+        messages.append({"role": "user", "content": "继续"})
+        messages.append({"role": "assistant", "content": "".join(
+            rng.choice(PHRASES) if rng.random() < 0.6
+            else "".join(rng.choice(FILLER) for _ in range(rng.randint(3, 15)))
+            for _ in range(parts)
+        )})
+    return messages
+
+
+def timed(processor, messages):
+    start = time.perf_counter()
+    result = processor.analyze_repeats(messages)
+    return (time.perf_counter() - start) * 1000, result
+
+
+def report(label: str, messages: list):
+    last_four = [m["content"] for m in messages if m["role"] == "assistant"][-4:]
+    new_ms, new_result = timed(RepeatProcessor, messages)
+    old_ms, old_result = timed(CubicRepeatProcessor, messages)
+    print(f"{label:28s} last four {sum(map(len, last_four)):6d} chars: "
+          f"cubic {old_ms:9.1f} ms  automaton {new_ms:7.1f} ms  same={new_result == old_result}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="*", default=[50, 200, 1000], help="历史消息条数")
+    parser.add_argument("--parts", type=int, default=25, help="每条回复的片段数，25 约 350 字")
+    parser.add_argument("--long", type=int, nargs="*", default=[100, 200], help="长回复的片段数，200 条历史")
+    args = parser.parse_args()
+
+    for n_msgs in args.sizes:
+        report(f"{n_msgs} msgs", history(n_msgs, n_msgs, args.parts))
+    for parts in args.long:
+        report(f"200 msgs, {parts} parts/reply", history(parts, 200, parts))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+模型路由策略的模拟：本地起几个延迟不同的 SSE 替身服务，按各策略轮流请求，对比首字延迟的 p95。
+
+    python benchmarks/latency_routing_sim.py
+    python benchmarks/latency_routing_sim.py --turns 200 --endpoint fast=50:20:0 --endpoint slow=800:200:0
+
+每个 --endpoint 是 名字=平均首字延迟ms:抖动ms:失败率。
+请求走标准库 http.client 流式读取，首字延迟由 StatusAnalyzer 量出后喂给 LatencyTracker；
+失败的一轮按实际耗时计入（用户要重发，这段时间是白等的）。
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.latency_tracker import LatencyTracker
+from utils.status_analysis import StatusAnalyzer
+
+DEFAULT_ENDPOINTS = ["fast=50:20:0", "mid=150:50:0", "slow=400:100:0", "flaky=30:10:0.5"]
+STRATEGIES = ("order", "random", "latency", "weighted")
+
+
+def parse_endpoint(spec: str):
+    name, _, values = spec.partition("=")
+    mean_ms, jitter_ms, fail = values.split(":")
+    return name, float(mean_ms) / 1000, float(jitter_ms) / 1000, float(fail)
+
+
+def start_server(mean: float, jitter: float, fail: float, rng: random.Random) -> int:
+    """OpenAI 风格的流式替身：等一段首字延迟，按失败率返回 503，否则吐三个分片"""
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers["Content-Length"]))
+            with lock:
+                delay = max(0.0, rng.gauss(mean, jitter))
+                failed = rng.random() < fail
+            time.sleep(delay)
+            if failed:
+                body = b'{"error":"overloaded"}'
+                self.send_response(503)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for i in range(3):
+                delta = json.dumps({"choices": [{"index": 0, "delta": {"content": f"tok{i} "}}]})
+                self._chunk(f"data: {delta}\n\n".encode())
+            self._chunk(b"data: [DONE]\n\n")
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+
+        def _chunk(self, data: bytes):
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+            self.wfile.flush()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server.server_port
+
+
+def request_once(port: int, model: str):
+    """发一次流式请求，返回 (是否成功, StatusAnalyzer 统计, 首字延迟或失败耗时 秒)"""
+    analyzer = StatusAnalyzer()
+    start = time.time()
+    analyzer.start_record(model=model, provider=model, send_time=start)
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    try:
+        body = json.dumps({"model": model, "stream": True, "messages": [{"role": "user", "content": "hi"}]})
+        conn.request("POST", "/v1/chat/completions", body, {"Content-Type": "application/json"})
+        resp = conn.getresponse()
+        if resp.status != 200:
+            resp.read()
+            return False, None, time.time() - start
+        for line in resp:
+            line = line.strip()
+            if not line.startswith(b"data: ") or line == b"data: [DONE]":
+                continue
+            delta = json.loads(line[6:])["choices"][0]["delta"].get("content", "")
+            analyzer.process_stream("sim", delta, "content")
+    finally:
+        conn.close()
+    return True, analyzer.process_full(), analyzer.first_token_time - start
+
+
+def run(strategy: str, endpoints, ports, turns: int, seed: int):
+    rng = random.Random(seed)
+    tracker = LatencyTracker("")
+    names = [name for name, *_ in endpoints]
+    latencies = []
+    failures = 0
+    for turn in range(turns):
+        if strategy == "order":
+            name = names[turn % len(names)]
+        elif strategy == "random":
+            name = rng.choice(names)
+        else:
+            name = names[tracker.choose([(n, n) for n in names], strategy, rng=rng)]
+        ok, status, latency = request_once(ports[name], name)
+        if ok:
+            tracker.record_success(name, name, status)
+        else:
+            tracker.record_failure(name, name)
+            failures += 1
+        latencies.append(latency * 1000)
+    latencies.sort()
+    p95 = latencies[max(0, int(0.95 * len(latencies)) - 1)]
+    return p95, statistics.median(latencies), failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--endpoint", action="append", help="名字=平均首字延迟ms:抖动ms:失败率，可重复")
+    parser.add_argument("--turns", type=int, default=120)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--strategy", action="append", choices=STRATEGIES)
+    args = parser.parse_args()
+
+    endpoints = [parse_endpoint(spec) for spec in (args.endpoint or DEFAULT_ENDPOINTS)]
+    for strategy in args.strategy or STRATEGIES:
+        # 每个策略都用同一个种子重新起服务，延迟序列可比
+        server_rng = random.Random(args.seed)
+        ports = {name: start_server(mean, jitter, fail, server_rng) for name, mean, jitter, fail in endpoints}
+        p95, p50, failures = run(strategy, endpoints, ports, args.turns, args.seed)
+        print(f"{strategy:9s} p95={p95:6.0f}ms  p50={p50:6.0f}ms  failures={failures}")
+
+
+if __name__ == "__main__":
+    main()
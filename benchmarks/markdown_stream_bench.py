@@ -0,0 +1,138 @@
+"""
+流式气泡 Markdown 渲染的基准：IncrementalMarkdownRenderer vs 每次整篇 MarkdownRenderer.render。
+
+    python benchmarks/markdown_stream_bench.py
+    python benchmarks/markdown_stream_bench.py --kb 4 16 --step 40
+    python benchmarks/markdown_stream_bench.py --file answer.md --step 20
+
+模拟流式回复：每收到 --step 个字符就渲染一次当前前缀（和 setMarkdown 每次更新一样），
+两边输出逐次比对。整篇渲染在每次调用前清空 pygments 高亮缓存，相当于增量渲染之前的做法
+（每次更新都重新高亮所有代码块）。默认文档混合标题、段落、列表、引用、表格、代码块和 $$ 公式。
+
+MarkdownRenderer 本身不依赖 Qt，但所在模块顶部导入了 PyQt6，运行需要装好界面依赖。
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ui.chat.markdown_browser import (
+    IncrementalMarkdownRenderer,
+    MarkdownRenderer,
+    MarkdownRenderOptions,
+    _highlight_code,
+)
+
+SENTENCES = [
+    "流式输出时每次更新都要重新排版整条消息。", "这里需要注意边界情况，", "比如 `None` 和空字符串。",
+    "The renderer keeps finished blocks cached. ", "**重点**是只重算最后一块，", "*斜体*和[链接](https://example.com)也要保持一致。",
+]
+PYTHON = [
+    "def fib(n: int) -> int:", "    a, b = 0, 1", "    for _ in range(n):", "        a, b = b, a + b",
+    "    return a", "", "print([fib(i) for i in range(10)])",
+]
+JS = ["const xs = [1, 2, 3];", "xs.map((x) => x * 2).forEach(console.log);", "export default xs;"]
+
+
+def paragraph(rng) -> str:
+    return "".join(rng.choice(SENTENCES) for _ in range(rng.randint(2, 6)))
+
+
+def make_document(kb: int, seed: int) -> str:
+    rng = random.Random(seed)
+    parts = []
+    size = 0
+    section = 0
+    while size < kb * 1024:
+        kind = rng.random()
+        if kind < 0.12:
+            section += 1
+            block = f"## {section}. 小节标题"
+        elif kind < 0.45:
+            block = paragraph(rng)
+        elif kind < 0.58:
+            block = "\n".join(f"- {paragraph(rng)[:30]}" for _ in range(rng.randint(2, 5)))
+        elif kind < 0.65:
+            block = "\n".join(f"{i + 1}. {paragraph(rng)[:25]}" for i in range(rng.randint(2, 4)))
+        elif kind < 0.72:
+            block = "> " + paragraph(rng)
+        elif kind < 0.78:
+            rows = [f"| {i} | {paragraph(rng)[:12]} | {i * i} |" for i in range(rng.randint(2, 5))]
+            block = "| 序号 | 说明 | 平方 |\n| --- | --- | --- |\n" + "\n".join(rows)
+        elif kind < 0.82:
+            block = "$$E = mc^2 + \\sum_{i=1}^{n} x_i$$"
+        else:
+            lang, lines = rng.choice([("python", PYTHON), ("javascript", JS), ("", PYTHON[:3])])
+            block = f"```{lang}\n" + "\n".join(lines * rng.randint(1, 4)) + "\n```"
+        parts.append(block)
+        size += len(block) + 2
+    return "\n\n".join(parts)
+
+
+def full_render(text: str, options: MarkdownRenderOptions) -> str:
+    _highlight_code.cache_clear()
+    return MarkdownRenderer.render(text, options=options)
+
+
+def stream(text: str, step: int, options: MarkdownRenderOptions) -> dict:
+    incremental = IncrementalMarkdownRenderer(options)
+    _highlight_code.cache_clear()
+    stats = {"full": [], "incremental": [], "mismatches": 0}
+    cuts = list(range(step, len(text), step)) + [len(text)]
+    for cut in cuts:
+        prefix = text[:cut]
+
+        start = time.perf_counter()
+        expected = full_render(prefix, options)
+        stats["full"].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        got = incremental.render(prefix)
+        stats["incremental"].append(time.perf_counter() - start)
+
+        if got != expected:
+            stats["mismatches"] += 1
+    stats["hits"] = incremental.hits
+    stats["misses"] = incremental.misses
+    return stats
+
+
+def p95(values: list) -> float:
+    return statistics.quantiles(values, n=20)[-1] if len(values) > 1 else values[0]
+
+
+def report(label: str, text: str, step: int, options: MarkdownRenderOptions):
+    stats = stream(text, step, options)
+    updates = len(stats["full"])
+    print(f"{label}: {len(text) / 1024:.1f} KB, {updates} updates of {step} chars, "
+          f"mismatches {stats['mismatches']}, block cache {stats['hits']} hits / {stats['misses']} misses")
+    for name in ("full", "incremental"):
+        times = stats[name]
+        print(f"  {name:12s} total {sum(times):7.2f} s  p95 {p95(times) * 1000:7.1f} ms  "
+              f"last update {times[-1] * 1000:7.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--kb", type=int, nargs="*", default=[4, 16], help="生成文档的大小")
+    parser.add_argument("--file", help="改用这个 Markdown 文件")
+    parser.add_argument("--step", type=int, default=40, help="每次更新新增的字符数")
+    parser.add_argument("--style", default="vs", help="pygments 配色")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    options = MarkdownRenderOptions(code_style=args.style)
+    if args.file:
+        with open(args.file, encoding="utf-8") as f:
+            report(os.path.basename(args.file), f.read(), args.step, options)
+        return
+    for kb in args.kb:
+        report(f"generated {kb} KB", make_document(kb, args.seed), args.step, options)
+
+
+if __name__ == "__main__":
+    main()
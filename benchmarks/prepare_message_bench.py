@@ -0,0 +1,117 @@
+"""
+Preprocessor.prepare_message 的基准：写时复制 vs 原来先 copy.deepcopy 整个窗口的做法。
+
+    python benchmarks/prepare_message_bench.py
+    python benchmarks/prepare_message_bench.py --sizes 50 500 5000 --runs 30 --image-every 5
+
+窗口里 user 约 30 词、assistant 约 80 词，每条都带完整的 info（id、时间、usage、server_id），
+每隔 --image-every 个 user 消息带一张图片附件（附件库里的引用，发送时换回 data URL）；
+开启 character_enforce，所以每条 user/assistant 都要注入 name。
+
+原来的做法用 DeepCopyPreprocessor 模拟：打包出的窗口先整体 deepcopy，
+_fix_chat_history 补回的消息也各自 deepcopy，之后的步骤相同。
+两条路径发出的消息逐条比对，并检查会话历史在请求前后没有被改动。
+"""
+import argparse
+import base64
+import copy
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import APP_SETTINGS
+from config.settings import ProviderConfig
+from core.session.attachment_store import get_attachment_store
+from core.session.data import ChatCompletionPack
+from core.session.preprocessor import Preprocessor
+from core.session.session_model import ChatSession
+
+WORDS = "the model keeps a rolling window of recent turns and packs older ones into a summary 我们 可以 继续 讨论".split()
+
+
+class DeepCopyPreprocessor(Preprocessor):
+    """写时复制之前的做法：窗口整体深拷贝，补回的工具调用消息再各自深拷贝"""
+
+    def _get_raw_messages(self, pack, max_rounds):
+        return copy.deepcopy(super()._get_raw_messages(pack, max_rounds))
+
+    def _fix_chat_history(self, messages, full_history):
+        window = {id(m) for m in messages}
+        fixed = super()._fix_chat_history(messages, full_history)
+        return [m if id(m) in window else copy.deepcopy(m) for m in fixed]
+
+
+def make_session(n: int, image_every: int, image_ref: dict, seed: int) -> ChatSession:
+    rng = random.Random(seed)
+    history = [{"role": "system", "content": "你是 {{char}}，正在和 {{user}} 聊天。",
+                "info": {"id": "system_prompt", "time": "2026-01-01 00:00:00"}}]
+    users = 0
+    for i in range(1, n):
+        role = "user" if i % 2 else "assistant"
+        words = 30 if role == "user" else 80
+        info = {"id": f"msg_{i:06d}", "time": "2026-01-01 00:00:00"}
+        if role == "assistant":
+            info["usage"] = {"prompt_tokens": 1000 + i, "completion_tokens": words,
+                             "total_tokens": 1000 + i + words,
+                             "prompt_tokens_details": {"cached_tokens": 512}}
+            info["server_id"] = [f"chatcmpl-{i:06d}"]
+            info["model"] = "bench-model"
+        else:
+            users += 1
+            if image_every and users % image_every == 0:
+                info["multimodal"] = [dict(image_ref)]
+        history.append({"role": role, "content": " ".join(rng.choices(WORDS, k=words)), "info": info})
+    return ChatSession(history=history)
+
+
+def timed_runs(pre: Preprocessor, pack: ChatCompletionPack, runs: int):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        messages, _ = pre.prepare_message(pack)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1000, messages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="*", default=[50, 500, 5000], help="窗口消息条数")
+    parser.add_argument("--runs", type=int, default=30, help="每种做法的轮数，取中位数")
+    parser.add_argument("--image-every", type=int, default=5, help="每隔几条 user 消息带一张图片，0 表示不带")
+    parser.add_argument("--image-kb", type=int, default=64, help="图片大小")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    # 只测消息准备本身：窗口不按预算裁切，关掉降重分析和联网搜索
+    APP_SETTINGS.names.character_enforce = True
+    APP_SETTINGS.force_repeat.enabled = False
+    APP_SETTINGS.web_search.web_search_enabled = False
+    APP_SETTINGS.limits.max_send_length_enabled = False
+    APP_SETTINGS.limits.max_send_token_enabled = False
+
+    store = get_attachment_store(tempfile.mkdtemp(prefix="cwla-bench-"))
+    image = base64.b64encode(random.Random(args.seed).randbytes(args.image_kb * 1024)).decode("ascii")
+    image_ref = store.intern_parts([{"type": "image_url", "image_url": {"url": f"data:image/png;base64,{image}"}}])[0]
+
+    provider = ProviderConfig(url="http://127.0.0.1/v1", key="sk-bench")
+    print(f"{'messages':>8s} {'images':>6s} {'deepcopy ms':>12s} {'copy-on-write ms':>17s} {'speedup':>8s}  same  history untouched")
+    for n in args.sizes:
+        APP_SETTINGS.generation.max_message_rounds = n
+        session = make_session(n, args.image_every, image_ref, args.seed)
+        snapshot = copy.deepcopy(session.history)
+        pack = ChatCompletionPack(chat_session=session, model="bench-model", provider=provider)
+
+        old_ms, old_messages = timed_runs(DeepCopyPreprocessor(), pack, args.runs)
+        new_ms, new_messages = timed_runs(Preprocessor(), pack, args.runs)
+        images = sum(1 for m in new_messages if isinstance(m["content"], list))
+        print(f"{n:8d} {images:6d} {old_ms:12.2f} {new_ms:17.2f} {old_ms / new_ms:7.1f}x  {old_messages == new_messages}  "
+              f"{session.history == snapshot}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+StrTools.vast_replace 的微基准：缓存的 ReplaceRuleSet vs 原来每次拆分 / 现编译的 _for_replace、_re_replace。
+
+    python benchmarks/replace_rules_bench.py
+    python benchmarks/replace_rules_bench.py --rules 1 10 100 --kb 50 --repeat 5
+
+每种规则数测普通字符串和 re:# 两种模式、50KB 长文本和 200 字符短文本（单条消息后处理的典型长度），
+输出单次调用的微秒数。普通字符串规则互不重叠，达到 ReplaceRuleSet.SINGLE_PASS_MIN_RULES 条时
+vast_replace 改用一条交替式正则一次替换（path=1-pass）；另外两列分别强制测逐条替换和一次替换，
+用来确定这个阈值。
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.str_tools import StrTools
+
+WORDS = [
+    "主人", "喵", "哈哈", "嗯嗯", "其实", "那个", "然后", "就是说", "好的", "唔",
+    "hey", "OK", "lol", "btw", "emmm", "*笑*", "……", "~", "！", "？",
+]
+FILLER = "的一是了我不人在他有这个上们来到时大地为子中你说生国年着就那和要她出也得里后自以会"
+
+
+def rule_word(i: int) -> str:
+    # 前 20 条是常见口癖，之后是互不重叠的占位词
+    return WORDS[i] if i < len(WORDS) else f"<w{i}>"
+
+
+def make_text(rng, chars: int, vocabulary: int) -> str:
+    parts = []
+    size = 0
+    while size < chars:
+        piece = rule_word(rng.randrange(vocabulary)) if rng.random() < 0.3 else "".join(rng.choices(FILLER, k=rng.randint(2, 8)))
+        parts.append(piece)
+        size += len(piece)
+    return "".join(parts)[:chars]
+
+
+def make_rules(count: int, regex: bool):
+    sources = []
+    for i in range(count):
+        word = rule_word(i)
+        if regex:
+            sources.append(re.escape(word) + ("+" if i % 3 == 0 else "[！？]?"))
+        else:
+            sources.append(word)
+    targets = [f"<{i}>" for i in range(count)]
+    prefix = "re:#" if regex else ""
+    return prefix + ";".join(sources), ";".join(targets)
+
+
+def old_replace(text, replace_from, replace_to):
+    """原来的 vast_replace：每次调用都拆分、补齐规则，正则模式每条都要查一次 re 模块的模式缓存"""
+    if replace_from.startswith("re:#"):
+        return StrTools._re_replace(text, replace_from[4:], replace_to)
+    return StrTools._for_replace(text, replace_from, replace_to)
+
+
+def per_call_us(fn, repeat: int) -> float:
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat, number)) / number * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rules", type=int, nargs="*", default=[1, 10, 100], help="规则条数")
+    parser.add_argument("--kb", type=int, default=50, help="长文本大小（KB，按字符计）")
+    parser.add_argument("--short", type=int, default=200, help="短文本字符数")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'mode':6s} {'rules':>5s} {'text':>6s}  {'old µs':>9s} {'cached µs':>9s} {'speedup':>8s} {'path':>6s}  "
+          f"{'seq µs':>9s} {'1-pass µs':>9s}  same")
+    for regex in (False, True):
+        for count in args.rules:
+            rng = random.Random(args.seed)
+            texts = {
+                f"{args.kb}KB": make_text(rng, args.kb * 1024, count),
+                f"{args.short}ch": make_text(rng, args.short, count),
+            }
+            replace_from, replace_to = make_rules(count, regex)
+            ruleset = StrTools.compile_replace_rules(replace_from, replace_to)
+            path = "re:#" if regex else ("1-pass" if ruleset.single_pass else "seq")
+            if not regex:
+                table = dict(ruleset.rules)
+                alternation = re.compile("|".join(map(re.escape, table)))
+
+            for label, text in texts.items():
+                expected = old_replace(text, replace_from, replace_to)
+                same = StrTools.vast_replace(text, replace_from, replace_to) == expected
+                old = per_call_us(lambda: old_replace(text, replace_from, replace_to), args.repeat)
+                new = per_call_us(lambda: StrTools.vast_replace(text, replace_from, replace_to), args.repeat)
+                forced = ""
+                if not regex:
+                    def sequential():
+                        out = text
+                        for pattern, replacement in ruleset.rules:
+                            out = out.replace(pattern, replacement)
+                        return out
+
+                    one_pass = lambda: alternation.sub(lambda m: table[m.group()], text)
+                    same = same and one_pass() == expected
+                    forced = f"{per_call_us(sequential, args.repeat):9.1f} {per_call_us(one_pass, args.repeat):9.1f}"
+                print(f"{'re:#' if regex else 'plain':6s} {count:5d} {label:>6s}  {old:9.1f} {new:9.1f} "
+                      f"{old / new:7.2f}x {path:>6s}  {forced:19s}  {same}")
+
+
+if __name__ == "__main__":
+    main()
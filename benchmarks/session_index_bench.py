@@ -0,0 +1,125 @@
+"""
+ChatSession 消息索引的基准：id→位置表 + 前缀计数 vs 原来的线性扫描。
+
+    python benchmarks/session_index_bench.py
+    python benchmarks/session_index_bench.py --sizes 10000 100000 --related 200 --rounds 50
+
+每个规模测四种操作，两边结果逐一核对：
+- lookup：在历史中段随机取 --related 个 id 查位置（LCI 合并时 get_filtered_context_data 的用法）
+- continuity：related 区间是否连续（原来逐条遍历 min..max，现在前缀计数相减）
+- append+lookup：追加一条消息再按 id 查它，重复 --rounds 次（流式回复结束时的用法）
+- insert+lookup：在锚点后插入一条 LCI 总结，再查锚点之后的一个 id，重复 --rounds 次
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.session.session_model import ChatSession
+
+
+# ---------------- 原来的实现 ----------------
+
+def linear_index(history: list, msg_id: str) -> int:
+    target_id = str(msg_id)
+    for i, msg in enumerate(history):
+        if str(msg.get('info', {}).get('id')) == target_id:
+            return i
+    raise ValueError(msg_id)
+
+
+def linear_continuous(history: list, indices: list) -> bool:
+    provided = set(indices)
+    for i in range(min(indices), max(indices) + 1):
+        if history[i].get('role', '') in ('user', 'assistant') and i not in provided:
+            return False
+    return True
+
+
+# ---------------- 新实现 ----------------
+
+def indexed_continuous(session: ChatSession, indices: list) -> bool:
+    history = session.history
+    provided = sum(1 for i in set(indices) if history[i].get('role', '') in ('user', 'assistant'))
+    return session.dialog_count(min(indices), max(indices)) == provided
+
+
+def make_session(n: int) -> ChatSession:
+    history = [{"role": "system", "content": "sys", "info": {"id": "system_prompt"}}]
+    for i in range(1, n):
+        role = "tool" if i % 17 == 0 else ("user" if i % 2 else "assistant")
+        history.append({"role": role, "content": f"消息 {i}", "info": {"id": f"msg_{i:08d}"}})
+    return ChatSession(history=history)
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return (time.perf_counter() - start) * 1000, result
+
+
+def bench(n: int, related: int, rounds: int, seed: int):
+    rng = random.Random(seed)
+    old_session = make_session(n)
+    new_session = make_session(n)
+    new_session.get_msg_index("system_prompt")  # 首次建索引不计入
+
+    mid = n // 2
+    ids = [f"msg_{i:08d}" for i in range(mid, mid + related)]
+    rng.shuffle(ids)
+    rows = []
+
+    old_ms, old_idx = timed(lambda: [linear_index(old_session.history, x) for x in ids])
+    new_ms, new_idx = timed(lambda: [new_session.get_msg_index(x) for x in ids])
+    rows.append(("lookup", old_ms, new_ms, old_idx == new_idx))
+
+    old_ms, old_cont = timed(lambda: linear_continuous(old_session.history, old_idx))
+    new_ms, new_cont = timed(lambda: indexed_continuous(new_session, new_idx))
+    rows.append(("continuity", old_ms, new_ms, old_cont == new_cont))
+
+    def append_lookup(session, lookup):
+        found = []
+        for r in range(rounds):
+            msg_id = f"tail_{r}"
+            session.append_message({"role": "assistant", "content": "回复", "info": {"id": msg_id}})
+            found.append(lookup(session, msg_id))
+        return found
+
+    old_ms, old_found = timed(lambda: append_lookup(old_session, lambda s, x: linear_index(s.history, x)))
+    new_ms, new_found = timed(lambda: append_lookup(new_session, lambda s, x: s.get_msg_index(x)))
+    rows.append(("append+lookup", old_ms, new_ms, old_found == new_found))
+
+    def insert_lookup(session, lookup):
+        found = []
+        for r in range(rounds):
+            anchor = lookup(session, f"msg_{mid + r:08d}")
+            session.insert_messages(anchor + 1, [{"role": "system", "content": "总结", "info": {"id": f"lci_{r}"}}])
+            found.append(lookup(session, f"msg_{mid + related + r:08d}"))
+        return found
+
+    old_ms, old_found = timed(lambda: insert_lookup(old_session, lambda s, x: linear_index(s.history, x)))
+    new_ms, new_found = timed(lambda: insert_lookup(new_session, lambda s, x: s.get_msg_index(x)))
+    rows.append(("insert+lookup", old_ms, new_ms, old_found == new_found))
+
+    for label, old_ms, new_ms, same in rows:
+        print(f"{n:7d} msgs  {label:14s} linear {old_ms:9.2f} ms  indexed {new_ms:8.2f} ms  "
+              f"x{old_ms / max(new_ms, 1e-6):7.1f}  same={same}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="*", default=[10000, 100000], help="会话消息条数")
+    parser.add_argument("--related", type=int, default=200, help="LCI 合并涉及的消息数")
+    parser.add_argument("--rounds", type=int, default=50, help="追加/插入的轮数")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    for n in args.sizes:
+        bench(n, args.related, args.rounds, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+full_content / full_reasoning 合并发射的对比：模拟一段 20k 词符的流式回复，统计“主线程”回调次数和总耗时。
+
+    python benchmarks/signal_coalesce_bench.py
+    python benchmarks/signal_coalesce_bench.py --tokens 50000 --rate 8000 --interval 0.05
+
+请求线程按 --rate 词符/秒发射 stream_content + full_content；主线程用一个队列模拟 Qt 的跨线程排队，
+每次 full_content 回调做一遍和整段文本长度成正比的处理（UI 重新排版）。
+不合并时每个词符都会排一次回调；合并时每个间隔只送最新一次，finished 之前一定送到最终文本。
+另外统计发射期间新启动的线程数（到点发射共用一个线程，不应随间隔数增长）。
+"""
+import argparse
+import os
+import queue
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from service.chat_completion.signals import RequesterSignals
+
+FORWARDED = ("full_content", "full_reasoning", "stream_content", "finished")
+
+
+def run(interval: float, tokens: int, rate: int) -> dict:
+    tasks = queue.Queue()
+    source = RequesterSignals()
+
+    def forward(name):
+        return lambda *args: tasks.put((name, args))
+
+    for name in FORWARDED:
+        if interval and name in source._coalesce:
+            source.connect_coalesced(name, forward(name), interval)
+        else:
+            getattr(source, name).connect(forward(name))
+
+    stats = {"calls": 0, "full_calls": 0, "time": 0.0, "max_queue": 0, "last": None, "final_ok": False}
+
+    def main_thread():
+        while True:
+            stats["max_queue"] = max(stats["max_queue"], tasks.qsize())
+            name, args = tasks.get()
+            if name == "finished":
+                stats["final_ok"] = stats["last"] == args[1][0]
+                return
+            start = time.perf_counter()
+            if name == "full_content":
+                text = args[1]
+                text.splitlines()
+                text.encode("utf-8")
+                stats["last"] = text
+                stats["full_calls"] += 1
+            stats["time"] += time.perf_counter() - start
+            stats["calls"] += 1
+
+    consumer = threading.Thread(target=main_thread)
+    consumer.start()
+
+    started_threads = []
+    original_start = threading.Thread.start
+
+    def counting_start(thread):
+        started_threads.append(thread.name)
+        return original_start(thread)
+
+    threading.Thread.start = counting_start
+
+    text = ""
+    step = 1.0 / rate
+    started = time.perf_counter()
+    for i in range(tokens):
+        delta = f"tok{i % 97} "
+        text += delta
+        source.stream_content.emit("req", delta)
+        source.full_content.emit("req", text)
+        target = started + (i + 1) * step
+        while time.perf_counter() < target:
+            pass
+    source.finished.emit("req", [text])
+    threading.Thread.start = original_start
+    consumer.join()
+    stats["threads"] = len(started_threads)
+    stats["wall"] = time.perf_counter() - started
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tokens", type=int, default=20000)
+    parser.add_argument("--rate", type=int, default=5000, help="每秒发射的词符数")
+    parser.add_argument("--interval", type=float, default=0.05, help="合并间隔（秒），和主窗口的设置一致")
+    args = parser.parse_args()
+
+    for interval in (0.0, args.interval):
+        stats = run(interval, args.tokens, args.rate)
+        label = f"coalesce={interval:g}s" if interval else "no coalesce"
+        print(f"{label:15s} main-thread callbacks={stats['calls']:6d} (full_content {stats['full_calls']:5d})  callback time={stats['time'] * 1000:7.0f} ms  "
+              f"max queue={stats['max_queue']:6d}  threads started={stats['threads']:4d}  "
+              f"final text delivered={stats['final_ok']}  wall={stats['wall']:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
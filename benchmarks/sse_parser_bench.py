@@ -0,0 +1,197 @@
+"""
+SimpleSSEParser.parse_stream 的基准：原来的 iter_lines + decode_content + json.loads + SSEEvent 逐行解析
+vs 现在的按网络块切行 + 快速 JSON 后端。
+
+    python benchmarks/sse_parser_bench.py
+    python benchmarks/sse_parser_bench.py --tokens 20000 --runs 5 --events-per-chunk 1
+    python benchmarks/sse_parser_bench.py --replay recorded.sse
+
+替身服务在单独的进程里（不和解析争 GIL），用 chunked 编码回放一段 OpenAI 格式的流：
+默认现场生成 --tokens 个分片（前 20% 是 reasoning_content，末尾是 finish_reason、usage 和 [DONE]），
+也可以用 --replay 回放从真实服务录下来的原始 SSE 字节。
+--events-per-chunk 控制每个 HTTP 块里放几个事件（服务器攒批发送时大于 1）。
+
+吞吐按 requests 读完整条流计时（delta/s）；分配用 tracemalloc 另跑一遍，
+统计解析过程的峰值内存，以及把全部 delta 收集进列表后仍被它们占着的块数和字节数。
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import sys
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests
+
+from service.chat_completion import stream_parser
+from service.chat_completion.stream_parser import DeltaObject, DeltaType, SimpleSSEParser, SSEEvent, decode_content
+
+WORDS = ["的", "我们", "可以", "这个", "问题", "，", "。", "首先", "然后", " the", " model", " stream", "\n", "`code`"]
+
+
+def make_stream(tokens: int, seed: int) -> list:
+    """生成一段 OpenAI 格式的流，返回每个事件的原始字节"""
+    rng = random.Random(seed)
+    base = {"id": "chatcmpl-bench", "object": "chat.completion.chunk", "created": 1760000000,
+            "model": "bench-model", "system_fingerprint": "fp_bench"}
+    events = []
+    reasoning = tokens // 5
+    for i in range(tokens):
+        delta = {"role": "assistant"} if i == 0 else {}
+        key = "reasoning_content" if i < reasoning else "content"
+        delta[key] = rng.choice(WORDS)
+        chunk = dict(base, choices=[{"index": 0, "delta": delta, "logprobs": None, "finish_reason": None}])
+        events.append(b"data: " + json.dumps(chunk, ensure_ascii=False).encode("utf-8") + b"\n\n")
+    final = dict(base, choices=[{"index": 0, "delta": {}, "logprobs": None, "finish_reason": "stop"}])
+    usage = dict(base, choices=[], usage={"prompt_tokens": 1200, "completion_tokens": tokens, "total_tokens": tokens + 1200})
+    for chunk in (final, usage):
+        events.append(b"data: " + json.dumps(chunk).encode("utf-8") + b"\n\n")
+    events.append(b"data: [DONE]\n\n")
+    return events
+
+
+def load_replay(path: str) -> list:
+    """录下来的原始 SSE：按空行切成事件，保留原来的换行风格"""
+    with open(path, "rb") as f:
+        data = f.read()
+    sep = b"\r\n\r\n" if b"\r\n\r\n" in data else b"\n\n"
+    return [part + sep for part in data.split(sep) if part.strip()]
+
+
+def serve(events: list, events_per_chunk: int, ports) -> None:
+    chunks = [b"".join(events[i:i + events_per_chunk]) for i in range(0, len(events), events_per_chunk)]
+    wire = [b"%x\r\n%s\r\n" % (len(c), c) for c in chunks]
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers["Content-Length"]))
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for data in wire:
+                self.wfile.write(data)
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    ports.put(server.server_port)
+    server.serve_forever()
+
+
+# ---------------- 原来的实现（9f03659 之前的 parse_stream） ----------------
+
+def legacy_parse_stream(response, logger=None):
+    try:
+        for line_bytes in response.iter_lines(decode_unicode=False):
+            if not line_bytes:
+                continue
+            line = decode_content(line_bytes)
+
+            if line.startswith('data:'):
+                data_str = line[5:].lstrip()
+
+                if data_str == '[DONE]':
+                    yield DeltaObject(delta_type=DeltaType.DONE)
+                    break
+
+                try:
+                    event_data = json.loads(data_str)
+                    event = SSEEvent.from_json(event_data)
+                    delta = event.get_first_delta()
+
+                    if delta:
+                        delta.raw_data = event_data
+                        if not delta.is_empty():
+                            yield delta
+
+                except json.JSONDecodeError:
+                    if logger:
+                        logger(f"JSON parse error: {data_str[:50]}...")
+                    continue
+    except (AttributeError, ValueError):
+        return
+
+
+PARSERS = {
+    "legacy": legacy_parse_stream,
+    "current": SimpleSSEParser.parse_stream,
+}
+
+
+def fetch(session: requests.Session, url: str, parse) -> list:
+    response = session.post(url, json={"stream": True}, stream=True)
+    response.raise_for_status()
+    deltas = list(parse(response))
+    response.close()
+    return deltas
+
+
+def summary(deltas: list) -> list:
+    return [(d.delta_type, d.content, d.reasoning_content, d.finish_reason, d.usage) for d in deltas]
+
+
+def measure_allocations(session, url, parse):
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    deltas = fetch(session, url, parse)
+    _, peak = tracemalloc.get_traced_memory()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    held = [s for s in after.compare_to(before, "filename") if s.size_diff > 0]
+    blocks = sum(s.count_diff for s in held)
+    size = sum(s.size_diff for s in held)
+    del deltas
+    return peak, blocks, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tokens", type=int, default=20000, help="生成的流里的分片数")
+    parser.add_argument("--replay", help="回放录制的原始 SSE 文件，代替生成的流")
+    parser.add_argument("--events-per-chunk", type=int, default=1, help="每个 HTTP 块里的事件数")
+    parser.add_argument("--runs", type=int, default=5, help="每个解析器的计时轮数，取最好的一轮")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    events = load_replay(args.replay) if args.replay else make_stream(args.tokens, args.seed)
+    ports = multiprocessing.Queue()
+    server = multiprocessing.Process(target=serve, args=(events, args.events_per_chunk, ports), daemon=True)
+    server.start()
+    url = f"http://127.0.0.1:{ports.get(timeout=10)}/v1/chat/completions"
+
+    json_backend = getattr(stream_parser._fast_loads, "__module__", "json").split(".")[0]
+    print(f"{len(events)} events, {sum(map(len, events)) / 1024:.0f} KB, "
+          f"{args.events_per_chunk} event(s) per HTTP chunk, json backend: {json_backend}")
+
+    session = requests.Session()
+    results = {}
+    for name, parse in PARSERS.items():
+        fetch(session, url, parse)  # 预热连接
+        best = None
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            deltas = fetch(session, url, parse)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        results[name] = summary(deltas)
+        peak, blocks, size = measure_allocations(session, url, parse)
+        print(f"{name:8s} {len(deltas):6d} deltas  {len(deltas) / best:9.0f} deltas/s  ({best * 1000:6.0f} ms)  "
+              f"peak {peak / 2**20:6.1f} MB  held by deltas {blocks:7d} blocks / {size / 2**20:5.1f} MB")
+
+    print("same output:", results["legacy"] == results["current"])
+    server.terminate()
+
+
+if __name__ == "__main__":
+    main()
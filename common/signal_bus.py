@@ -1,7 +1,128 @@
+import heapq
+import itertools
+import threading
+import time
+from dataclasses import dataclass
 from psygnal import SignalInstance
-from typing import Optional,Union,Iterable
+from typing import Callable,Dict,Optional,Tuple,Union,Iterable
+
+
+@dataclass(frozen=True)
+class Coalesce:
+    """
+    声明某个信号可以合并发射：同一个 key 在一个间隔内只保留最新的一份参数。
+    只适合“每次都携带完整状态”的信号（full_content 这类），增量信号不能合并。
+
+    在总线类上声明：
+        _coalesce = {'full_content': Coalesce()}
+    连接时 bus_connect(other, coalesce=间隔秒数) 才真正启用。
+    """
+    key_arg: int = 0
+    """第几个参数作为 key，默认 request_id"""
+    flush_on: Tuple[str, ...] = ('finished', 'failed')
+    """这些信号发射前先把暂存的最新值发出去，保证对方先收到最终全文再收到结束"""
+
+
+class _CoalesceFlusher:
+    """
+    所有合并器共用的一个到点发射线程：按到期时间排成堆，到点调用合并器的 _on_timer。
+    flush / cancel 不从堆里删除，只让合并器手里的 token 失效，线程到点时跳过。
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._heap: list = []
+        self._seq = itertools.count()
+        self._thread: Optional[threading.Thread] = None
+
+    def schedule(self, due: float, coalescer: "SignalCoalescer", token: object):
+        with self._cond:
+            heapq.heappush(self._heap, (due, next(self._seq), coalescer, token))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="signal-coalesce-flusher", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    now = time.monotonic()
+                    if self._heap and self._heap[0][0] <= now:
+                        break
+                    self._cond.wait(self._heap[0][0] - now if self._heap else None)
+                _, _, coalescer, token = heapq.heappop(self._heap)
+            # 在锁外发射，槽函数慢也不会挡住别的合并器排队
+            coalescer._on_timer(token)
+
+
+_FLUSHER = _CoalesceFlusher()
+
+
+class SignalCoalescer:
+    """
+    合并发射器：空闲时第一份参数立即发出，之后间隔内的只保留每个 key 的最新一份，
+    到点（或 flush）再发。到点发射由共用的 _CoalesceFlusher 线程完成，不再每个间隔开一个 Timer 线程。
+    发射在锁内进行，到点发射和 flush 不会把旧值发在新值后面。
+    """
+
+    FLUSH_PRIORITY = 100
+    """flush 挂在 flush_on 信号上的优先级，先于该信号的其他槽执行"""
+
+    def __init__(self, slot: Callable, interval: float, key_arg: int = 0):
+        self.slot = slot
+        self.interval = interval
+        self.key_arg = key_arg
+        self._lock = threading.RLock()
+        self._pending: Dict[object, tuple] = {}
+        self._token: Optional[object] = None
+        """排队中的到点发射；flush / cancel 置空后，flusher 到点时认不出它就跳过"""
+        self._last_emit = 0.0
+
+    def push(self, *args):
+        key = args[self.key_arg] if len(args) > self.key_arg else None
+        with self._lock:
+            now = time.monotonic()
+            if not self._pending and now - self._last_emit >= self.interval:
+                self._last_emit = now
+                self.slot(*args)
+                return
+            self._pending[key] = args
+            if self._token is None:
+                self._token = object()
+                _FLUSHER.schedule(max(now, self._last_emit + self.interval), self, self._token)
+
+    def _on_timer(self, token: object):
+        with self._lock:
+            if token is not self._token:
+                return
+            self._token = None
+            self._flush_locked()
+
+    def cancel(self):
+        """丢弃暂存的值，不再发射"""
+        with self._lock:
+            self._token = None
+            self._pending = {}
+
+    def flush(self, *_):
+        """立即发出所有暂存的最新值"""
+        with self._lock:
+            self._token = None
+            self._flush_locked()
+
+    def _flush_locked(self):
+        pending, self._pending = self._pending, {}
+        if pending:
+            self._last_emit = time.monotonic()
+        for args in pending.values():
+            self.slot(*args)
+
 
 class BaseSignalBus:
+    _coalesce: Dict[str, Coalesce] = {}
+    """可以合并发射的信号，见 Coalesce"""
+
     def disconnect_all(self):
         """
         断开当前实例上所有信号的所有槽连接。
@@ -11,12 +132,30 @@ class BaseSignalBus:
         for name, attr in vars(self).items():
             if isinstance(attr, SignalInstance):
                 attr.disconnect()
+        for coalescer in self.__dict__.pop('_coalescers', ()):
+            coalescer.cancel()
+
+    def connect_coalesced(self, name: str, slot: Callable, interval: float) -> SignalCoalescer:
+        """
+        按 _coalesce 里的声明把信号合并后接到 slot，
+        并在 flush_on 信号上以高优先级挂 flush。返回的合并器由总线持有。
+        """
+        spec = self._coalesce[name]
+        coalescer = SignalCoalescer(slot, interval, spec.key_arg)
+        getattr(self, name).connect(coalescer.push)
+        for flush_name in spec.flush_on:
+            signal = getattr(self, flush_name, None)
+            if isinstance(signal, SignalInstance):
+                signal.connect(coalescer.flush, priority=SignalCoalescer.FLUSH_PRIORITY)
+        # psygnal 对绑定方法只存弱引用，合并器要有人持有
+        self.__dict__.setdefault('_coalescers', []).append(coalescer)
+        return coalescer
 
-    
     def bus_connect(self, 
                     other, 
                     exclude: Optional[Union[str, Iterable[str]]] = None, 
-                    include: Optional[Union[str, Iterable[str]]] = None):
+                    include: Optional[Union[str, Iterable[str]]] = None,
+                    coalesce: float = 0):
         """
         将当前总线的信号连接到另一个总线实例。支持黑名单和白名单过滤。
 
@@ -24,6 +163,7 @@ class BaseSignalBus:
             other: 目标对象（RequesterSignals 或 Qt 镜像对象）。
             exclude: 不需要连接的信号名称列表（黑名单）。优先级高于 include。
             include: 仅需要连接的信号名称列表（白名单）。如果不传则默认连接所有（除非在 exclude 中）。
+            coalesce: 大于 0 时，_coalesce 里声明的信号按这个间隔（秒）合并发射，其余信号不受影响。
         """
         # 1. 标准化参数为集合 set
         def to_set(val):
@@ -58,6 +198,9 @@ class BaseSignalBus:
                     attr_other = getattr(other, name)
                     # 检查对方是不是也是 psygnal 的信号实例
                     if isinstance(attr_other, SignalInstance):
-                        attr_self.connect(attr_other)
+                        if coalesce > 0 and name in self._coalesce:
+                            self.connect_coalesced(name, attr_other.emit, coalesce)
+                        else:
+                            attr_self.connect(attr_other)
 
 
@@ -234,6 +234,23 @@ class LongChatImprovePersetVars(BaseSettings):
     mix_consolidation_prompt:str='''请将以下片段整合成完整剧情：
 {dispersed_contents}'''
 
+    mapreduce_map_prompt:str="""请为下面这一段对话撰写摘要。它只是完整对话中的一段，前后文会另外总结。
+{hint_text}
+### 💬 对话片段
+{new_content}
+
+### 📝 摘要指令
+1. 只总结这一段里出现的内容，不要推测前后发生的事。
+2. 按时间顺序保留人物、关系、事件和物品的变化。
+3. 直接输出摘要文本。
+"""
+
+    mapreduce_reduce_prompt:str="""下面是同一段对话按时间顺序切分后各部分的摘要，请整合成一份完整的总结，符合[背景要求]的格式。
+{hint_text}
+禁止缺少或省略信息；后面的片段与前面冲突时，以后面的为准。
+
+{chunk_summaries}"""
+
 class LciSettings(BaseSettings):
     """上下文自动压缩设置"""
 
@@ -264,7 +281,16 @@ class LciSettings(BaseSettings):
     placement: str = ''
     """上下文压缩结果的放置位置"""  # long_chat_placement
 
-    mode : Literal['single','dispersed','mix'] = 'single'
+    mode : Literal['single','dispersed','mix','mapreduce'] = 'single'
+
+    chunk_tokens: int = 4000
+    """MapReduce 模式：每块历史的词符预算，在消息边界切开"""
+
+    max_parallel: int = 4
+    """MapReduce 模式：同时进行的摘要请求数"""
+
+    chunk_cache: bool = True
+    """MapReduce 模式：按内容哈希缓存分块摘要，下次只总结新增或改动过的块"""
 
     preset : LongChatImprovePersetVars = Field(default_factory=LongChatImprovePersetVars)
 
@@ -276,6 +302,18 @@ class TTSSettings(BaseSettings):
     tts_enabled: bool = False
     tts_provider: str = '不使用TTS'
 
+    cache_enabled: bool = True
+    """合成结果按 (文本, 音色, 语速, 音调, 供应商) 缓存，同样的句子不再重新合成"""
+
+    cache_max_mb: int = 200
+    """音频缓存的容量上限（MB），超出后淘汰最久没用的"""
+
+    max_concurrency: int = 3
+    """同时进行的合成请求数"""
+
+    synth_timeout: float = 30.0
+    """单句合成的超时（秒），0 表示不限；超时的句子跳过，后面的句子照常播放"""
+
 class TitleSettings(BaseSettings):
     """自动标题配置"""
 
@@ -348,6 +386,15 @@ class InputLimitSettings(BaseSettings):
     max_send_token:int = 32767
     """对话截断：最大上传词符"""
 
+    tokenizer_encoding:str = ''
+    """词符计数用的 tiktoken 编码名（如 o200k_base），留空或加载失败时按字符比例估算"""
+
+    cache_stable_layout:bool = False
+    """缓存友好布局：时间、临时风格、搜索结果等易变内容移到末尾，窗口按步长截断，请求前缀多轮不变，便于命中供应商的前缀缓存"""
+
+    cache_window_step:int = 16
+    """缓存友好布局下窗口起点每次移动的条数"""
+
     max_input_length_enabled:bool=False
     """启用单个对话长度限制：不是，限制这个干嘛"""
 
@@ -362,6 +409,47 @@ class NameSettings(BaseSettings):
     character_enforce: bool = False
     """是否在消息中注入name字段"""
 
+# ==================== 存档 ====================
+
+class HistorySettings(BaseSettings):
+    """聊天记录存储"""
+    sqlite_index: bool = True
+    """使用 SQLite 索引历史列表，关闭后回退到 .chat_index.json 缓存"""
+
+# ==================== 网络 ====================
+
+class NetworkSettings(BaseSettings):
+    """请求引擎与连接"""
+    async_requester: bool = False
+    """主对话请求走单线程 asyncio 引擎（httpx），关闭时每个请求占一个线程"""
+
+    async_max_concurrency: int = 4
+    """asyncio 引擎下每个供应商的最大并发请求数"""
+
+    pool_size: int = 10
+    """共享连接池里每个主机保留的连接数"""
+
+    pool_keepalive: bool = True
+    """请求结束后保留连接供下次复用，关闭则每次请求都重新握手"""
+
+    pool_max_retries: int = 2
+    """连接失败、幂等请求遇到 429/5xx 时的重试次数，POST 不会被重放"""
+
+    pool_retry_backoff: float = 0.5
+    """重试退避系数（秒）"""
+
+    hedge_enabled: bool = False
+    """主对话对冲请求：首字迟迟不来时把同一份请求再发一份给备用模型，先出字的一路胜出"""
+
+    hedge_delay: float = 3.0
+    """等待首字多久（秒）后发出备用请求"""
+
+    hedge_provider: str = ""
+    """备用请求的供应商，留空用主请求的供应商"""
+
+    hedge_model: str = ""
+    """备用请求的模型，留空用主请求的模型"""
+
 # ================== 请求后处理 =====================
 
 class AutoReplaceSettings(BaseSettings): 
@@ -377,6 +465,29 @@ class UserToolPermission(BaseSettings):
     enabled:bool = True
     names:list = Field(default_factory=list)
 
+    parallel_calls:bool = False
+    """同一轮的多个工具调用并行执行，声明了 parallel=False 的工具仍然单独执行"""
+
+class CodeSandboxSettings(BaseSettings):
+    """python_cmd 代码沙盒"""
+    pool_size:int = 2
+    """预热的解释器进程数，也是能同时执行的代码段数"""
+
+    max_runs_per_worker:int = 20
+    """一个进程执行多少次后换新，避免用户代码留下的状态越积越多"""
+
+    memory_mb:int = 1024
+    """单个进程的内存上限（MB），0 不限"""
+
+    cpu_seconds:int = 600
+    """单次执行的 CPU 时间上限（秒，仅 Linux/macOS 生效），0 不限"""
+
+    max_timeout:float = 6000
+    """单次执行的墙钟上限（秒），超时直接结束进程"""
+
+    max_output:int = 10000
+    """回传的打印内容上限（字）"""
+
 # ==================== 快捷键 =====================
 
 class HotkeySingle(BaseSettings):
@@ -505,7 +616,8 @@ class ModelPollSettings(BaseSettings):
     enabled : bool = False
     """启用模型轮询"""
 
-    mode: Literal['random','order'] = 'order'
+    mode: Literal['random','order','latency','weighted'] = 'order'
+    """order/random 不看统计；latency 选最快的健康端点，weighted 按速度加权随机，见 utils.latency_tracker"""
 
     model_map : list[LLMUsagePack] = Field(default_factory=list)
     """模型轮询顺序"""
@@ -513,7 +625,7 @@ class ModelPollSettings(BaseSettings):
 # 模型聚合
 class ModelGroup(BaseSettings):
     """模型聚合存单"""
-    strategy: Literal['random', 'order'] = 'order'
+    strategy: Literal['random', 'order', 'latency', 'weighted'] = 'order'
 
     models: List[LLMUsagePack] = Field(default_factory=list)
 
@@ -523,7 +635,7 @@ class ModelAggregationSettings(BaseSettings):
     enabled: bool = False
     """启用模型聚合"""
 
-    strategy: Literal['random', 'order'] = 'order'
+    strategy: Literal['random', 'order', 'latency', 'weighted'] = 'order'
 
     groups: Dict[str, ModelGroup] = Field(default_factory=dict)
 
@@ -614,8 +726,17 @@ class AppSettings(BaseSettings):
     ui: UIStatus = Field(default_factory=UIStatus)
     """UI和UI恢复设置"""
 
+    history: HistorySettings = Field(default_factory=HistorySettings)
+    """聊天记录存储"""
+
+    network: NetworkSettings = Field(default_factory=NetworkSettings)
+    """请求引擎与连接"""
+
     tool_permission: UserToolPermission = Field(default_factory=UserToolPermission)
 
+    sandbox: CodeSandboxSettings = Field(default_factory=CodeSandboxSettings)
+    """python_cmd 代码沙盒"""
+
 # 初始化单例
 APP_SETTINGS = AppSettings()
 
@@ -636,6 +757,9 @@ class AppPaths(BaseSettings):
     # 先定义成普通字段，给个空字符串当占位符
     application_path: str = ""
     history_path: str = ""
+    attachment_path: str = ""
+    latency_stats_path: str = ""
+    lci_chunk_cache_path: str = ""
     theme_path: str = ""
     system_prompt_preset_path: str = ""
     config_path:str = ""
@@ -656,6 +780,15 @@ class AppPaths(BaseSettings):
         # 2. 如果没传值，就根据 application_path 算出 history_path
         if not self.history_path:
             self.history_path = os.path.join(self.application_path,"data", "history")
+
+        if not self.attachment_path:
+            self.attachment_path = os.path.join(self.application_path,"data", "attachments")
+
+        if not self.latency_stats_path:
+            self.latency_stats_path = os.path.join(self.application_path,"data", "latency_stats.json")
+
+        if not self.lci_chunk_cache_path:
+            self.lci_chunk_cache_path = os.path.join(self.application_path,"data", "lci_chunk_cache.json")
             
         if not self.theme_path:
             self.theme_path = os.path.join(self.application_path,"data", "theme")
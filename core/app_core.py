@@ -2,6 +2,8 @@ from .signals import MainBus
 from .session.session_manager import SessionManager
 from .session.chat_flow import ChatFlowManager
 from common.info_module import LOGMANAGER as LOGGER
+from config import APP_SETTINGS
+from service.http_pool import get_http_pool
 
 class CWLACore:
     """
@@ -10,6 +12,14 @@ class CWLACore:
     """
     def __init__(self):
 
+        network = APP_SETTINGS.network
+        get_http_pool().configure(
+            pool_size=network.pool_size,
+            keepalive=network.pool_keepalive,
+            max_retries=network.pool_max_retries,
+            retry_backoff=network.pool_retry_backoff,
+        )
+
         self.signals = MainBus()
 
         self.session_manager = SessionManager()
@@ -30,4 +40,8 @@ class CWLACore:
         #self.signals.tool_changed.connect(print)
         #self.signals.title_changed.connect(print)
 
-        self.signals.ask_for_tool_permission.connect(print)
\ No newline at end of file
+        self.signals.ask_for_tool_permission.connect(print)
+
+    def connection_stats(self) -> dict:
+        """共享连接池的统计：每个供应商的请求数、握手数、复用率、排队次数"""
+        return get_http_pool().stats()
@@ -0,0 +1,102 @@
+"""
+ChunkSummaryCache - MapReduce 模式的分块摘要缓存。
+
+MapReduce 模式每次都从头总结整段历史，历史按消息边界切成固定预算的块，
+前面的块在下次触发时通常原样不变；按 (模型, 系统提示, 完整用户提示) 的哈希存一份摘要，
+下次只有新增或改动过的块才真正请求模型。合并阶段的请求同样走这里。
+
+条目按最近使用排序，超过 max_entries 淘汰最旧的；存成 json，由 get_chunk_cache(path) 取全局实例。
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+
+def chunk_cache_key(model: str, system_prompt: str, user_prompt: str) -> str:
+    """请求内容的 SHA-256"""
+    raw = json.dumps([model, system_prompt, user_prompt], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ChunkSummaryCache:
+    """线程安全；一个缓存文件一个实例，见 get_chunk_cache"""
+
+    def __init__(self, path: str = "", max_entries: int = 2000):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        """key -> 摘要，最旧的在前"""
+        self._dirty = False
+        self._load()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            summary = self._entries.get(key)
+            if summary is not None:
+                self._entries.move_to_end(key)
+                self._dirty = True
+            return summary
+
+    def put(self, key: str, summary: str):
+        if not summary:
+            return
+        with self._lock:
+            self._entries[key] = summary
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._dirty = True
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    # ==================== 持久化 ====================
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                raw = json.load(f).get("entries", {})
+            self._entries = OrderedDict(
+                (key, value) for key, value in raw.items() if isinstance(value, str)
+            )
+        except (OSError, ValueError, AttributeError):
+            self._entries = OrderedDict()
+
+    def save(self):
+        """有改动时写盘，一次 LCI 结束调用一次"""
+        if not self.path:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            data = {"entries": dict(self._entries)}
+            self._dirty = False
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = f"{self.path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            self._dirty = True
+
+
+_CACHE: Optional[ChunkSummaryCache] = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_chunk_cache(path: str = "") -> ChunkSummaryCache:
+    """全局分块摘要缓存；传入的路径和当前不同时换一个新实例，留空沿用当前的"""
+    global _CACHE
+    with _CACHE_LOCK:
+        if _CACHE is None or (path and os.path.abspath(path) != os.path.abspath(_CACHE.path or "")):
+            if _CACHE is not None:
+                _CACHE.save()
+            _CACHE = ChunkSummaryCache(path)
+        return _CACHE
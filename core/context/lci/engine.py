@@ -3,6 +3,7 @@ import threading
 import uuid
 import time
 
+from concurrent.futures import ThreadPoolExecutor
 from typing import TYPE_CHECKING,Optional,Callable,Literal
 
 
@@ -71,6 +72,9 @@ class LongChatImprove:
         # Signature: () -> None
         self.on_finished: Optional[Callable[[], None]] = None
 
+        # MapReduce counters of the last run: chunks, calls (real requests), hits (chunk cache hits)
+        self.mapreduce_stats: dict = {}
+
 
     def start(
             self, 
@@ -122,10 +126,10 @@ class LongChatImprove:
     def _get_client(self):
         """Get OpenAI Client Instance"""
         provider = self._lci_settings.api_provider
-        import openai
-        return openai.Client(
+        from service.http_pool import get_http_pool
+        return get_http_pool().openai_client(
+            base_url=self._api_settings.providers[provider].url,
             api_key=self._api_settings.providers[provider].key,
-            base_url=self._api_settings.providers[provider].url
         )
 
     def _create_lci_item(self, content: str, mode: str, related_ids: list[str], is_global: bool = False) -> dict:
@@ -352,6 +356,21 @@ class LongChatImprove:
                 grand_item = self._create_lci_item(grand_text, "mix", [], is_global=True)
                 generated_items.append(grand_item)
 
+            # --- Mode: MapReduce (Chunked Parallel Mode) ---
+            # Whole history -> token-bounded chunks summarized in parallel -> reduce into one complete summary
+            elif mode == 'mapreduce':
+                hint_text = ""
+                if self._lci_settings.hint:
+                    hint_text = f"{preset.long_chat_hint_prefix}{self._lci_settings.hint}\n"
+
+                dialog = [msg for msg in chathistory if "lci" not in msg.get("info", {})]
+                related_ids = [msg.get("info", {}).get("id", str(uuid.uuid4())) for msg in dialog]
+
+                result_text = self._run_mapreduce(client, model, dialog, hint_text)
+
+                item = self._create_lci_item(result_text, "mapreduce", related_ids)
+                generated_items.append(item)
+
             # --- Execution Complete ---
             if self.on_log:
                 self.on_log("log", f"LCI Execution Complete. Generated {len(generated_items)} summaries.")
@@ -373,3 +392,146 @@ class LongChatImprove:
         finally:
             if self.on_finished:
                 self.on_finished()
+
+    # ==================== MapReduce ====================
+
+    def _split_chunks(self, messages: list[dict]) -> list[list[dict]]:
+        """
+        Split messages into chunks of at most chunk_tokens, cutting only at message boundaries.
+        Packing is greedy from the start, so appending messages only changes the last chunk
+        and the earlier chunks keep hitting the cache. A single oversized message gets its own chunk.
+        """
+        from core.session.context_packer import ContextPacker, get_tokenizer
+        packer = ContextPacker(get_tokenizer())
+        budget = max(1, self._lci_settings.chunk_tokens)
+
+        chunks = []
+        current = []
+        current_tokens = 0
+        for msg in messages:
+            if msg.get("role") == "system":
+                # to_readable_str skips system messages anyway
+                continue
+            tokens, _ = packer.measure(msg)
+            if current and current_tokens + tokens > budget:
+                chunks.append(current)
+                current = []
+                current_tokens = 0
+            current.append(msg)
+            current_tokens += tokens
+        if current:
+            chunks.append(current)
+        return chunks
+
+    def _summarize(self, client, model: str, user_prompt: str, stats: dict) -> str:
+        """One summary request, answered from the chunk cache when the same prompt was seen before"""
+        from core.context.lci.chunk_cache import chunk_cache_key
+
+        system_prompt = self._lci_settings.preset.summary_prompt
+        cache = stats["cache"]
+        key = chunk_cache_key(model, system_prompt, user_prompt)
+        if cache is not None:
+            cached = cache.get(key)
+            if cached is not None:
+                stats["hits"] += 1
+                return cached
+
+        resp = client.chat.completions.create(
+            model=model,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ]
+        )
+        result_text = resp.choices[0].message.content or ""
+        stats["calls"] += 1
+        if cache is not None:
+            cache.put(key, result_text)
+        return result_text
+
+    def _reduce_prompt(self, summaries: list[str], hint_text: str) -> str:
+        chunk_summaries = "\n\n".join(
+            f"### 片段 {i}\n{summary}" for i, summary in enumerate(summaries, 1)
+        )
+        return self._lci_settings.preset.mapreduce_reduce_prompt.format(
+            hint_text=hint_text,
+            chunk_summaries=chunk_summaries
+        )
+
+    def _run_mapreduce(self, client, model: str, messages: list[dict], hint_text: str) -> str:
+        """Map every chunk in parallel, then reduce; returns the complete summary"""
+        from core.context.lci.chunk_cache import get_chunk_cache
+        from core.session.context_packer import get_tokenizer
+
+        settings = self._lci_settings
+        cache = None
+        if settings.chunk_cache:
+            from config.settings import APP_RUNTIME
+            cache = get_chunk_cache(APP_RUNTIME.paths.lci_chunk_cache_path)
+        stats = {"cache": cache, "calls": 0, "hits": 0}
+        self.mapreduce_stats = {"chunks": 0, "calls": 0, "hits": 0}
+
+        try:
+            chunks = self._split_chunks(messages)
+            self.mapreduce_stats["chunks"] = len(chunks)
+            if not chunks:
+                raise ValueError("MapReduce: no dialog content to summarize")
+
+            map_prompts = [
+                settings.preset.mapreduce_map_prompt.format(
+                    hint_text=hint_text,
+                    new_content=ChatHistoryTools.to_readable_str(chunk)
+                )
+                for chunk in chunks
+            ]
+
+            tokenizer = get_tokenizer()
+            budget = max(1, settings.chunk_tokens)
+
+            with ThreadPoolExecutor(max_workers=max(1, settings.max_parallel), thread_name_prefix="lci-map") as pool:
+                def run_all(prompts: list[str]) -> list[str]:
+                    return list(pool.map(lambda prompt: self._summarize(client, model, prompt, stats), prompts))
+
+                summaries = run_all(map_prompts)
+                if self.on_log:
+                    self.on_log("log", f"MapReduce: {len(chunks)} chunks mapped "
+                                       f"({stats['calls']} requests, {stats['hits']} cache hits)")
+
+                # Reduce in rounds while the summaries don't fit one chunk budget.
+                # Groups are consecutive and hold at least two summaries, so every round shrinks the list.
+                while len(summaries) > 1:
+                    sizes = [tokenizer.count(summary) for summary in summaries]
+                    if sum(sizes) <= budget:
+                        break
+                    groups = []
+                    current = []
+                    current_tokens = 0
+                    for summary, size in zip(summaries, sizes):
+                        if len(current) >= 2 and current_tokens + size > budget:
+                            groups.append(current)
+                            current = []
+                            current_tokens = 0
+                        current.append(summary)
+                        current_tokens += size
+                    if current:
+                        groups.append(current)
+                    if self.on_log:
+                        self.on_log("log", f"MapReduce: intermediate reduce, {len(summaries)} -> {len(groups)} summaries")
+                    # A trailing single summary is carried over as is
+                    reduced = run_all([self._reduce_prompt(group, hint_text) for group in groups if len(group) > 1])
+                    summaries = [group[0] if len(group) == 1 else reduced.pop(0) for group in groups]
+
+            if len(summaries) == 1:
+                result_text = summaries[0]
+            else:
+                result_text = self._summarize(client, model, self._reduce_prompt(summaries, hint_text), stats)
+
+        finally:
+            # Chunks that did succeed are kept even if a later request fails, the retry skips them
+            if cache is not None:
+                cache.save()
+            self.mapreduce_stats.update(calls=stats["calls"], hits=stats["hits"])
+
+        if self.on_log:
+            self.on_log("log", f"MapReduce: done, {stats['calls']} requests, {stats['hits']} cache hits")
+        return result_text
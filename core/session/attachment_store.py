@@ -0,0 +1,328 @@
+"""
+AttachmentStore - 按内容寻址的附件库。
+
+以前粘贴的图片、音频以 base64 data URL 直接放在 info.multimodal 里：
+每次自动保存都把它们写进会话 JSON，每次请求 prepare_message 都深复制一遍。
+现在附件只存一份，历史里只留引用：
+
+    data:image/png;base64,<b64>   ->   cwla-attachment:image/png;sha256,<hex>
+
+    AttachmentStore
+        ├─ blobs/<hex[:2]>/<hex>    原始字节，按 SHA-256 命名，同样的内容只存一次
+        ├─ refs.json                每个存档引用了哪些附件（引用计数由它推出）
+        ├─ intern_*                 data URL -> 引用，新消息和 V3 迁移时调用
+        └─ resolve_*                引用 -> data URL，构建请求时才读盘编码，带 LRU
+
+删除会话时 release() 减引用，归零的附件直接删掉（本进程刚写入的也一样，只要已经保存登记过）；
+从没被任何存档引用过的附件（会话没保存就关掉了）由 collect() 在宽限期后清理，SessionManager 启动时在后台跑一次。
+引用和 data URL 可以混在同一份历史里，resolve 对 data URL 原样放行。
+"""
+import base64
+import binascii
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Set
+
+ATTACHMENT_SCHEME = "cwla-attachment:"
+
+_DATA_URL_RE = re.compile(r"data:([^;,]*);base64,", re.ASCII)
+_REF_URL_RE = re.compile(r"cwla-attachment:([^;,]*);sha256,([0-9a-f]{64})\Z", re.ASCII)
+
+
+def make_ref_url(mime: str, digest: str) -> str:
+    return f"{ATTACHMENT_SCHEME}{mime};sha256,{digest}"
+
+
+def parse_ref_url(url: str) -> Optional[tuple]:
+    """引用 URL -> (mime, digest)，不是引用时返回 None"""
+    if not isinstance(url, str) or not url.startswith(ATTACHMENT_SCHEME):
+        return None
+    m = _REF_URL_RE.match(url)
+    return (m.group(1), m.group(2)) if m else None
+
+
+def _part_url(part) -> Optional[str]:
+    """多模态条目里的 url：{"type": X, X: {"url": ...}}"""
+    if not isinstance(part, dict):
+        return None
+    body = part.get(part.get("type"))
+    if isinstance(body, dict):
+        url = body.get("url")
+        if isinstance(url, str):
+            return url
+    return None
+
+
+def _with_url(part: dict, url: str) -> dict:
+    """换掉 url 的浅拷贝，原条目不动"""
+    kind = part["type"]
+    return {**part, kind: {**part[kind], "url": url}}
+
+
+class AttachmentStore:
+    """线程安全；一个附件目录一个实例，见 get_attachment_store"""
+
+    CACHE_ENTRIES = 64
+    """编码后 data URL 的缓存条数"""
+
+    CACHE_CHARS = 64 * 1024 * 1024
+    """编码后 data URL 的缓存总字数"""
+
+    ORPHAN_GRACE = 24 * 3600
+    """从没被引用过的附件保留多久（秒）再被 collect 清理"""
+
+    def __init__(self, root: str):
+        self.root = root
+        self.blob_root = os.path.join(root, "blobs")
+        self.refs_path = os.path.join(root, "refs.json")
+
+        self._lock = threading.Lock()
+        self._refs: Optional[Dict[str, Set[str]]] = None
+        self._fresh: Set[str] = set()
+        """本进程写入、还没被任何存档登记过的附件，不参与清理；set_refs 登记后移出，之后按引用计数回收"""
+
+        self._encoded: "OrderedDict[str, str]" = OrderedDict()
+        self._encoded_chars = 0
+
+    # ==================== 存取 ====================
+
+    def blob_path(self, digest: str) -> str:
+        return os.path.join(self.blob_root, digest[:2], digest)
+
+    def put(self, data: bytes) -> str:
+        """写入原始字节，返回 SHA-256；已存在时不重复写"""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.blob_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        with self._lock:
+            self._fresh.add(digest)
+        return digest
+
+    def read(self, digest: str) -> bytes:
+        with open(self.blob_path(digest), "rb") as f:
+            return f.read()
+
+    def has(self, digest: str) -> bool:
+        return os.path.exists(self.blob_path(digest))
+
+    # ==================== data URL <-> 引用 ====================
+
+    def intern_url(self, url: str) -> str:
+        """base64 data URL 存进附件库并换成引用，其他 URL 原样返回"""
+        if not isinstance(url, str) or not url.startswith("data:"):
+            return url
+        m = _DATA_URL_RE.match(url)
+        if not m:
+            return url
+        try:
+            data = base64.b64decode(url[m.end():], validate=True)
+        except (binascii.Error, ValueError):
+            return url
+        return make_ref_url(m.group(1), self.put(data))
+
+    def intern_parts(self, parts: list) -> list:
+        """多模态条目列表中的 data URL 换成引用，返回新列表"""
+        result = []
+        for part in parts:
+            url = _part_url(part)
+            if url is not None and url.startswith("data:"):
+                new_url = self.intern_url(url)
+                if new_url is not url:
+                    part = _with_url(part, new_url)
+            result.append(part)
+        return result
+
+    def intern_history(self, history: list) -> bool:
+        """原地把整份历史里的 data URL 换成引用，有改动时返回 True"""
+        changed = False
+        for message in history:
+            info = message.get("info")
+            if isinstance(info, dict) and info.get("multimodal"):
+                parts = self.intern_parts(info["multimodal"])
+                if any(a is not b for a, b in zip(parts, info["multimodal"])):
+                    info["multimodal"] = parts
+                    changed = True
+            content = message.get("content")
+            if isinstance(content, list):
+                parts = self.intern_parts(content)
+                if any(a is not b for a, b in zip(parts, content)):
+                    message["content"] = parts
+                    changed = True
+        return changed
+
+    def resolve_url(self, url: str) -> str:
+        """引用换回 base64 data URL（带缓存），附件缺失时抛 FileNotFoundError"""
+        ref = parse_ref_url(url)
+        if ref is None:
+            return url
+        mime, digest = ref
+
+        with self._lock:
+            encoded = self._encoded.get(url)
+            if encoded is not None:
+                self._encoded.move_to_end(url)
+                return encoded
+
+        encoded = f"data:{mime};base64,{base64.b64encode(self.read(digest)).decode('ascii')}"
+
+        with self._lock:
+            if url not in self._encoded:
+                self._encoded[url] = encoded
+                self._encoded_chars += len(encoded)
+                while self._encoded and (
+                    len(self._encoded) > self.CACHE_ENTRIES or self._encoded_chars > self.CACHE_CHARS
+                ):
+                    _, dropped = self._encoded.popitem(last=False)
+                    self._encoded_chars -= len(dropped)
+        return encoded
+
+    def resolve_parts(self, parts: list, skip_missing: bool = False) -> list:
+        """多模态条目列表中的引用换回 data URL，返回新列表；skip_missing 时丢掉找不到的附件"""
+        result = []
+        for part in parts:
+            url = _part_url(part)
+            if url is not None and url.startswith(ATTACHMENT_SCHEME):
+                try:
+                    part = _with_url(part, self.resolve_url(url))
+                except FileNotFoundError:
+                    if skip_missing:
+                        continue
+                    raise
+            result.append(part)
+        return result
+
+    @staticmethod
+    def digests_in(history: Iterable[dict]) -> Set[str]:
+        """历史里引用到的所有附件"""
+        digests = set()
+        for message in history:
+            info = message.get("info")
+            groups = [info.get("multimodal")] if isinstance(info, dict) else []
+            content = message.get("content")
+            if isinstance(content, list):
+                groups.append(content)
+            for parts in groups:
+                for part in parts or ():
+                    ref = parse_ref_url(_part_url(part))
+                    if ref is not None:
+                        digests.add(ref[1])
+        return digests
+
+    # ==================== 引用计数 ====================
+
+    def _load_refs(self) -> Dict[str, Set[str]]:
+        if self._refs is None:
+            try:
+                with open(self.refs_path, "r", encoding="utf-8") as f:
+                    raw = json.load(f).get("owners", {})
+                self._refs = {owner: set(digests) for owner, digests in raw.items()}
+            except (OSError, ValueError, AttributeError):
+                self._refs = {}
+        return self._refs
+
+    def _save_refs(self):
+        os.makedirs(self.root, exist_ok=True)
+        data = {"owners": {owner: sorted(digests) for owner, digests in self._refs.items()}}
+        tmp_path = self.refs_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, self.refs_path)
+
+    def set_refs(self, owner: str, digests: Set[str]):
+        """登记某个存档当前引用的附件，没变化时不写盘"""
+        with self._lock:
+            self._fresh.difference_update(digests)
+            refs = self._load_refs()
+            if refs.get(owner, set()) == digests:
+                return
+            if digests:
+                refs[owner] = set(digests)
+            else:
+                refs.pop(owner, None)
+            self._save_refs()
+
+    def refcount(self, digest: str) -> int:
+        with self._lock:
+            return sum(digest in digests for digests in self._load_refs().values())
+
+    def release(self, owner: str) -> int:
+        """存档被删除：去掉它的引用，删除归零的附件，返回删除数量"""
+        with self._lock:
+            refs = self._load_refs()
+            digests = refs.pop(owner, None)
+            if not digests:
+                return 0
+            self._save_refs()
+            still_used = set().union(*refs.values()) if refs else set()
+            dead = [d for d in digests if d not in still_used and d not in self._fresh]
+        return self._remove_blobs(dead)
+
+    def collect(self) -> int:
+        """
+        全量清理：存档文件已不存在的引用先去掉，
+        再删除没有引用、且超过宽限期的附件。返回删除数量。
+        """
+        now = time.time()
+        with self._lock:
+            refs = self._load_refs()
+            gone = [owner for owner in refs if not os.path.exists(owner)]
+            for owner in gone:
+                del refs[owner]
+            if gone:
+                self._save_refs()
+            used = set().union(*refs.values()) if refs else set()
+            fresh = set(self._fresh)
+
+        dead = []
+        if os.path.isdir(self.blob_root):
+            for shard in os.scandir(self.blob_root):
+                if not shard.is_dir():
+                    continue
+                for entry in os.scandir(shard.path):
+                    name = entry.name
+                    if name in used or name in fresh:
+                        continue
+                    try:
+                        if now - entry.stat().st_mtime < self.ORPHAN_GRACE:
+                            continue
+                    except OSError:
+                        continue
+                    dead.append(name)
+        return self._remove_blobs(dead)
+
+    def _remove_blobs(self, digests: List[str]) -> int:
+        removed = 0
+        for digest in digests:
+            try:
+                os.remove(self.blob_path(digest))
+                removed += 1
+            except OSError:
+                continue
+        if removed:
+            with self._lock:
+                for url in [u for u in self._encoded if u.endswith(tuple(digests))]:
+                    self._encoded_chars -= len(self._encoded.pop(url))
+        return removed
+
+
+_STORE: Optional[AttachmentStore] = None
+_STORE_LOCK = threading.Lock()
+
+
+def get_attachment_store(root: str = "") -> AttachmentStore:
+    """全局附件库；传入的目录和当前不同时换一个新实例，留空沿用当前的"""
+    global _STORE
+    with _STORE_LOCK:
+        if _STORE is None or (root and os.path.abspath(root) != os.path.abspath(_STORE.root)):
+            _STORE = AttachmentStore(root or os.path.join("data", "attachments"))
+        return _STORE
@@ -85,8 +85,10 @@ class ChatFlowManager:
         self.rfm.signals.request_toolcall_resend.connect(self._request_toolcall_resend)
         self.rfm.signals.update_message.connect(self._handle_message_update)
         self.rfm.signals.finished.connect(self._handle_message_update)
-        # todo: tts现在接了完整的内容，O(n^2)，要换成接流式
-        self.rfm.signals.full_content.connect(self._dist_tts)
+        # tts 只接增量，分句在 TTS 侧流式完成；一轮结束（或转入工具调用）时发空串收尾
+        self.rfm.signals.stream_content.connect(self._dist_tts)
+        self.rfm.signals.update_message.connect(lambda id, _: self._dist_tts(id, ''))
+        self.rfm.signals.finished.connect(lambda id, _: self._dist_tts(id, ''))
         self.rfm.signals.failed.connect(self._handle_request_fail)
 
     def _handle_request_fail(self, request_id: str, error: str):
@@ -2,19 +2,31 @@ import concurrent.futures
 import json
 import os
 import re
+import threading
 import time
 import uuid
 from typing import Any, Dict, List, Optional, Tuple
 from pathlib import Path
 import heapq
+import sqlite3
 
 
 from core.session.session_model import ChatSession
+from core.session.attachment_store import AttachmentStore
+from core.session.history_journal import HistoryJournal
+from core.session.history_index import HistoryIndex
+from utils.str_tools import StrTools
 
 
 class ChatHistoryTools:
     @staticmethod
     def locate_chat_index(chathistory, request_id):
+        if isinstance(chathistory, ChatSession):
+            # 会话自带 id 索引
+            try:
+                return chathistory.get_msg_index(request_id)
+            except ValueError:
+                return None
         for i, msg in enumerate(chathistory):
             info = msg.get('info', {})
             if str(info.get('id')) == str(request_id):
@@ -92,21 +104,28 @@ class ChatHistoryVersionPatcher:
     - V0: 最初的无版本格式（0.25.1 之前）
     - V1: 通过 patch_history_0_25_1 升级后的格式（info 中包含 name, avatar, chat_id, title, tools）
     - V2: ChatSession 数据结构（将 name, avatar, chat_id, title, tools 从 history[0].info 提取到 ChatSession 顶层字段）
+    - V3: 多模态附件移入 AttachmentStore，历史里的 base64 data URL 换成 cwla-attachment 引用
     """
 
-    CURRENT_VERSION = 'V2'
+    CURRENT_VERSION = 'V3'
 
     # 有序的版本列表，用于确定升级路径
-    _VERSION_ORDER = ['V0', 'V1', 'V2']
+    _VERSION_ORDER = ['V0', 'V1', 'V2', 'V3']
 
     # 版本到升级函数的映射：key 为源版本，value 为 (目标版本, 升级函数)
     # 升级函数签名：(data: dict) -> dict
     # data 是整个 ChatSession 的序列化表示（对于 V0/V1，是以 history 为核心的结构）
 
-    def __init__(self):
+    def __init__(self, attachment_store: Optional[AttachmentStore] = None):
+        """
+        Args:
+            attachment_store: V3 迁移时存放附件的库；为 None 时只升级版本号，data URL 原样保留
+        """
+        self.attachment_store = attachment_store
         self._patchers = {
             'V0': ('V1', self._patch_v0_to_v1),
             'V1': ('V2', self._patch_v1_to_v2),
+            'V2': ('V3', self._patch_v2_to_v3),
         }
 
     def detect_version(self, data: Any) -> str:
@@ -114,12 +133,12 @@ class ChatHistoryVersionPatcher:
         检测数据的版本。
         
         Args:
-            data: 可能是旧格式的 list（V0/V1 的 history）或新格式的 dict（V2 的 ChatSession）
+            data: 可能是旧格式的 list（V0/V1 的 history）或新格式的 dict（V2/V3 的 ChatSession）
             
         Returns:
-            版本字符串: 'V0', 'V1', 'V2'
+            版本字符串: 'V0', 'V1', 'V2', 'V3'
         """
-        # V2: ChatSession 序列化后是 dict，且有 _version 字段
+        # V2/V3: ChatSession 序列化后是 dict，且有 _version 字段
         if isinstance(data, dict):
             version = data.get('_version', None)
             if version and version in self._VERSION_ORDER:
@@ -182,16 +201,16 @@ class ChatHistoryVersionPatcher:
         title: str = 'New Chat',
     ) -> dict:
         """
-        将任意版本的聊天历史数据升级到最新版本 (V2 ChatSession dict)。
+        将任意版本的聊天历史数据升级到最新版本 (V3 ChatSession dict)。
         
         Args:
-            data: 旧格式的 list（V0/V1）或 dict（V2）
+            data: 旧格式的 list（V0/V1）或 dict（V2/V3）
             names: 可选的 name 字典 {"user": ..., "assistant": ...}，用于 V0 升级
             avatar: 可选的 avatar 字典 {"user": ..., "assistant": ...}，用于 V0 升级
             title: 标题，用于 V0 升级时的默认标题
             
         Returns:
-            符合 V2 (ChatSession) 结构的 dict
+            符合 V3 (ChatSession) 结构的 dict
         """
         detected = self.detect_version(data)
 
@@ -207,7 +226,7 @@ class ChatHistoryVersionPatcher:
                 },
                 '_version': detected,
             }
-        elif detected == 'V2':
+        elif detected == self.CURRENT_VERSION:
             # 已经是最新版本，直接返回
             if isinstance(data, dict):
                 return data
@@ -403,27 +422,161 @@ class ChatHistoryVersionPatcher:
             '_version': 'V2',
         }
 
+    def _patch_v2_to_v3(self, data: dict) -> dict:
+        """
+        将 V2 格式升级到 V3 格式。
+        
+        V2 -> V3 的变更：
+        - info.multimodal 和多模态 content 中的 base64 data URL 存入附件库，换成引用
+        - _version = 'V3'
+        
+        没有附件库时只改版本号；V3 里 data URL 仍然合法，请求时原样发送。
+        """
+        if self.attachment_store is not None:
+            self.attachment_store.intern_history(data.get('history', []))
+        data['_version'] = 'V3'
+        return data
+
+# ---------------------------------------------------------------------- #
+#  历史列表共用的文件筛选与校验（JSON 缓存和 SQLite 索引两条路径共用）
+# ---------------------------------------------------------------------- #
+def _scan_history_jsons(base: str) -> List[Tuple[float, str, str]]:
+    """列出目录下所有存档 (mtime, path, name)"""
+    entries = []
+    with os.scandir(base) as it:
+        for e in it:
+            try:
+                if not e.is_file():
+                    continue
+                name = e.name
+                if not name.endswith(".json") or name.startswith("."):
+                    continue
+                st = e.stat()
+                entries.append((st.st_mtime, e.path, name))
+            except FileNotFoundError:
+                continue
+    return entries
+
+
+def _select_latest(entries: List[Tuple[float, str, str]], n: int) -> List[Tuple[str, str, float]]:
+    """按修改时间降序取前 n 个 (path, name, mtime)"""
+    if len(entries) <= n:
+        entries = sorted(entries, key=lambda t: t[0], reverse=True)
+        return [(p, nm, mt) for mt, p, nm in entries]
+
+    top = heapq.nlargest(n, entries, key=lambda t: t[0])
+    top.sort(key=lambda t: t[0], reverse=True)
+    return [(p, nm, mt) for mt, p, nm in top]
+
+
+# 消息级校验（兼容 OpenAI Chat Completion API 全部 role）
+_VALID_ROLES = frozenset(("system", "user", "assistant", "tool"))
+
+
+def _validate_message(item: dict) -> bool:
+    if not isinstance(item, dict):
+        return False
+
+    role = item.get("role")
+    if role not in _VALID_ROLES:
+        return False
+
+    if role in ("system", "user"):
+        # V2 user content 可以是 str 或 list（多模态）
+        content = item.get("content")
+        if not isinstance(content, (str, list)):
+            return False
+
+    elif role == "assistant":
+        has_content = "content" in item
+        has_tool_calls = "tool_calls" in item
+        if not (has_content or has_tool_calls):
+            return False
+        if has_content and not isinstance(item["content"], (str, type(None))):
+            return False
+        if has_tool_calls and not isinstance(item["tool_calls"], list):
+            return False
+
+    else:  # tool
+        if "tool_call_id" not in item or "content" not in item:
+            return False
+        if not isinstance(item["content"], (str, list)):
+            return False
+
+    return True
+
+
+def _validate_json_structure(data) -> bool:
+    """文件级校验（自动区分 V0/V1 list 与 V2 dict）"""
+    if isinstance(data, list):
+        # V0 / V1：顶层直接是消息列表
+        return all(_validate_message(m) for m in data)
+
+    if isinstance(data, dict):
+        # V2：ChatSession dict，history 是消息列表
+        history = data.get("history")
+        if not isinstance(history, list):
+            return False
+        return all(_validate_message(m) for m in history)
+
+    return False
+
+
+def _extract_title(data, version: str) -> str:
+    """标题提取（按版本走不同路径，不做完整 patch）"""
+    if version in ("V2", "V3"):
+        # V2/V3 title 是 ChatSession 顶层字段
+        return data.get("title") or "Untitled Chat"
+
+    # V0 / V1：title 存放在 system message 的 info 里
+    if isinstance(data, list):
+        for msg in data:
+            if msg.get("role") == "system":
+                info = msg.get("info")
+                if isinstance(info, dict):
+                    title = info.get("title")
+                    if title:
+                        return title
+    return "Untitled Chat"
+
+
 class ChathistoryFileManager:
     '''
     聊天历史文件管理器
     该类负责管理聊天历史记录的文件操作，包括加载、保存、删除聊天记录，
-    以及批量加载历史聊天记录。支持多个版本的聊天记录格式（V0/V1/V2）。
+    以及批量加载历史聊天记录。支持多个版本的聊天记录格式（V0/V1/V2/V3）。
     Attributes:
         history_path (str): 聊天历史文件的存储路径，默认为 'data/history'
         patcher (ChatHistoryVersionPatcher): 聊天历史版本补丁器，用于处理不同版本的格式转换
+        journal (HistoryJournal): 追加式日志，自动保存只写变化的部分
+        use_index (bool): 是否启用 SQLite 索引（历史列表、标题、概要查询）
+        attachment_store (AttachmentStore): 多模态附件库，保存时登记引用，删除时回收
     Methods:
         load_chathistory: 从指定文件路径加载单个聊天历史记录
         save_chathistory: 保存聊天会话到指定的文件夹或文件路径
         delete_chathistory: 安全地删除指定的聊天历史文件
         load_past_chats: 并行加载并验证指定数量的历史聊天记录，支持缓存机制
+        import_history_to_index: 一次性把已有存档导入 SQLite 索引（首次启用时在后台自动进行）
+        session_summary: 不读存档，从索引取 chat_id/标题/消息数
     '''
 
-    def __init__(self, history_path='data/history'):
+    def __init__(self, history_path='data/history', use_index=False, attachment_store: Optional[AttachmentStore] = None):
         self.history_path = history_path
-        self.patcher= ChatHistoryVersionPatcher()
+        self.attachment_store = attachment_store
+        self.patcher= ChatHistoryVersionPatcher(attachment_store)
+        # 建索引只读文本，不把附件搬进附件库
+        self._index_patcher = ChatHistoryVersionPatcher()
+        self.journal = HistoryJournal()
+        self.use_index = use_index
+        self._index: Optional[HistoryIndex] = None
+        self._import_thread: Optional[threading.Thread] = None
 
     # 载入记录
-    def load_chathistory(self, file_path) -> ChatSession:
+    def load_chathistory(self, file_path, track=False) -> ChatSession:
+        """
+        载入记录：快照走版本补丁，再重放追加日志。
+        track=True 时登记为当前会话，之后的增量保存直接追加到日志。
+        """
         chathistory = {}
         if not(file_path and os.path.exists(file_path)):
             raise FileNotFoundError(f"文件不存在: {file_path}")
@@ -432,12 +585,25 @@ class ChathistoryFileManager:
         if not chathistory:
             raise ValueError(f"无有效历史记录: {file_path}")
 
-        return ChatSession.from_dict(self.patcher.patch(chathistory))
+        migrated = self.patcher.detect_version(chathistory) != ChatHistoryVersionPatcher.CURRENT_VERSION
+        data = self.journal.replay(file_path, self.patcher.patch(chathistory))
+        if self.attachment_store is not None and self.attachment_store.intern_history(data.get('history', [])):
+            # 旧版本写下的日志里也可能有 data URL
+            migrated = True
+        session = ChatSession.from_dict(data)
 
-    # 保存聊天记录
-    def save_chathistory(self, chat_session:ChatSession,folder_path='', file_path='') -> str:
+        if track:
+            # 升级过的存档不接着追加，下次保存直接写新快照，把 data URL 从文件里清掉
+            self.journal.track(file_path, session, None if migrated else data.get('_journal'))
 
-        chathistory = chat_session.to_json()
+        return session
+
+    # 保存聊天记录
+    def save_chathistory(self, chat_session:ChatSession,folder_path='', file_path='', incremental=False) -> str:
+        """
+        保存聊天记录。
+        incremental=True 时走追加日志（自动保存），否则整文件重写。
+        """
 
         if not folder_path and not file_path:
             raise ValueError("必须指定文件夹或文件路径")
@@ -473,11 +639,34 @@ class ChathistoryFileManager:
         # 确保目录存在
         if dir_path and not os.path.exists(dir_path):
             os.makedirs(dir_path, exist_ok=True)
-        with open(file_path, "w", encoding="utf-8") as file:
-            file.write(chathistory) 
+
+        if incremental:
+            self.journal.save(chat_session, file_path)
+        else:
+            chathistory = chat_session.to_json()
+            with open(file_path, "w", encoding="utf-8") as file:
+                file.write(chathistory) 
+
+            # 整文件重写后旧日志作废
+            self.journal.discard(file_path)
+
+        self._index_saved_session(chat_session, file_path)
+        self._register_attachments(chat_session, file_path)
 
         return file_path
 
+    def _register_attachments(self, chat_session: ChatSession, file_path: str) -> None:
+        """登记存档引用的附件，引用计数按存档路径记"""
+        if self.attachment_store is None:
+            return
+        try:
+            self.attachment_store.set_refs(
+                os.path.normcase(os.path.realpath(os.path.abspath(file_path))),
+                self.attachment_store.digests_in(list(chat_session.history)),
+            )
+        except OSError as e:
+            print(f"Failed to update attachment refs: {e}")
+
     def delete_chathistory(self, file_path: str):
         # 1. 基础参数检查
         if not file_path:
@@ -500,127 +689,228 @@ class ChathistoryFileManager:
         # 4. 直接执行，出错让它自己爆
         # 如果文件被占用，os.remove 会自动抛出 OSError (PermissionError)，上层捕获即可
         os.remove(normalized_path)
+        self.journal.discard(normalized_path)
+        if self._index is not None:
+            self._index.remove([os.path.basename(normalized_path)])
+        if self.attachment_store is not None:
+            self.attachment_store.release(os.path.normcase(normalized_path))
 
     def load_past_chats(self, history_path: str = '', file_count: int = 100) -> List[Dict[str, Any]]:
         """
-        并行获取并验证历史聊天记录（支持 V0/V1/V2 混存格式）
+        并行获取并验证历史聊天记录（支持 V0/V1/V2/V3 混存格式）
+        启用 SQLite 索引时只解析新增/变更的存档，列表本身是索引查询。
         """
         # 路径准备
         if not history_path:
             history_path = self.history_path
         os.makedirs(history_path, exist_ok=True)
 
-        def load_json_from_file(path: str):
-            with open(path, "r", encoding="utf-8") as f:
-                return json.load(f)
+        index = self._get_index(history_path)
+        if index is not None:
+            try:
+                return self._load_past_chats_indexed(index, history_path, file_count)
+            except sqlite3.Error as e:
+                print(f"History index unavailable, falling back to json cache: {e}")
+                self._index = None
+
+        return self._load_past_chats_cached(history_path, file_count)
+
+    # ==================== SQLite 索引 ====================
+
+    def _get_index(self, history_path: str) -> Optional[HistoryIndex]:
+        """索引只服务于本管理器的 history_path"""
+        if not self.use_index:
+            return None
+        if os.path.abspath(history_path) != os.path.abspath(self.history_path):
+            return None
+        if self._index is None:
+            try:
+                self._index = HistoryIndex(self.history_path)
+            except sqlite3.Error as e:
+                print(f"Failed to open history index: {e}")
+                self.use_index = False
+                return None
+        return self._index
+
+    def _parse_for_index(self, path: str) -> Tuple[str, str, str, list]:
+        """
+        解析单个存档用于建索引。
+        返回 (chat_id, title, version, history)，结构非法时抛 ValueError。
+        """
+        data = self._read_json(path)
+        if not _validate_json_structure(data):
+            raise ValueError("Invalid data structure")
 
-        # 读取/初始化元数据缓存
-        cache_path = os.path.join(history_path, ".chat_index.json")
+        version = self._index_patcher.detect_version(data)
+        title = _extract_title(data, version)
+
+        session_dict = self.journal.replay(path, self._index_patcher.patch(data))
+        if version in ("V2", "V3"):
+            title = session_dict.get("title") or title
+
+        return session_dict.get("chat_id", ""), title, version, session_dict.get("history", [])
+
+    def _index_file(self, index: HistoryIndex, path: str, name: str, mtime: float) -> Optional[Dict[str, Any]]:
+        """解析一个存档并写入索引，失败返回 None"""
         try:
-            with open(cache_path, "r", encoding="utf-8") as cf:
-                meta_cache: Dict[str, Dict[str, Any]] = json.load(cf)
-        except Exception:
-            meta_cache = {}
+            chat_id, title, version, history = self._parse_for_index(path)
+        except json.JSONDecodeError:
+            print(f"Failed to parse {name}: Invalid JSON format")
+            index.remove([name])
+            return None
+        except FileNotFoundError:
+            print(f"Failed to parse {name}: File not found")
+            index.remove([name])
+            return None
+        except Exception as e:
+            print(f"Failed to parse {name}: {e}")
+            index.remove([name])
+            return None
+
+        index.upsert_session(
+            file_name=name,
+            file_path=path,
+            chat_id=chat_id,
+            title=title,
+            mtime=mtime,
+            version=version,
+            message_count=len(history),
+            char_length=StrTools.get_chat_content_length(history),
+        )
+        return {"file_path": path, "title": title, "modification_time": mtime}
+
+    def import_history_to_index(self, history_path: str = '') -> int:
+        """
+        一次性把目录下所有 V0/V1/V2/V3 存档导入 SQLite 索引。
+        解析并发进行，写库串行。返回成功导入的数量。
+        """
+        history_path = history_path or self.history_path
+        index = self._get_index(history_path)
+        if index is None:
+            return 0
+        return self._import_entries(index, _scan_history_jsons(history_path))
+
+    def _import_entries(self, index: HistoryIndex, entries: List[Tuple[float, str, str]]) -> int:
+        if not entries:
+            return 0
+        imported = 0
+        max_workers = min(32, max(1, len(entries)))
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [
+                executor.submit(self._index_file, index, p, n, m)
+                for m, p, n in entries
+            ]
+            for future in concurrent.futures.as_completed(futures):
+                if future.result():
+                    imported += 1
+        return imported
+
+    def _import_in_background(self, index: HistoryIndex, entries: List[Tuple[float, str, str]]) -> None:
+        """首次启用索引时，列表之外的旧存档放后台导入，不挡界面线程"""
+        def run():
+            try:
+                imported = self._import_entries(index, entries)
+                print(f"History index: imported {imported}/{len(entries)} older sessions")
+            except sqlite3.Error as e:
+                # 没导完的存档在 session_summary 查到时再单独补
+                print(f"History index import failed: {e}")
+
+        self._import_thread = threading.Thread(target=run, name="history-index-import", daemon=True)
+        self._import_thread.start()
+
+    def _load_past_chats_indexed(self, index: HistoryIndex, history_path: str, file_count: int) -> List[Dict[str, Any]]:
+        entries = _scan_history_jsons(history_path)
+        indexed = index.session_mtimes()
+        latest = _select_latest(entries, file_count)
+
+        # 0) 首次启用：下面只解析列表要显示的最新 file_count 个，其余的交给后台
+        if not indexed and self._import_thread is None:
+            shown = {n for _, n, _ in latest}
+            self._import_in_background(index, [e for e in entries if e[2] not in shown])
+
+        # 1) 磁盘上已经不存在的存档移出索引
+        on_disk = {name for _, _, name in entries}
+        index.remove(name for name in indexed if name not in on_disk)
+
+        # 2) 只解析最新 file_count 个里索引过期的
+        to_parse = [
+            (p, n, m)
+            for p, n, m in latest
+            if abs(indexed.get(n, -1) - m) >= 1e-6
+        ]
+        if to_parse:
+            max_workers = min(32, max(1, len(to_parse)))
+            with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futures = [executor.submit(self._index_file, index, p, n, m) for p, n, m in to_parse]
+                concurrent.futures.wait(futures)
+
+        # 3) 解析失败的存档不进索引，列表直接按 mtime 查询
+        past_chats = []
+        for row in index.latest_sessions(file_count):
+            past_chats.append({
+                "file_path": row["file_path"],
+                "title": row["title"],
+                "modification_time": row["mtime"],
+            })
+        return past_chats
 
-        # ------------------------------------------------------------------ #
-        #  文件筛选
-        # ------------------------------------------------------------------ #
-        def select_latest_jsons(base: str, n: int) -> List[Tuple[str, str, float]]:
-            """高效获取按修改时间降序的前 n 个 JSON 文件 (path, name, mtime)"""
-            entries = []
-            with os.scandir(base) as it:
-                for e in it:
-                    try:
-                        if not e.is_file():
-                            continue
-                        name = e.name
-                        if not name.endswith(".json") or name.startswith("."):
-                            continue
-                        st = e.stat()
-                        entries.append((st.st_mtime, e.path, name))
-                    except FileNotFoundError:
-                        continue
-
-            if len(entries) <= n:
-                entries.sort(key=lambda t: t[0], reverse=True)
-                return [(p, nm, mt) for mt, p, nm in entries]
-
-            top = heapq.nlargest(n, entries, key=lambda t: t[0])
-            top.sort(key=lambda t: t[0], reverse=True)
-            return [(p, nm, mt) for mt, p, nm in top]
+    def _index_saved_session(self, chat_session: ChatSession, file_path: str) -> None:
+        """保存后直接用内存里的会话更新 sessions 行，不重新解析存档"""
+        if os.path.dirname(os.path.abspath(file_path)) != os.path.abspath(self.history_path):
+            return
+        index = self._get_index(self.history_path)
+        if index is None:
+            return
+        try:
+            index.upsert_session(
+                file_name=os.path.basename(file_path),
+                file_path=file_path,
+                chat_id=str(chat_session.chat_id),
+                title=chat_session.title or "Untitled Chat",
+                mtime=os.path.getmtime(file_path),
+                version=ChatHistoryVersionPatcher.CURRENT_VERSION,
+                message_count=chat_session.chat_rounds,
+                char_length=chat_session.chat_length,
+            )
+        except (sqlite3.Error, OSError) as e:
+            print(f"Failed to update history index: {e}")
 
-        # ------------------------------------------------------------------ #
-        #  消息级校验（兼容 OpenAI Chat Completion API 全部 role）
-        # ------------------------------------------------------------------ #
-        _VALID_ROLES = frozenset(("system", "user", "assistant", "tool"))
-
-        def validate_message(item: dict) -> bool:
-            if not isinstance(item, dict):
-                return False
-
-            role = item.get("role")
-            if role not in _VALID_ROLES:
-                return False
-
-            if role in ("system", "user"):
-                # V2 user content 可以是 str 或 list（多模态）
-                content = item.get("content")
-                if not isinstance(content, (str, list)):
-                    return False
-
-            elif role == "assistant":
-                has_content = "content" in item
-                has_tool_calls = "tool_calls" in item
-                if not (has_content or has_tool_calls):
-                    return False
-                if has_content and not isinstance(item["content"], (str, type(None))):
-                    return False
-                if has_tool_calls and not isinstance(item["tool_calls"], list):
-                    return False
-
-            else:  # tool
-                if "tool_call_id" not in item or "content" not in item:
-                    return False
-                if not isinstance(item["content"], (str, list)):
-                    return False
-
-            return True
+    def session_summary(self, file_path: str) -> Optional[Dict[str, Any]]:
+        """
+        存档概要（chat_id、标题、消息数、长度），索引命中时不读存档文件。
+        未启用索引时返回 None，由调用方自己载入。
+        """
+        name = os.path.basename(file_path)
+        index = self._get_index(os.path.dirname(os.path.abspath(file_path)))
+        if index is None:
+            return None
+        try:
+            mtime = os.path.getmtime(file_path)
+        except OSError:
+            raise FileNotFoundError(f"文件不存在: {file_path}")
 
-        # ------------------------------------------------------------------ #
-        #  文件级校验（自动区分 V0/V1 list 与 V2 dict）
-        # ------------------------------------------------------------------ #
-        def validate_json_structure(data) -> bool:
-            if isinstance(data, list):
-                # V0 / V1：顶层直接是消息列表
-                return all(validate_message(m) for m in data)
+        row = index.get_session(name)
+        if not row or abs(row["mtime"] - mtime) >= 1e-6:
+            if not self._index_file(index, file_path, name, mtime):
+                raise ValueError(f"无有效历史记录: {file_path}")
+            row = index.get_session(name)
+        return row
 
-            if isinstance(data, dict):
-                # V2：ChatSession dict，history 是消息列表
-                history = data.get("history")
-                if not isinstance(history, list):
-                    return False
-                return all(validate_message(m) for m in history)
+    # ==================== JSON 缓存（旧路径） ====================
 
-            return False
+    @staticmethod
+    def _read_json(path: str):
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
 
-        # ------------------------------------------------------------------ #
-        #  标题提取（按版本走不同路径，不做完整 patch）
-        # ------------------------------------------------------------------ #
-        def extract_title(data, version: str) -> str:
-            if version == "V2":
-                # V2 title 是 ChatSession 顶层字段
-                return data.get("title") or "Untitled Chat"
-
-            # V0 / V1：title 存放在 system message 的 info 里
-            if isinstance(data, list):
-                for msg in data:
-                    if msg.get("role") == "system":
-                        info = msg.get("info")
-                        if isinstance(info, dict):
-                            title = info.get("title")
-                            if title:
-                                return title
-            return "Untitled Chat"
+    def _load_past_chats_cached(self, history_path: str, file_count: int) -> List[Dict[str, Any]]:
+        # 读取/初始化元数据缓存
+        cache_path = os.path.join(history_path, ".chat_index.json")
+        try:
+            with open(cache_path, "r", encoding="utf-8") as cf:
+                meta_cache: Dict[str, Dict[str, Any]] = json.load(cf)
+        except Exception:
+            meta_cache = {}
 
         # ------------------------------------------------------------------ #
         #  单文件解析
@@ -630,13 +920,13 @@ class ChathistoryFileManager:
         ) -> Tuple[bool, str, str, float, str, str, str]:
             """返回: (ok, name, path, mtime, err_msg, title, version)"""
             try:
-                data = load_json_from_file(path)
+                data = self._read_json(path)
 
-                if not validate_json_structure(data):
+                if not _validate_json_structure(data):
                     return False, name, path, mtime, "Invalid data structure", "", ""
 
                 version = self.patcher.detect_version(data)
-                title = extract_title(data, version)
+                title = _extract_title(data, version)
                 return True, name, path, mtime, "", title, version
 
             except json.JSONDecodeError:
@@ -651,7 +941,7 @@ class ChathistoryFileManager:
         # ================================================================== #
 
         # 1) 挑选最新的 file_count 个文件
-        selected = select_latest_jsons(history_path, file_count)
+        selected = _select_latest(_scan_history_jsons(history_path), file_count)
 
         # 2) 缓存命中 → 直接使用；未命中 → 加入待解析列表
         past_chats: List[Dict[str, Any]] = []
@@ -711,5 +1001,3 @@ class ChathistoryFileManager:
         # 5) 按修改时间降序输出
         past_chats.sort(key=lambda x: x["modification_time"], reverse=True)
         return past_chats
-    
-
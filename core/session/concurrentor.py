@@ -1,7 +1,15 @@
-import threading,os,json,random
+import copy,os,json,random
 from PyQt6.QtWidgets import *
 from PyQt6.QtCore import *
 from PyQt6.QtGui import *
+
+from core.session.convergence_engine import (
+    DEFAULT_PRESETS,
+    ConvergenceSignals,
+    build_convergence_graph,
+    final_node_name,
+    get_convergence_engine,
+)
 MODEL_MAP={#临时测试用
   "baidu": [
     "deepseek-r1-distill-qwen-7b",
@@ -142,6 +150,24 @@ class ConvergenceDialogueOptiUI(QWidget):
         self.concurrent_spin.setValue(3)
         self.concurrent_spin.valueChanged.connect(self.update_model_groups)
         concurrent_layout.addWidget(self.concurrent_spin)
+
+        # 凑够几个响应就往下走，慢的供应商不再拖住整轮
+        self.quorum_spin = QSpinBox()
+        self.quorum_spin.setRange(0, 10)
+        self.quorum_spin.setValue(0)
+        self.quorum_spin.setPrefix("至少等待: ")
+        self.quorum_spin.setSuffix(" 个响应")
+        self.quorum_spin.setSpecialValueText("至少等待: 全部响应")
+        self.quorum_spin.setToolTip("凑够这么多个成功响应就进入下一层，还没回来的请求直接中止")
+        concurrent_layout.addWidget(self.quorum_spin)
+
+        self.timeout_spin = QSpinBox()
+        self.timeout_spin.setRange(0, 600)
+        self.timeout_spin.setValue(0)
+        self.timeout_spin.setPrefix("单个请求超时: ")
+        self.timeout_spin.setSuffix(" 秒")
+        self.timeout_spin.setSpecialValueText("单个请求超时: 不限")
+        concurrent_layout.addWidget(self.timeout_spin)
         concurrent_layout.addStretch(1)
         
         # 水平布局的模型容器
@@ -941,589 +967,34 @@ class GodVarStock:
         else:
             self.stock=TestLib()
 
-class APIRequestHandler(QObject):
-    # 定义信号用于跨线程通信
-    response_received = pyqtSignal(str)  # 接收到部分响应
-    reasoning_response_received = pyqtSignal(str)
-    request_completed = pyqtSignal(str)  # 请求完成
-    error_occurred = pyqtSignal(str)  # 发生错误
-    
-    def __init__(self, api_config, parent=None):
-        """
-        初始化API请求处理器
-        :param api_config: API配置信息
-        :param parent: 父对象
-        """
-        super().__init__(parent)
-        self.api_config = api_config
-        self.client = None
-        self.current_thread = None
-        self.full_response = ""  # 用于存储完整响应
-
-    def send_request(self, message, model):
-        """
-        发送API请求（线程安全方式）
-        :param message: 提示词
-        :param model: 使用的模型
-        """
-        threading.Thread(
-            target=self._send_request_thread,
-            args=(message, model)
-        ).start()
-    
-    def special_block_handler(self,content,                      #incoming content                     #function to call
-                                  starter='<think>', 
-                                  ender='</think>',
-                                  extra_params=None             #extra params to fullfill
-                                  ):
-        """处理自定义块内容"""
-        if starter in content :
-            content = content.split(starter)[1]
-            if ender in content:
-                return {"starter":True,"ender":True}
-            if extra_params:
-                if hasattr(self, extra_params):
-                    setattr(self, extra_params, content)
-
-            return {"starter":True,"ender":False}
-        return {"starter":False,"ender":False}
-
-
-    def _send_request_thread(self, messages, model):
-
-        
-        def handle_response(content,temp_response):
-            if hasattr(content, "content") and content.content:
-                special_block_handler_result=self.special_block_handler(temp_response,
-                                      starter='<think>', ender='</think>',
-                                      extra_params='think_response'
-                                      )
-                if special_block_handler_result["starter"] and special_block_handler_result["ender"]:#如果思考链结束
-                    self.full_response+= content.content
-                    self.reasoning_response_received.emit(content.content)
-                    self.full_response.replace('</think>\n\n', '')
-                elif not (special_block_handler_result["starter"]):#如果没有思考链
-                    self.full_response += content.content
-                    self.response_received.emit(content.content)
-                        # 处理思考链内容
-            if hasattr(content, "reasoning_content") and content.reasoning_content:
-                self.think_response += content.reasoning_content
-                self.reasoning_response_received.emit(content.reasoning_content)
-        #try:
-        import openai
-        client = openai.Client(
-            api_key=self.api_config['key'],  # 替换为实际的 API 密钥
-            base_url=self.api_config['url']  # 替换为实际的 API 基础 URL
-        )
-        try: 
-            print('AI回复(流式):',type(messages))
-            self.response = client.chat.completions.create(
-                    model=model,
-                    messages=messages,
-                    stream=True,  # 启用流式响应
-                )
-            self.full_response = ""
-            self.think_response = "### AI 思考链\n---\n"
-            temp_response = ""
-            print('请求已经发到API')
-
-
-            for event in self.response:
-                if not hasattr(event, "choices") or not event.choices:
-                    print("无效的响应事件:", event)
-                    continue
-
-                content = getattr(event.choices[0], "delta", None)
-                if not content:
-                    print("无效的内容:", event.choices[0])
-                    continue
-                if hasattr(content, "content") and content.content:
-                    temp_response += content.content
-                    handle_response(content,temp_response)
-                if hasattr(content, "reasoning_content") and content.reasoning_content:
-                    self.think_response += content.reasoning_content
-                    print(content.reasoning_content, end='', flush=True)
-            print("下一步是发送信号")
-            self.request_completed.emit(self.full_response)
-        except Exception as e:
-            print("汇流优化API请求错误:", str(e))
-            self.error_occurred.emit(f"API请求错误: {str(e)}")
-
-class ConcurrentorSender(QObject):
-    request_finished = pyqtSignal(dict)
-    
-    def __init__(self, slot, api_provider, model,params):
-        super().__init__()
-        self.slot = slot
-        self.api_provider = api_provider
-        self.model = model
-        self.params=params
-    
-    def run(self):
-        default_apis=ConcurrentorTools.get_default_apis()
-        api_config={
-            "url": default_apis[self.api_provider].url,
-            "key": default_apis[self.api_provider].key
-        }
-
-        self.requester=APIRequestHandler(api_config)
-        self.requester.request_completed.connect(self.handle_request_completed)
-        self.requester.send_request(self.params['messages'], self.model)
-
-    def handle_request_completed(self,message):
-        self.request_finished.emit({"slot": self.slot, "message": message})
-
-class RatingSender(QObject):
-    # 定义一个信号用于返回评价结果列表
-    rating_finished = pyqtSignal(list)
-    
-    def run(self, messages, settings):
-        """
-        执行评价请求
-        :param messages: 字符串列表，包含需要评价的各个模型生成结果 [message_1, message_2, ..., message_n]
-        :param settings: 设置字典，包含评价所需参数
-        """
-        # 构建评价提示词
-        content = settings["prefix"]
-        
-        # 添加每个模型生成结果
-        for i, message in enumerate(messages, 1):
-            content += f"\n\n--- 结果id: {i} ---\n{message}"
-        
-        # 添加后缀
-        content += settings["suffix"]
-        
-        # 创建完整的消息结构
-        full_messages = [
-            {"role": "user", "content": content}
-        ]
-        
-        # 获取API配置
-        api_provider = settings["process_provider"]
-        model = settings["process_model"]
-        
-        default_apis = ConcurrentorTools.get_default_apis()
-        api_config = {
-            "url": default_apis[api_provider].url,
-            "key": default_apis[api_provider].key
-        }
-        
-        # 创建API请求处理器
-        self.requester = APIRequestHandler(api_config)
-        # 连接完成信号
-        self.requester.request_completed.connect(self._handle_rating_response)
-        # 发送请求
-        print(full_messages)
-        self.requester.send_request(full_messages, model)
-    
-    def _handle_rating_response(self, response_text):
-        """
-        处理评价API的响应
-        :param response_text: API返回的文本响应
-        """
-        try:
-            # 查找并提取JSON内容
-            json_results = []
-            from jsonfinder import jsonfinder
-            for _, __, obj in jsonfinder(response_text, json_only=True):
-                if isinstance(obj, list):  # 确保我们提取到的是JSON数组
-                    json_results = obj
-                    break
-            
-            # 验证结果格式
-            if not json_results:
-                raise ValueError("未找到有效的JSON结果")
-            
-            # 确保每个元素都包含text和rating字段
-            valid_results = []
-            for item in json_results:
-                if not isinstance(item, dict):
-                    continue
-                if "text_id" in item and "rating" in item:
-                    valid_results.append({
-                        "text_id": item["text_id"],
-                        "rating": item["rating"]
-                    })
-            
-            # 发送评分结果
-            self.rating_finished.emit(valid_results)
-            
-        except Exception as e:
-            print(f"评分解析错误: {str(e)}")
-            self.rating_finished.emit([])
-
-class SummarySender(QObject):
-    # 定义信号用于返回汇总结果
-    summary_finished = pyqtSignal(str)
-    summary_response = pyqtSignal(str)
-    
-    def __init__(self):
-        super().__init__()
-        self.requester = None
-        
-    def run(self, messages, ratings, summary_settings, params):
-        """
-        执行汇总请求
-        :param messages: 待汇总的消息列表 [message_1, message_2, ...]
-        :param ratings: 评分列表 [{"text_id": int, "rating": int}, ...]
-        :param summary_settings: 汇总层设置
-        :param params: 额外参数，包含用户当前消息等上下文信息
-        """
-        try:
-            # 构建提示词
-            content = summary_settings["prefix"]
-            
-            # 如果没有评分信息（来自并发层），添加特别提示
-            if not ratings:
-                content += "（以下回复没有评分信息，请自行判断保留优质回答）：\n"
-            
-            # 添加每个模型生成结果及评分（如果有）
-            for i, msg in enumerate(messages):
-                # 找到对应的评分（如果存在）
-                rating_info = next((r for r in ratings if r["text_id"] == i+1), None)
-                rating_value = rating_info["rating"] if rating_info else "未评分"
-                
-                content += f"\n\n--- 结果 {i+1} | 评分: {rating_value} ---\n{msg}"
-            
-            # 添加后缀
-            content += summary_settings["suffix"]
-            
-            # 添加上下文信息（如果有）
-            if "current_message" in params:
-                content = content.replace("{{user}}", params["current_message"])
-            
-            # 创建完整的消息结构
-            full_messages = [
-                {"role": "user", "content": content}
-            ]
-            
-            # 获取API配置
-            api_provider = summary_settings["process_provider"]
-            model = summary_settings["process_model"]
-            
-            default_apis = ConcurrentorTools.get_default_apis()
-            api_config = {
-                "url": default_apis[api_provider].url,
-                "key": default_apis[api_provider].key
-            }
-            
-            # 创建API请求处理器
-            self.requester = APIRequestHandler(api_config)
-            self.requester.request_completed.connect(self._handle_summary_response)
-            self.requester.response_received.connect(self.summary_response.emit)
-            self.requester.reasoning_response_received.connect(self.summary_response.emit)
-
-            self.requester.send_request(full_messages, model)
-        
-        except Exception as e:
-            print(f"创建汇总请求时出错: {str(e)}")
-            self.summary_finished.emit(f"汇总出错: {str(e)}")
-    
-    def _handle_summary_response(self, response_text):
-        """
-        处理汇总API的响应
-        :param response_text: API返回的汇总文本
-        """
-        # 直接返回汇总结果，无需额外处理
-        self.summary_finished.emit(response_text)
-
-class StyleSender(QObject):
-    # 定义信号用于返回风格化后的文本
-    style_finished = pyqtSignal(str)
-    style_thinking = pyqtSignal(str)
-    style_response = pyqtSignal(str)
-    
-    def __init__(self):
-        super().__init__()
-        self.requester = None
-
-    def run(self, previous_content, style_settings, params):
-        """
-        执行风格转换请求
-        :param previous_content: 上一步的结果文本（通常是汇总层的输出）
-        :param style_settings: 风格层设置（包含前缀、后缀和模型信息）
-        :param params: 额外参数（包含用户消息、对话历史等上下文）
-        """
-        chathistory=params.get("messages", "")
-        user=params.get("user", "用户")
-        message=''
-        if type(chathistory)==list:
-            for item in chathistory:
-                if item["role"]=="user":
-                    message+='\n'+user+':\n'+item["content"]+'\n'
-                elif item["role"]=="assistant":
-                    message+='\n'+"AI(you)"+':\n'+item["content"]+'\n'
-                elif item["role"]=="system":
-                    message+="背景设定"+':\n'+item["content"]
-
-
-        try:
-            # 构建提示词
-            content = style_settings["prefix"]
-            
-            # 替换提示词中的变量
-            content = content.replace("#chathistory#", message)
-            content = content.replace("#user#", user)
-            content = content.replace("#style#", params.get("style", ""))
-            content = content.replace("#pervious_content#", previous_content)
-            
-            # 添加后缀内容
-            content += style_settings["suffix"]
-            
-            # 创建完整的消息结构
-            full_messages = [
-                {"role": "user", "content": content}
-            ]
-            
-            # 获取API配置
-            api_provider = style_settings["process_provider"]
-            model = style_settings["process_model"]
-            
-            # 从全局获取API配置
-            default_apis = ConcurrentorTools.get_default_apis()
-            api_config = {
-                "url": default_apis[api_provider].url,
-                "key": default_apis[api_provider].key
-            }
-            
-            # 创建API请求处理器
-            print(full_messages[0]["content"])
-            self.requester = APIRequestHandler(api_config)
-            self.requester.request_completed.connect(self._handle_style_response)
-            self.requester.response_received.connect(self.style_response.emit)
-            self.requester.reasoning_response_received.connect(self.style_thinking.emit)
-            self.requester.send_request(full_messages, model)
-        
-        except Exception as e:
-            print(f"创建风格转换请求时出错: {str(e)}")
-            self.style_finished.emit(f"风格转换出错: {str(e)}")
-    
-    def _handle_style_response(self, response_text):
-        """
-        处理风格转换API的响应
-        :param response_text: API返回的风格化文本
-        """
-        # 直接返回风格化后的结果
-        self.style_finished.emit(response_text)
-
-class CorrectionSender(QObject):
-    # 定义一个信号用于返回补正结果
-    correction_finished = pyqtSignal(str)  # 修正后的文本
-    correction_thinking = pyqtSignal(str)
-    correction_response = pyqtSignal(str)
-    
-    def run(self, styled_text, settings):
-        """
-        执行补正请求
-        :param styled_text: 风格化后的文本
-        :param settings: 设置字典，包含补正所需参数
-        """
-        # 构建补正提示词
-        mod_functions = settings.get("mod_functions", "优化语法错误，修正流畅度，调整表述使其更加自然")
-        content = settings["prefix"].replace("#mod_functions#", mod_functions)
-        content += styled_text
-        content += settings["suffix"]
-        
-        # 创建完整的消息结构
-        full_messages = [
-            {"role": "user", "content": content}
-        ]
-        
-        # 获取API配置
-        api_provider = settings["process_provider"]
-        model = settings["process_model"]
-        
-        default_apis = ConcurrentorTools.get_default_apis()
-        api_config = {
-            "url": default_apis[api_provider].url,
-            "key": default_apis[api_provider].key
-        }
-        
-        # 创建API请求处理器
-        self.requester = APIRequestHandler(api_config)
-        # 连接完成信号
-        self.requester.request_completed.connect(self._handle_correction_response)
-        self.requester.response_received.connect(self.correction_response.emit)
-        self.requester.reasoning_response_received.connect(self.correction_thinking.emit)
-        # 发送请求
-        self.requester.send_request(full_messages, model)
-    
-    def _handle_correction_response(self, response_text):
-        """
-        处理补正API的响应
-        :param response_text: API返回的文本响应
-        """
-        try:
-            # 尝试提取JSON格式的修正结果
-            if "{" in response_text:
-                # 查找并提取JSON内容
-                from jsonfinder import jsonfinder
-                for _, __, obj in jsonfinder(response_text, json_only=True):
-                    if isinstance(obj, dict) and "correction" in obj:
-                        corrected_text = obj["correction"]
-                        self.correction_finished.emit(corrected_text)
-                        return
-                    
-            # 如果没有找到JSON格式的修正结果，直接使用整个响应
-            self.correction_finished.emit(response_text)
-            
-            
-        except Exception as e:
-            print(f"补正解析错误: {str(e)}")
-            self.correction_finished.emit("")
-
 class RequestDispatcher(QObject):
-    """请求分发中转类，处理各层请求的分发"""
-    layer_completed =       pyqtSignal(dict, str)  # 数据, 完成的层名称
-    layer_response =        pyqtSignal(dict, str)
-    
+    """把 ConvergenceEngine 的信号转到主线程，界面只通过它接触引擎"""
+    node_delta =        pyqtSignal(str, str, str)  # 节点名, content/reasoning, 片段
+    node_finished =     pyqtSignal(str, object)    # 节点名, NodeResult
+    workflow_finished = pyqtSignal(dict)
+
     def __init__(self, processor):
         super().__init__()
         self.processor = processor
-        self.current_layer = None
-        self.current_result = {}
+        self.engine = get_convergence_engine()
+        self.current_run = None
 
+    def start(self, nodes):
+        """开始新一轮，上一轮还没结束就先取消"""
+        self.cancel()
+        signals = ConvergenceSignals()
+        # 引擎在工作线程发信号，pyqtSignal 会排队到主线程
+        signals.node_delta.connect(self.node_delta.emit)
+        signals.node_finished.connect(self.node_finished.emit)
+        signals.finished.connect(self.workflow_finished.emit)
+        self.current_run = self.engine.start(nodes, signals)
+        return self.current_run
 
-    def dispatch_request(self, layer_name, params):
-        """分派请求到指定层"""
-        self.current_layer = layer_name
-
-        if layer_name == "concurrent":
-            self._dispatch_concurrent(params)
-        elif layer_name == "evaluation":
-            self._dispatch_evaluation()
-        elif layer_name == "summary":
-            self._dispatch_summary(params)
-        elif layer_name == "style":
-            self._dispatch_style(params)
-        elif layer_name == "correction":
-            self._dispatch_correction()
-    
-    def _dispatch_concurrent(self, params):
-        """分派并发请求"""
-        self.processor.start_concurrent_requests(params)
-    
-    def _dispatch_evaluation(self):
-        """分派评价层请求"""
-        messages = []
-        for slot in sorted(self.processor.model_responses.keys()):
-            message = self.processor.model_responses.get(slot)
-            if message:  # 只包含非空消息
-                messages.append(message)
-        
-        if not messages:
-            print("所有模型返回空响应，无法进行评价")
-            self.layer_completed.emit({"error": "所有模型返回空响应"}, "evaluation")
-            return
-        
-        # 其余代码保持不变...
-        eval_settings = self.processor.presets["evaluation"]
-        self.rating_sender = RatingSender()
-        self.rating_sender.rating_finished.connect(
-            lambda ratings: self._handle_evaluation_result(ratings)
-        )
-        self.rating_sender.run(messages, eval_settings)
-    
-    def _handle_evaluation_result(self, ratings):
-        """处理评价层返回结果"""
-        self.layer_completed.emit({
-            "rating": ratings,
-            "messages": [msg for msg in self.processor.model_responses.values() if msg]
-        }, "evaluation")
-    
-    def _dispatch_summary(self, params):
-        """分派汇总层请求"""
-        # 添加调试信息
-        print(f"分派汇总请求，参数类型: {type(params)}")
-        
-        # 如果params为None，尝试从处理器获取有效的workflow_params
-        if params is None:
-            # 尝试从处理器获取工作流参数
-            workflow_params = getattr(self.processor, "workflow_params", None)
-            print(f"使用处理器的工作流参数: {workflow_params}")
-            params = workflow_params
-        
-        summary_settings = self.processor.presets["summary"]
-        messages = self.current_result.get("messages", [])
-        ratings = self.current_result.get("rating", [])
-        
-        if not messages:
-            print("没有有效消息进行汇总")
-            self.layer_completed.emit({"error": "没有有效消息"}, "summary")
-            return
-        
-        self.summary_sender = SummarySender()
-        self.summary_sender.summary_finished.connect(
-            lambda summary: self.layer_completed.emit({"summary": summary}, "summary")
-        )
-        self.summary_sender.summary_response.connect(
-            lambda summary: self.layer_response.emit({"text": summary}, "summary")
-        )
-        
-        # 确保传入有效的params，即使为空字典
-        self.summary_sender.run(messages, ratings, summary_settings, params or {})
-    
-    def _dispatch_style(self, params):
-        """分派风格层请求"""
-        # 尝试获取汇总层的结果，但如果没有（层数可能跳过汇总层），则直接使用并发层的响应
-        summary = self.current_result.get("summary", "")
-        concurrent_messages = self.current_result.get("messages", [])
-        
-        # 如果没有任何输入内容，报错
-        if not summary and not concurrent_messages:
-            print("没有有效的输入内容进行风格化处理")
-            self.layer_completed.emit({"error": "没有输入内容"}, "style")
-            return
-        
-        # 如果没有汇总结果，使用并发层的响应（将它们合并）
-        previous_content = summary
-        if not previous_content and concurrent_messages:
-            # 用分隔线合并所有并发层的响应
-            separator = "\n\n" + "-"*40 + "\n\n"
-            previous_content = separator.join(concurrent_messages)
-        
-        style_settings = self.processor.presets["style"]
-        
-        # 创建并启动风格转换
-        self.style_sender = StyleSender()
-        self.style_sender.style_finished.connect(
-            lambda styled: self.layer_completed.emit({"styled_text": styled}, "style")
-        )
-        self.style_sender.style_response.connect(
-            lambda styled: self.layer_response.emit({"text": styled,'type':'content'}, "style")
-        )
-        self.style_sender.style_thinking.connect(
-            lambda styled: self.layer_response.emit({"text": styled,'type':'reasoning_content'}, "style")
-        )
-
-        self.style_sender.run(previous_content, style_settings, params or {})
-    
-    def _dispatch_correction(self):
-        """分派补正层请求"""
-        # 从风格层获取的数据
-        styled_text = self.current_result.get("styled_text", "")
-        
-        if not styled_text:
-            print("没有风格化文本进行补正")
-            self.layer_completed.emit({"error": "没有风格化文本"}, "correction")
-            return
-        
-        correction_settings = self.processor.presets["correction"]
-        self.correction_sender = CorrectionSender()
-        self.correction_sender.correction_finished.connect(
-            lambda corrected: self.layer_completed.emit({"corrected_text": corrected}, "correction")
-        )
-        self.correction_sender.correction_response.connect(
-            lambda styled: self.layer_response.emit({"text": styled,'type':'content'}, "style")
-        )
-        self.correction_sender.correction_thinking.connect(
-            lambda styled: self.layer_response.emit({"text": styled,'type':'reasoning_content'}, "style")
-        )
-        self.correction_sender.run(styled_text, correction_settings)
-    
-    def set_current_result(self, result):
-        """更新当前处理的中间结果"""
-        self.current_result = result
+    def cancel(self):
+        if self.current_run is not None and not self.current_run.done:
+            self.current_run.signals.disconnect_all()
+            self.current_run.cancel()
+        self.current_run = None
 
 class ConvergenceDialogueOptiProcessor(QWidget):
     PRESETS_PATH = "data/convergence_presets.json"
@@ -1537,15 +1008,11 @@ class ConvergenceDialogueOptiProcessor(QWidget):
         self.dispatcher = RequestDispatcher(self)
         self.init_ui()
         self.connect_signals()
-        self.active_requests = 0
-        self.presets = {
-            "evaluation": {"prefix": "请根据要求对模型响应进行评分。要求：越贴近日常交流，越让人觉得自己在和活生生的人对话时，分数越高。对话内容：\n", "suffix": '\n返回j格式[{"text_id":a,"rating":xx},{"text_id":b,"rating":xx}]', "process_provider": "deepseek", "process_model": "deepseek-chat"},
-            "summary": {"prefix": "请总结以下多个模型响应的核心观点，可以抛弃评价较低的回复和观点:\n", "suffix": "\n\n要求: 生成简短的清晰总结。不要补充或解释原因。", "process_provider": "deepseek", "process_model": "deepseek-chat"},
-            "style": {"prefix": "先前的对话是：#chathistory#\n```内容指导\n#pervious_content#```\n现在在不超出指导内容的前提下（只能缩减，不能增加），回复#user#。要求：回复风格为#style#", "suffix": "style:自然", "process_provider": "deepseek", "process_model": "deepseek-chat"},
-            "correction": {"prefix": "根据要求评估并返回响应的结果:\n#mod_functions#", "suffix": "回复时使用json", "process_provider": "deepseek", "process_model": "deepseek-chat"}
-        }
+        self.presets = copy.deepcopy(DEFAULT_PRESETS)
         
         self.model_responses = {}  # 存储模型响应 {slot: response_text}
+        self.slot_groups = []      # 并发层第 i 个请求对应的模型组
+        self.layer_count = self.ui.layer_spin.value()
         self.load_presets()
 
     def init_ui(self):
@@ -1562,214 +1029,115 @@ class ConvergenceDialogueOptiProcessor(QWidget):
     
     def connect_signals(self):
         self.ui.settings_btn.clicked.connect(self.open_settings)
-        self.dispatcher.layer_completed.connect(self.handle_layer_completed)
-        self.dispatcher.layer_response.connect(self._handle_layer_response)
+        self.dispatcher.node_delta.connect(self.handle_node_delta)
+        self.dispatcher.node_finished.connect(self.handle_node_finished)
     
     def start_workflow(self, params):
-        """启动整个工作流"""
+        """启动整个工作流：按界面选择组图，交给引擎执行"""
         self.init_content_container()
         self.workflow_params = params
-        self.dispatcher.dispatch_request("concurrent", params)
-    
-    def start_concurrent_requests(self, params):
-        """启动并发请求"""
-        # 重置计数器
-        self.active_requests = 0
+        self.layer_count = self.ui.layer_spin.value()
         self.model_responses = {}
-        self.thread_keeper = []
-        
-        
-        # 清除之前的响应
+        self.slot_groups = []
+
+        slots = []
         for group in self.ui.model_groups:
-            text_edit = group.property("response")
-            text_edit.clear()
-        
-        # 遍历所有模型组并发送请求
-        for slot, group in enumerate(self.ui.model_groups):
+            group.property("response").clear()
             vendor_combo = group.property("vendor")
             model_combo = group.property("model")
-            
             vendor = vendor_combo.currentText()
             model = model_combo.currentText()
-            
             if not vendor or not model:
                 continue
-            
-            # 禁用界面控件
+
+            # 禁用界面控件，并发层结束后恢复
             vendor_combo.setEnabled(False)
             model_combo.setEnabled(False)
-            self.ui.concurrent_spin.setEnabled(False)
-            self.active_requests += 1
-            
-            # 创建并启动请求线程
-            sender = ConcurrentorSender(slot, vendor, model, params)
-            sender.request_finished.connect(self.on_request_finished)
-            sender.run()
-            self.thread_keeper.append(sender)
+            slots.append((vendor, model))
+            self.slot_groups.append(group)
+        self.ui.concurrent_spin.setEnabled(False)
 
-    def on_request_finished(self, result):
-        """处理单个并发请求完成"""
-        slot = result["slot"]
-        message = result["message"]
-        
-        # 找到对应的模型组
-        group = self.ui.model_groups[slot]
-        text_edit = group.property("response")
-        
-        # 存储响应
-        self.model_responses[slot] = message
-        
-        # 更新UI
-        text_edit.setPlainText(message)
-        
-        # 减少活跃请求计数
-        self.active_requests -= 1
-        
-        if self.active_requests == 0:
-            # 所有请求完成，重新启用控件
-            for group in self.ui.model_groups:
-                vendor_combo = group.property("vendor")
-                model_combo = group.property("model")
-                
-                vendor_combo.setEnabled(True)
-                model_combo.setEnabled(True)
-            
-            self.ui.concurrent_spin.setEnabled(True)
-            
-            # 通知分派器并发层完成
-            self.dispatcher.layer_completed.emit({
-                "messages": [msg for msg in self.model_responses.values() if msg]
-            }, "concurrent")
+        nodes = build_convergence_graph(
+            params, slots, self.presets, self.layer_count,
+            quorum=self.ui.quorum_spin.value(),
+            timeout=self.ui.timeout_spin.value(),
+        )
+        self.dispatcher.start(nodes)
+
+    def _set_controls_enabled(self, enabled):
+        for group in self.ui.model_groups:
+            group.property("vendor").setEnabled(enabled)
+            group.property("model").setEnabled(enabled)
+        self.ui.concurrent_spin.setEnabled(enabled)
+
+    def handle_node_delta(self, name, kind, delta):
+        """流式片段：最终回复的正文进 content，其余中间层进 reasoning"""
+        if name.startswith("concurrent") or name == "evaluation":
+            return
+        if kind == 'content' and name == final_node_name(self.layer_count) and name != "correction":
+            self.content += delta
+            self.concurrentor_content.emit(str(self.msg_id), self.content)
+        else:
+            self.reasoning_content += delta
+            self.concurrentor_reasoning.emit(str(self.msg_id), self.reasoning_content)
+
+    def handle_node_finished(self, name, result):
+        """某个节点结束，更新对应的界面"""
+        if name.startswith("concurrent."):
+            slot = int(name.split(".", 1)[1])
+            text_edit = self.slot_groups[slot].property("response")
+            if result.ok:
+                self.model_responses[slot] = result.text
+                text_edit.setPlainText(result.text)
+            else:
+                text_edit.setPlainText(f"[{result.error}]")
+
+        elif name == "concurrent":
+            self._set_controls_enabled(True)
             full_concurrent_text_result=''
-            for i in [msg for msg in self.model_responses.values() if msg]:
-                full_concurrent_text_result+='单模型响应：'+i+'\n'
-            self.dispatcher.layer_response.emit({
-                'text':full_concurrent_text_result
-            },"concurrent"
-            )
+            for text in result.value or []:
+                full_concurrent_text_result+='单模型响应：'+text+'\n'
+            self.reasoning_content += full_concurrent_text_result
+            self.concurrentor_reasoning.emit(str(self.msg_id), self.reasoning_content)
 
-    def handle_layer_completed(self, result, layer_name):
-        """处理某一层处理完成"""
-        # 更新当前层结果
-        self.dispatcher.set_current_result(result)
-        layer_count = self.ui.layer_spin.value()
-        
-        # 根据完成的层，执行下一层处理
-        if layer_name == "concurrent":
-            # 并发层完成后，根据层数决定下一步
-            if layer_count >= 4:  # 4层时执行评价层
-                self.dispatcher.dispatch_request("evaluation", None)
-            elif layer_count >= 3:  # 3层时直接执行总结层
-                self.dispatcher.dispatch_request("summary", {
-                    "messages": result.get("messages", [])
-                })
-            else: 
-                self.dispatcher.dispatch_request("style", {
-                    "messages": result.get("messages", []),
-                    **self.workflow_params
-                })
-        
-        elif layer_name == "evaluation":
-            # 更新评价层UI
+        elif name == "evaluation":
             self._update_rating_ui(result)
-            
-            # 传递评价结果给汇总层
-            self.dispatcher.dispatch_request("summary", {
-                "messages": self.model_responses.values(),
-                "rating": result.get("rating", []),
-                **self.workflow_params
-            })
-        
-        elif layer_name == "summary":
-            # 更新汇总层UI
+        elif name == "summary":
             self._update_summary_ui(result)
-            
-            # 传递汇总结果给风格层
-            self.dispatcher.dispatch_request("style", {
-                "summary": result.get("summary", ""),
-                **self.workflow_params
-            })
-        
-        elif layer_name == "style":
-            # 更新风格层UI
+        elif name == "style":
             self._update_style_ui(result)
-            
-            # 检查是否需要补正层
-            if layer_count >= 5:
-                self.dispatcher.dispatch_request("correction", {
-                    "styled_text": result.get("styled_text", "")
-                })
-            else:
-                # 如果不需要补正层，流程结束
-                self.dispatcher.layer_completed.emit(
-                    {"final_result": result.get("styled_text", "")}, "end"
-                )
-                self.concurrentor_finish.emit(str(self.msg_id,result).get("styled_text", ""))
-        
-        elif layer_name == "correction":
-            # 更新补正层UI
+        elif name == "correction":
             self._update_correction_ui(result)
-            
-            # 流程结束
-            self.dispatcher.layer_completed.emit(
-                {"final_result": result.get("corrected_text", "")}, "end"
-            )
-            self.concurrentor_finish.emit(str(self.msg_id),result.get("corrected_text", ""))
+
+        if name == final_node_name(self.layer_count):
+            final_text = result.value if name == "correction" and result.ok else result.text
+            self.concurrentor_finish.emit(str(self.msg_id), final_text or "")
 
     def _update_rating_ui(self, result):
         """更新评价层UI"""
-        if "error" in result:
-            self.ui.score_text.setPlainText(result["error"])
+        if not result.ok:
+            self.ui.score_text.setPlainText(result.error)
             return
         
-        ratings = result.get("rating", [])
         rating_text = ""
-        
-        for result in ratings:
-            text_id = result.get('text_id', '未知')
-            rating = result.get('rating', 0)
+        for rating_item in result.value:
+            text_id = rating_item.get('text_id', '未知')
+            rating = rating_item.get('rating', 0)
             rating_text += f"文本ID: {text_id}  评分: {rating}\n"
         
         self.ui.score_text.setPlainText(rating_text)
     
     def _update_summary_ui(self, result):
         """更新汇总层UI"""
-        if "error" in result:
-            self.ui.summary_text.setPlainText(result["error"])
-            return
-        
-        summary = result.get("summary", "")
-        self.ui.summary_text.setPlainText(summary)
+        self.ui.summary_text.setPlainText(result.text if result.ok else result.error)
 
     def _update_style_ui(self, result):
         """更新风格层UI"""
-        if "error" in result:
-            self.ui.style_text.setPlainText(result["error"])
-            return
-        
-        styled_text = result.get("styled_text", "")
-        self.ui.style_text.setPlainText(styled_text)
+        self.ui.style_text.setPlainText(result.text if result.ok else result.error)
     
     def _update_correction_ui(self, result):
         """更新补正层UI"""
-        if "error" in result:
-            self.ui.correction_text.setPlainText(result["error"])
-            return
-        
-        corrected_text = result.get("corrected_text", "")
-        self.ui.correction_text.setPlainText(corrected_text)
-    
-    def _handle_layer_response(self,result,layer_name):
-        layer_count = self.ui.layer_spin.value()
-        # 统一处理 content 和 reasoning_content
-        if result.get('type','') == 'content' and not (layer_name == "style" and layer_count > 4):
-            self.content += result["text"]
-            self.concurrentor_content.emit(str(self.msg_id), self.content)
-        else:
-            # 默认处理 reasoning_content
-            self.reasoning_content += result["text"]
-            self.concurrentor_reasoning.emit(str(self.msg_id), self.reasoning_content)
-
+        self.ui.correction_text.setPlainText(result.value if result.ok else result.error)
 
     def update_preset(self, layer_name, prefix, suffix, process_provider='', process_model=''):
         if layer_name in self.presets:
@@ -1823,27 +1191,6 @@ class ConvergenceDialogueOptiProcessor(QWidget):
             'model':models
         }
 
-if __name__ == "__22=main__":
-    app = QApplication([])
-    def printer(value):
-        print(value)
-    sender = RatingSender()
-    sender.rating_finished.connect(printer)
-    settings = {
-        "prefix": "请根据以下模型响应进行评分:\n",
-        "suffix": '\n返回json,[{"text_id":a,"rating":xx},{"text_id":b,"rating":xx}]',
-        "process_provider": "deepseek",
-        "process_model": "deepseek-chat"
-    }
-    model_outputs = [
-    "后端测试，给这一段打60分",
-    "后端测试，给这一段打85分",
-    "后端测试，给这一段打0分",
-    "后端测试，在打分之前重复一下给你发送的内容"
-]
-    sender.run(model_outputs, settings)
-    app.exec()
-
 if __name__ == "__main__":
     app = QApplication([])
     processor = ConvergenceDialogueOptiProcessor()
@@ -0,0 +1,291 @@
+"""
+上下文打包：从新到旧挑选要发送的历史消息。
+
+只开轮数限制时和以前的 _get_raw_messages 完全一样；
+开了词符 / 字数限制（InputLimitSettings）后，按预算装箱：
+
+    预算 = 上限 - 预留（系统提示、最近一条 LCI 总结、联网搜索块、工具 schema）
+    从最新一条往前装，装不下就停；截断处对齐到 user 消息，不留半截工具调用
+
+给了 window_step 时窗口起点按步长取整，起点每 window_step 条才挪一次，
+中间几轮的请求前缀完全一致，供应商的前缀缓存能命中：
+    只按轮数    起点往前取整，多带最多 step - 1 条，不会少带
+    按预算      多带的几条装得下就往前取整，否则往后取整；
+                往后取整丢掉的超过窗口一半时放弃取整，缓存命中不能拿大半上下文来换
+
+每条消息的词符数缓存在 info['token_cache'] 里，内容不变就不再重新分词，
+所以长对话每次重新打包只需要给新消息计数。
+"""
+import json
+import zlib
+from typing import Iterable, List, Optional, Protocol, Tuple
+
+from core.session.session_model import MEDIA_TYPES
+
+
+class Tokenizer(Protocol):
+    name: str
+    """写进缓存的标识，换分词器后旧缓存自动失效"""
+
+    def count(self, text: str) -> int: ...
+
+
+class CharRatioTokenizer:
+    """没有离线分词器时的估算：ASCII 约 4 字符一个词符，其余字符（中日韩等）约 1 字符一个"""
+
+    name = "char-ratio"
+
+    def __init__(self, ascii_chars_per_token: float = 4.0, other_chars_per_token: float = 1.0):
+        self.ascii_chars_per_token = ascii_chars_per_token
+        self.other_chars_per_token = other_chars_per_token
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        if text.isascii():
+            return int(len(text) / self.ascii_chars_per_token) + 1
+        ascii_len = len(text.encode("ascii", "ignore"))
+        other_len = len(text) - ascii_len
+        return int(ascii_len / self.ascii_chars_per_token + other_len / self.other_chars_per_token) + 1
+
+
+class TiktokenTokenizer:
+    """tiktoken 分词，编码文件需要已经缓存在本地或者能联网下载一次"""
+
+    def __init__(self, encoding: str):
+        import tiktoken
+        self._encoding = tiktoken.get_encoding(encoding)
+        self.name = f"tiktoken:{encoding}"
+
+    def count(self, text: str) -> int:
+        return len(self._encoding.encode(text, disallowed_special=()))
+
+
+_TOKENIZERS = {}
+
+
+def get_tokenizer(encoding: str = "") -> Tokenizer:
+    """
+    按编码名取分词器，留空或加载失败时退回字符比例估算。
+    结果按编码名缓存，失败的也缓存，避免每次请求都去重试加载。
+    """
+    tokenizer = _TOKENIZERS.get(encoding)
+    if tokenizer is None:
+        tokenizer = CharRatioTokenizer()
+        if encoding:
+            try:
+                tokenizer = TiktokenTokenizer(encoding)
+            except Exception:
+                pass
+        _TOKENIZERS[encoding] = tokenizer
+    return tokenizer
+
+
+def set_tokenizer(encoding: str, tokenizer: Tokenizer):
+    """注册自定义分词器，之后 get_tokenizer(encoding) 会返回它"""
+    _TOKENIZERS[encoding] = tokenizer
+
+
+class ContextPacker:
+    """
+    按轮数和预算选择历史消息。
+    返回的是原历史里的消息对象本身，不做复制。
+    """
+
+    MEDIA_TOKENS = 1000
+    """每个图片/音频/视频按多少词符计"""
+
+    MEDIA_CHARS = 1000
+    """每个图片/音频/视频按多少字计，和 ChatSession 的加权长度一致"""
+
+    MESSAGE_OVERHEAD_TOKENS = 4
+    """每条消息的角色、分隔符开销"""
+
+    def __init__(self, tokenizer: Optional[Tokenizer] = None):
+        self.tokenizer = tokenizer or CharRatioTokenizer()
+
+    # ==================== 计数 ====================
+
+    @staticmethod
+    def _message_text(message: dict) -> Tuple[str, int]:
+        """消息里会被发送的文本，以及媒体数量"""
+        parts = []
+        media = 0
+
+        content = message.get("content")
+        if isinstance(content, str):
+            parts.append(content)
+        elif content:
+            for item in content:
+                item_type = item.get("type") if isinstance(item, dict) else None
+                if item_type == "text":
+                    parts.append(item.get("text", ""))
+                elif item_type in MEDIA_TYPES:
+                    media += 1
+                else:
+                    parts.append(str(item))
+
+        for call in message.get("tool_calls") or ():
+            function = call.get("function", {})
+            parts.append(function.get("name", ""))
+            parts.append(function.get("arguments", ""))
+
+        info = message.get("info")
+        if info:
+            media += len(info.get("multimodal") or ())
+
+        return "\n".join(parts), media
+
+    def text_tokens(self, text: str) -> int:
+        return self.tokenizer.count(text) if text else 0
+
+    def measure(self, message: dict) -> Tuple[int, int]:
+        """单条消息的 (词符数, 字数)，词符数带缓存"""
+        text, media = self._message_text(message)
+        chars = len(text) + media * self.MEDIA_CHARS
+
+        info = message.get("info")
+        signature = zlib.crc32(text.encode("utf-8", "surrogatepass"))
+        cached = info.get("token_cache") if info is not None else None
+        if cached and cached[0] == self.tokenizer.name and cached[1] == signature:
+            text_tokens = cached[2]
+        else:
+            text_tokens = self.text_tokens(text)
+            if info is not None:
+                info["token_cache"] = [self.tokenizer.name, signature, text_tokens]
+
+        tokens = text_tokens + media * self.MEDIA_TOKENS + self.MESSAGE_OVERHEAD_TOKENS
+        return tokens, chars
+
+    def measure_blocks(self, blocks: Iterable[str]) -> Tuple[int, int]:
+        """不在历史里、但会随请求发送的文本块的 (词符数, 字数)"""
+        tokens = chars = 0
+        for block in blocks:
+            if block:
+                tokens += self.text_tokens(block)
+                chars += len(block)
+        return tokens, chars
+
+    # ==================== 打包 ====================
+
+    @staticmethod
+    def _rounds_window(history: list, max_rounds: int) -> int:
+        """只按轮数时窗口的起点：tool 消息不消耗轮数，第 0 条单独保留"""
+        quota = max_rounds - 1
+        count = 0
+        start = len(history)
+        for i in range(len(history) - 1, 0, -1):
+            start = i
+            if history[i].get("role") != "tool":
+                count += 1
+            if count >= quota:
+                break
+        return start
+
+    @staticmethod
+    def _step_align_down(start: int, step: int) -> int:
+        """窗口起点往前取整到 step 的倍数，第 0 条是系统提示，起点至少为 1"""
+        if step <= 1 or start <= 1:
+            return start
+        return max(1, start // step * step)
+
+    @staticmethod
+    def _step_align_up(start: int, step: int, length: int) -> int:
+        """
+        窗口起点往后取整到 step 的倍数。
+        取整后剩下的不到原窗口一半、或者只剩最新一条时不取整，返回原起点。
+        """
+        if step <= 1 or start <= 1:
+            return start
+        aligned = -(-start // step) * step
+        window = length - start
+        kept = length - aligned
+        if kept < window - step or kept * 2 < window or kept < min(window, 2):
+            return start
+        return aligned
+
+    def pack(
+        self,
+        history: list,
+        max_rounds: int,
+        max_tokens: int = 0,
+        max_chars: int = 0,
+        reserved: Tuple[int, int] = (0, 0),
+        window_step: int = 0,
+    ) -> List[dict]:
+        """
+        Args:
+            history: 完整聊天记录，第 0 条是系统提示
+            max_rounds: 最大轮数
+            max_tokens / max_chars: 词符 / 字数上限，0 表示不限
+            reserved: 历史之外要预留的 (词符数, 字数)，见 measure_blocks
+            window_step: 窗口起点的取整步长，0 表示逐条滑动
+        """
+        if not history:
+            return []
+        if len(history) <= 1:
+            return history
+
+        first_msg = history[0]
+        start = self._rounds_window(history, max_rounds)
+
+        if max_tokens <= 0 and max_chars <= 0:
+            return [first_msg] + history[self._step_align_down(start, window_step):]
+
+        tokens_left = (max_tokens or float("inf")) - reserved[0]
+        chars_left = (max_chars or float("inf")) - reserved[1]
+
+        def take(message) -> bool:
+            nonlocal tokens_left, chars_left
+            tokens, chars = self.measure(message)
+            tokens_left -= tokens
+            chars_left -= chars
+            return tokens_left >= 0 and chars_left >= 0
+
+        take(first_msg)
+
+        # 最近一条 LCI 总结固定保留，即使它落在窗口之外
+        lci_index = None
+        for i in range(len(history) - 1, 0, -1):
+            if "lci" in (history[i].get("info") or {}):
+                lci_index = i
+                take(history[i])
+                break
+
+        budget_start = len(history)
+        for i in range(len(history) - 1, start - 1, -1):
+            if i == lci_index:
+                budget_start = i
+                continue
+            # 最新一条无论如何都要发
+            if not take(history[i]) and i != len(history) - 1:
+                break
+            budget_start = i
+
+        if window_step:
+            # 先试着往前取整，多出来的几条装得下就多带；装不下才往后取整
+            aligned = self._step_align_down(budget_start, window_step)
+            fits = all(take(history[i]) for i in range(budget_start - 1, aligned - 1, -1) if i != lci_index)
+            if fits:
+                budget_start = aligned
+            else:
+                budget_start = self._step_align_up(budget_start, window_step, len(history))
+
+        window = history[budget_start:]
+        if budget_start > start:
+            # 预算截断：对齐到 user 消息，避免开头是孤立的工具结果或助手回复
+            for offset, message in enumerate(window):
+                if message.get("role") == "user":
+                    window = window[offset:]
+                    break
+
+        if lci_index is not None and lci_index < len(history) - len(window):
+            return [first_msg, history[lci_index]] + window
+        return [first_msg] + window
+
+
+def tool_schema_text(tool_list: list) -> str:
+    """工具 schema 会随请求一起发送，按 json 文本计入预留"""
+    if not tool_list:
+        return ""
+    return json.dumps(tool_list, ensure_ascii=False)
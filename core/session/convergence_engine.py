@@ -0,0 +1,538 @@
+"""
+ConvergenceEngine - 汇流对话优化的无界面执行引擎。
+
+以前汇流流程写死在 concurrentor.py 的 QWidget 里：并发层从下拉框读模型，
+RequestDispatcher 一层做完才发下一层，每一层都是一个 QObject Sender，
+没有界面就跑不起来，一个慢供应商会拖住整轮。现在流程描述成 LLM 任务的有向无环图：
+
+    concurrent.0 ─┐
+    concurrent.1 ─┼─ concurrent（k/n 汇合）─ evaluation ─ summary ─ style ─ correction
+    concurrent.2 ─┘                                  ╰─（软依赖）─╯
+
+    LLMNode      一次 OneTimeLLMRequester 请求，依赖全部就绪后提交到共享线程池，可单独设超时
+    GatherNode   汇合节点，k 个上游成功就放行，没回来的请求直接中止
+    ConvergenceEngine.start(nodes) -> ConvergenceRun，信号报告每个节点的流式片段和结果
+
+层与层之间没有额外的等待，节点就绪即发。界面（concurrentor.py）只负责组图和展示。
+build_convergence_graph 按层数生成和旧版逐层调度相同的流程。
+
+Dependencies:
+    - psygnal: 信号
+    - jsonfinder: 解析评价层、补正层返回的 json
+"""
+import concurrent.futures
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from psygnal import Signal
+
+from common.signal_bus import BaseSignalBus
+from service.chat_completion.llm_requester import OneTimeLLMRequester, RequestConfig
+
+
+@dataclass
+class NodeResult:
+    """一个节点的结果"""
+    name: str
+    ok: bool = False
+    text: str = ""
+    reasoning: str = ""
+    value: Any = None
+    """LLMNode 是 parse(text) 的返回值；GatherNode 是成功上游的文本列表"""
+    error: str = ""
+    timed_out: bool = False
+    skipped: bool = False
+    """上游失败没有执行，或者汇合后被中止"""
+    duration: float = 0.0
+
+
+@dataclass
+class LLMNode:
+    """
+    一次模型请求。
+
+    build 拿到依赖的结果字典 {节点名: NodeResult}，返回要发送的 messages。
+    deps 需要全部成功；soft_deps 只等它们结束，成败都行（比如评价层失败时汇总层照常进行）。
+    """
+    name: str
+    provider: str
+    model: str
+    build: Callable[[Dict[str, NodeResult]], List[dict]]
+    deps: Tuple[str, ...] = ()
+    soft_deps: Tuple[str, ...] = ()
+    parse: Optional[Callable[[str], Any]] = None
+    timeout: float = 0.0
+    """秒，0 表示不限；超时后中止请求，节点按失败处理"""
+
+
+@dataclass
+class GatherNode:
+    """汇合节点：上游里有 quorum 个成功就完成，0 表示等全部结束"""
+    name: str
+    deps: Tuple[str, ...]
+    quorum: int = 0
+    cancel_rest: bool = True
+    """放行后中止还没回来的上游请求"""
+
+
+Node = Union[LLMNode, GatherNode]
+
+
+class ConvergenceSignals(BaseSignalBus):
+    """引擎信号，都在工作线程里发出，界面侧需要自己切回主线程"""
+    node_started = Signal(str)                  # (node_name)
+    node_delta = Signal(str, str, str)          # (node_name, 'content' | 'reasoning', delta)
+    node_finished = Signal(str, object)         # (node_name, NodeResult)
+    finished = Signal(dict)                     # ({node_name: NodeResult})
+    log = Signal(str)
+
+
+def provider_request_config(provider: str) -> RequestConfig:
+    """按供应商名从设置里取请求配置"""
+    from config import APP_SETTINGS
+    config = APP_SETTINGS.api.providers[provider]
+    return RequestConfig(key=config.key, url=config.url, provider_type=config.provider_type)
+
+
+class ConvergenceRun:
+    """一次图执行的状态，由 ConvergenceEngine.start 创建"""
+
+    def __init__(self, engine: "ConvergenceEngine", nodes: Sequence[Node], signals: ConvergenceSignals):
+        self.engine = engine
+        self.nodes: Dict[str, Node] = {node.name: node for node in nodes}
+        self.signals = signals
+        self.results: Dict[str, NodeResult] = {}
+        self.started_at = time.monotonic()
+
+        self._lock = threading.RLock()
+        self._done = threading.Event()
+        self._submitted = set()
+        self._requesters: Dict[str, OneTimeLLMRequester] = {}
+        self._timers: Dict[str, threading.Timer] = {}
+        self._cancelled = False
+
+        self._dependents: Dict[str, List[str]] = {name: [] for name in self.nodes}
+        for node in nodes:
+            for dep in self._all_deps(node):
+                self._dependents[dep].append(node.name)
+
+    @staticmethod
+    def _all_deps(node: Node) -> Tuple[str, ...]:
+        if isinstance(node, LLMNode):
+            return node.deps + node.soft_deps
+        return node.deps
+
+    # ==================== 调度 ====================
+
+    def _schedule(self, names: Iterable[str]):
+        """检查这些节点是否可以执行/完成"""
+        for name in names:
+            with self._lock:
+                if self._cancelled or name in self.results or name in self._submitted:
+                    continue
+                node = self.nodes[name]
+                if isinstance(node, GatherNode):
+                    gathered = self._gather_ready(node)
+                    if gathered is None:
+                        continue
+                    self._submitted.add(name)
+                else:
+                    deps = self._all_deps(node)
+                    if any(dep not in self.results for dep in deps):
+                        continue
+                    self._submitted.add(name)
+                    broken = [dep for dep in node.deps if not self.results[dep].ok]
+
+            if isinstance(node, GatherNode):
+                self._finish_gather(node, gathered)
+            elif broken:
+                self._resolve(NodeResult(name, skipped=True, error=f"上游失败: {', '.join(broken)}"))
+            else:
+                self.engine.executor.submit(self._execute, node)
+
+    def _gather_ready(self, node: GatherNode) -> Optional[List[str]]:
+        """满足放行条件时返回成功的上游（按 deps 顺序），否则 None"""
+        ok = [dep for dep in node.deps if dep in self.results and self.results[dep].ok]
+        quorum = node.quorum if 0 < node.quorum <= len(node.deps) else len(node.deps)
+        if len(ok) >= quorum or all(dep in self.results for dep in node.deps):
+            return ok
+        return None
+
+    def _finish_gather(self, node: GatherNode, ok: List[str]):
+        if node.cancel_rest:
+            for dep in node.deps:
+                self._abort(dep, NodeResult(dep, skipped=True, error="已凑够响应数，请求被中止"))
+        texts = [self.results[dep].text for dep in ok]
+        self._resolve(NodeResult(
+            node.name,
+            ok=bool(ok),
+            text="\n\n".join(texts),
+            value=texts,
+            error="" if ok else "所有上游请求都失败了",
+            duration=time.monotonic() - self.started_at,
+        ))
+
+    def _resolve(self, result: NodeResult) -> bool:
+        """记录结果，先到先得；返回是否是这次写入的"""
+        with self._lock:
+            if result.name in self.results:
+                return False
+            self.results[result.name] = result
+            timer = self._timers.pop(result.name, None)
+            all_done = len(self.results) == len(self.nodes)
+        if timer is not None:
+            timer.cancel()
+
+        self.signals.node_finished.emit(result.name, result)
+        self._schedule(self._dependents[result.name])
+
+        if all_done:
+            self._done.set()
+            self.signals.finished.emit(dict(self.results))
+        return True
+
+    def _abort(self, name: str, result: NodeResult):
+        """中止还在请求的节点，结果以 result 记"""
+        if name in self.results:
+            return
+        with self._lock:
+            requester = self._requesters.pop(name, None)
+        if self._resolve(result) and requester is not None:
+            self._stop_requester(requester)
+
+    @staticmethod
+    def _stop_requester(requester: OneTimeLLMRequester):
+        requester.signals.disconnect_all()
+        try:
+            requester.pause()
+        except Exception:
+            # 请求线程还没走到 _reset_for_request 时 pause 会取不到 result
+            requester.close()
+
+    # ==================== 执行 ====================
+
+    def _execute(self, node: LLMNode):
+        if self._cancelled or node.name in self.results:
+            return
+        start = time.monotonic()
+        self.signals.node_started.emit(node.name)
+
+        try:
+            inputs = {dep: self.results[dep] for dep in self._all_deps(node)}
+            messages = node.build(inputs)
+            requester = self.engine.requester_factory(config=self.engine.provider_resolver(node.provider))
+        except Exception as e:
+            self._resolve(NodeResult(node.name, error=f"构建请求失败: {e}", duration=time.monotonic() - start))
+            return
+
+        outcome = {}
+        requester.signals.stream_content.connect(
+            lambda rid, delta: self.signals.node_delta.emit(node.name, "content", delta))
+        requester.signals.stream_reasoning.connect(
+            lambda rid, delta: self.signals.node_delta.emit(node.name, "reasoning", delta))
+        requester.signals.finished.connect(lambda rid, history: outcome.setdefault("history", history))
+        requester.signals.failed.connect(lambda rid, err: outcome.setdefault("error", err))
+        requester.signals.error.connect(lambda err: outcome.setdefault("error", err))
+
+        with self._lock:
+            if self._cancelled or node.name in self.results:
+                return
+            self._requesters[node.name] = requester
+            if node.timeout > 0:
+                timer = threading.Timer(node.timeout, self._abort, args=(node.name, NodeResult(
+                    node.name, timed_out=True, error=f"请求超时（{node.timeout}s）", duration=node.timeout,
+                )))
+                timer.daemon = True
+                self._timers[node.name] = timer
+                timer.start()
+
+        params = {"model": node.model, "messages": messages, "stream": True}
+        try:
+            requester.send_request(params, create_thread=False, id=f"CWLA_cvg_{node.name}_{uuid.uuid4().hex[:8]}")
+        except Exception as e:
+            outcome.setdefault("error", str(e))
+        finally:
+            with self._lock:
+                self._requesters.pop(node.name, None)
+
+        duration = time.monotonic() - start
+        history = outcome.get("history")
+        if not history:
+            self._resolve(NodeResult(node.name, error=outcome.get("error", "服务端空回复"), duration=duration))
+            return
+
+        message = history[0]
+        result = NodeResult(
+            node.name,
+            ok=bool((message.get("content") or "").strip()),
+            text=message.get("content") or "",
+            reasoning=message.get("reasoning_content") or "",
+            error="" if (message.get("content") or "").strip() else "服务端空回复",
+            duration=duration,
+        )
+        if result.ok and node.parse is not None:
+            try:
+                result.value = node.parse(result.text)
+            except Exception as e:
+                result.ok, result.error = False, f"解析失败: {e}"
+        self._resolve(result)
+
+    # ==================== 对外 ====================
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """阻塞到所有节点结束，返回是否结束"""
+        return self._done.wait(timeout)
+
+    @property
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    def cancel(self):
+        """中止整张图，没结束的节点都记为 skipped"""
+        with self._lock:
+            self._cancelled = True
+            pending = [name for name in self.nodes if name not in self.results]
+        for name in pending:
+            self._abort(name, NodeResult(name, skipped=True, error="已取消"))
+
+
+class ConvergenceEngine:
+    """
+    图执行器，线程池在多次执行之间共享。
+
+    requester_factory / provider_resolver 可以替换，
+    方便在没有网络的环境下跑基准或者接别的请求器。
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 8,
+        requester_factory: Callable[..., OneTimeLLMRequester] = OneTimeLLMRequester,
+        provider_resolver: Callable[[str], RequestConfig] = provider_request_config,
+    ):
+        self.executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="convergence")
+        self.requester_factory = requester_factory
+        self.provider_resolver = provider_resolver
+
+    @staticmethod
+    def validate(nodes: Sequence[Node]):
+        """节点名唯一、依赖存在、无环，否则抛 ValueError"""
+        names = [node.name for node in nodes]
+        if len(set(names)) != len(names):
+            raise ValueError("duplicate node names")
+        deps = {node.name: ConvergenceRun._all_deps(node) for node in nodes}
+        for name, items in deps.items():
+            missing = [dep for dep in items if dep not in deps]
+            if missing:
+                raise ValueError(f"node {name} depends on unknown nodes: {missing}")
+
+        state = {}
+
+        def visit(name):
+            if state.get(name) == 1:
+                raise ValueError(f"dependency cycle at node {name}")
+            if state.get(name) != 2:
+                state[name] = 1
+                for dep in deps[name]:
+                    visit(dep)
+                state[name] = 2
+
+        for name in names:
+            visit(name)
+
+    def start(self, nodes: Sequence[Node], signals: Optional[ConvergenceSignals] = None) -> ConvergenceRun:
+        """开始执行，立即返回；没有依赖的节点马上提交"""
+        self.validate(nodes)
+        run = ConvergenceRun(self, nodes, signals or ConvergenceSignals())
+        if not nodes:
+            run._done.set()
+            run.signals.finished.emit({})
+            return run
+        run._schedule(list(run.nodes))
+        return run
+
+    def run(self, nodes: Sequence[Node], timeout: Optional[float] = None) -> Dict[str, NodeResult]:
+        """阻塞执行，超时后取消剩余节点"""
+        handle = self.start(nodes)
+        if not handle.wait(timeout):
+            handle.cancel()
+        return dict(handle.results)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+_ENGINE: Optional[ConvergenceEngine] = None
+_ENGINE_LOCK = threading.Lock()
+
+
+def get_convergence_engine() -> ConvergenceEngine:
+    """全局汇流引擎"""
+    global _ENGINE
+    with _ENGINE_LOCK:
+        if _ENGINE is None:
+            _ENGINE = ConvergenceEngine()
+        return _ENGINE
+
+
+# ==================== 汇流流程 ====================
+
+DEFAULT_PRESETS = {
+    "evaluation": {"prefix": "请根据要求对模型响应进行评分。要求：越贴近日常交流，越让人觉得自己在和活生生的人对话时，分数越高。对话内容：\n", "suffix": '\n返回j格式[{"text_id":a,"rating":xx},{"text_id":b,"rating":xx}]', "process_provider": "deepseek", "process_model": "deepseek-chat"},
+    "summary": {"prefix": "请总结以下多个模型响应的核心观点，可以抛弃评价较低的回复和观点:\n", "suffix": "\n\n要求: 生成简短的清晰总结。不要补充或解释原因。", "process_provider": "deepseek", "process_model": "deepseek-chat"},
+    "style": {"prefix": "先前的对话是：#chathistory#\n```内容指导\n#pervious_content#```\n现在在不超出指导内容的前提下（只能缩减，不能增加），回复#user#。要求：回复风格为#style#", "suffix": "style:自然", "process_provider": "deepseek", "process_model": "deepseek-chat"},
+    "correction": {"prefix": "根据要求评估并返回响应的结果:\n#mod_functions#", "suffix": "回复时使用json", "process_provider": "deepseek", "process_model": "deepseek-chat"},
+}
+
+
+def parse_ratings(response_text: str) -> List[dict]:
+    """评价层返回里找出 [{"text_id":..,"rating":..}]，没有时抛 ValueError"""
+    from jsonfinder import jsonfinder
+    for _, __, obj in jsonfinder(response_text, json_only=True):
+        if isinstance(obj, list):
+            ratings = [
+                {"text_id": item["text_id"], "rating": item["rating"]}
+                for item in obj
+                if isinstance(item, dict) and "text_id" in item and "rating" in item
+            ]
+            return ratings
+    raise ValueError("未找到有效的JSON结果")
+
+
+def parse_correction(response_text: str) -> str:
+    """补正层返回里有 {"correction": ...} 就取它，否则整段原样使用"""
+    if "{" in response_text:
+        from jsonfinder import jsonfinder
+        for _, __, obj in jsonfinder(response_text, json_only=True):
+            if isinstance(obj, dict) and "correction" in obj:
+                return obj["correction"]
+    return response_text
+
+
+def _rating_messages(texts: List[str], settings: dict) -> List[dict]:
+    content = settings["prefix"]
+    for i, text in enumerate(texts, 1):
+        content += f"\n\n--- 结果id: {i} ---\n{text}"
+    content += settings["suffix"]
+    return [{"role": "user", "content": content}]
+
+
+def _summary_messages(texts: List[str], ratings: List[dict], settings: dict, params: dict) -> List[dict]:
+    content = settings["prefix"]
+    if not ratings:
+        content += "（以下回复没有评分信息，请自行判断保留优质回答）：\n"
+    for i, text in enumerate(texts):
+        rating_info = next((r for r in ratings if r["text_id"] == i + 1), None)
+        rating_value = rating_info["rating"] if rating_info else "未评分"
+        content += f"\n\n--- 结果 {i+1} | 评分: {rating_value} ---\n{text}"
+    content += settings["suffix"]
+    if "current_message" in params:
+        content = content.replace("{{user}}", params["current_message"])
+    return [{"role": "user", "content": content}]
+
+
+def _style_messages(previous_content: str, settings: dict, params: dict) -> List[dict]:
+    chathistory = params.get("messages", "")
+    user = params.get("user", "用户")
+    message = ''
+    if isinstance(chathistory, list):
+        for item in chathistory:
+            if item["role"] == "user":
+                message += '\n' + user + ':\n' + item["content"] + '\n'
+            elif item["role"] == "assistant":
+                message += '\n' + "AI(you)" + ':\n' + item["content"] + '\n'
+            elif item["role"] == "system":
+                message += "背景设定" + ':\n' + item["content"]
+
+    content = settings["prefix"]
+    content = content.replace("#chathistory#", message)
+    content = content.replace("#user#", user)
+    content = content.replace("#style#", params.get("style", ""))
+    content = content.replace("#pervious_content#", previous_content)
+    content += settings["suffix"]
+    return [{"role": "user", "content": content}]
+
+
+def _correction_messages(styled_text: str, settings: dict) -> List[dict]:
+    mod_functions = settings.get("mod_functions", "优化语法错误，修正流畅度，调整表述使其更加自然")
+    content = settings["prefix"].replace("#mod_functions#", mod_functions)
+    content += styled_text
+    content += settings["suffix"]
+    return [{"role": "user", "content": content}]
+
+
+def build_convergence_graph(
+    params: dict,
+    slots: Sequence[Tuple[str, str]],
+    presets: Optional[Dict[str, dict]] = None,
+    layer_count: int = 4,
+    quorum: int = 0,
+    timeout: float = 0.0,
+) -> List[Node]:
+    """
+    按层数生成汇流流程图，和旧版逐层调度的走向一致：
+
+        2 层：并发 -> 风格
+        3 层：并发 -> 汇总 -> 风格
+        4 层：并发 -> 评价 -> 汇总 -> 风格
+        5 层：并发 -> 评价 -> 汇总 -> 风格 -> 补正
+
+    Args:
+        params: 工作流参数，messages 为完整对话，另有 user / style / current_message
+        slots: 并发层的 (供应商, 模型)
+        quorum: 并发层凑够几个响应就往下走，0 表示等全部
+        timeout: 每个请求的超时（秒），0 表示不限
+    """
+    presets = {**DEFAULT_PRESETS, **(presets or {})}
+    messages = params.get("messages", [])
+    nodes: List[Node] = []
+
+    concurrent_names = []
+    for slot, (provider, model) in enumerate(slots):
+        name = f"concurrent.{slot}"
+        concurrent_names.append(name)
+        nodes.append(LLMNode(name, provider, model, build=lambda inputs: messages, timeout=timeout))
+    nodes.append(GatherNode("concurrent", tuple(concurrent_names), quorum=quorum))
+
+    def llm(name, build, deps, soft_deps=(), parse=None):
+        settings = presets[name]
+        nodes.append(LLMNode(
+            name, settings["process_provider"], settings["process_model"], build=build,
+            deps=deps, soft_deps=soft_deps, parse=parse, timeout=timeout,
+        ))
+
+    if layer_count >= 4:
+        llm("evaluation", lambda inputs: _rating_messages(inputs["concurrent"].value, presets["evaluation"]),
+            deps=("concurrent",), parse=parse_ratings)
+
+    if layer_count >= 3:
+        def build_summary(inputs):
+            evaluation = inputs.get("evaluation")
+            ratings = evaluation.value if evaluation is not None and evaluation.ok else []
+            return _summary_messages(inputs["concurrent"].value, ratings, presets["summary"], params)
+        llm("summary", build_summary, deps=("concurrent",),
+            soft_deps=("evaluation",) if layer_count >= 4 else ())
+
+        style_deps = ("summary",)
+        previous = lambda inputs: inputs["summary"].text
+    else:
+        style_deps = ("concurrent",)
+        separator = "\n\n" + "-" * 40 + "\n\n"
+        previous = lambda inputs: separator.join(inputs["concurrent"].value)
+
+    llm("style", lambda inputs: _style_messages(previous(inputs), presets["style"], params), deps=style_deps)
+
+    if layer_count >= 5:
+        llm("correction", lambda inputs: _correction_messages(inputs["style"].text, presets["correction"]),
+            deps=("style",), parse=parse_correction)
+
+    return nodes
+
+
+def final_node_name(layer_count: int) -> str:
+    """流程最后一个节点，它的结果就是最终回复"""
+    return "correction" if layer_count >= 5 else "style"
@@ -60,7 +60,12 @@ class RepeatProcessor:
 
         for i in range(len(last_four)):
             for j in range(i+1, len(last_four)):
-                ratio = difflib.SequenceMatcher(None, last_four[i], last_four[j]).ratio()
+                matcher = difflib.SequenceMatcher(None, last_four[i], last_four[j])
+                # 上限够不到阈值的两条不用算精确值，ratio() 是平方级的
+                if (matcher.real_quick_ratio() < similarity_threshold
+                        or matcher.quick_ratio() < similarity_threshold):
+                    continue
+                ratio = matcher.ratio()
                 LOGMANAGER.info(f'[RepeatProcesser]当前相似度 {ratio:.2f}')
                 if ratio >= similarity_threshold:
                     LOGMANAGER.warning('[RepeatProcesser]已确认过高相似度')
@@ -69,49 +74,135 @@ class RepeatProcessor:
 
     @classmethod
     def _find_repeated_substrings(cls, last_four):
-        """查找重复子串"""
-        repeats = set()
-        for i in range(len(last_four)):
-            for j in range(i + 1, len(last_four)):
-                s_prev = last_four[i]
-                s_current = last_four[j]
-                cls._add_repeats(s_prev, s_current, repeats)
-        return sorted(repeats, key=lambda x: (-len(x), x))
+        """
+        查找重复子串：对每一对消息，s1 每个位置起、在 s2 里出现过的最长子串都算一个重复项；
+        返回其中不被别的重复项包含的那些，按 (-长度, 文本) 排序。
+
+        最长匹配长度用 s2 反串的后缀自动机一遍扫出来；
+        位置 idx 的匹配如果只是 idx-1 那条去掉首字，必然被包含，直接跳过。
+        剩下的候选拼成一串建自动机，出现不止一次的就是被别的候选包含。
+        """
+        candidates = set()
+        for j in range(1, len(last_four)):
+            automaton = _SuffixAutomaton(last_four[j][::-1])
+            for i in range(j):
+                s1 = last_four[i]
+                lengths = automaton.matching_lengths(s1[::-1])[::-1]
+                prev = 0
+                for idx, length in enumerate(lengths):
+                    if length and length >= prev:
+                        candidates.add(s1[idx:idx + length])
+                    prev = length
+        return sorted(cls._drop_contained(candidates), key=lambda x: (-len(x), x))
 
     @classmethod
-    def _add_repeats(cls, s1, s2, repeats):
-        """添加发现的重复项"""
-        len_s1 = len(s1)
-        for idx in range(len_s1):
-            max_len = len_s1 - idx
-            for l in range(max_len, 0, -1):
-                substr = s1[idx:idx+l]
-                if substr in s2:
-                    repeats.add(substr)
-                    break
+    def _drop_contained(cls, candidates):
+        """去掉被其他候选包含的候选"""
+        if len(candidates) <= 1:
+            return list(candidates)
+        separator = next(chr(c) for c in range(0xE000, 0xF900) if not any(chr(c) in x for x in candidates))
+        automaton = _SuffixAutomaton(separator.join(candidates))
+        counts = automaton.occurrence_counts()
+        return [x for x in candidates if counts[automaton.find(x)] == 1]
 
     @classmethod
     def _clean_repeats(cls, repeats):
-        """清洗重复项结果"""
+        """清洗重复项结果，repeats 已经去掉了被包含的项"""
         symbol_to_remove = [',','.','"',"'",'，','。','！','？','...','——','：','~']
         clean_output = []
-        repeats_check_list = list(reversed(repeats)) 
 
-        for item1 in repeats_check_list:
-            if cls._is_unique_substring(item1, repeats_check_list) and len(item1) > 3:
+        for item1 in reversed(repeats):
+            if len(item1) > 3:
                 cleaned = cls._remove_symbols(item1, symbol_to_remove)
                 if cleaned:
                     clean_output.append(cleaned)
         return clean_output
 
-    @classmethod
-    def _is_unique_substring(cls, item, repeats):
-        """检查是否唯一子串"""
-        return not any(item in item2 and item != item2 for item2 in repeats)
-
     @classmethod
     def _remove_symbols(cls, text, symbols):
         """移除指定符号"""
         for symbol in symbols:
             text = text.replace(symbol, '')
-        return text
\ No newline at end of file
+        return text
+
+
+class _SuffixAutomaton:
+    """后缀自动机，线性时间构建；转移用 dict，适合中文这类大字符集"""
+
+    __slots__ = ('next', 'link', 'length', 'cloned', 'last')
+
+    def __init__(self, text: str = ''):
+        self.next = [{}]
+        self.link = [-1]
+        self.length = [0]
+        self.cloned = [False]
+        self.last = 0
+        for ch in text:
+            self.extend(ch)
+
+    def extend(self, ch: str):
+        nxt, link, length = self.next, self.link, self.length
+        cur = len(length)
+        nxt.append({})
+        length.append(length[self.last] + 1)
+        link.append(0)
+        self.cloned.append(False)
+
+        p = self.last
+        while p != -1 and ch not in nxt[p]:
+            nxt[p][ch] = cur
+            p = link[p]
+        if p != -1:
+            q = nxt[p][ch]
+            if length[p] + 1 == length[q]:
+                link[cur] = q
+            else:
+                clone = len(length)
+                nxt.append(dict(nxt[q]))
+                length.append(length[p] + 1)
+                link.append(link[q])
+                self.cloned.append(True)
+                while p != -1 and nxt[p].get(ch) == q:
+                    nxt[p][ch] = clone
+                    p = link[p]
+                link[q] = link[cur] = clone
+        self.last = cur
+
+    def matching_lengths(self, text: str) -> list:
+        """text 每个位置结尾、在自动机文本里出现过的最长子串长度"""
+        nxt, link, length = self.next, self.link, self.length
+        state = matched = 0
+        result = []
+        for ch in text:
+            while state and ch not in nxt[state]:
+                state = link[state]
+                matched = length[state]
+            if ch in nxt[state]:
+                state = nxt[state][ch]
+                matched += 1
+            else:
+                matched = 0
+            result.append(matched)
+        return result
+
+    def find(self, pattern: str) -> int:
+        """pattern 对应的状态，不是子串时返回 -1"""
+        state = 0
+        for ch in pattern:
+            state = self.next[state].get(ch, -1)
+            if state == -1:
+                return -1
+        return state
+
+    def occurrence_counts(self) -> list:
+        """每个状态代表的子串在文本里出现的次数"""
+        length, link = self.length, self.link
+        counts = [0 if cloned else 1 for cloned in self.cloned]
+        counts[0] = 0
+        buckets = [[] for _ in range(length[self.last] + 1)]
+        for state, l in enumerate(length):
+            buckets[l].append(state)
+        for l in range(len(buckets) - 1, 0, -1):
+            for state in buckets[l]:
+                counts[link[state]] += counts[state]
+        return counts
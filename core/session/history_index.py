@@ -0,0 +1,113 @@
+import os
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, List, Optional
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    file_name      TEXT PRIMARY KEY,
+    file_path      TEXT NOT NULL,
+    chat_id        TEXT,
+    title          TEXT,
+    mtime          REAL NOT NULL,
+    version        TEXT,
+    message_count  INTEGER NOT NULL DEFAULT 0,
+    char_length    INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_sessions_mtime ON sessions (mtime DESC);
+CREATE INDEX IF NOT EXISTS idx_sessions_chat_id ON sessions (chat_id);
+"""
+
+
+class HistoryIndex:
+    """
+    聊天记录的 SQLite 索引，每个存档一行（标题、修改时间、版本、消息数、加权长度）。
+
+    存档文件仍然是唯一的真实数据，索引只是缓存：按 mtime 判断是否过期，
+    过期或缺失时由 ChathistoryFileManager 重新解析后写回，保存时直接用内存里的会话更新。
+    """
+
+    DB_NAME = '.chat_index.sqlite3'
+
+    def __init__(self, history_path: str):
+        self.db_path = os.path.join(history_path, self.DB_NAME)
+        os.makedirs(history_path, exist_ok=True)
+
+        # 自动保存线程写、主线程读，共用一个连接，自己加锁
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.executescript(_SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # ==================== sessions ====================
+
+    @property
+    def is_empty(self) -> bool:
+        with self._lock:
+            return self._conn.execute('SELECT 1 FROM sessions LIMIT 1').fetchone() is None
+
+    def session_mtimes(self) -> Dict[str, float]:
+        """{file_name: mtime}"""
+        with self._lock:
+            rows = self._conn.execute('SELECT file_name, mtime FROM sessions').fetchall()
+        return {r['file_name']: r['mtime'] for r in rows}
+
+    def get_session(self, file_name: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT * FROM sessions WHERE file_name = ?', (file_name,)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def latest_sessions(self, limit: int) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT file_path, title, mtime FROM sessions ORDER BY mtime DESC LIMIT ?',
+                (limit,)
+            ).fetchall()
+        return [dict(r) for r in rows]
+
+    def upsert_session(
+        self,
+        file_name: str,
+        file_path: str,
+        chat_id: str,
+        title: str,
+        mtime: float,
+        version: str,
+        message_count: int,
+        char_length: int,
+    ) -> None:
+        """写入/更新一个存档"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                """
+                INSERT INTO sessions
+                    (file_name, file_path, chat_id, title, mtime, version, message_count, char_length)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(file_name) DO UPDATE SET
+                    file_path = excluded.file_path,
+                    chat_id = excluded.chat_id,
+                    title = excluded.title,
+                    mtime = excluded.mtime,
+                    version = excluded.version,
+                    message_count = excluded.message_count,
+                    char_length = excluded.char_length
+                """,
+                (file_name, file_path, chat_id, title, mtime, version, message_count, char_length),
+            )
+
+    def remove(self, file_names: Iterable[str]) -> None:
+        names = [(n,) for n in file_names]
+        if not names:
+            return
+        with self._lock, self._conn:
+            self._conn.executemany('DELETE FROM sessions WHERE file_name = ?', names)
+
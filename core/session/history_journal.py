@@ -0,0 +1,298 @@
+import json
+import os
+import threading
+import uuid
+from dataclasses import dataclass, field, fields
+from typing import Dict, List, Optional, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from core.session.session_model import ChatSession
+
+
+# 会话顶层字段里除 history 以外需要跟随日志的部分
+_META_FIELDS = ('chat_id', 'new_chat_rounds', 'new_background_rounds', 'title', 'name', 'avatars', 'tools', '_version')
+
+
+@dataclass
+class _JournalState:
+    """某个存档文件最近一次落盘时的状态，只保存引用，不复制消息"""
+    gen: str
+    messages: List[dict] = field(default_factory=list)
+    prints: List[tuple] = field(default_factory=list)
+    meta_json: str = ''
+    title: str = ''
+    snapshot_bytes: int = 0
+    journal_bytes: int = 0
+
+
+class HistoryJournal:
+    """
+    追加式聊天记录日志。
+
+    存档由两部分组成：
+    - `<chat_id>.json`：快照，仍然是 ChatSession 结构（当前为 V3），多了一个 `_journal` 代号字段
+    - `<chat_id>.journal`：JSON Lines，第一行是 base 记录（代号），之后是 add/edit/truncate/meta 记录
+
+    载入时先用 ChatHistoryVersionPatcher 处理快照，再把代号一致的日志重放上去；
+    代号不一致（例如压缩到一半崩溃）的日志直接忽略，快照本身是完整的。
+
+    差异检测先比对象身份：消息 dict 不是同一个就当作结构变化；
+    同一个 dict 再比指纹，界面和打包器会原地改写 reasoning_content、info、tool_calls 等字段。
+    指纹里字符串字段只留引用（不可变，身份不变即内容不变），其余字段取 repr，
+    所以每次保存的开销和正文长度无关，序列化和写盘的量只和变化量有关。
+    """
+
+    JOURNAL_EXT = '.journal'
+
+    COMPACT_MIN_BYTES = 256 * 1024
+    """日志至少这么大才考虑压缩"""
+
+    COMPACT_RATIO = 0.5
+    """日志超过快照大小的这个比例时压缩"""
+
+    def __init__(self):
+        self._states: Dict[str, _JournalState] = {}
+        self._lock = threading.Lock()
+
+    # ==================== 路径 ====================
+
+    @staticmethod
+    def _key(file_path: str) -> str:
+        return os.path.normcase(os.path.abspath(file_path))
+
+    @classmethod
+    def journal_path(cls, file_path: str) -> str:
+        return os.path.splitext(file_path)[0] + cls.JOURNAL_EXT
+
+    # ==================== 状态登记 ====================
+
+    @staticmethod
+    def _meta_of(session: "ChatSession") -> dict:
+        return {name: getattr(session, name) for name in _META_FIELDS}
+
+    @staticmethod
+    def _fingerprint(msg: dict) -> tuple:
+        """消息的指纹：(字符串字段的键和引用, 其余字段的 repr)"""
+        strings = []
+        rest = []
+        for k, v in msg.items():
+            if type(v) is str:
+                strings.append(k)
+                strings.append(v)
+            else:
+                rest.append((k, v))
+        return tuple(strings), repr(rest)
+
+    @staticmethod
+    def _changed(new: tuple, old: tuple) -> bool:
+        new_strings, new_rest = new
+        old_strings, old_rest = old
+        return (
+            new_rest != old_rest
+            or len(new_strings) != len(old_strings)
+            or any(a is not b for a, b in zip(new_strings, old_strings))
+        )
+
+    def _make_state(
+        self, session: "ChatSession", gen: str, snapshot_bytes: int = 0, journal_bytes: int = 0,
+        prints: Optional[List[tuple]] = None,
+    ) -> _JournalState:
+        history = session.history
+        return _JournalState(
+            gen=gen,
+            messages=list(history),
+            prints=prints if prints is not None else [self._fingerprint(msg) for msg in history],
+            meta_json=json.dumps(self._meta_of(session), ensure_ascii=False, sort_keys=True),
+            title=session.title,
+            snapshot_bytes=snapshot_bytes,
+            journal_bytes=journal_bytes,
+        )
+
+    def track(self, file_path: str, session: "ChatSession", gen: str) -> None:
+        """
+        登记刚从磁盘载入的会话，之后的保存可以直接追加。
+        gen 为空（旧格式或刚升级过版本）时清掉旧状态，让下一次保存重写快照。
+        """
+        if not gen:
+            with self._lock:
+                self._states.pop(self._key(file_path), None)
+            return
+        try:
+            snapshot_bytes = os.path.getsize(file_path)
+        except OSError:
+            snapshot_bytes = 0
+        try:
+            journal_bytes = os.path.getsize(self.journal_path(file_path))
+        except OSError:
+            journal_bytes = 0
+        with self._lock:
+            self._states[self._key(file_path)] = self._make_state(session, gen, snapshot_bytes, journal_bytes)
+
+    def discard(self, file_path: str) -> None:
+        """放弃某个存档的日志（整文件重写或删除时调用）"""
+        with self._lock:
+            self._states.pop(self._key(file_path), None)
+        try:
+            os.remove(self.journal_path(file_path))
+        except FileNotFoundError:
+            pass
+
+    # ==================== 保存 ====================
+
+    def save(self, session: "ChatSession", file_path: str) -> None:
+        """增量保存，必要时压缩为新快照"""
+        with self._lock:
+            key = self._key(file_path)
+            state = self._states.get(key)
+
+            if state is None or not os.path.exists(file_path):
+                self._states[key] = self._compact(session, file_path)
+                return
+
+            prints = [self._fingerprint(msg) for msg in session.history]
+            records = self._diff(state, session, prints)
+            if records is None:
+                self._states[key] = self._compact(session, file_path)
+                return
+            if not records:
+                return
+
+            lines = ''.join(json.dumps(r, ensure_ascii=False) + '\n' for r in records)
+            data = lines.encode('utf-8')
+
+            if state.journal_bytes + len(data) > max(self.COMPACT_MIN_BYTES, state.snapshot_bytes * self.COMPACT_RATIO):
+                self._states[key] = self._compact(session, file_path)
+                return
+
+            with open(self.journal_path(file_path), 'ab') as f:
+                f.write(data)
+
+            # 让按修改时间排序的历史列表感知到这次保存
+            os.utime(file_path, None)
+
+            new_state = self._make_state(session, state.gen, state.snapshot_bytes, state.journal_bytes + len(data), prints)
+            self._states[key] = new_state
+
+    def _diff(self, state: _JournalState, session: "ChatSession", prints: List[tuple]) -> Optional[List[dict]]:
+        """
+        计算从上次落盘到当前会话的记录列表，prints 是当前消息的指纹。
+        返回 None 表示变化太大，直接压缩更划算。
+        """
+        records: List[dict] = []
+
+        meta = self._meta_of(session)
+        if session.title != state.title:
+            # 标题要进快照，历史列表只读快照
+            return None
+
+        old_msgs = state.messages
+        old_prints = state.prints
+        new_msgs = session.history
+        n_old, n_new = len(old_msgs), len(new_msgs)
+
+        # 1. 公共前缀，顺便找出原地编辑
+        limit = min(n_old, n_new)
+        k = 0
+        while k < limit:
+            msg = new_msgs[k]
+            if msg is not old_msgs[k]:
+                break
+            if self._changed(prints[k], old_prints[k]):
+                records.append({'op': 'edit', 'index': k, 'msg': msg})
+            k += 1
+
+        # 2. 结构变化
+        if k < n_old or k < n_new:
+            inserted = n_new - n_old
+            if (
+                k < n_old
+                and inserted > 0
+                and all(new_msgs[i + inserted] is old_msgs[i] for i in range(k, n_old))
+            ):
+                # 中间插入（LCI）：插入点之后的消息原样后移
+                for i in range(k, n_old):
+                    if self._changed(prints[i + inserted], old_prints[i]):
+                        records.append({'op': 'edit', 'index': i + inserted, 'msg': new_msgs[i + inserted]})
+                records.insert(0, {'op': 'add', 'index': k, 'msgs': new_msgs[k:k + inserted]})
+            else:
+                # 尾部截断和/或追加
+                if n_new - k > max(32, n_new // 2):
+                    return None
+                if k < n_old:
+                    records.append({'op': 'truncate', 'length': k})
+                if k < n_new:
+                    records.append({'op': 'add', 'index': k, 'msgs': new_msgs[k:]})
+
+        meta_json = json.dumps(meta, ensure_ascii=False, sort_keys=True)
+        if meta_json != state.meta_json:
+            records.append({'op': 'meta', 'data': meta})
+
+        return records
+
+    def _compact(self, session: "ChatSession", file_path: str) -> _JournalState:
+        """写新快照并重置日志，快照和日志都先写临时文件再替换"""
+        gen = uuid.uuid4().hex
+
+        data = {f.name: getattr(session, f.name) for f in fields(session)}
+        data['_journal'] = gen
+        snapshot = json.dumps(data, ensure_ascii=False, indent=4).encode('utf-8')
+
+        tmp_path = file_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(snapshot)
+        os.replace(tmp_path, file_path)
+
+        base = (json.dumps({'op': 'base', 'gen': gen}) + '\n').encode('utf-8')
+        journal_path = self.journal_path(file_path)
+        tmp_path = journal_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(base)
+        os.replace(tmp_path, journal_path)
+
+        return self._make_state(session, gen, len(snapshot), len(base))
+
+    # ==================== 重放 ====================
+
+    @classmethod
+    def replay(cls, file_path: str, data: dict) -> dict:
+        """
+        把日志重放到已经升级到最新版本的会话 dict 上。
+        没有日志或代号不一致时原样返回。
+        """
+        gen = data.get('_journal')
+        if not gen:
+            return data
+
+        journal_path = cls.journal_path(file_path)
+        if not os.path.exists(journal_path):
+            return data
+
+        history = data.setdefault('history', [])
+
+        with open(journal_path, 'r', encoding='utf-8') as f:
+            first = True
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # 最后一行可能写到一半就崩了
+                    break
+
+                op = record.get('op')
+                if first:
+                    first = False
+                    if op != 'base' or record.get('gen') != gen:
+                        return data
+                    continue
+
+                if op == 'add':
+                    index = record['index']
+                    history[index:index] = record['msgs']
+                elif op == 'edit':
+                    history[record['index']] = record['msg']
+                elif op == 'truncate':
+                    del history[record['length']:]
+                elif op == 'meta':
+                    data.update(record['data'])
+
+        return data
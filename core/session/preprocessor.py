@@ -1,6 +1,5 @@
 from __future__ import annotations
 import time
-import copy
 
 from typing import TYPE_CHECKING
 if TYPE_CHECKING:
@@ -14,6 +13,8 @@ from common import LOGMANAGER
 from utils.str_tools import StrTools  
 from service.chat_completion import GlobalPatcher
 from core.session.enforce_repeat import RepeatProcessor
+from core.session.context_packer import ContextPacker, get_tokenizer, tool_schema_text
+from core.session.attachment_store import get_attachment_store
 
 
 LOGGER = LOGMANAGER
@@ -26,6 +27,15 @@ class Preprocessor:
     与 RequestWorkflowManager 分离，专注于数据转换逻辑。
     """
 
+    SEARCH_RESERVE_TOKENS = 600
+    """联网搜索每条结果预留的词符数"""
+
+    SEARCH_RESERVE_CHARS = 800
+    """联网搜索每条结果预留的字数"""
+
+    VOLATILE_TIME_HINT = "（见最后一条系统消息中的当前时间）"
+    """缓存友好布局下 {{time}} / {{date}} 在系统提示里的替代文本，真实时间放到末尾"""
+
     def __init__(self,search_facade:"WebSearchFacade"=None,return_search_result:callable=None):
         self.search_facade = search_facade
         self.return_search_result = return_search_result
@@ -52,8 +62,10 @@ class Preprocessor:
         # 1. 计算合适的轮数并获取原始数据
         raw_messages = self._get_raw_messages(pack, APP_SETTINGS.generation.max_message_rounds)
         
-        # 2. 深复制原始消息，之后所有操作都在副本上进行
-        messages = copy.deepcopy(raw_messages)
+        # 2. 写时复制：列表是新的，消息 dict 仍是历史里的原对象。
+        #    之后每一步都不能原地改消息，要改就换成浅拷贝（见 _replace），
+        #    info 在最后 _purge_message 时丢掉，从头到尾不复制
+        messages = list(raw_messages)
         
         # 3. 按顺序应用所有处理
         
@@ -105,67 +117,68 @@ class Preprocessor:
         逻辑修改：
         1. 始终保留第0条（Global System）。
         2. Tool 类型的消息不计入 max_rounds 消耗。
+        3. 启用词符/字数限制时按预算从新到旧装箱，见 ContextPacker。
         """
-        history = pack.chat_session.history
-        if not history:
-            return []
-
-        # 1. 基础检查：如果历史记录很短，直接返回
-        if len(history) <= 1:
-            return history
-
-        # 2. 准备容器
-        # 始终保留第 0 条
-        first_msg = history[0]
-        recent_messages = []
-
-        # 计算剩余需要填冲的额度 (扣除掉第0条占用的1个名额)
-        quota = max_rounds - 1
-        current_valid_count = 0
-
-        # 3. 倒序遍历 (从最后一条往前走，直到索引 1)
-        for i in range(len(history) - 1, 0, -1):
-            msg = history[i]
-            role = msg.get("role")
-
-            # 先加入当前消息
-            recent_messages.append(msg)
-
-            # 如果是 tool 消息，不消耗额度；其他消息消耗额度
-            if role != "tool":
-                current_valid_count += 1
-
-            # 检查额度是否已满
-            if current_valid_count >= quota:
-                break
+        limits = APP_SETTINGS.limits
+        max_tokens = limits.max_send_token if limits.max_send_token_enabled else 0
+        max_chars = limits.max_send_length if limits.max_send_length_enabled else 0
+
+        packer = ContextPacker(get_tokenizer(limits.tokenizer_encoding))
+        reserved = (0, 0)
+        if max_tokens or max_chars:
+            reserved = self._reserved_budget(packer, pack)
+
+        messages = packer.pack(
+            pack.chat_session.history,
+            max_rounds,
+            max_tokens=max_tokens,
+            max_chars=max_chars,
+            reserved=reserved,
+            window_step=limits.cache_window_step if limits.cache_stable_layout else 0,
+        )
+        if max_tokens or max_chars:
+            LOGGER.info(f'上下文预算: 预留 {reserved[0]} 词符/{reserved[1]} 字，'
+                        f'保留 {len(messages)}/{len(pack.chat_session.history)} 条')
+        return messages
 
-        # 4. 因为是倒序添加的，需要反转回来使其按时间正序排列
-        recent_messages.reverse()
+    def _reserved_budget(self, packer: ContextPacker, pack: ChatCompletionPack) -> tuple[int, int]:
+        """不在历史里、但会跟着请求发出去的内容：工具 schema、联网搜索块"""
+        search_result = pack.optional.get('web_search_result', '')
+        tokens, chars = packer.measure_blocks([tool_schema_text(pack.tool_list), search_result])
 
-        # 5. 拼接首条 + 最近的消息
-        return [first_msg] + recent_messages
+        if not search_result and APP_SETTINGS.web_search.web_search_enabled:
+            # 搜索在打包之后才执行，按结果条数估个上限
+            results_num = APP_SETTINGS.web_search.search_results_num
+            tokens += self.SEARCH_RESERVE_TOKENS * results_num
+            chars += self.SEARCH_RESERVE_CHARS * results_num
+        return tokens, chars
     
+    @staticmethod
+    def _replace(messages: list, index: int, **changes) -> dict:
+        """写时复制：messages[index] 换成带改动的浅拷贝，历史里的原消息不动"""
+        new_msg = {**messages[index], **changes}
+        messages[index] = new_msg
+        return new_msg
+
     def _handle_mod_functions(self, messages, pack: ChatCompletionPack):
         """处理mod函数"""
+        if pack.mod:
+            # mod 函数可能原地修改，给它们浅拷贝
+            messages = [dict(item) for item in messages]
         for func in pack.mod:
             messages = func(messages)
         return messages
     
     def _purge_message(self, messages):
-        """清理不需要的字段"""
+        """清理不需要的字段，生成最终发送的消息（每条都是新 dict，不含 info）"""
         new_messages = []
-        not_needed = ['info']
         
         for item in messages:
+            temp_dict = {key: value for key, value in item.items() if key != 'info'}
             # recover
-            info = item.get('info', {})
-            server_id =info.get('server_id', [])
+            server_id = (item.get('info') or {}).get('server_id', [])
             if server_id:
-                item['id'] = server_id[-1]
-            temp_dict = {}
-            for key, value in item.items():
-                if key not in not_needed:
-                    temp_dict[key] = value
+                temp_dict['id'] = server_id[-1]
             new_messages.append(temp_dict)
         return new_messages
     
@@ -201,7 +214,11 @@ class Preprocessor:
             if force_text:
                 append_text += [f"你必须避免重复以下内容:{force_text}"]
             new_system_msg = {"role": "system", "content": '\n'.join(append_text)}
-            messages.insert(user_index, new_system_msg)
+            if APP_SETTINGS.limits.cache_stable_layout:
+                # 每轮都不同的内容放在末尾，前面的前缀才能命中缓存
+                messages.append(new_system_msg)
+            else:
+                messages.insert(user_index, new_system_msg)
         
         return messages
 
@@ -209,10 +226,10 @@ class Preprocessor:
         """处理网络搜索结果 - 改为User前插入System"""
         search_result = pack.optional.get('web_search_result', '')
         if search_result:
-            if messages[-1]["role"] == "user":
+            if self._last_turn_is_user(messages):
                 prompt_text = f"搜索引擎提供的结果:\n{search_result}\n请根据以上搜索结果回答用户的提问。"
                 new_msg = {"role": "system", "content": prompt_text}
-                messages.insert(-1, new_msg)
+                self._insert_volatile(messages, new_msg)
         
             return messages
 
@@ -259,25 +276,64 @@ class Preprocessor:
             if result['reference']:
                 prompt_text = f"搜索引擎提供的结果:\n{result['reference']}\n请根据以上搜索结果回答用户的提问。"
                 new_msg = {"role": "system", "content": prompt_text}
-                messages.insert(-1, new_msg)
+                self._insert_volatile(messages, new_msg)
                 self.return_search_result(result)
 
         return messages
 
+    @staticmethod
+    def _last_turn_is_user(messages: list) -> bool:
+        """最后一条非系统消息是否是 user；缓存友好布局下风格提示等系统消息会追加在它后面"""
+        for message in reversed(messages):
+            if message["role"] != "system":
+                return message["role"] == "user"
+        return False
+
+    @staticmethod
+    def _insert_volatile(messages: list, new_msg: dict):
+        """插入每轮都会变的系统消息：默认放在最后一条之前，缓存友好布局下放在末尾"""
+        if APP_SETTINGS.limits.cache_stable_layout:
+            messages.append(new_msg)
+        else:
+            messages.insert(-1, new_msg)
+
     def _fix_chat_history(self, messages: list, full_history: list):
         """修复被截断的聊天记录，保证工具调用的完整性"""
-        if len(messages) > 1 and messages[1]['role'] != 'user':
-            current_length = len(messages)
-            cutten_len = len(full_history) - current_length
-            
-            if cutten_len > 0:
-                for item in reversed(full_history[:cutten_len+1]):
-                    if item['role'] != 'user':
-                        messages.insert(1, copy.deepcopy(item))
-                    elif item['role'] == 'user':
-                        messages.insert(1, copy.deepcopy(item))
-                        break
+        # 跳过开头的系统消息（系统提示、被固定保留的 LCI 总结），看第一条对话消息
+        first = next((i for i in range(1, len(messages)) if messages[i]['role'] != 'system'), None)
+        if first is None or messages[first]['role'] == 'user':
+            return messages
+
+        start = self._history_position(messages[first], full_history)
+        if start is None:
+            return messages
+
+        # 往前补到最近的一条 user 消息，开头已经带上的系统消息不重复补
+        kept = {id(m) for m in messages[:first]} | {self._message_id(m) for m in messages[:first]}
+        kept.discard(None)
+        missing = []
+        for item in reversed(full_history[1:start]):
+            if id(item) in kept or self._message_id(item) in kept:
+                continue
+            missing.append(item)
+            if item['role'] == 'user':
+                break
+        messages[first:first] = reversed(missing)
         return messages
+
+    @staticmethod
+    def _message_id(message: dict):
+        return (message.get('info') or {}).get('id')
+
+    @classmethod
+    def _history_position(cls, message: dict, full_history: list):
+        """消息在完整历史里的下标；mod 函数可能换成了拷贝，按 info.id 找"""
+        msg_id = cls._message_id(message)
+        for i in range(len(full_history) - 1, -1, -1):
+            item = full_history[i]
+            if item is message or (msg_id is not None and cls._message_id(item) == msg_id):
+                return i
+        return None
     
     def _handle_long_chat_placement(self, messages:list[ChatMessage]):
         """处理长对话总结 (LCI) 的位置"""
@@ -290,7 +346,7 @@ class Preprocessor:
 
             if lci_msg['role'] == 'system' and lci_msg.get('info', {}).get('lci'):
                 # 合并内容
-                next_msg['content'] = lci_msg['content'] + "\n" + next_msg['content']
+                self._replace(messages, 2, content=lci_msg['content'] + "\n" + next_msg['content'])
                 # 移除 LCI 消息
                 messages.pop(1)
 
@@ -311,13 +367,16 @@ class Preprocessor:
         if not user_name:
             user_name = APP_SETTINGS.names.user if APP_SETTINGS.names.user else 'user'
         
-        for item in messages:
+        cache_stable = APP_SETTINGS.limits.cache_stable_layout
+        volatile_time = False
+
+        for index, item in enumerate(messages):
             role = item.get('role')
             if APP_SETTINGS.names.character_enforce:
                 if role == 'user':
-                    item['name'] = user_name
+                    item = self._replace(messages, index, name=user_name)
                 elif role == 'assistant':
-                    item['name'] = ai_name
+                    item = self._replace(messages, index, name=ai_name)
             
             if role == 'system':
                 content = item.get('content', '')
@@ -327,6 +386,11 @@ class Preprocessor:
                     content = content.replace('{{char}}', ai_name)
                 if '{{model}}' in content:
                     content = content.replace('{{model}}', pack.model)
+                if cache_stable and ('{{time}}' in content or '{{date}}' in content):
+                    # 时间每轮都变，系统提示里只留指引，真实时间追加到末尾
+                    content = content.replace('{{time}}', self.VOLATILE_TIME_HINT)
+                    content = content.replace('{{date}}', self.VOLATILE_TIME_HINT)
+                    volatile_time = True
                 if '{{time}}' in content:
                     content = content.replace('{{time}}', time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()))
                 if '{{date}}' in content:
@@ -350,17 +414,27 @@ class Preprocessor:
                     random_cache_breaker = str(uuid.uuid4())
                     content = content.replace('{{abandon_kvcache}}', random_cache_breaker)
 
-                item['content'] = content
+                if content is not item.get('content'):
+                    self._replace(messages, index, content=content)
+
+        if volatile_time:
+            messages.append({
+                "role": "system",
+                "content": f"当前时间: {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime())}",
+            })
         return messages
     
     def _handle_multimodal_format(self, messages):
-        """处理多模态格式 (将 info.multimodal 合并入 content)"""
-        for single_message in messages:
+        """处理多模态格式 (将 info.multimodal 合并入 content，附件引用换回 data URL)"""
+        store = get_attachment_store()
+        for index, single_message in enumerate(messages):
             if 'info' in single_message and 'multimodal' in single_message['info']:
                 text_content = single_message.get('content', '')
                 text_message = [{"type": "text", "text": text_content}]
-                multimodal_data = single_message['info']['multimodal']
-                single_message['content'] = text_message + multimodal_data
+                multimodal_data = store.resolve_parts(single_message['info']['multimodal'], skip_missing=True)
+                self._replace(messages, index, content=text_message + multimodal_data)
+            elif isinstance(single_message.get('content'), list):
+                self._replace(messages, index, content=store.resolve_parts(single_message['content'], skip_missing=True))
         return messages
     
     def _handle_provider_patch(self, params, pack: ChatCompletionPack):
@@ -385,6 +459,10 @@ class Preprocessor:
         }
         
         gen_settings = APP_SETTINGS.generation
+
+        if stream and APP_SETTINGS.limits.cache_stable_layout:
+            # 流式响应默认不带 usage，要它才能看到缓存命中
+            params['stream_options'] = {'include_usage': True}
         
         if gen_settings.top_p_enable:
             params['top_p'] = float(gen_settings.top_p)
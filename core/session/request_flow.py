@@ -2,10 +2,11 @@ import threading
 import traceback
 import uuid
 import time
+from dataclasses import dataclass
+from functools import partial
 from typing import TYPE_CHECKING,Literal
 
 from psygnal import Signal
-import requests
 
 from config import APP_SETTINGS,APP_RUNTIME
 
@@ -14,15 +15,17 @@ from core.session.preprocessor import Preprocessor
 from core.session.signals import RequestFlowManagerSignalBus
 
 from utils.str_tools import StrTools
+from utils.stream_replace import StreamReplacer
+from utils.latency_tracker import get_latency_tracker
 
 from service.chat_completion.signals import RequesterSignals
 
 from service.chat_completion.llm_requester import OneTimeLLMRequester,RequestConfig
+from service.chat_completion.async_requester import AsyncLLMRequester,get_async_engine
 from .data import RequestType
 
 if TYPE_CHECKING:
     from config.settings import AutoReplaceSettings,UserToolPermission,DangerousTools
-    from requests import Session as requests_session
     from .data import ChatCompletionPack
     from .session_model import ChatMessage,ChatSession
     from utils.status_analysis import StatusAnalyzer
@@ -39,12 +42,14 @@ class MidProcessor:
         self.ARS_config =ARS_config
 
         # 文本处理
-        self._raw_buffer = ""          # 原始的累积文本
-        self._last_processed = ""      # 上一次处理完发给 UI 的文本
+        self._raw_parts = []           # 原始流的增量，规则变更时重放
+        self._replacer: StreamReplacer = None
+        self._emitted = 0              # 已经作为增量发出的长度
     
     def reset(self):
-        self._raw_buffer = ""
-        self._last_processed = ""
+        self._raw_parts = []
+        self._replacer = None
+        self._emitted = 0
     
     @property 
     def signals(self):
@@ -59,30 +64,39 @@ class MidProcessor:
 
         # full_content全部拦截，stream内容重写
         request_signals.stream_content.connect(self._handle_stream_content)
+        # 结束时把暂存的尾巴补发出去
+        request_signals.finished.connect(self._handle_finished)
+
+    def _ensure_replacer(self) -> StreamReplacer:
+        key = (self.ARS_config.autoreplace_from, self.ARS_config.autoreplace_to)
+        if self._replacer is None or self._replacer.key != key:
+            # 流式过程中改了规则：按新规则重放已收到的原文
+            self._replacer = StreamReplacer(*key)
+            if self._raw_parts:
+                self._replacer.feed(''.join(self._raw_parts))
+        return self._replacer
+
+    def _emit_new(self, req_id, processed: str):
+        # 只发已发部分之后的内容，已发的内容不撤回
+        if len(processed) > self._emitted:
+            self.signals.stream_content.emit(req_id, processed[self._emitted:])
+            self._emitted = len(processed)
 
     def _handle_stream_content(self, req_id, delta):
-        # 1. 累积原始流
-        self._raw_buffer += delta
-        # 2. 全量跑一遍正则
-        current_processed = StrTools.vast_replace(
-            self._raw_buffer, 
-            self.ARS_config.autoreplace_from, 
-            self.ARS_config.autoreplace_to
-        )
-        # 3. 比较差异
-        if current_processed.startswith(self._last_processed):
-
-            # 计算增量
-            new_part = current_processed[len(self._last_processed):]
-            if new_part:
-                # 发送增量信号
-                self.signals.stream_content.emit(req_id, new_part)
-
-        # 4. 更新状态
-        self._last_processed = current_processed
-
-        # 5. 全量信号同步更新
-        self.signals.full_content.emit(req_id, current_processed)
+        # 1. 只重算仍可能匹配的尾部窗口
+        replacer = self._ensure_replacer()
+        self._raw_parts.append(delta)
+        if replacer.feed(delta):
+            # 2. 发送新确定的增量
+            self._emit_new(req_id, replacer.stable)
+
+        # 3. 全量信号同步更新，等于对整段原文跑 vast_replace
+        self.signals.full_content.emit(req_id, replacer.preview())
+
+    def _handle_finished(self, req_id, result):
+        if self._replacer is None:
+            return
+        self._emit_new(req_id, self._replacer.preview())
 
 class PostProcessor:
     warning = Signal(str)
@@ -186,12 +200,19 @@ class RequesterPool:
         self.current_requester = requester
 
         self.requesters.add(requester)
+
+    def add_hedge(self, requester: OneTimeLLMRequester):
+        """加入对冲请求，和当前请求并存，胜负分出后由 abandon_all(keep=...) 清掉输家"""
+        self.requesters.add(requester)
     
-    def abandon_all(self):
+    def abandon_all(self, keep: OneTimeLLMRequester = None):
         """
         清理所有请求，重置状态。
+        给了 keep 时保留它并设为当前请求。
         """
         for req in list(self.requesters):
+            if req is keep:
+                continue
             try:
                 req.signals.disconnect_all()
             except Exception as e:
@@ -203,6 +224,85 @@ class RequesterPool:
                 self.log.emit(f"[RequesterPool] Close error: {e}")
         self.requesters.clear()
         self.current_requester = None
+        if keep is not None:
+            self.requesters.add(keep)
+            self.current_requester = keep
+
+@dataclass
+class HedgeAttempt:
+    """对冲中的一路请求"""
+    requester: OneTimeLLMRequester
+    provider: str
+    model: str
+    role: str
+    """primary / backup"""
+    sent_at: float = 0.0
+    first_token_at: float = 0.0
+    error: str = ''
+
+class HedgeState:
+    """
+    一次主请求的对冲状态。
+
+    胜者确定前，每一路的流式信号都先进闸门；第一路出字（或直接结束）的胜出，
+    输家被 abandon，胜者的信号才真正接进主流程。
+    """
+    def __init__(self, request_id: str, delay: float, backup: tuple):
+        self.request_id = request_id
+        self.delay = delay
+        self.backup = backup
+        """(供应商名, ProviderConfig, 模型)"""
+        self.attempts: list[HedgeAttempt] = []
+        self.winner: HedgeAttempt = None
+        self.fired = False
+        self.payload: dict = None
+        self.timer: threading.Timer = None
+        self.lock = threading.Lock()
+
+    def arm(self, payload: dict, fire):
+        """主请求发出前调用：留一份请求体，开始计时"""
+        # 主请求会从 payload 里弹出 extra_headers，这里先浅拷贝一份
+        self.payload = dict(payload)
+        self.attempts[0].sent_at = time.time()
+        self.timer = threading.Timer(self.delay, fire)
+        self.timer.daemon = True
+        self.timer.start()
+
+    def cancel(self):
+        if self.timer:
+            self.timer.cancel()
+
+    def info(self, winner_info: dict) -> dict:
+        """写进结果 info['hedge'] 的账目；输家的用量按胜者的 prompt_tokens 估算"""
+        prompt_tokens = winner_info.get('prompt_tokens')
+        attempts = []
+        extra_prompt_tokens = 0
+        for attempt in self.attempts:
+            entry = {
+                'role': attempt.role,
+                'provider': attempt.provider,
+                'model': attempt.model,
+                'won': attempt is self.winner,
+            }
+            if attempt.first_token_at and attempt.sent_at:
+                entry['ttft_ms'] = int((attempt.first_token_at - attempt.sent_at) * 1000)
+            if attempt.error:
+                entry['error'] = attempt.error[:200]
+            if attempt is self.winner:
+                entry['usage'] = {
+                    k: winner_info[k] for k in ('prompt_tokens', 'completion_tokens', 'total_tokens')
+                    if k in winner_info
+                }
+            elif prompt_tokens is not None and not attempt.error:
+                entry['usage'] = {'prompt_tokens': prompt_tokens, 'estimated': True}
+                extra_prompt_tokens += prompt_tokens
+            attempts.append(entry)
+        return {
+            'delay': self.delay,
+            'fired': self.fired,
+            'attempts': attempts,
+            'extra_prompt_tokens': extra_prompt_tokens,
+        }
 
 class ToolNotExecutedError(RuntimeError):pass
 class MessageOrderError(RuntimeError):pass
@@ -254,13 +354,14 @@ class RequestFlowManager:
         # Requester生命周期管理
         self.requester_pool : RequesterPool = RequesterPool()
 
-        self.request_session : "requests_session" = requests.session()
-
         self.current_requester : OneTimeLLMRequester = None
 
         # cache
         self._request_id_for_tool=''
 
+        # 对冲请求，见 _hedge_gate
+        self._hedge: HedgeState = None
+
         # signals
         self.signals.finish_reason_received.connect(self._on_finish_reason_received)
 
@@ -321,6 +422,17 @@ class RequestFlowManager:
         result = self.status_analyzer.process_stream(request_id, content,content_type)
         self.signals.request_status.emit(result)
 
+    def _record_latency(self, ok: bool):
+        """本次请求的首字延迟、速率或失败记进延迟统计，供 latency / weighted 轮询策略使用"""
+        analyzer = self.status_analyzer
+        if not analyzer.provider or not analyzer.model:
+            return
+        tracker = get_latency_tracker(APP_RUNTIME.paths.latency_stats_path)
+        if not ok:
+            tracker.record_failure(analyzer.provider, analyzer.model)
+        elif analyzer.first_token_time > 0:
+            tracker.record_success(analyzer.provider, analyzer.model, analyzer.process_full())
+
     def _ensure_web_ability(self):
         self.pre_processor.web_enabled(
             search_facade= self.search_facade,
@@ -338,6 +450,9 @@ class RequestFlowManager:
         通常在开始新请求前调用。
         """
         
+        if self._hedge is not None:
+            self._hedge.cancel()
+            self._hedge = None
         self.requester_pool.abandon_all()
         self.status_analyzer.reset()
         self.mid_processor.reset()
@@ -484,15 +599,18 @@ class RequestFlowManager:
             provider_type=pack.provider.provider_type,
         )
 
-        self.current_requester = OneTimeLLMRequester(
-            config=req_config,
-            session=self.request_session
-        )
-        self.mid_processor.bridge_signals(self.current_requester.signals)
-        self.current_requester.signals.finished.connect(self._on_requester_finished)
-
+        self.current_requester = self._create_requester(req_config)
         self.requester_pool.add_requester(self.current_requester)
 
+        backup = self._hedge_backup(pack) if APP_SETTINGS.network.hedge_enabled else None
+        if backup:
+            self._hedge = HedgeState(self._current_request_id, APP_SETTINGS.network.hedge_delay, backup)
+            primary = HedgeAttempt(self.current_requester, pack.provider_name, pack.model, 'primary')
+            self._hedge.attempts.append(primary)
+            self._hedge_gate(self._hedge, primary)
+        else:
+            self._attach_requester(self.current_requester)
+
         # 启动请求线程
         threading.Thread(
             target=self._RWM_main_request_thread,
@@ -501,6 +619,121 @@ class RequestFlowManager:
         ).start()
         return True
 
+    def _attach_requester(self, requester: OneTimeLLMRequester):
+        """请求器的信号接进主流程"""
+        self.mid_processor.bridge_signals(requester.signals)
+        requester.signals.finished.connect(self._on_requester_finished)
+        requester.signals.failed.connect(lambda rid, err: self._record_latency(ok=False))
+
+    # ==================== 对冲请求 ====================
+
+    _HEDGE_GATED = ('stream_content', 'stream_reasoning', 'stream_tool_delta', 'finished', 'failed')
+    """胜负分出前被闸门拦下的信号，其余信号（日志、状态）直接丢弃"""
+
+    def _hedge_backup(self, pack: "ChatCompletionPack"):
+        """备用请求的 (供应商名, ProviderConfig, 模型)，配置无效时返回 None"""
+        name = APP_SETTINGS.network.hedge_provider or pack.provider_name
+        model = APP_SETTINGS.network.hedge_model or pack.model
+        provider = APP_SETTINGS.api.providers.get(name)
+        if provider is None or not model:
+            self.signals.log.emit(f"[RWM hedge] 备用供应商 {name} 不存在，本轮不对冲")
+            return None
+        return name, provider, model
+
+    def _hedge_gate(self, state: HedgeState, attempt: HedgeAttempt):
+        """胜者确定前，这一路的信号先进闸门"""
+        for name in self._HEDGE_GATED:
+            getattr(attempt.requester.signals, name).connect(
+                partial(self._on_hedge_signal, state, attempt, name)
+            )
+
+    def _on_hedge_signal(self, state: HedgeState, attempt: HedgeAttempt, name: str, *args):
+        """
+        第一路出字或结束的请求胜出。
+        失败的一路：另一路还活着就忽略；备用请求还没发就立刻发；都不行才把失败交给主流程。
+        """
+        fire_now = False
+        with state.lock:
+            if state.winner is not None or state is not self._hedge:
+                return
+            if name == 'failed':
+                attempt.error = str(args[1]) if len(args) > 1 else 'failed'
+                alive = [a for a in state.attempts if not a.error]
+                if alive or not state.fired:
+                    # 被压下的失败也要记进延迟统计
+                    get_latency_tracker(APP_RUNTIME.paths.latency_stats_path).record_failure(
+                        attempt.provider, attempt.model
+                    )
+                if alive:
+                    return
+                if not state.fired:
+                    fire_now = True
+                else:
+                    state.winner = attempt
+            else:
+                if name != 'finished':
+                    attempt.first_token_at = time.time()
+                state.winner = attempt
+
+        if fire_now:
+            self.signals.log.emit(f"[RWM hedge] {attempt.provider}/{attempt.model} 失败，立即发出备用请求")
+            self._fire_hedge(state)
+            return
+        self._promote_hedge(state, attempt, name, args)
+
+    def _promote_hedge(self, state: HedgeState, attempt: HedgeAttempt, name: str, args: tuple):
+        """胜者接进主流程，输家全部放弃，再补发触发胜负的那条信号"""
+        state.cancel()
+        self.requester_pool.abandon_all(keep=attempt.requester)
+        attempt.requester.signals.disconnect_all()
+
+        self.current_requester = attempt.requester
+        self.status_analyzer.provider = attempt.provider
+        self.status_analyzer.model = attempt.model
+        if attempt.sent_at:
+            # 首字延迟按胜者自己的发送时间算，延迟统计里才是这个模型真实的 TTFT
+            self.status_analyzer.request_send_time = attempt.sent_at
+        self._attach_requester(attempt.requester)
+
+        if len(state.attempts) > 1:
+            self.signals.log.emit(f"[RWM hedge] {attempt.role} {attempt.provider}/{attempt.model} 胜出")
+        getattr(attempt.requester.signals, name).emit(*args)
+
+    def _fire_hedge(self, state: HedgeState):
+        """等首字超时（或主请求先失败）：同一份请求发给备用模型"""
+        with state.lock:
+            if state.fired or state.winner is not None or state is not self._hedge:
+                return
+            state.fired = True
+        provider_name, provider, model = state.backup
+
+        requester = self._create_requester(RequestConfig(
+            key=provider.key,
+            url=provider.url,
+            provider_type=provider.provider_type,
+        ))
+        attempt = HedgeAttempt(requester, provider_name, model, 'backup', sent_at=time.time())
+        self._hedge_gate(state, attempt)
+
+        with state.lock:
+            # 创建期间可能已经分出胜负，此时不再加入，也不再发送
+            if state.winner is not None or state is not self._hedge:
+                return
+            state.attempts.append(attempt)
+            self.requester_pool.add_hedge(requester)
+
+        self.signals.log.emit(
+            f"[RWM hedge] {state.delay}s 内没有首字，备用请求发往 {provider_name}/{model}"
+        )
+        requester.send_request(dict(state.payload, model=model), create_thread=True, id=state.request_id)
+
+    def _create_requester(self, req_config: RequestConfig) -> OneTimeLLMRequester:
+        """按设置选择线程版或 asyncio 版请求器，两者信号完全一致"""
+        if APP_SETTINGS.network.async_requester:
+            return AsyncLLMRequester(config=req_config, engine=get_async_engine())
+        # 不传 session，按供应商从全局连接池借
+        return OneTimeLLMRequester(config=req_config)
+
     def _RWM_main_request_thread(self, pack: "ChatCompletionPack", requester: OneTimeLLMRequester):
         """
         主请求线程入口，在后台线程中运行。
@@ -532,6 +765,9 @@ class RequestFlowManager:
 
             # 3. 发送请求
             self.signals.log.emit(f"[RWM M_R] msg prepare completed in {time.time()*1000-start_time:.2f}ms")
+            state = self._hedge
+            if state is not None and state.attempts[0].requester is requester:
+                state.arm(payload, partial(self._fire_hedge, state))
             requester.send_request(payload,create_thread=False,id=self._current_request_id)
 
         except Exception as e:
@@ -600,6 +836,17 @@ class RequestFlowManager:
             request_id: 请求唯一标识
             result: LLM返回的消息列表
         """
+        if not (self.current_requester and self.current_requester.paused):
+            self._record_latency(ok=True)
+
+        cache_info = result[0].get('info', {}) if result else {}
+        if self._hedge is not None and self._hedge.winner is not None and result:
+            cache_info['hedge'] = self._hedge.info(cache_info)
+        if 'cached_tokens' in cache_info:
+            self.signals.log.emit(
+                f"前缀缓存命中: {cache_info['cached_tokens']}/{cache_info.get('prompt_tokens', '?')} 词符"
+            )
+
         chat_message,tc_list = self.post_processor.handle_results(result) 
 
         if not tc_list:
@@ -724,29 +971,14 @@ class RequestFlowManager:
             denied_tool_call+=allowed_tool_call
             allowed_tool_call=[]
 
+        tool_results = self._exec_tool_calls(allowed_tool_call, valid_tool_names_snapshot)
         for call in allowed_tool_call:
             tool_to_exec=call['tool_call']
             call_index=call["index"]
-            try:
-                if not call['tool_call']['function']['name'] in valid_tool_names_snapshot:
-                    tool_result = f"工具调用失败。原因：未定义的工具名“{call['tool_call']['function']['name']}”。\n可用工具列表：{' '.join(valid_tool_names_snapshot)}"
-                else:
-                    exec_result = self.function_manager.call_from_openai(tool_to_exec)
-                    self.signals.log.emit(f"调用结果: {exec_result}")
-                    
-                    if  exec_result['ok']:
-                        tool_result = exec_result['result']
-                    else:
-                        tool_result = f"执行错误: {exec_result['message']}"
-                        self.signals.warning.emit(tool_result)
-            except Exception as e:
-                # AI用错误的参数调用了工具或者执行内容把工具核心干碎了
-                tool_result= f"工具解析错误: {e}"
-
             message_to_be_returned[call_index]={
                     "role": "tool",
                     "tool_call_id": tool_to_exec.get("id"),
-                    "content": tool_result,
+                    "content": tool_results[call_index],
                     'info': tool_to_exec
                 }
 
@@ -774,6 +1006,49 @@ class RequestFlowManager:
         if not quick_deny:
             self.signals.request_toolcall_resend.emit(request_id)
 
+    def _exec_tool_calls(self, allowed_tool_call: list, valid_tool_names: list[str]) -> dict:
+        """
+        执行允许的工具调用，返回 {call_index: 工具结果文本}。
+        开启并行时多个调用一起提交给 ToolRegistry，总耗时约等于最慢的一个。
+        """
+        tool_results = {}
+        runnable = []
+        for call in allowed_tool_call:
+            try:
+                name = call['tool_call']['function']['name']
+                if not name in valid_tool_names:
+                    tool_results[call["index"]] = f"工具调用失败。原因：未定义的工具名“{name}”。\n可用工具列表：{' '.join(valid_tool_names)}"
+                else:
+                    runnable.append(call)
+            except Exception as e:
+                tool_results[call["index"]] = f"工具解析错误: {e}"
+
+        if APP_SETTINGS.tool_permission.parallel_calls and len(runnable) > 1:
+            exec_results = self.function_manager.call_batch_from_openai(
+                [call['tool_call'] for call in runnable]
+            )
+            for call, exec_result in zip(runnable, exec_results):
+                tool_results[call["index"]] = self._format_exec_result(exec_result)
+            return tool_results
+
+        for call in runnable:
+            try:
+                exec_result = self.function_manager.call_from_openai(call['tool_call'])
+                tool_results[call["index"]] = self._format_exec_result(exec_result)
+            except Exception as e:
+                # AI用错误的参数调用了工具或者执行内容把工具核心干碎了
+                tool_results[call["index"]] = f"工具解析错误: {e}"
+        return tool_results
+
+    def _format_exec_result(self, exec_result: dict) -> str:
+        """ToolRegistry 的结果字典转成发回给模型的文本"""
+        self.signals.log.emit(f"调用结果: {exec_result}")
+        if exec_result['ok']:
+            return exec_result['result']
+        tool_result = f"执行错误: {exec_result['message']}"
+        self.signals.warning.emit(tool_result)
+        return tool_result
+
     def exec_tool_calls_after_paused(self,denied_tool_call):
         message_to_be_returned={}
         denied_tool_call = denied_tool_call or []
@@ -7,6 +7,7 @@ import threading
 import time
 import uuid
 from .chat_history_manager import ChathistoryFileManager
+from .attachment_store import get_attachment_store
 from .session_model import ChatSession,ChatMessage,ChatList
 from .signals import SessionManagerSignalBus
 
@@ -167,7 +168,14 @@ class SessionManager:
         self.default_names =APP_SETTINGS.names
 
         self.current_chat = ChatSession()
-        self.chathistory_file_manager = ChathistoryFileManager(self.history_path)
+        self.attachment_store = get_attachment_store(APP_RUNTIME.paths.attachment_path)
+        self.chathistory_file_manager = ChathistoryFileManager(
+            self.history_path,
+            use_index=APP_SETTINGS.history.sqlite_index,
+            attachment_store=self.attachment_store,
+        )
+        # 清理存档已删除、或从没保存过的附件；要扫一遍附件目录，放后台
+        threading.Thread(target=self.attachment_store.collect, name="attachment-gc", daemon=True).start()
 
         self.signals = SessionManagerSignalBus()
 
@@ -235,6 +243,7 @@ class SessionManager:
             self.chathistory_file_manager.save_chathistory(
                 chat_session=session,
                 folder_path=self.history_path,
+                incremental=True,
             )
             return True
         except RuntimeError as e:
@@ -346,10 +355,10 @@ class SessionManager:
 
     # ==================== 文件操作 ====================
 
-    def load_chathistory(self, file_path: str = None) -> "ChatSession":
+    def load_chathistory(self, file_path: str = None, track: bool = False) -> "ChatSession":
         """从文件加载聊天记录,不覆盖"""
         try:
-            loaded_chat_session = self.chathistory_file_manager.load_chathistory(file_path)
+            loaded_chat_session = self.chathistory_file_manager.load_chathistory(file_path, track=track)
         except Exception as e:
             self.error.emit(f"载入旧历史失败。错误原因 - {e}")
             return
@@ -418,7 +427,22 @@ class SessionManager:
     def is_saved_current_history(self, file_path: str) -> "ChatSession":
         """
         检查当前历史是否已保存（与文件内容比较）
+        启用索引时只查 chat_id 和消息数，命中返回当前会话
         """
+        try:
+            summary = self.chathistory_file_manager.session_summary(file_path)
+        except Exception as e:
+            self.signals.error.emit(f"聊天记录校对：载入旧历史失败。错误原因： {e}")
+            return None
+
+        if summary is not None:
+            if (
+                summary['message_count'] == self.current_chat.chat_rounds
+                and summary['chat_id'] == str(self.current_chat.chat_id)
+            ):
+                return self.current_chat
+            return None
+
         try:
             loaded = self.chathistory_file_manager.load_chathistory(file_path)
         except Exception as e:
@@ -488,7 +512,7 @@ class SessionManager:
     def change_session_by_path(self,path:str) -> "ChatSession":
         self.autosave()
         self.clear_history()
-        cs = self.load_chathistory(path)
+        cs = self.load_chathistory(path, track=True)
         if cs:
             self.current_chat = cs
         else:
@@ -530,9 +554,15 @@ class SessionManager:
         # 取得待修改值
         content = self.history[-1]["content"]
         muti = self.history[-1].get('info',{}).get('multimodal',[])
+        try:
+            # 输入框只认 data URL
+            muti = self.attachment_store.resolve_parts(muti)
+        except OSError as e:
+            self.warning.emit(f"附件读取失败，已忽略：{e}")
+            muti = []
 
         # 删除待修改值
-        self.history.pop()
+        self.current_chat.pop_message()
 
         # 收尾
         _finished()
@@ -632,7 +662,7 @@ class SessionManager:
         """设置系统消息内容"""
         # system prompt 目前不显示
         if self.current_chat.history and self.current_chat.history[0].get("role") == "system":
-            self.current_chat.history[0]["content"] = content
+            self.current_chat.edit_by_index(0, content)
         self.request_autosave()
 
     def _apply_round_updates(self, amount=0):
@@ -650,7 +680,8 @@ class SessionManager:
             }
         }
         if multimodal:
-            new_msg['info']['multimodal'] = multimodal
+            # 附件存进附件库，历史里只留引用
+            new_msg['info']['multimodal'] = self.attachment_store.intern_parts(multimodal)
         if info:
             for key, value in info.items():
                 new_msg['info'][key] = value
@@ -658,13 +689,13 @@ class SessionManager:
     
     def add_new_message(self,role:str,content: str, multimodal=None,info:dict=None):
         new_msg = self.create_new_message(role,content,multimodal,info)
-        self.current_chat.history.append(new_msg)
+        self.current_chat.append_message(new_msg)
         self._apply_round_updates(1)
         self.signals.history_changed.emit(self.chat_id,self.history)
         self.request_autosave()
 
     def add_messages(self,messages: ChatList):
-        self.current_chat.history.extend(messages)
+        self.current_chat.extend_messages(messages)
         self._apply_round_updates(len(messages))
         self.signals.history_changed.emit(self.chat_id,self.history)
         self.request_autosave()
@@ -738,15 +769,16 @@ class SessionManager:
             max_idx = sorted_pairs[-1][1]
             provided_indices = set(idx for _, idx in sorted_pairs)
 
-            is_continuous = True
-            # 从最小索引遍历到最大索引，检查历史记录
-            for i in range(min_idx, max_idx + 1):
-                role = self.current_chat.history[i].get('role', '')
-                # 如果历史记录里有一句 user 或 assistant 的话
-                if role in ('user', 'assistant'):
-                    if i not in provided_indices:
-                        is_continuous = False
-                        break
+            # 区间内每一句 user/assistant 都必须在 related 里：
+            # 比较区间内对话消息总数（前缀计数，O(1)）和 related 覆盖到的对话消息数
+            history = self.current_chat.history
+            provided_dialog = sum(
+                1 for i in provided_indices
+                if history[i].get('role', '') in ('user', 'assistant')
+            )
+            is_continuous = (
+                self.current_chat.dialog_count(min_idx, max_idx) == provided_dialog
+            )
 
         
         
@@ -789,14 +821,14 @@ class SessionManager:
             insert_pos = anchor_idx + 1
             current_time = time.strftime("%Y-%m-%d %H:%M:%S")
             
-            for i, item in enumerate(items):
+            for item in items:
                 item.setdefault('info', {})
                 item['info'].setdefault('id', f"{business_tag}_{uuid.uuid4().hex[:8]}")
                 item['info'].setdefault('time', current_time)
                 item['info'][business_tag] = item.get('info', {}).get(business_tag, {})
                 item['role'] = 'system'
-                
-                self.current_chat.history.insert(insert_pos + i, item)
+
+            self.current_chat.insert_messages(insert_pos, items)
             
             return True
             
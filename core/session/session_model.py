@@ -58,6 +58,33 @@ ChatList = List[ChatMessage]
 
 DEFAULT_TITLE_SET = {None, '', 'New Chat', 'Untitled Chat'}
 
+
+def _message_length(message: ChatMessage) -> int:
+    """单条消息的加权长度：文本按字符数，媒体按 1000"""
+    content = message.get('content')
+    if not content:
+        return 0
+
+    if type(content) is str:
+        return len(content)
+
+    total = 0
+    for item in content:
+        try:
+            item_type = item['type']
+
+            if item_type == 'text':
+                total += len(item['text'])
+
+            elif item_type in MEDIA_TYPES:
+                total += 1000
+
+            else:
+                total += len(str(item))
+        except KeyError:
+            total += len(str(item))
+    return total
+
 @dataclass
 class ChatSession:
     """
@@ -90,12 +117,153 @@ class ChatSession:
         }
     )
     tools: List[str] = field(default_factory=list)
-    _version: str = 'V2'
+    _version: str = 'V3'
     """ChatSession 类的版本号"""
 
     def __post_init__(self):
         if not self.chat_id:
             self.chat_id = str(uuid.uuid4())
+        self._invalidate_index()
+
+    # ==================== 消息索引 ====================
+    # history 仍是普通 list，外部可以直接改；索引按下面的规则自校验：
+    # - [0, _indexed) 区间内的条目可信，append 只补尾部
+    # - 通过本类方法插入时整体平移插入点之后的条目；删除 / 截断时把 _indexed 回退到修改点
+    # - history 被整体替换、尾部对象对不上、或者绕过本类方法变短时全量重建
+    #   （外部 pop(i) 之后尾部对象仍然对得上，分不清是截尾还是删中间，只能重建）
+    #   两次外部修改之间没有读过索引、且长度和尾部对象都恢复原样（先删后插）时无法察觉
+    # - id 命中后再核对一次，不一致视为未命中并全量重建
+    # - 长度前缀和无法感知原地改 content，改内容要走 edit_by_index
+
+    def _invalidate_index(self) -> None:
+        self._indexed_history = None
+        self._indexed = 0
+        self._indexed_tail = None
+        self._id_index: Dict[str, int] = {}
+        self._dialog_prefix: List[int] = [0]
+        self._length_prefix: List[int] = [0]
+
+    def _sync_index(self) -> None:
+        history = self.history
+        n = len(history)
+
+        if history is not self._indexed_history:
+            self._invalidate_index()
+            self._indexed_history = history
+        elif n < self._indexed or (self._indexed and history[self._indexed - 1] is not self._indexed_tail):
+            # 外部改过已索引的部分：变短了（截尾或删中间），或者中间插入过
+            self._invalidate_index()
+            self._indexed_history = history
+
+        start = self._indexed
+        if start >= n:
+            return
+
+        ids = self._id_index
+        dialog = self._dialog_prefix
+        lengths = self._length_prefix
+        del dialog[start + 1:]
+        del lengths[start + 1:]
+        count = dialog[start]
+        total = lengths[start]
+        seen = set()
+        for i in range(start, n):
+            msg = history[i]
+            key = str(msg.get('info', {}).get('id'))
+            # 重复 id 保留第一次出现的位置；>= start 的旧条目是悬空的，本轮第一次遇到时覆盖
+            if key not in seen:
+                seen.add(key)
+                old = ids.get(key)
+                if old is None or old >= start:
+                    ids[key] = i
+            if msg.get('role') in ('user', 'assistant'):
+                count += 1
+            dialog.append(count)
+            total += _message_length(msg)
+            lengths.append(total)
+
+        self._indexed = n
+        self._indexed_tail = history[n - 1]
+
+    def _truncate_index(self, length: int) -> None:
+        """把可信区间缩到 length，悬空的 id 条目留给命中核对处理"""
+        self._indexed = length
+        self._indexed_tail = self.history[length - 1] if length else None
+        del self._dialog_prefix[length + 1:]
+        del self._length_prefix[length + 1:]
+
+    def has_msg_id(self, msg_id: str) -> bool:
+        try:
+            self.get_msg_index(msg_id)
+            return True
+        except ValueError:
+            return False
+
+    def dialog_count(self, start: int, end: int) -> int:
+        """[start, end] 闭区间内 user/assistant 消息的数量，O(1)"""
+        self._sync_index()
+        return self._dialog_prefix[end + 1] - self._dialog_prefix[start]
+
+    # ==================== 结构修改 ====================
+
+    def append_message(self, message: ChatMessage) -> None:
+        self.history.append(message)
+
+    def extend_messages(self, messages: ChatList) -> None:
+        self.history.extend(messages)
+
+    def insert_messages(self, index: int, messages: ChatList) -> None:
+        """在 index 处插入若干消息，插入点之后的索引整体平移"""
+        self._sync_index()
+        self.history[index:index] = messages
+        if index < self._indexed:
+            self._shift_index(index, messages)
+
+    def _shift_index(self, index: int, messages: ChatList) -> None:
+        """插入后平移索引：字典和前缀和各一次批量操作，不逐条重算尾部"""
+        k = len(messages)
+        ids = {key: (i + k if i >= index else i) for key, i in self._id_index.items()}
+        dialog = self._dialog_prefix
+        lengths = self._length_prefix
+        count = dialog[index]
+        total = lengths[index]
+        new_dialog = []
+        new_lengths = []
+        for offset, msg in enumerate(messages):
+            pos = index + offset
+            key = str(msg.get('info', {}).get('id'))
+            old = ids.get(key)
+            # 重复 id 保留第一次出现的位置
+            if old is None or old > pos:
+                ids[key] = pos
+            if msg.get('role') in ('user', 'assistant'):
+                count += 1
+            new_dialog.append(count)
+            total += _message_length(msg)
+            new_lengths.append(total)
+        dc = count - dialog[index]
+        dl = total - lengths[index]
+        dialog[index + 1:] = new_dialog + [c + dc for c in dialog[index + 1:]]
+        lengths[index + 1:] = new_lengths + [t + dl for t in lengths[index + 1:]]
+        self._id_index = ids
+        self._indexed += k
+
+    def pop_message(self, index: int = -1) -> ChatMessage:
+        self._sync_index()
+        n = len(self.history)
+        if index < 0:
+            index += n
+        message = self.history.pop(index)
+        if index < self._indexed:
+            self._truncate_index(index)
+        return message
+
+    def truncate(self, length: int) -> None:
+        """只保留前 length 条消息"""
+        self._sync_index()
+        del self.history[length:]
+        if length < self._indexed:
+            self._truncate_index(length)
 
     # ==================== 对内速查速改 ====================
     def to_json(self):
@@ -106,11 +274,21 @@ class ChatSession:
         return json.dumps(data_dict, ensure_ascii=False, indent=4)
     
     def get_msg_index(self, msg_id: str) -> int:
-        """根据 ID 查找消息索引，找不到返回 -1"""
-        target_id = str(msg_id) # 提前转一次 string，避免循环里重复转
-        for i, msg in enumerate(self.history):
-            if str(msg.get('info', {}).get('id')) == target_id:
-                return i
+        """根据 ID 查找消息索引，找不到抛 ValueError"""
+        target_id = str(msg_id)
+        self._sync_index()
+
+        idx = self._id_index.get(target_id)
+        history = self.history
+        if idx is not None and idx < len(history) and str(history[idx].get('info', {}).get('id')) == target_id:
+            return idx
+
+        # 未命中或条目过期：外部可能原地改过，全量重建后再查一次
+        self._invalidate_index()
+        self._sync_index()
+        idx = self._id_index.get(target_id)
+        if idx is not None and idx < len(history) and str(history[idx].get('info', {}).get('id')) == target_id:
+            return idx
         raise ValueError(f"Message with ID {msg_id} not found in history")
     
     def truncate_to_message(self, msg_id: str, include_target: bool = True):
@@ -119,8 +297,7 @@ class ChatSession:
         """
         index = self.get_msg_index(msg_id)
         end_index = index + 1 if include_target else index
-        # 直接修改自己的数据
-        self.history = self.history[:end_index]
+        self.truncate(end_index)
 
     def truncate_to_user(self):self.truncate_to_role('user')
 
@@ -140,47 +317,19 @@ class ChatSession:
         if len(self.history) <= 1:
             return
 
-        while len(self.history) > 1 and self.history[-1].get('role') not in roles:
-            self.history.pop()
-
-    def get_last_n_length(self,n:int=0) -> int:
-        target_types_set = MEDIA_TYPES
-        _len = len
-        _str = str
-
-        total = 0
-
-        if n:
-            his=self.history[-n:]
-        else:
-            his=self.history
-
-        for message in his:
-
-            content = message.get('content')
-            if not content:
-                continue
-
-            if type(content) is str:
-                total += _len(content)
-                continue
-
-            for item in content:
-                try:
-                    item_type = item['type']
-
-                    if item_type == 'text':
-                        total += _len(item['text'])
-
-                    elif item_type in target_types_set:
-                        total += 1000
-
-                    else:
-                        total += _len(_str(item))
-                except KeyError:
-                    total += _len(_str(item))
+        end = len(self.history)
+        while end > 1 and self.history[end - 1].get('role') not in roles:
+            end -= 1
+        self.truncate(end)
 
-        return total
+    def get_last_n_length(self, n: int = 0) -> int:
+        """最后 n 条消息的加权长度，n 为 0 时是全部，O(1)"""
+        self._sync_index()
+        lengths = self._length_prefix
+        total = len(lengths) - 1
+        if not n or n >= total:
+            return lengths[total]
+        return lengths[total] - lengths[total - n]
 
     def get_last_message(self, role: str = "") -> ChatMessage:
         """获取最后一条消息（可按role过滤）"""
@@ -218,7 +367,12 @@ class ChatSession:
         return result
 
     def edit_by_index(self, index: int, new_content: str) -> None:
+        self._sync_index()
+        if index < 0:
+            index += len(self.history)
         self.history[index]['content'] = new_content
+        if index < self._indexed:
+            self._truncate_index(index)
 
     @property
     def system_messages(self) -> ChatList :
@@ -34,7 +34,7 @@ class ChatFlowManagerSignalBus(RequesterSignals):
     """LCI完成信号，回传: 日志"""
 
     tts = Signal(str, str)
-    """TTS信号，参数: (request_id, text)"""
+    """TTS信号，参数: (request_id, 正文增量)，空字符串表示这一轮结束"""
 
 class SessionManagerSignalBus(BaseSignalBus):
     log = Signal(str)
@@ -259,10 +259,10 @@ class APIRequestHandler(QObject):
                 self.think_response += content.reasoning_content
                 print(content.reasoning_content, end='', flush=True)
         #try:
-        import openai
-        client = openai.Client(
-            api_key=self.api_config['key'],  # 替换为实际的 API 密钥
-            base_url=self.api_config['url']  # 替换为实际的 API 基础 URL
+        from service.http_pool import get_http_pool
+        client = get_http_pool().openai_client(
+            base_url=self.api_config['url'],
+            api_key=self.api_config['key'],
         )
         try: 
             print('AI回复(流式):')
@@ -0,0 +1,332 @@
+"""
+SandboxPool - python_cmd 的进程外执行池。
+
+以前 python_cmd 在应用进程的工具线程池里直接 exec：CPU 密集的代码占着 GIL 拖慢流式输出和 UI，
+超时后线程也停不下来，那个线程池名额就永远没了。现在：
+
+    SandboxPool
+        ├─ 预热 pool_size 个解释器进程（sandbox_worker.py），执行完放回池里复用
+        ├─ 每次执行有墙钟超时，超时直接结束进程并补一个新的
+        ├─ 内存上限：POSIX 用 RLIMIT_AS，Windows 用 Job Object
+        ├─ CPU 时间上限：POSIX 用 RLIMIT_CPU（Windows 只有墙钟超时）
+        └─ 打印内容有上限，分块流回，可以用 on_output 边执行边拿
+
+一个进程执行 max_runs_per_worker 次后换新，避免用户代码留下的全局状态越积越多。
+"""
+import itertools
+import json
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, List, Optional
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sandbox_worker.py")
+
+WORKER_FLAG = "--sandbox-worker"
+"""打包后没有独立解释器，用这个参数让主程序自己以工作进程身份启动，见 main.py"""
+
+
+@dataclass
+class SandboxResult:
+    """一次执行的结果"""
+    ok: bool
+    output: str = ""
+    error: str = ""
+    truncated: bool = False
+    """打印内容超过上限被截断"""
+    timed_out: bool = False
+    crashed: bool = False
+    """进程中途退出（内存/CPU 超限被系统结束、os._exit 等）"""
+    duration: float = 0.0
+
+
+class _WindowsJob:
+    """Windows Job Object：限制单进程内存，句柄关闭时连带结束进程"""
+
+    JOB_OBJECT_LIMIT_PROCESS_MEMORY = 0x00000100
+    JOB_OBJECT_LIMIT_KILL_ON_JOB_CLOSE = 0x00002000
+    JOB_OBJECT_EXTENDED_LIMIT_INFORMATION_CLASS = 9
+
+    def __init__(self, process: subprocess.Popen, memory_mb: int):
+        import ctypes
+        from ctypes import wintypes
+
+        class IO_COUNTERS(ctypes.Structure):
+            _fields_ = [(name, ctypes.c_ulonglong) for name in (
+                "ReadOperationCount", "WriteOperationCount", "OtherOperationCount",
+                "ReadTransferCount", "WriteTransferCount", "OtherTransferCount",
+            )]
+
+        class JOBOBJECT_BASIC_LIMIT_INFORMATION(ctypes.Structure):
+            _fields_ = [
+                ("PerProcessUserTimeLimit", ctypes.c_int64),
+                ("PerJobUserTimeLimit", ctypes.c_int64),
+                ("LimitFlags", wintypes.DWORD),
+                ("MinimumWorkingSetSize", ctypes.c_size_t),
+                ("MaximumWorkingSetSize", ctypes.c_size_t),
+                ("ActiveProcessLimit", wintypes.DWORD),
+                ("Affinity", ctypes.c_size_t),
+                ("PriorityClass", wintypes.DWORD),
+                ("SchedulingClass", wintypes.DWORD),
+            ]
+
+        class JOBOBJECT_EXTENDED_LIMIT_INFORMATION(ctypes.Structure):
+            _fields_ = [
+                ("BasicLimitInformation", JOBOBJECT_BASIC_LIMIT_INFORMATION),
+                ("IoInfo", IO_COUNTERS),
+                ("ProcessMemoryLimit", ctypes.c_size_t),
+                ("JobMemoryLimit", ctypes.c_size_t),
+                ("PeakProcessMemoryUsed", ctypes.c_size_t),
+                ("PeakJobMemoryUsed", ctypes.c_size_t),
+            ]
+
+        kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+        kernel32.CreateJobObjectW.restype = wintypes.HANDLE
+        kernel32.CreateJobObjectW.argtypes = (ctypes.c_void_p, wintypes.LPCWSTR)
+        kernel32.SetInformationJobObject.argtypes = (wintypes.HANDLE, ctypes.c_int, ctypes.c_void_p, wintypes.DWORD)
+        kernel32.AssignProcessToJobObject.argtypes = (wintypes.HANDLE, wintypes.HANDLE)
+        kernel32.CloseHandle.argtypes = (wintypes.HANDLE,)
+        self._kernel32 = kernel32
+
+        self._handle = kernel32.CreateJobObjectW(None, None)
+        if not self._handle:
+            raise ctypes.WinError(ctypes.get_last_error())
+
+        info = JOBOBJECT_EXTENDED_LIMIT_INFORMATION()
+        flags = self.JOB_OBJECT_LIMIT_KILL_ON_JOB_CLOSE
+        if memory_mb > 0:
+            flags |= self.JOB_OBJECT_LIMIT_PROCESS_MEMORY
+            info.ProcessMemoryLimit = memory_mb * 1024 * 1024
+        info.BasicLimitInformation.LimitFlags = flags
+
+        if not kernel32.SetInformationJobObject(
+            self._handle, self.JOB_OBJECT_EXTENDED_LIMIT_INFORMATION_CLASS,
+            ctypes.byref(info), ctypes.sizeof(info),
+        ) or not kernel32.AssignProcessToJobObject(self._handle, int(process._handle)):
+            error = ctypes.WinError(ctypes.get_last_error())
+            self.close()
+            raise error
+
+    def close(self):
+        if self._handle:
+            self._kernel32.CloseHandle(self._handle)
+            self._handle = None
+
+
+class _Worker:
+    """一个预热好的解释器进程，后台线程把它的输出逐行读进队列"""
+
+    def __init__(self, memory_mb: int):
+        if getattr(sys, "frozen", False):
+            command = [sys.executable, WORKER_FLAG]
+        else:
+            command = [sys.executable, "-u", WORKER_SCRIPT]
+
+        self.process = subprocess.Popen(
+            command,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            creationflags=getattr(subprocess, "CREATE_NO_WINDOW", 0),
+        )
+        self.runs = 0
+        self.messages: "queue.Queue[Optional[dict]]" = queue.Queue()
+
+        self._job = None
+        if sys.platform == "win32":
+            try:
+                self._job = _WindowsJob(self.process, memory_mb)
+            except Exception:
+                # 限制加不上也照常执行，只是没有内存上限
+                self._job = None
+
+        threading.Thread(target=self._read, name="sandbox-reader", daemon=True).start()
+
+    def _read(self):
+        for raw in self.process.stdout:
+            try:
+                self.messages.put(json.loads(raw))
+            except ValueError:
+                continue
+        # None 表示进程已经退出
+        self.messages.put(None)
+
+    @property
+    def alive(self) -> bool:
+        return self.process.poll() is None
+
+    def send(self, job: dict):
+        self.process.stdin.write((json.dumps(job, ensure_ascii=False) + "\n").encode("utf-8"))
+        self.process.stdin.flush()
+
+    def kill(self):
+        try:
+            self.process.kill()
+            self.process.wait(timeout=2.0)
+        except Exception:
+            pass
+        for stream in (self.process.stdin, self.process.stdout):
+            try:
+                stream.close()
+            except Exception:
+                pass
+        if self._job is not None:
+            self._job.close()
+
+
+class SandboxPool:
+    """预热的代码执行进程池，run() 可以在任意线程调用"""
+
+    def __init__(self, size: int = 2, memory_mb: int = 1024, max_runs_per_worker: int = 20):
+        self.size = max(1, size)
+        self.memory_mb = memory_mb
+        self.max_runs_per_worker = max_runs_per_worker
+
+        self._idle: List[_Worker] = []
+        self._count = 0
+        self._cond = threading.Condition()
+        self._job_ids = itertools.count(1)
+        self._closed = False
+
+    def warm(self):
+        """把空闲进程补到 size 个，进程在后台启动，不等它就绪"""
+        with self._cond:
+            while not self._closed and self._count < self.size:
+                self._idle.append(_Worker(self.memory_mb))
+                self._count += 1
+
+    def _acquire(self) -> _Worker:
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise RuntimeError("sandbox pool is closed")
+                while self._idle:
+                    worker = self._idle.pop()
+                    if worker.alive:
+                        return worker
+                    worker.kill()
+                    self._count -= 1
+                if self._count < self.size:
+                    self._count += 1
+                    return _Worker(self.memory_mb)
+                self._cond.wait()
+
+    def _release(self, worker: _Worker, reusable: bool):
+        with self._cond:
+            if reusable and not self._closed and worker.alive and worker.runs < self.max_runs_per_worker:
+                self._idle.append(worker)
+            else:
+                worker.kill()
+                self._count -= 1
+                if not self._closed:
+                    # 立刻补一个，下次调用不用等解释器启动
+                    self._idle.append(_Worker(self.memory_mb))
+                    self._count += 1
+            self._cond.notify()
+
+    def run(
+        self,
+        code: str,
+        timeout: float,
+        cpu_seconds: int = 0,
+        max_output: int = 10000,
+        on_output: Optional[Callable[[str], None]] = None,
+    ) -> SandboxResult:
+        """
+        在沙盒进程里执行代码，阻塞到结束、超时或进程退出。
+
+        Args:
+            timeout: 墙钟超时（秒），到点直接结束进程
+            cpu_seconds: CPU 时间上限（秒，仅 POSIX），0 不限
+            max_output: 回传的打印内容上限（字）
+            on_output: 每收到一块打印内容就回调一次
+        """
+        start = time.monotonic()
+        deadline = start + timeout
+        worker = self._acquire()
+        job_id = next(self._job_ids)
+        parts = []
+        reusable = False
+
+        try:
+            worker.runs += 1
+            worker.send({
+                "id": job_id,
+                "code": code,
+                "memory_mb": self.memory_mb,
+                "cpu_seconds": cpu_seconds,
+                "max_output": max_output,
+            })
+
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return SandboxResult(
+                        ok=False, output="".join(parts), timed_out=True,
+                        error=f"执行超时（{timeout}s），进程已结束",
+                        duration=time.monotonic() - start,
+                    )
+                try:
+                    message = worker.messages.get(timeout=remaining)
+                except queue.Empty:
+                    continue
+
+                if message is None:
+                    return SandboxResult(
+                        ok=False, output="".join(parts), crashed=True,
+                        error="执行进程意外退出（可能超出内存或 CPU 时间限制）",
+                        duration=time.monotonic() - start,
+                    )
+                if message.get("id") != job_id:
+                    continue
+
+                if message["type"] == "output":
+                    parts.append(message["data"])
+                    if on_output is not None:
+                        on_output(message["data"])
+                elif message["type"] == "done":
+                    reusable = True
+                    return SandboxResult(
+                        ok=message["ok"],
+                        output="".join(parts),
+                        error=message.get("error", ""),
+                        truncated=message.get("truncated", False),
+                        duration=time.monotonic() - start,
+                    )
+        except OSError as e:
+            # 往已经退出的进程写任务
+            return SandboxResult(ok=False, output="".join(parts), crashed=True, error=str(e),
+                                 duration=time.monotonic() - start)
+        finally:
+            self._release(worker, reusable)
+
+    def shutdown(self):
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._count -= len(idle)
+            self._cond.notify_all()
+        for worker in idle:
+            worker.kill()
+
+
+_POOL: Optional[SandboxPool] = None
+_POOL_LOCK = threading.Lock()
+
+
+def get_sandbox_pool(size: int = 2, memory_mb: int = 1024, max_runs_per_worker: int = 20) -> SandboxPool:
+    """全局沙盒池，参数变了就换一个新池"""
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None or (_POOL.size, _POOL.memory_mb, _POOL.max_runs_per_worker) != (
+            max(1, size), memory_mb, max_runs_per_worker
+        ):
+            if _POOL is not None:
+                _POOL.shutdown()
+            _POOL = SandboxPool(size, memory_mb, max_runs_per_worker)
+            _POOL.warm()
+        return _POOL
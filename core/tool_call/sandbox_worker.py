@@ -0,0 +1,156 @@
+"""
+python_cmd 沙盒工作进程。
+
+独立脚本，只依赖标准库，启动时不导入应用的任何包。
+父进程（SandboxPool）通过 stdin 每行发一个 JSON 任务，通过 stdout 收回：
+
+    {"type": "ready", "pid": ...}                         启动完成
+    {"id": ..., "type": "output", "data": "..."}          打印内容，分块、有上限
+    {"id": ..., "type": "done", "ok": ..., "error": ...}   一次执行结束
+
+协议通道是启动时复制出来的文件描述符，fd 0/1 被换成 devnull，
+用户代码的 input()、子进程直接写 stdout 都碰不到协议。
+"""
+import io
+import json
+import os
+import sys
+import time
+
+FLUSH_CHARS = 4096
+"""攒够这么多字就发一块"""
+
+FLUSH_INTERVAL = 0.05
+"""遇到换行且距上次发送超过这么久就发一块"""
+
+
+def _send(channel, message: dict):
+    channel.write(json.dumps(message, ensure_ascii=False) + "\n")
+    channel.flush()
+
+
+class _StreamWriter(io.TextIOBase):
+    """替换 sys.stdout：超过上限的部分丢弃，其余分块发回父进程"""
+
+    def __init__(self, channel, job_id, max_output: int):
+        self._channel = channel
+        self._job_id = job_id
+        self._max_output = max_output
+        self._pending = []
+        self._pending_len = 0
+        self._last_flush = time.monotonic()
+        self.total = 0
+        self.truncated = False
+
+    def writable(self):
+        return True
+
+    def write(self, s):
+        if not isinstance(s, str):
+            raise TypeError(f"write() argument must be str, not {type(s).__name__}")
+
+        remaining = self._max_output - self.total
+        piece = s[:remaining] if remaining > 0 else ""
+        if len(piece) < len(s):
+            self.truncated = True
+
+        if piece:
+            self.total += len(piece)
+            self._pending.append(piece)
+            self._pending_len += len(piece)
+            if self._pending_len >= FLUSH_CHARS or (
+                "\n" in piece and time.monotonic() - self._last_flush >= FLUSH_INTERVAL
+            ):
+                self.flush()
+        return len(s)
+
+    def flush(self):
+        if self._pending:
+            _send(self._channel, {"id": self._job_id, "type": "output", "data": "".join(self._pending)})
+            self._pending = []
+            self._pending_len = 0
+        self._last_flush = time.monotonic()
+
+
+def _apply_limits(job: dict):
+    """POSIX 下用 rlimit 限制内存和本次执行的 CPU 时间；Windows 的内存限制由父进程的 Job Object 负责"""
+    try:
+        import resource
+    except ImportError:
+        return
+
+    memory_mb = job.get("memory_mb") or 0
+    if memory_mb > 0:
+        limit = memory_mb * 1024 * 1024
+        try:
+            resource.setrlimit(resource.RLIMIT_AS, (limit, resource.getrlimit(resource.RLIMIT_AS)[1]))
+        except (ValueError, OSError):
+            pass
+
+    cpu_seconds = job.get("cpu_seconds") or 0
+    if cpu_seconds > 0:
+        # RLIMIT_CPU 是整个进程累计的，进程会被复用，所以按已用时间往后顺延
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        soft = int(usage.ru_utime + usage.ru_stime) + 1 + int(cpu_seconds)
+        try:
+            resource.setrlimit(resource.RLIMIT_CPU, (soft, resource.getrlimit(resource.RLIMIT_CPU)[1]))
+        except (ValueError, OSError):
+            pass
+
+
+def _run_job(channel, job: dict, home: str):
+    job_id = job.get("id")
+    writer = _StreamWriter(channel, job_id, job.get("max_output", 10000))
+    ok, error = True, ""
+
+    _apply_limits(job)
+    stdout = sys.stdout
+    sys.stdout = writer
+    try:
+        exec(compile(job["code"], "<python_cmd>", "exec"), {"__name__": "__main__"})
+    except SystemExit:
+        pass
+    except BaseException as e:
+        ok, error = False, str(e) or e.__class__.__name__
+    finally:
+        sys.stdout = stdout
+        writer.flush()
+        # 进程会被复用，把工作目录还原
+        try:
+            os.chdir(home)
+        except OSError:
+            pass
+
+    _send(channel, {
+        "id": job_id,
+        "type": "done",
+        "ok": ok,
+        "error": error,
+        "truncated": writer.truncated,
+    })
+
+
+def main() -> int:
+    commands = os.fdopen(os.dup(0), "r", encoding="utf-8")
+    channel = os.fdopen(os.dup(1), "w", encoding="utf-8")
+
+    null_fd = os.open(os.devnull, os.O_RDWR)
+    os.dup2(null_fd, 0)
+    os.dup2(null_fd, 1)
+    sys.stdin = io.StringIO()
+
+    # 和 python -c 一样，让用户代码从当前目录导入
+    home = os.getcwd()
+    if sys.path and not getattr(sys, "frozen", False):
+        sys.path[0] = home
+
+    _send(channel, {"type": "ready", "pid": os.getpid()})
+    for line in commands:
+        if not line.strip():
+            continue
+        _run_job(channel, json.loads(line), home)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -11,7 +11,7 @@ from PyQt6 import QtCore
 
 
 logger = logging.getLogger("tools")
-executor = concurrent.futures.ThreadPoolExecutor(max_workers=4)
+executor = concurrent.futures.ThreadPoolExecutor(max_workers=8)  # 并行工具调用时同一轮可能有多个阻塞工具
 
 @dataclass
 class Tool:
@@ -23,6 +23,7 @@ class Tool:
     timeout: float = 30.0
     permissions: List[str] = field(default_factory=list)
     is_async: bool = False
+    parallel: bool = True  # False：和其他工具调用互斥执行（比如会改同一个文件、改全局状态）
 
 class ToolRegistry:
     def __init__(self):
@@ -151,10 +152,17 @@ class ToolRegistry:
             fut = executor.submit(lambda: tool.handler(**arguments))
         return fut
 
+    @staticmethod
+    def _time_limit(tool: Optional[Tool]) -> Optional[float]:
+        """Tool.timeout 为 0 或 None 表示不限时，统一换成 None"""
+        if tool is None or not tool.timeout or tool.timeout <= 0:
+            return None
+        return tool.timeout
+
     def _run(self, tool: Tool, arguments: Dict[str, Any]):
         fut = self._submit(tool, arguments)
         try:
-            return fut.result(timeout=tool.timeout)
+            return fut.result(timeout=self._time_limit(tool))
         except concurrent.futures.TimeoutError as e:
             # 尝试取消协程任务；线程池任务一般不可取消
             try:
@@ -163,6 +171,30 @@ class ToolRegistry:
                 pass
             raise TimeoutError(f"Tool '{tool.name}' timed out after {tool.timeout}s") from e
 
+    @staticmethod
+    def _ok_result(name: str, start: float, value: Any) -> Dict[str, Any]:
+        return {
+            "ok": True,
+            "tool": name,
+            "duration_ms": int((time.time() - start) * 1000),
+            "result": str(value) #兼容性转写
+        }
+
+    @staticmethod
+    def _error_result(name: str, e: BaseException) -> Dict[str, Any]:
+        return {
+            "ok": False,
+            "tool": name,
+            "error_type": e.__class__.__name__,
+            "message": str(e)
+        }
+
+    @staticmethod
+    def _done_future(value) -> concurrent.futures.Future:
+        f = concurrent.futures.Future()
+        f.set_result(value)
+        return f
+
     def call(self, name: str, arguments: Union[str, Dict[str, Any]]):
         tool = self.get(name)
         if not tool:
@@ -173,73 +205,122 @@ class ToolRegistry:
 
         start = time.time()
         try:
-            result = str(self._run(tool, args)) #兼容性转写
-            return {
-                "ok": True,
-                "tool": name,
-                "duration_ms": int((time.time() - start) * 1000),
-                "result": result
-            }
+            return self._ok_result(name, start, self._run(tool, args))
         except Exception as e:
             logger.exception("Tool run error: %s", name)
-            return {
-                "ok": False,
-                "tool": name,
-                "error_type": e.__class__.__name__,
-                "message": str(e)
-            }
+            return self._error_result(name, e)
 
     def call_async(self, name: str, arguments: Union[str, Dict[str, Any]]) -> concurrent.futures.Future:
         """
         非阻塞入口：返回一个 concurrent.futures.Future。
         注意：返回值为 call(...) 的字典结果，而非工具原始返回值。
+        不在线程池里再开一层等待（那样并发数一多会把线程池占满互相等死），
+        超时用计时器：到 Tool.timeout 还没结束就以 TimeoutError 结果完成，并尝试取消工具任务；
+        调用方取消返回的 Future 同样会尝试取消工具任务。
         """
         tool = self.get(name)
         if not tool:
-            f = concurrent.futures.Future()
-            f.set_result({
-                "ok": False,
-                "tool": name,
-                "error_type": "ValueError",
-                "message": f"Tool '{name}' not found or disabled"
-            })
-            return f
+            return self._done_future(self._error_result(
+                name, ValueError(f"Tool '{name}' not found or disabled")
+            ))
 
         # 这里预处理参数与校验
         try:
             args = self._coerce_arguments(arguments)
             self._validate(tool, args)
         except Exception as e:
-            f = concurrent.futures.Future()
-            f.set_result({
-                "ok": False,
-                "tool": name,
-                "error_type": e.__class__.__name__,
-                "message": str(e)
-            })
-            return f
+            return self._done_future(self._error_result(name, e))
 
-        def runner():
-            start = time.time()
+        start = time.time()
+        try:
+            task = self._submit(tool, args)
+        except Exception as e:
+            return self._done_future(self._error_result(name, e))
+
+        result = concurrent.futures.Future()
+        timer: Optional[threading.Timer] = None
+
+        def on_timeout():
             try:
-                result = str(self._run(tool, args)) #兼容性转写
-                return {
-                    "ok": True,
-                    "tool": name,
-                    "duration_ms": int((time.time() - start) * 1000),
-                    "result": result
-                }
-            except Exception as e:
-                logger.exception("Tool run error: %s", name)
-                return {
-                    "ok": False,
-                    "tool": name,
-                    "error_type": e.__class__.__name__,
-                    "message": str(e)
-                }
+                result.set_result(self._error_result(
+                    name, TimeoutError(f"Tool '{name}' timed out after {tool.timeout}s")
+                ))
+            except concurrent.futures.InvalidStateError:
+                return
+            # 线程池任务一般不可取消，协程任务会被取消
+            task.cancel()
+
+        def on_task_done(f: concurrent.futures.Future):
+            if timer is not None:
+                timer.cancel()
+            try:
+                payload = self._ok_result(name, start, f.result())
+            except BaseException as e:
+                if not isinstance(e, concurrent.futures.CancelledError):
+                    logger.exception("Tool run error: %s", name)
+                payload = self._error_result(name, e)
+            try:
+                result.set_result(payload)
+            except concurrent.futures.InvalidStateError:
+                # 已经被调用方取消
+                pass
+
+        def on_result_done(f: concurrent.futures.Future):
+            if f.cancelled():
+                task.cancel()
+
+        limit = self._time_limit(tool)
+        if limit is not None:
+            timer = threading.Timer(limit, on_timeout)
+            timer.daemon = True
+            timer.start()
+
+        result.add_done_callback(on_result_done)
+        task.add_done_callback(on_task_done)
+        return result
 
-        # 将整体包装为线程池任务，返回字典结果
-        return executor.submit(runner)
+    def call_batch_from_openai(self, function_call_dicts: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        一次提交多个工具调用，结果顺序与输入一致。
+        - 相邻的可并行工具一起提交，各自按 Tool.timeout 计时（call_async 的计时器负责，这里的等待只是兜底），
+          timeout 为 0/None 的工具不限时
+        - parallel=False 的工具是屏障：前面的全部结束后单独执行，结束后才提交后面的
+        """
+        results: List[Optional[Dict[str, Any]]] = [None] * len(function_call_dicts)
+        batch = []
+
+        def gather():
+            for i, name, fut, timeout, deadline in batch:
+                try:
+                    wait = None if deadline is None else max(0.0, deadline - time.monotonic())
+                    results[i] = fut.result(timeout=wait)
+                except concurrent.futures.TimeoutError:
+                    fut.cancel()
+                    results[i] = self._error_result(
+                        name, TimeoutError(f"Tool '{name}' timed out after {timeout}s")
+                    )
+            batch.clear()
+
+        for i, function_call_dict in enumerate(function_call_dicts):
+            fn = function_call_dict.get("function", {})
+            name = fn.get("name")
+            args = fn.get("arguments", {})
+            tool = self.get(name)
+
+            if tool is not None and not tool.parallel:
+                gather()
+                try:
+                    results[i] = self.call(name, args)
+                except Exception as e:
+                    results[i] = self._error_result(name, e)
+                continue
+
+            timeout = self._time_limit(tool)
+            deadline = None if timeout is None else time.monotonic() + timeout
+            batch.append((i, name, self.call_async(name, args), timeout, deadline))
+
+        gather()
+        return results
 
     def call_from_openai(self, function_call_dict: Dict[str, Any]):
         # 兼容OpenAI/Kimi等格式
@@ -323,27 +404,37 @@ def sys_time(type: str):
     },
     tags=["dangerous", "dev",'builtin'],
     timeout=6000,
-    permissions=["sandbox"]
+    permissions=["sandbox"],
+    parallel=False  # 任意代码可能读写同一批文件，和别的调用错开执行
 )
 
 def python_cmd(code: str, timeout_sec: float = 6000):
-    """Python命令执行函数，捕获print输出"""
-    import contextlib
-    from io import StringIO
+    """Python命令执行函数，在沙盒进程里运行，捕获print输出"""
+    from config import APP_SETTINGS
+    from core.tool_call.sandbox_pool import get_sandbox_pool
+
     code = code.replace('```python', '').replace('```', '').replace('`', '')
     print(f"Executing code: {code}")
-    output_buffer = StringIO()
-    try:
-        with contextlib.redirect_stdout(output_buffer):
-            exec(code, {})  # 在独立环境中执行代码
-        captured_output = output_buffer.getvalue().strip()
-        if len(captured_output)>10000:
-            return '执行完成，响应过长。'+captured_output[0:10000]+"\nWARNING:\ntoo many output!\nthe first 10000 words are kept and the rest is abandoned."
-        if len(captured_output) == 0:
-            return '执行完成，无打印内容'
-        return f"执行完成，打印内容：\n{captured_output}"
-    except Exception as e:
-        return f"执行失败：{str(e)}"
+
+    settings = APP_SETTINGS.sandbox
+    pool = get_sandbox_pool(settings.pool_size, settings.memory_mb, settings.max_runs_per_worker)
+    result = pool.run(
+        code,
+        timeout=min(timeout_sec, settings.max_timeout) if timeout_sec else settings.max_timeout,
+        cpu_seconds=settings.cpu_seconds,
+        max_output=settings.max_output,
+    )
+
+    captured_output = result.output.strip()
+    if not result.ok:
+        if captured_output:
+            return f"执行失败：{result.error}\n失败前的打印内容：\n{captured_output}"
+        return f"执行失败：{result.error}"
+    if result.truncated:
+        return f'执行完成，响应过长。{captured_output}\nWARNING:\ntoo many output!\nthe first {settings.max_output} words are kept and the rest is abandoned.'
+    if len(captured_output) == 0:
+        return '执行完成，无打印内容'
+    return f"执行完成，打印内容：\n{captured_output}"
 
 
 @registry.tool(
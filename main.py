@@ -1,4 +1,10 @@
 import sys,ctypes
+
+# 打包后 python_cmd 的沙盒进程也从这个入口启动，见 core/tool_call/sandbox_pool.py
+if '--sandbox-worker' in sys.argv:
+    from core.tool_call.sandbox_worker import main as sandbox_worker_main
+    sys.exit(sandbox_worker_main())
+
 import atexit
 import threading
 import sys
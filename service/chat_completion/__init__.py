@@ -1,7 +1,9 @@
 from .llm_requester import OneTimeLLMRequester,APIRequestHandler
+from .async_requester import AsyncLLMRequester
 from .patch_manager import GlobalPatcher
 __all__ = [
     "OneTimeLLMRequester",
+    "AsyncLLMRequester",
     "APIRequestHandler",
     "GlobalPatcher",
 ]
\ No newline at end of file
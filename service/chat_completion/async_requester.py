@@ -0,0 +1,281 @@
+"""
+AsyncLLMRequester - asyncio 版的单次 LLM 请求器。
+
+和 OneTimeLLMRequester 对外完全一样（RequesterSignals、RequestResult、send_request/pause/close），
+区别在于请求不再各占一个阻塞线程：
+
+    AsyncRequestEngine（单个事件循环线程）
+        ├─ 每个供应商一个 httpx.AsyncClient，连接复用
+        ├─ 每个供应商一个 ProviderLimit，限制并发（上限可以运行时调整）
+        └─ run_coroutine_threadsafe 提交，Future.cancel() 即协作式取消
+
+调用方只需要把 OneTimeLLMRequester 换成 AsyncLLMRequester，信号连线不用改。
+
+Dependencies:
+    - httpx: openai SDK 的依赖，装了 openai 就有
+"""
+import asyncio
+import concurrent.futures
+import threading
+from typing import Any, Dict, Optional
+from urllib.parse import urlsplit
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+from .llm_requester import OneTimeLLMRequester, RequestConfig, RequestResult, RequestState
+from .stream_parser import DeltaType, SimpleSSEParser, decode_content
+
+
+class ProviderLimit:
+    """
+    可调上限的并发闸，用法和 asyncio.Semaphore 一样（async with）。
+    调小上限时不打断正在进行的请求，等它们结束、数量降到上限以下才放新的进来。
+    只能在事件循环线程里使用。
+    """
+
+    def __init__(self, limit: int):
+        self.limit = max(1, limit)
+        self.active = 0
+        self._cond = asyncio.Condition()
+
+    async def __aenter__(self):
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.active < self.limit)
+            self.active += 1
+        return self
+
+    async def __aexit__(self, *exc):
+        # 先减计数再等锁，退出时被取消也不会漏还名额
+        self.active -= 1
+        async with self._cond:
+            self._cond.notify()
+
+    async def resize(self, limit: int):
+        async with self._cond:
+            self.limit = max(1, limit)
+            self._cond.notify_all()
+
+
+class AsyncRequestEngine:
+    """
+    单事件循环线程上的请求引擎。
+    client_for / limit_for 只能在事件循环线程里调用，submit 可以在任意线程调用。
+    """
+
+    def __init__(self, max_concurrency_per_provider: int = 4, max_keepalive: int = 8):
+        if httpx is None:
+            raise RuntimeError("httpx not available")
+
+        self.max_concurrency_per_provider = max_concurrency_per_provider
+        """每个供应商的并发上限，运行时用 configure 修改"""
+        self.max_keepalive = max_keepalive
+
+        self._clients: Dict[str, "httpx.AsyncClient"] = {}
+        self._limits: Dict[str, ProviderLimit] = {}
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name="llm-async-loop", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_forever()
+
+    @staticmethod
+    def provider_key(url: str) -> str:
+        parts = urlsplit(url)
+        return f"{parts.scheme}://{parts.netloc}"
+
+    def in_loop_thread(self) -> bool:
+        return threading.get_ident() == self._thread.ident
+
+    def client_for(self, url: str) -> "httpx.AsyncClient":
+        key = self.provider_key(url)
+        client = self._clients.get(key)
+        if client is None:
+            # 连接数不在 client 上封顶，并发由 limit_for 控制，改上限时不用重建 client
+            client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=None,
+                    max_keepalive_connections=self.max_keepalive,
+                ),
+            )
+            self._clients[key] = client
+        return client
+
+    def limit_for(self, url: str) -> ProviderLimit:
+        key = self.provider_key(url)
+        limit = self._limits.get(key)
+        if limit is None:
+            limit = ProviderLimit(self.max_concurrency_per_provider)
+            self._limits[key] = limit
+        return limit
+
+    def configure(self, max_concurrency_per_provider: int) -> None:
+        """修改每个供应商的并发上限，已经出现过的供应商也立即按新上限放行"""
+        async def _resize_all():
+            self.max_concurrency_per_provider = max_concurrency_per_provider
+            for limit in self._limits.values():
+                await limit.resize(max_concurrency_per_provider)
+
+        if self.in_loop_thread():
+            raise RuntimeError("configure() cannot block inside the engine loop")
+        self.submit(_resize_all()).result(timeout=2.0)
+
+    def submit(self, coro) -> concurrent.futures.Future:
+        """提交协程，返回的 Future 被 cancel 时对应的 Task 也会被取消"""
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    def shutdown(self):
+        async def _close_all():
+            for client in self._clients.values():
+                await client.aclose()
+            self._clients.clear()
+
+        if self._loop.is_running():
+            try:
+                self.submit(_close_all()).result(timeout=2.0)
+            except Exception:
+                pass
+            self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=2.0)
+
+
+_ENGINE: Optional[AsyncRequestEngine] = None
+_ENGINE_LOCK = threading.Lock()
+
+
+def get_async_engine() -> AsyncRequestEngine:
+    """全局异步请求引擎，第一次调用时按网络设置创建并启动事件循环线程"""
+    global _ENGINE
+    with _ENGINE_LOCK:
+        if _ENGINE is None:
+            from config import APP_SETTINGS
+            _ENGINE = AsyncRequestEngine(
+                max_concurrency_per_provider=APP_SETTINGS.network.async_max_concurrency,
+            )
+        return _ENGINE
+
+
+class AsyncLLMRequester(OneTimeLLMRequester):
+    """
+    openai chat completion单次请求（asyncio 版）
+
+    - create_thread=True：提交到引擎后立即返回
+    - create_thread=False：提交后阻塞等待结果，不能在引擎线程里这样调用
+    - pause()/close()：取消协程，等价于同步版的关 socket
+    """
+
+    def __init__(self, config: "RequestConfig", session=None, engine: AsyncRequestEngine = None):
+        super().__init__(config=config, session=session)
+        self._engine = engine or get_async_engine()
+        self._future: Optional[concurrent.futures.Future] = None
+
+    def _send_request_multithreading(self, params: Dict[str, Any]):
+        self._future = self._engine.submit(self._execute_request_async(params))
+
+    def _send_request_sync(self, params: Dict[str, Any]):
+        if self._engine.in_loop_thread():
+            raise RuntimeError("AsyncLLMRequester cannot block inside the engine loop")
+        self._future = self._engine.submit(self._execute_request_async(params))
+        try:
+            return self._future.result()
+        except concurrent.futures.CancelledError:
+            return None
+
+    def close(self):
+        """取消进行中的协程，共享的 AsyncClient 不关闭"""
+        future = self._future
+        if future is not None and not future.done():
+            future.cancel()
+        return super().close()
+
+    def _timeout(self) -> "httpx.Timeout":
+        return httpx.Timeout(self.config.timeout_read, connect=self.config.timeout_connect)
+
+    async def _execute_request_async(self, params: Dict[str, Any]):
+        """异步发送请求的内部实现，在引擎线程里运行"""
+        if self._pause_flag.is_set():
+            return None
+
+        self._reset_for_request()
+        self.signals.started.emit(self._current_request_id)
+
+        try:
+            url, headers, is_stream = self._prepare_request(params)
+            client = self._engine.client_for(url)
+
+            async with self._engine.limit_for(url):
+                if is_stream:
+                    self.result = await self._handle_stream_request_async(client, url, headers, params)
+                else:
+                    self.result = await self._handle_non_stream_request_async(client, url, headers, params)
+
+            return self._deliver_result()
+
+        except asyncio.CancelledError:
+            # pause()/close() 取消，和同步版被关 socket 一样静默结束
+            self._state = RequestState.COMPLETED
+            return None
+
+        except Exception as e:
+            if self._pause_flag.is_set():
+                return None
+            self._report_failure(e, is_network_error=isinstance(e, httpx.HTTPError))
+            return None
+
+    async def _handle_stream_request_async(
+        self,
+        client: "httpx.AsyncClient",
+        url: str,
+        headers: Dict[str, str],
+        request_data: Dict
+    ) -> Optional[RequestResult]:
+        """处理流式请求"""
+        self.result = RequestResult(request_id=self._current_request_id)
+
+        async with client.stream(
+            'POST', url, json=request_data, headers=headers, timeout=self._timeout()
+        ) as response:
+            # 检查 HTTP 状态
+            if response.status_code != 200:
+                error_text = decode_content(await response.aread())
+                raise httpx.HTTPStatusError(
+                    error_text,
+                    request=response.request,
+                    response=response
+                )
+
+            # 解析 SSE 流
+            async for delta in SimpleSSEParser.aparse_stream(response, logger=self._log):
+                # 检查暂停
+                if self._pause_flag.is_set():
+                    self._log("Request paused by user")
+                    break
+
+                if delta.delta_type == DeltaType.DONE:
+                    break
+
+                self._process_delta(delta, self.result)
+
+        self._finalize_stream_result()
+        return self.result
+
+    async def _handle_non_stream_request_async(
+        self,
+        client: "httpx.AsyncClient",
+        url: str,
+        headers: Dict[str, str],
+        request_data: Dict
+    ) -> Optional[RequestResult]:
+        """处理非流式请求"""
+        self.result = RequestResult(request_id=self._current_request_id)
+
+        response = await client.post(url, json=request_data, headers=headers, timeout=self._timeout())
+        response.raise_for_status()
+
+        self._apply_non_stream_data(response.json())
+        return self.result
@@ -46,6 +46,7 @@ import uuid
 from .stream_parser import DeltaObject, DeltaType, SimpleSSEParser,decode_content
 from .reasoning_parser import StreamingReasoningParser,SimpleReasoningParser
 from .signals import RequesterSignals
+from service.http_pool import get_http_pool
 
 
 # 结束原因映射
@@ -81,6 +82,29 @@ class RequestConfig:
     timeout_read: float = 180.0
 
 
+def cached_prompt_tokens(usage: Optional[Dict]) -> Optional[int]:
+    """
+    从 usage 里取缓存命中的词符数，各家字段不同：
+    - OpenAI / SiliconFlow 等：prompt_tokens_details.cached_tokens
+    - DeepSeek：prompt_cache_hit_tokens
+    - Moonshot：cached_tokens
+    - Anthropic 兼容接口：cache_read_input_tokens
+    """
+    if not isinstance(usage, dict):
+        return None
+    details = usage.get('prompt_tokens_details')
+    candidates = (
+        details.get('cached_tokens') if isinstance(details, dict) else None,
+        usage.get('prompt_cache_hit_tokens'),
+        usage.get('cached_tokens'),
+        usage.get('cache_read_input_tokens'),
+    )
+    for value in candidates:
+        if isinstance(value, int):
+            return value
+    return None
+
+
 @dataclass  
 class RequestResult:
     """请求结果"""
@@ -99,6 +123,11 @@ class RequestResult:
 
     
     """list:用于json.dump"""
+
+    @property
+    def cached_tokens(self) -> Optional[int]:
+        """本次请求命中供应商前缀缓存的词符数，供应商没有报告时为 None"""
+        return cached_prompt_tokens(self.usage)
     
     def to_chat_history(self) -> List[Dict]:
         """转换为落盘格式"""
@@ -119,6 +148,10 @@ class RequestResult:
         
         if self.tool_calls:
             message['tool_calls'] = self.tool_calls
+
+        cached = self.cached_tokens
+        if cached is not None:
+            message['info']['cached_tokens'] = cached
             
         return [message]
 
@@ -144,7 +177,7 @@ class OneTimeLLMRequester:
         初始化请求处理器
         
         Args:
-            session: 上层请求池，不传就自己解决
+            session: 上层请求池，不传就用全局连接池里该供应商的 Session
             config: 请求配置
         """
         
@@ -153,11 +186,8 @@ class OneTimeLLMRequester:
 
         self.signals = RequesterSignals()
         
-        # 会话管理，外部连接池或者自己维护
-        self._have_own_session=False
-        if not session:
-            self._have_own_session=True
-        self._session = session or requests.Session()
+        # 会话管理，外部连接池或者全局共享池，都不归本请求器关闭
+        self._session = session or get_http_pool().session_for(self.config.url)
 
         # 请求状态
         self._state = RequestState.IDLE
@@ -300,54 +330,18 @@ class OneTimeLLMRequester:
 
             raise RuntimeError("Super Fast Cancel")
         
-        # 重置状态
-        self._state = RequestState.RUNNING
-        self._pause_flag.clear()
-        self._current_response = None
-        self._tool_calls_buffer.clear()
-        self.result = None
-        
-        
-        # 初始化思维链解析器（本地模型需要）
-        is_local = self.config.provider_type == 'local'
-        if is_local:
-            self._reasoning_parser = StreamingReasoningParser()
-        else:
-            self._reasoning_parser = None
-        
+        self._reset_for_request()
         self.signals.started.emit(self._current_request_id)
         
         try:
-            # 构建请求
-            url = f"{self.config.url.rstrip('/')}"
-            if not "/chat/completions" in url:
-                url += f"/chat/completions"
-
-            headers = self._build_headers(params.get('extra_headers',{}))
-            # openai 默认构建的payload允许有extra_headers，但请求里是不需要的
-            if 'extra_headers' in params:
-                params.pop('extra_headers')
-            print('otlr headers',headers)
-            import json
-            pld = json.dumps(params,indent=2,ensure_ascii=False)
-            print('otlr payload:',pld[:500],'\n',pld[-1000:]) if len(pld) > 1500 else print('otlr payload:',pld)
-
-            is_stream = params.get('stream', False)
+            url, headers, is_stream = self._prepare_request(params)
             
             if is_stream:
                 self.result = self._handle_stream_request(url, headers, params)
             else:
                 self.result = self._handle_non_stream_request(url, headers, params)
             
-            self._state = RequestState.COMPLETED
-
-            if self.result != RequestResult(request_id=self._current_request_id):
-                self.signals.finished.emit(self._current_request_id, self.result.to_chat_history())
-                return self.result
-            else:
-                self.signals.warning('服务器返回了空响应，检查服务状态或参数设置。')
-                return None
-            
+            return self._deliver_result()
                 
         except Exception as e:
             # 发生异常时，先看是不是因为用户按了暂停
@@ -356,24 +350,89 @@ class OneTimeLLMRequester:
                 return None
 
             # 只有在非暂停状态下的异常，才是真正的故障
-            error_msg = self._format_error(e)
-            self._state = RequestState.FAILED
-            if isinstance(e, (
-                requests.exceptions.RequestException,
-                requests.exceptions.Timeout,
-                requests.exceptions.ConnectionError,
-                requests.HTTPError
-            )):
-                self.signals.failed.emit(
-                    self._current_request_id,
-                    f"服务器错误：{error_msg}"
-                )
-            else:
-                self.signals.error.emit(
-                    f"请求失败，内部错误: {error_msg}{traceback.format_exc()}"
-                )
+            self._report_failure(e, is_network_error=isinstance(e, requests.exceptions.RequestException))
             return None
-    
+
+    # ==================== 同步/异步共用的请求步骤 ====================
+
+    def _reset_for_request(self):
+        """重置单次请求的状态"""
+        self._state = RequestState.RUNNING
+        self._pause_flag.clear()
+        self._current_response = None
+        self._tool_calls_buffer.clear()
+        self.result = None
+        
+        # 初始化思维链解析器（本地模型需要）
+        is_local = self.config.provider_type == 'local'
+        if is_local:
+            self._reasoning_parser = StreamingReasoningParser()
+        else:
+            self._reasoning_parser = None
+
+    def _prepare_request(self, params: Dict[str, Any]):
+        """构建 url 和请求头，返回 (url, headers, is_stream)"""
+        url = f"{self.config.url.rstrip('/')}"
+        if not "/chat/completions" in url:
+            url += f"/chat/completions"
+
+        headers = self._build_headers(params.get('extra_headers',{}))
+        # openai 默认构建的payload允许有extra_headers，但请求里是不需要的
+        if 'extra_headers' in params:
+            params.pop('extra_headers')
+        print('otlr headers',headers)
+        pld = json.dumps(params,indent=2,ensure_ascii=False)
+        print('otlr payload:',pld[:500],'\n',pld[-1000:]) if len(pld) > 1500 else print('otlr payload:',pld)
+
+        return url, headers, params.get('stream', False)
+
+    def _deliver_result(self) -> Optional[RequestResult]:
+        """请求正常结束，发射 finished"""
+        self._state = RequestState.COMPLETED
+
+        if self.result != RequestResult(request_id=self._current_request_id):
+            self.signals.finished.emit(self._current_request_id, self.result.to_chat_history())
+            return self.result
+        else:
+            self.signals.warning('服务器返回了空响应，检查服务状态或参数设置。')
+            return None
+
+    def _report_failure(self, e: Exception, is_network_error: bool):
+        """非暂停导致的异常：网络错误走 failed，其余走 error"""
+        error_msg = self._format_error(e)
+        self._state = RequestState.FAILED
+        if is_network_error:
+            self.signals.failed.emit(
+                self._current_request_id,
+                f"服务器错误：{error_msg}"
+            )
+        else:
+            self.signals.error.emit(
+                f"请求失败，内部错误: {error_msg}{traceback.format_exc()}"
+            )
+
+    def _finalize_stream_result(self):
+        """流读完后收尾：思维链、工具调用、结束原因"""
+        # 完成思维链解析
+        if self._reasoning_parser:
+            parse_result = self._reasoning_parser.finalize()
+            self.result.content = parse_result.content
+            self.result.reasoning_content = parse_result.reasoning_content
+        
+        # 处理工具调用
+        if self._tool_calls_buffer:
+            self.result.tool_calls = list(self._tool_calls_buffer.values())
+            self.signals.tool_calls_detected.emit(
+                self._current_request_id,
+                self.result.tool_calls
+            )
+        
+        # 确定 finish_reason
+        if not self.result.finish_reason:
+            self.result.finish_reason = "stop" if not self._pause_flag.is_set() else "paused"
+        
+        self._emit_finish_reason(self.result.finish_reason)
+
     def _build_headers(self, extra_headers: Optional[Dict] = None) -> Dict[str, str]:
         """构建请求头"""
         # 给默认值，用户整活自己覆盖去
@@ -430,25 +489,7 @@ class OneTimeLLMRequester:
                 
                 self._process_delta(delta, self.result)
 
-            # 完成思维链解析
-            if self._reasoning_parser:
-                parse_result = self._reasoning_parser.finalize()
-                self.result.content = parse_result.content
-                self.result.reasoning_content = parse_result.reasoning_content
-            
-            # 处理工具调用
-            if self._tool_calls_buffer:
-                self.result.tool_calls = list(self._tool_calls_buffer.values())
-                self.signals.tool_calls_detected.emit(
-                    self._current_request_id,
-                    self.result.tool_calls
-                )
-            
-            # 确定 finish_reason
-            if not self.result.finish_reason:
-                self.result.finish_reason = "stop" if not self._pause_flag.is_set() else "paused"
-            
-            self._emit_finish_reason(self.result.finish_reason)
+            self._finalize_stream_result()
             
             return self.result
             
@@ -475,55 +516,59 @@ class OneTimeLLMRequester:
             response.raise_for_status()
             
             data = response.json()
-            self.result.model=data.get('model','')
-
             self._current_response = response
-            # 解析响应
-            if 'choices' in data and data['choices']:
-                choice = data['choices'][0]
-                message = choice.get('message', {})
-                
-                ct=message.get('content', '')
-                self.result.content = ct if ct else ''
+            self._apply_non_stream_data(data)
+            
+            return self.result
+            
+        finally:
+            self.close()
 
-                rc= message.get('reasoning_content', '') or message.get('reasoning', '')
-                self.result.reasoning_content = rc if rc else ''
+    def _apply_non_stream_data(self, data: Dict[str, Any]):
+        """解析非流式响应并一次性发射信号"""
+        self.result.model=data.get('model','')
 
-                self.result.finish_reason = choice.get('finish_reason') or None # supported by upper layer
+        # 解析响应
+        if 'choices' in data and data['choices']:
+            choice = data['choices'][0]
+            message = choice.get('message', {})
 
-                self.result.tool_calls = message.get('tool_calls')
+            ct=message.get('content', '')
+            self.result.content = ct if ct else ''
 
-                self.result.usage = data.get('usage')
-                
-                # 处理本地模型的思维链
-                if self.config.provider_type == 'local' and self.result.content:
-                    
-                    parse_result = SimpleReasoningParser.parse(self.result.content)
+            rc= message.get('reasoning_content', '') or message.get('reasoning', '')
+            self.result.reasoning_content = rc if rc else ''
 
-                    # 这玩意看起来好吃性能
-                    # 但本地V/LLM跑个32k token顶天了
-                    # 32k*1.6 = 51,200字符
-                    # 好像也不多，ms级在后台或者线程里的任务不太影响
-                    if parse_result.reasoning_content in parse_result.content:
-                        parse_result.content = parse_result.content.replace(parse_result.reasoning_content, '')
+            self.result.finish_reason = choice.get('finish_reason') or None # supported by upper layer
 
-                    self.result.content = parse_result.content
-                    self.result.reasoning_content = parse_result.reasoning_content or self.result.reasoning_content
-            
-            # 发送累积的信号
-            if self.result.content:
-                self.signals.stream_content.emit(self.result.request_id, self.result.content)
-            if self.result.reasoning_content:
-                self.signals.stream_reasoning.emit(self.result.request_id, self.result.reasoning_content)
-            if self.result.tool_calls:
-                self.signals.tool_calls_detected.emit(self.result.request_id, self.result.tool_calls)
-            
-            self._emit_finish_reason(self.result.finish_reason)
-            
-            return self.result
-            
-        finally:
-            self.close()
+            self.result.tool_calls = message.get('tool_calls')
+
+            self.result.usage = data.get('usage')
+
+            # 处理本地模型的思维链
+            if self.config.provider_type == 'local' and self.result.content:
+
+                parse_result = SimpleReasoningParser.parse(self.result.content)
+
+                # 这玩意看起来好吃性能
+                # 但本地V/LLM跑个32k token顶天了
+                # 32k*1.6 = 51,200字符
+                # 好像也不多，ms级在后台或者线程里的任务不太影响
+                if parse_result.reasoning_content in parse_result.content:
+                    parse_result.content = parse_result.content.replace(parse_result.reasoning_content, '')
+
+                self.result.content = parse_result.content
+                self.result.reasoning_content = parse_result.reasoning_content or self.result.reasoning_content
+
+        # 发送累积的信号
+        if self.result.content:
+            self.signals.stream_content.emit(self.result.request_id, self.result.content)
+        if self.result.reasoning_content:
+            self.signals.stream_reasoning.emit(self.result.request_id, self.result.reasoning_content)
+        if self.result.tool_calls:
+            self.signals.tool_calls_detected.emit(self.result.request_id, self.result.tool_calls)
+        
+        self._emit_finish_reason(self.result.finish_reason)
     
     def _process_delta(self, delta: DeltaObject, result: RequestResult, ):
         """处理单个 delta"""
@@ -531,13 +576,12 @@ class OneTimeLLMRequester:
         # 有逆天服务器喜欢发heartbeat当id
         # 每个delta都要处理，性能消耗...
         # 大概是没有吧
-        if delta.raw_data and 'id' in delta.raw_data:
-            _sv_id=delta.raw_data['id']
-            result.server_id.add(_sv_id)
+        if delta.server_id:
+            result.server_id.add(delta.server_id)
         
         # 更新模型信息
-        if delta.raw_data and 'model' in delta.raw_data:
-            result.model = delta.raw_data['model']
+        if delta.model:
+            result.model = delta.model
 
         # 更新用量
         if delta.usage:
@@ -676,8 +720,6 @@ class OneTimeLLMRequester:
         try:
             if self._current_response:
                 self._current_response.close()
-            if self._have_own_session and self._session:
-                self._session.close()
             success = True
         except Exception as e:
             self.signals.warning.emit(f"Error closing response: {e}")
@@ -225,6 +225,140 @@ class ReasoningStateMachine:
         )
 
 
+class ChunkReasoningStateMachine:
+    """
+    按块处理的思维链状态机，输出与 ReasoningStateMachine 逐字一致。
+
+    用 str.find 跳到下一个标记首字符，中间的整段直接切片；
+    块之间只保留“可能是标记前缀”的几个字符。
+    和逐字符版一样，标记前缀匹配失败时连同失败的那个字符一起按当前区域输出，
+    不会回头重新识别（例如 "<<think>" 整体是正文）。
+    每块最多回调一次 on_content / on_reasoning。
+    """
+
+    def __init__(
+        self,
+        think_start: str = "<think>",
+        think_end: str = "</think>",
+        on_content: Optional[Callable[[str], None]] = None,
+        on_reasoning: Optional[Callable[[str], None]] = None,
+        on_state_change: Optional[Callable[[ReasoningState, ReasoningState], None]] = None
+    ):
+        self.think_start = think_start
+        self.think_end = think_end
+        self.on_content = on_content
+        self.on_reasoning = on_reasoning
+        self.on_state_change = on_state_change
+
+        self._state = ReasoningState.NORMAL
+        self._buffer = ""  # 已匹配的标记前缀
+
+        self._full_content = ""
+        self._full_reasoning = ""
+
+    @property
+    def state(self) -> ReasoningState:
+        return self._state
+
+    @property
+    def is_reasoning(self) -> bool:
+        return self._state == ReasoningState.THINKING
+
+    def reset(self):
+        self._state = ReasoningState.NORMAL
+        self._buffer = ""
+        self._full_content = ""
+        self._full_reasoning = ""
+
+    def _transition_to(self, new_state: ReasoningState):
+        old_state = self._state
+        self._state = new_state
+        if self.on_state_change:
+            self.on_state_change(old_state, new_state)
+
+    def process(self, text: str) -> ParseResult:
+        content_parts = []
+        reasoning_parts = []
+        i, n = 0, len(text)
+
+        while i < n:
+            state = self._state
+            thinking = state in (ReasoningState.THINKING, ReasoningState.THINK_END_PENDING)
+            parts = reasoning_parts if thinking else content_parts
+            tag = self.think_end if thinking else self.think_start
+
+            if state in (ReasoningState.NORMAL, ReasoningState.THINKING):
+                j = text.find(tag[0], i)
+                if j < 0:
+                    parts.append(text[i:])
+                    break
+                if j > i:
+                    parts.append(text[i:j])
+                self._buffer = tag[0]
+                self._state = ReasoningState.THINK_END_PENDING if thinking else ReasoningState.THINK_START_PENDING
+                i = j + 1
+                continue
+
+            # 接着匹配标记的剩余部分
+            need = tag[len(self._buffer):]
+            k = 0
+            limit = min(len(need), n - i)
+            while k < limit and text[i + k] == need[k]:
+                k += 1
+
+            if k == len(need):
+                i += k
+                self._buffer = ""
+                self._transition_to(ReasoningState.NORMAL if thinking else ReasoningState.THINKING)
+            elif k == n - i:
+                # 块结束时仍是前缀，留到下一块
+                self._buffer += text[i:]
+                break
+            else:
+                parts.append(self._buffer + text[i:i + k + 1])
+                self._buffer = ""
+                self._state = ReasoningState.THINKING if thinking else ReasoningState.NORMAL
+                i += k + 1
+
+        if content_parts:
+            delta = ''.join(content_parts)
+            self._full_content += delta
+            if self.on_content:
+                self.on_content(delta)
+        if reasoning_parts:
+            delta = ''.join(reasoning_parts)
+            self._full_reasoning += delta
+            if self.on_reasoning:
+                self.on_reasoning(delta)
+
+        return ParseResult(
+            content=self._full_content,
+            reasoning_content=self._full_reasoning,
+            is_reasoning=self.is_reasoning,
+            state=self._state
+        )
+
+    def finalize(self) -> ParseResult:
+        """完成解析，未完成的标记前缀按所在区域输出（状态保持不变，与逐字符版一致）"""
+        if self._buffer:
+            if self._state in (ReasoningState.THINKING, ReasoningState.THINK_END_PENDING):
+                self._full_reasoning += self._buffer
+                if self.on_reasoning:
+                    self.on_reasoning(self._buffer)
+            else:
+                self._full_content += self._buffer
+                if self.on_content:
+                    self.on_content(self._buffer)
+            self._buffer = ""
+
+        return ParseResult(
+            content=self._full_content,
+            reasoning_content=self._full_reasoning,
+            is_reasoning=self.is_reasoning,
+            state=self._state
+        )
+
+
 class SimpleReasoningParser:
     """
     简化的思维链解析器（批量处理版本）
@@ -297,7 +431,8 @@ class StreamingReasoningParser:
     """
     流式思维链解析器（适配器）
     
-    将状态机包装为更易用的流式处理接口
+    将状态机包装为更易用的流式处理接口，
+    内部用按块处理的 ChunkReasoningStateMachine，每块只产出一个正文增量和一个思维链增量
     """
     
     def __init__(
@@ -305,7 +440,7 @@ class StreamingReasoningParser:
         think_start: str = "<think>",
         think_end: str = "</think>"
     ):
-        self.state_machine = ReasoningStateMachine(
+        self.state_machine = ChunkReasoningStateMachine(
             think_start=think_start,
             think_end=think_end
         )
@@ -1,5 +1,5 @@
 from psygnal import Signal
-from common.signal_bus import BaseSignalBus
+from common.signal_bus import BaseSignalBus,Coalesce
 
 class RequesterSignals(BaseSignalBus):
     """
@@ -39,3 +39,10 @@ class RequesterSignals(BaseSignalBus):
 
     notify = Signal(str)               # (message)
     """notify the user"""
+
+    # 全量信号每个增量都带着整段文本，跨线程转发给 UI 时可以只发最新的一份
+    _coalesce = {
+        'full_content': Coalesce(),
+        'full_reasoning': Coalesce(),
+        'full_tool_call': Coalesce(),
+    }
@@ -4,10 +4,21 @@ SSE (Server-Sent Events) 流式解析器
 将流式响应解析逻辑从主请求处理器中剥离，实现单一职责。
 """
 import json
-from typing import Iterator, Dict, Any, Optional, Callable
+from typing import AsyncIterator, Iterator, Dict, Any, List, Optional, Callable
 from dataclasses import dataclass
 from enum import Enum
 
+# 可选的快速 JSON 后端，都接受 bytes，失败时抛 ValueError 的子类
+try:
+    import orjson
+    _fast_loads = orjson.loads
+except ImportError:
+    try:
+        import simdjson
+        _fast_loads = simdjson.loads
+    except ImportError:
+        _fast_loads = json.loads
+
 
 def decode_content(content: bytes) -> str:
     """解码响应内容"""
@@ -48,7 +59,7 @@ class DeltaType(Enum):
     USAGE = "usage"
 
 
-@dataclass
+@dataclass(slots=True)
 class DeltaObject:
     """
     表示 LLM 流式响应中的一个增量片段
@@ -60,6 +71,37 @@ class DeltaObject:
     delta_type: DeltaType = DeltaType.CONTENT
     raw_data: Optional[Dict] = None
     usage: Optional[Dict] = None 
+    server_id: Optional[str] = None
+    model: Optional[str] = None
+
+    @classmethod
+    def from_event(cls, event: Dict[str, Any]) -> Optional["DeltaObject"]:
+        """
+        直接从一个 chunk 的 JSON 创建，等价于 SSEEvent.from_json(event).get_first_delta()，
+        但不构造 SSEEvent，也不保留整个 event dict，只取出 id / model。
+        """
+        choices = event.get('choices')
+        usage = event.get('usage')
+
+        if not choices:
+            if usage:
+                return cls(
+                    delta_type=DeltaType.USAGE,
+                    usage=usage,
+                    server_id=event.get('id'),
+                    model=event.get('model'),
+                )
+            return None
+
+        choice = choices[0]
+        delta = cls.from_openai_delta(choice.get('delta') or {})
+        delta.raw_data = None
+        delta.finish_reason = choice.get('finish_reason')
+        delta.server_id = event.get('id')
+        delta.model = event.get('model')
+        if usage:
+            delta.usage = usage
+        return delta
     
     @classmethod
     def from_openai_delta(cls, delta_data: Dict[str, Any]) -> "DeltaObject":
@@ -285,11 +327,67 @@ class SimpleSSEParser:
     不依赖复杂的状态管理，直接产出可用的 delta 数据
     """
     
+    @staticmethod
+    def _cut_lines(buffer: bytearray, chunk: bytes) -> List[bytes]:
+        """把网络块拼进可复用的 bytearray，切出其中完整的非空行"""
+        buffer += chunk
+        end = buffer.rfind(b'\n')
+        if end < 0:
+            return []
+        lines = bytes(buffer[:end + 1]).splitlines()
+        del buffer[:end + 1]
+        return [line for line in lines if line]
+
+    @staticmethod
+    def _iter_lines(response) -> Iterator[bytes]:
+        """按网络块读取 requests 响应，产出完整的非空行"""
+        # chunked 响应按服务器的块产出；否则和 iter_lines 一样 512 字节一读，
+        # 避免 read(None) 一直等到连接关闭
+        chunk_size = None if getattr(response.raw, 'chunked', False) else 512
+        buffer = bytearray()
+
+        for chunk in response.iter_content(chunk_size=chunk_size):
+            if chunk:
+                yield from SimpleSSEParser._cut_lines(buffer, chunk)
+
+        # 最后一行可能没有换行
+        yield from (line for line in bytes(buffer).splitlines() if line)
+
+    @staticmethod
+    def _parse_line(line: bytes, logger: Optional[Callable] = None) -> Optional[DeltaObject]:
+        """解析一行 SSE，非 data 行、空 delta 和坏 JSON 返回 None"""
+        if not line.startswith(b'data:'):
+            return None
+        data = line[5:].lstrip()
+
+        if data == b'[DONE]':
+            return DeltaObject(delta_type=DeltaType.DONE)
+
+        try:
+            event_data = _fast_loads(data)
+        except ValueError:
+            # 非 UTF-8 的服务器（GBK 等）走原来的解码回退
+            try:
+                event_data = json.loads(decode_content(data))
+            except json.JSONDecodeError:
+                if logger:
+                    logger(f"JSON parse error: {decode_content(data[:50])}...")
+                return None
+
+        delta = DeltaObject.from_event(event_data)
+        if delta and not delta.is_empty():
+            return delta
+        return None
+
     @staticmethod
     def parse_stream(response, logger: Optional[Callable] = None) -> Iterator[DeltaObject]:
         """
         从 requests 响应对象直接解析
         
+        每行只解码一次（快速 JSON 后端直接吃 bytes），
+        不再为每个 token 构造 SSEEvent。
+        仍然逐行处理 data:，和以前一样兼容单个换行分隔事件的服务器。
+        
         Args:
             response: requests Response 对象
             logger: 可选的日志函数
@@ -297,34 +395,21 @@ class SimpleSSEParser:
         Yields:
             DeltaObject: 增量内容
         """
-        
         try:
-            for line_bytes in response.iter_lines(decode_unicode=False):
-                if not line_bytes:
+            lines = SimpleSSEParser._iter_lines(response)
+            for line in lines:
+                delta = SimpleSSEParser._parse_line(line, logger)
+                if delta is None:
                     continue
-                line = decode_content(line_bytes)
-
-                if line.startswith('data:'):
-                    data_str = line[5:].lstrip()
-
-                    if data_str == '[DONE]':
-                        yield DeltaObject(delta_type=DeltaType.DONE)
-                        break
-
-                    try:
-                        event_data = json.loads(data_str)
-                        event = SSEEvent.from_json(event_data)
-                        delta = event.get_first_delta()
-
-                        if delta:
-                            delta.raw_data = event_data
-                            if not delta.is_empty():
-                                yield delta
+                if delta.delta_type == DeltaType.DONE:
+                    # 先读完 [DONE] 后面的结束块再交出去：调用方一 break，
+                    # 带着未读数据的连接回池会被当成断线，下次只能重新握手
+                    for _ in lines:
+                        pass
+                    yield delta
+                    break
+                yield delta
 
-                    except json.JSONDecodeError:
-                        if logger:
-                            logger(f"JSON parse error: {data_str[:50]}...")
-                        continue
         except (AttributeError, ValueError) as e:
             return
         
@@ -333,6 +418,42 @@ class SimpleSSEParser:
                 logger(f"Stream parse error: {e}")
             raise
 
+    @staticmethod
+    async def aparse_stream(response, logger: Optional[Callable] = None) -> AsyncIterator[DeltaObject]:
+        """
+        parse_stream 的异步版本，用于 httpx 的流式响应（aiter_bytes）
+        """
+        buffer = bytearray()
+        parse_line = SimpleSSEParser._parse_line
+
+        try:
+            chunks = response.aiter_bytes()
+            async for chunk in chunks:
+                if not chunk:
+                    continue
+                for line in SimpleSSEParser._cut_lines(buffer, chunk):
+                    delta = parse_line(line, logger)
+                    if delta is None:
+                        continue
+                    if delta.delta_type == DeltaType.DONE:
+                        # 同 parse_stream：读完结束块，连接才能留在池里
+                        async for _ in chunks:
+                            pass
+                        yield delta
+                        return
+                    yield delta
+
+            for line in bytes(buffer).splitlines():
+                delta = parse_line(line, logger) if line else None
+                if delta is None:
+                    continue
+                yield delta
+                if delta.delta_type == DeltaType.DONE:
+                    return
+
+        except (AttributeError, ValueError):
+            return
+
 
 # 便捷函数
 def create_parser() -> SSEParser:
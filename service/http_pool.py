@@ -0,0 +1,309 @@
+"""
+HttpPoolRegistry - 进程内共享的出站 HTTP 连接池。
+
+以前各个服务各建各的客户端：OneTimeLLMRequester 每次新建 requests.Session，
+LCI / RAG 过滤每次新建 openai.Client，爬虫按线程各持一个 Session。
+每一个新客户端都要重新握手 TCP + TLS。现在统一从这里借：
+
+    HttpPoolRegistry
+        ├─ session_for(url)         按供应商（scheme://host:port）共享的 requests.Session
+        ├─ web_session()            给爬虫、搜索等任意站点用的通用 Session
+        ├─ openai_client(url, key)  按 (供应商, key) 缓存的 openai.Client
+        └─ stats()                  每个供应商的请求数、新建连接数、复用率、排队次数
+
+池大小、keep-alive、重试策略由 configure() 设置，只对之后新建的 Session / Client 生效。
+重试只对连接失败和幂等方法生效，POST 不会因为读超时或 5xx 被重放。
+
+Dependencies:
+    - requests / urllib3: 同步连接池
+    - openai / httpx: 可选，openai_client 使用
+"""
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+
+@dataclass
+class PoolStats:
+    """单个供应商的连接统计"""
+    provider: str
+    requests: int = 0
+    """从池里取连接的次数"""
+    connects: int = 0
+    """实际建立的连接数（含断线重连），每次都是一次握手"""
+    waits: int = 0
+    """取连接时池已被占满的次数"""
+    wait_time: float = 0.0
+    """排队等待连接的总时长（秒）"""
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    @property
+    def reuse_ratio(self) -> float:
+        """复用率：没有新建连接的请求占比"""
+        if not self.requests:
+            return 0.0
+        return max(0.0, 1.0 - self.connects / self.requests)
+
+    def add(self, requests: int = 0, connects: int = 0, waits: int = 0, wait_time: float = 0.0):
+        with self._lock:
+            self.requests += requests
+            self.connects += connects
+            self.waits += waits
+            self.wait_time += wait_time
+
+    def as_dict(self) -> dict:
+        return {
+            "provider": self.provider,
+            "requests": self.requests,
+            "connects": self.connects,
+            "reuse_ratio": round(self.reuse_ratio, 4),
+            "waits": self.waits,
+            "wait_time": round(self.wait_time, 4),
+        }
+
+
+def provider_key(url: str) -> str:
+    """供应商键：scheme://host:port，路径不同的同一个主机共用连接"""
+    parts = urlsplit(url)
+    scheme = parts.scheme or "https"
+    port = parts.port or (443 if scheme == "https" else 80)
+    return f"{scheme}://{parts.hostname}:{port}"
+
+
+class HttpPoolRegistry:
+    """
+    全局连接池登记处。
+    返回的 Session / Client 是共享的，调用方不要 close，也不要往上面挂鉴权头。
+    """
+
+    def __init__(
+        self,
+        pool_size: int = 10,
+        keepalive: bool = True,
+        max_retries: int = 2,
+        retry_backoff: float = 0.5,
+        pool_block: bool = False,
+    ):
+        self.pool_size = pool_size
+        """每个主机保留的连接数"""
+        self.keepalive = keepalive
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.pool_block = pool_block
+        """池满时排队等待，而不是临时多开一个用完即弃的连接"""
+
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._sessions: Dict[str, requests.Session] = {}
+        self._web_session: Optional[requests.Session] = None
+        self._openai_clients: Dict[Tuple[str, str], object] = {}
+        self._stats: Dict[str, PoolStats] = {}
+
+    def configure(self, **options):
+        """更新池参数，只对之后新建的 Session / Client 生效"""
+        for name, value in options.items():
+            if not hasattr(self, name) or name.startswith("_"):
+                raise AttributeError(f"unknown pool option: {name}")
+            setattr(self, name, value)
+
+    # ==================== 统计 ====================
+
+    def stats_for(self, key: str) -> PoolStats:
+        stats = self._stats.get(key)
+        if stats is None:
+            with self._stats_lock:
+                stats = self._stats.setdefault(key, PoolStats(provider=key))
+        return stats
+
+    def stats(self) -> Dict[str, dict]:
+        """所有供应商的统计快照"""
+        return {key: stats.as_dict() for key, stats in list(self._stats.items())}
+
+    def reset_stats(self):
+        """计数清零，已借出的 Session / Client 继续记到同一个对象上"""
+        for stats in list(self._stats.values()):
+            with stats._lock:
+                stats.requests = stats.connects = stats.waits = 0
+                stats.wait_time = 0.0
+
+    # ==================== requests ====================
+
+    def _retry(self) -> Retry:
+        return Retry(
+            total=self.max_retries,
+            connect=self.max_retries,
+            read=self.max_retries,
+            status=self.max_retries,
+            backoff_factor=self.retry_backoff,
+            status_forcelist=(429, 502, 503, 504),
+            raise_on_status=False,
+        )
+
+    def _new_session(self) -> requests.Session:
+        session = requests.Session()
+        adapter = _CountingAdapter(
+            registry=self,
+            pool_connections=self.pool_size,
+            pool_maxsize=self.pool_size,
+            max_retries=self._retry(),
+            pool_block=self.pool_block,
+        )
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        if not self.keepalive:
+            session.headers["Connection"] = "close"
+        return session
+
+    def session_for(self, url: str) -> requests.Session:
+        """供应商专用的共享 Session"""
+        key = provider_key(url)
+        session = self._sessions.get(key)
+        if session is None:
+            with self._lock:
+                session = self._sessions.get(key)
+                if session is None:
+                    session = self._sessions[key] = self._new_session()
+        return session
+
+    def web_session(self) -> requests.Session:
+        """面向任意站点的共享 Session，urllib3 内部仍按主机分池"""
+        if self._web_session is None:
+            with self._lock:
+                if self._web_session is None:
+                    self._web_session = self._new_session()
+        return self._web_session
+
+    # ==================== openai ====================
+
+    def _new_http_client(self, openai_module, key: str):
+        # DefaultHttpxClient 带着 openai 默认的超时和重定向设置
+        client_cls = getattr(openai_module, "DefaultHttpxClient", httpx.Client)
+        return client_cls(
+            transport=_TracingTransport(
+                self.stats_for(key),
+                limits=httpx.Limits(
+                    max_connections=self.pool_size,
+                    max_keepalive_connections=self.pool_size if self.keepalive else 0,
+                ),
+                retries=self.max_retries,
+            ),
+        )
+
+    def openai_client(self, base_url: str, api_key: str):
+        """按 (base_url, api_key) 缓存的 openai.Client，同一供应商的连接在 Client 内复用"""
+        import openai
+
+        cache_key = (base_url.rstrip("/"), api_key)
+        client = self._openai_clients.get(cache_key)
+        if client is None:
+            with self._lock:
+                client = self._openai_clients.get(cache_key)
+                if client is None:
+                    kwargs = {}
+                    if httpx is not None:
+                        kwargs["http_client"] = self._new_http_client(openai, provider_key(base_url))
+                    client = openai.Client(api_key=api_key, base_url=base_url, **kwargs)
+                    self._openai_clients[cache_key] = client
+        return client
+
+    def close_all(self):
+        with self._lock:
+            sessions = list(self._sessions.values())
+            if self._web_session is not None:
+                sessions.append(self._web_session)
+            clients = list(self._openai_clients.values())
+            self._sessions.clear()
+            self._web_session = None
+            self._openai_clients.clear()
+        for session in sessions:
+            session.close()
+        for client in clients:
+            try:
+                client.close()
+            except Exception:
+                pass
+
+
+# ==================== urllib3 计数钩子 ====================
+
+class _CountingAdapter(HTTPAdapter):
+    """把 urllib3 的连接池类换成带计数的版本"""
+
+    def __init__(self, registry: HttpPoolRegistry, **kwargs):
+        self._registry = registry
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _counting_pool(HTTPConnectionPool, HTTPConnection, self._registry),
+            "https": _counting_pool(HTTPSConnectionPool, HTTPSConnection, self._registry),
+        }
+
+
+def _counting_pool(pool_cls, conn_cls, registry: HttpPoolRegistry):
+    class CountingConnection(conn_cls):
+        def connect(self):
+            super().connect()
+            registry.stats_for(f"{self.scheme}://{self.host}:{self.port}").add(connects=1)
+
+    CountingConnection.scheme = pool_cls.scheme
+
+    class CountingPool(pool_cls):
+        ConnectionCls = CountingConnection
+
+        def _get_conn(self, timeout=None):
+            stats = registry.stats_for(f"{self.scheme}://{self.host}:{self.port}")
+            if self.pool is not None and self.pool.empty():
+                start = time.perf_counter()
+                conn = super()._get_conn(timeout)
+                stats.add(requests=1, waits=1, wait_time=time.perf_counter() - start)
+                return conn
+            stats.add(requests=1)
+            return super()._get_conn(timeout)
+
+    return CountingPool
+
+
+if httpx is not None:
+    class _TracingTransport(httpx.HTTPTransport):
+        """借 httpcore 的 trace 扩展统计新建连接"""
+
+        def __init__(self, stats: PoolStats, **kwargs):
+            super().__init__(**kwargs)
+            self._stats = stats
+
+        def _trace(self, event_name, info):
+            if event_name == "connection.connect_tcp.complete":
+                self._stats.add(connects=1)
+
+        def handle_request(self, request):
+            self._stats.add(requests=1)
+            request.extensions = {**request.extensions, "trace": self._trace}
+            return super().handle_request(request)
+
+
+_POOL: Optional[HttpPoolRegistry] = None
+_POOL_LOCK = threading.Lock()
+
+
+def get_http_pool() -> HttpPoolRegistry:
+    """全局连接池登记处"""
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = HttpPoolRegistry()
+        return _POOL
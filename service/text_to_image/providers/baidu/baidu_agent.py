@@ -1,9 +1,10 @@
 import os
 import json
-import requests
 import threading
 from psygnal import Signal
 
+from service.http_pool import get_http_pool
+
 
 class BaiduImageGenerator:
     pull_success = Signal(str)  # 图片保存路径
@@ -29,7 +30,7 @@ class BaiduImageGenerator:
                 filename += '.png'
 
             filepath = os.path.join(self.save_path, filename)
-            response = requests.get(image_url)
+            response = get_http_pool().web_session().get(image_url)
 
             if response.status_code == 200:
                 with open(filepath, 'wb') as f:
@@ -87,7 +88,7 @@ class BaiduImageGenerator:
         try:
             # 发送请求
             print('post')
-            response = requests.post(
+            response = get_http_pool().session_for(self.base_url).post(
                 self.base_url,
                 headers=self.headers,
                 json=payload
@@ -146,11 +147,11 @@ class BaiduModelFetcher:
     def _fetch_in_thread(self):
         try:
             try:
-                response = requests.get(self.exact_url, headers=self.headers)
+                response = get_http_pool().session_for(self.exact_url).get(self.exact_url, headers=self.headers)
                 response.raise_for_status()
                 result = response.json()
             except Exception:
-                response = requests.get(self.universal_url, headers=self.headers)
+                response = get_http_pool().session_for(self.universal_url).get(self.universal_url, headers=self.headers)
                 response.raise_for_status()
                 result = response.json()
 
@@ -5,6 +5,8 @@ import time
 import threading
 from psygnal import Signal
 
+from service.http_pool import get_http_pool
+
 
 class NovitaModelPresetVars:
     model_list_path = r'service\text_to_image\providers\novita\NOVITA_MODEL_OPTIONS.json'
@@ -81,7 +83,7 @@ class NovitaModelFetcher:
 
     def _fetch_in_thread(self):
         try:
-            response = requests.get(self.base_url, headers=self.headers)
+            response = get_http_pool().session_for(self.base_url).get(self.base_url, headers=self.headers)
             response.raise_for_status()
             result = response.json()
 
@@ -130,7 +132,7 @@ class NovitaImageGenerator:
         """保存图片到指定目录"""
         try:
             filepath = os.path.join(self.save_path, filename)
-            response = requests.get(url)
+            response = get_http_pool().web_session().get(url)
             if response.status_code == 200:
                 with open(filepath, 'wb') as f:
                     f.write(response.content)
@@ -168,7 +170,7 @@ class NovitaImageGenerator:
                 "guidance_scale": guidance_scale
             }
         }
-        response = requests.post(
+        response = get_http_pool().session_for(self.base_url).post(
             f"{self.base_url}async/txt2img",
             headers=self.headers,
             json=data  # 使用json参数自动处理序列化和Content-Type
@@ -204,7 +206,7 @@ negative_prompt:{negative_prompt},
 
             # 查询任务状态
             try:
-                response = requests.get(
+                response = get_http_pool().session_for(self.base_url).get(
                    f"{self.base_url}async/task-result",
                     params={"task_id": task_id},  # 更规范的参数传递方式
                     headers=self.headers
@@ -1,12 +1,13 @@
 import os
 import json
-import requests
 import time
 import threading
 import random
 from psygnal import Signal
 from urllib.parse import urljoin
 
+from service.http_pool import get_http_pool
+
 
 class OtherModelFetcher:
     update_done = Signal(list)
@@ -38,11 +39,11 @@ class OtherModelFetcher:
         """在后台线程中执行实际请求"""
         try:
             try:
-                response = requests.get(self.exact_url, headers=self.headers)
+                response = get_http_pool().session_for(self.exact_url).get(self.exact_url, headers=self.headers)
                 response.raise_for_status()
                 result = response.json()
             except Exception:
-                response = requests.get(self.universal_url, headers=self.headers)
+                response = get_http_pool().session_for(self.universal_url).get(self.universal_url, headers=self.headers)
                 response.raise_for_status()
                 result = response.json()
 
@@ -131,7 +132,7 @@ class OtherImageGenerator:
                 filename += '.png'
 
             filepath = os.path.join(self.save_path, filename)
-            response = requests.get(image_url)
+            response = get_http_pool().web_session().get(image_url)
 
             if response.status_code == 200:
                 with open(filepath, 'wb') as f:
@@ -179,7 +180,7 @@ class OtherImageGenerator:
 
         try:
             # 发送请求
-            response = requests.post(
+            response = get_http_pool().session_for(self.base_url).post(
                 self.base_url,
                 headers=self.headers,
                 json=payload
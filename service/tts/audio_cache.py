@@ -0,0 +1,125 @@
+"""
+AudioCache - 按内容寻址的合成音频缓存。
+
+同一句问候、同一段系统台词、重读的消息，以前每次都重新合成；现在按
+(文本, 音色, 语速, 音调, 供应商) 的哈希存一份：
+
+    <root>/<hex[:2]>/<hex>.<后缀>
+
+命中时直接返回文件路径，播放器可以直接播放。
+总字节数超过预算时按最近使用时间淘汰，最近使用时间就是文件的 mtime（命中时刷新），
+所以不需要额外的索引文件，重启后扫描一遍目录即可恢复 LRU 顺序。
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+
+def audio_cache_key(text: str, voice: str, rate: str = "", pitch: str = "", provider: str = "") -> str:
+    """合成参数的 SHA-256"""
+    raw = json.dumps([provider, voice, rate, pitch, text], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class AudioCache:
+    """线程安全；一个缓存目录一个实例，见 get_audio_cache"""
+
+    def __init__(self, root: str, max_bytes: int = 200 * 1024 * 1024):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        """key -> (路径, 字节数)，按最近使用排序，最旧的在前"""
+        self._total = 0
+        self._scan()
+
+    def _scan(self):
+        found = []
+        if os.path.isdir(self.root):
+            for shard in os.scandir(self.root):
+                if not shard.is_dir():
+                    continue
+                for entry in os.scandir(shard.path):
+                    key, _, suffix = entry.name.partition(".")
+                    if len(key) != 64 or suffix.endswith("tmp"):
+                        continue
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    found.append((stat.st_mtime, key, entry.path, stat.st_size))
+        for _, key, path, size in sorted(found):
+            self._entries[key] = (path, size)
+            self._total += size
+        self._evict()
+
+    def get(self, key: str) -> Optional[str]:
+        """命中返回文件路径并刷新最近使用时间，否则返回 None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            path = entry[0]
+            if not os.path.exists(path):
+                del self._entries[key]
+                self._total -= entry[1]
+                return None
+            self._entries.move_to_end(key)
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return path
+
+    def put(self, key: str, data: bytes, suffix: str = "mp3") -> str:
+        """写入音频，返回文件路径；写完后按预算淘汰旧条目（刚写入的除外）"""
+        path = os.path.join(self.root, key[:2], f"{key}.{suffix}")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old:
+                self._total -= old[1]
+            self._entries[key] = (path, len(data))
+            self._total += len(data)
+            self._evict()
+        return path
+
+    def _evict(self):
+        while self._total > self.max_bytes and len(self._entries) > 1:
+            _, (path, size) = self._entries.popitem(last=False)
+            self._total -= size
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    @property
+    def total_bytes(self) -> int:
+        return self._total
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+_CACHE: Optional[AudioCache] = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_audio_cache(root: str = "", max_bytes: int = 0) -> AudioCache:
+    """全局音频缓存；传入的目录和当前不同时换一个新实例，留空沿用当前的；max_bytes 非 0 时更新预算"""
+    global _CACHE
+    with _CACHE_LOCK:
+        if _CACHE is None or (root and os.path.abspath(root) != os.path.abspath(_CACHE.root)):
+            _CACHE = AudioCache(root or os.path.join("audio", "cache"))
+        if max_bytes and max_bytes != _CACHE.max_bytes:
+            _CACHE.max_bytes = max_bytes
+            with _CACHE._lock:
+                _CACHE._evict()
+        return _CACHE
@@ -6,11 +6,16 @@ from PyQt6.QtWidgets import *
 from PyQt6.QtGui import *
 from PyQt6.QtMultimedia import QMediaPlayer
 from PyQt6.QtMultimedia import QAudioOutput
-import threading
-import asyncio
 import random
 import json
+import base64
+import binascii
+from config import APP_SETTINGS
 from config.settings import TTSSettings
+from service.http_pool import get_http_pool
+from service.tts.audio_cache import audio_cache_key,get_audio_cache
+from service.tts.tts_runtime import CachedSynthesizer,get_tts_loop
+from utils.sentence_segmenter import SentenceSegmenter
 
 class WindowAnimator:
     @staticmethod
@@ -46,9 +51,10 @@ class CosyVoiceTTSClient(QObject):
     success_signal = pyqtSignal(dict)    # 成功信号（携带完整响应）
     error_signal = pyqtSignal(str)       # 错误信号（携带错误信息）
 
-    def __init__(self, server_url="http://localhost:5000/tts"):
+    def __init__(self, server_url="http://localhost:5000/tts", cache_root=''):
         super().__init__()
         self.server_url = server_url
+        self.cache_root = cache_root
 
     def extract_dialogue(self,text):
         # 正则表达式模式匹配中文和英文的引号内容（包括单引号）
@@ -81,8 +87,15 @@ class CosyVoiceTTSClient(QObject):
         }
         payload = {k: v for k, v in payload.items() if v is not None}
 
+        # 同样的文本 + 参考音频 + 参考文本合成过就直接播缓存
+        cache = get_audio_cache(self.cache_root, APP_SETTINGS.tts.cache_max_mb * 1024 * 1024)
+        key = audio_cache_key(text, f"{audio}|{prompt or ''}", '', function_type, 'cosyvoice')
+        if APP_SETTINGS.tts.cache_enabled and (path := cache.get(key)):
+            self.success_signal.emit({'audio_path': path, 'cached': True})
+            return
+
         try:
-            response = requests.post(
+            response = get_http_pool().session_for(self.server_url).post(
                 self.server_url,
                 json=payload,
                 headers={'Content-Type': 'application/json'}
@@ -91,7 +104,14 @@ class CosyVoiceTTSClient(QObject):
             if response.status_code == 202:
                 self.processing_signal.emit(response.json().get('message', 'Processing started'))
             elif response.ok:
-                self.success_signal.emit(response.json())
+                result = response.json()
+                audio_data = result.get('audio_data')
+                if isinstance(audio_data, str):
+                    try:
+                        result['audio_path'] = cache.put(key, base64.b64decode(audio_data, validate=True), 'wav')
+                    except (binascii.Error, ValueError):
+                        pass
+                self.success_signal.emit(result)
             else:
                 self.error_signal.emit(
                     f"请求失败（状态码：{response.status_code}）\n错误信息: {response.text}"
@@ -111,11 +131,12 @@ class CosyVoiceTTSClient(QObject):
 
 class CosyVoiceTTSWindow(QWidget):
     enable_dialog_extract=pyqtSignal(bool)
-    def __init__(self,_=''):
+    def __init__(self,application_path=''):
         super().__init__()
         # 初始化客户端
         self.setWindowTitle("CosyVoice TTS设置/测试")
-        self.tts_client = CosyVoiceTTSClient()
+        self.tts_client = CosyVoiceTTSClient(cache_root=os.path.join(application_path,'audio','cache'))
+        self.player = AudioPlayer()
 
 
         # 连接信号
@@ -185,24 +206,23 @@ class CosyVoiceTTSWindow(QWidget):
         prompt=self.prompt_text.text()
         audio=self.audio_path.text()
         
-        # 发起请求
-        # 使用threading创建新线程
-        thread = threading.Thread(
-            target=self.tts_client.send_request,
-            args=(text, prompt),
-            kwargs={'audio': audio, 'extract_dialogue': False}
+        # 发起请求，在 TTS 常驻循环的线程池里执行，受合成并发上限约束
+        get_tts_loop(APP_SETTINGS.tts.max_concurrency).submit_blocking(
+            self.tts_client.send_request, text, prompt,
+            audio=audio, extract_dialogue=False
         )
         self.stat.setText("正在发送请求...")
-        thread.daemon = True  # 设置为守护线程
-        thread.start()
 
     def show_processing(self, message):
         self.stat.setText(f"处理中... {message}")
         self.stat.setStyleSheet("color: blue;")
 
     def handle_success(self, response):
-        audio_data = response.get("audio_data")
-        self.play_audio(audio_data)
+        audio_path = response.get("audio_path")
+        if audio_path:
+            self.player.add_play_task(audio_path)
+        self.stat.setText("已从缓存播放" if response.get("cached") else "合成完成")
+        self.stat.setStyleSheet("")
 
     def show_error(self, message):
         QMessageBox.critical(self, "错误", message)
@@ -211,7 +231,7 @@ class CosyVoiceTTSWindow(QWidget):
         """检查TTS服务是否可用"""
         server_url = self.tts_client.server_url
         try:
-            response = requests.get(server_url)
+            response = get_http_pool().session_for(server_url).get(server_url)
             if response.ok:
                 QMessageBox.information(self, "成功", "TTS服务正常运行")
             else:
@@ -612,74 +632,54 @@ class EdgeTTSHandler(QObject):
     """Edge TTS功能处理器，支持在PyQt5中使用"""
     
     # 信号定义
-    tts_finished = pyqtSignal(str)                   # TTS转换完成信号（是否成功）
+    tts_finished = pyqtSignal(str)                   # TTS转换完成信号（音频路径，按提交顺序发出）
     voice_list_received = pyqtSignal(list)             # 接收到音色列表信号
     error_occurred = pyqtSignal(str)                  # 错误信号
     
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, cache_root=''):
         super().__init__(parent)
-        self._loop = None  # 每个线程独立的事件循环
-        self._thread = None
-
-    def run_tts(self, text, voice, output_file):
+        self.cache_root = cache_root
+        self._synthesizer: CachedSynthesizer = None
+
+    def _get_synthesizer(self) -> CachedSynthesizer:
+        """合成都跑在全局 TTS 循环上，结果先查音频缓存"""
+        loop = get_tts_loop(APP_SETTINGS.tts.max_concurrency)
+        cache = get_audio_cache(self.cache_root, APP_SETTINGS.tts.cache_max_mb * 1024 * 1024)
+        if self._synthesizer is None or self._synthesizer.cache is not cache:
+            self._synthesizer = CachedSynthesizer(self._synthesize, cache, loop, provider='edge-tts')
+        self._synthesizer.lookup = APP_SETTINGS.tts.cache_enabled
+        self._synthesizer.timeout = APP_SETTINGS.tts.synth_timeout
+        return self._synthesizer
+
+    def run_tts(self, text, voice, rate='+0%', pitch='+0Hz'):
         """执行TTS转换
         
         Args:
             text: 要转换的文本
             voice: 音色名称（如"zh-CN-XiaoxiaoNeural"）
-            output_file: 输出文件路径
+            rate / pitch: 语速、音调，和文本、音色一起作为缓存键
+
+        缓存命中时不再合成，tts_finished 直接发出缓存文件路径。
         """
-        self._start_thread(self._execute_tts, text, voice, output_file)
+        self._get_synthesizer().request(
+            text, voice, rate, pitch,
+            on_ready=self.tts_finished.emit,
+            on_error=lambda e: self.error_occurred.emit(f"TTS转换失败: {e}")
+        )
     
     def fetch_all_voices(self):
         """获取所有可用的音色列表"""
-        self._start_thread(self._execute_fetch_all_voices)
-    
-    def _start_thread(self, target, *args, **kwargs):
-        """启动线程执行任务"""
-        # 停止任何正在运行的线程
-        if self._thread and self._thread.is_alive():
-            self._thread.join(0.1)
-        
-        # 创建新线程
-        self._thread = threading.Thread(
-            target=self._run_async,
-            args=(target, *args),
-            kwargs=kwargs,
-            daemon=True
-        )
-        self._thread.start()
-    
-    def _run_async(self, task_func, *args, **kwargs):
-        """在新线程中运行异步任务（修复事件循环管理）"""
-        try:
-            # 每个线程独立创建并管理事件循环
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            
-            # 运行异步任务
-            loop.run_until_complete(task_func(*args, **kwargs))
-        except Exception as e:
-            self.error_occurred.emit(str(e))
-        finally:
-            # 安全关闭事件循环
-            try:
-                if loop.is_running():
-                    loop.stop()
-                # 关闭前先执行待定回调
-                loop.run_until_complete(loop.shutdown_asyncgens())
-                loop.run_until_complete(loop.shutdown_default_executor())
-            finally:
-                loop.close()
-    
-    async def _execute_tts(self, text, voice, output_file):
-        """执行TTS转换的异步实现"""
-        try:
-            communicate = edge_tts.Communicate(text, voice)
-            await communicate.save(output_file)
-            self.tts_finished.emit(str(output_file))
-        except Exception as e:
-            self.error_occurred.emit(f"TTS转换失败: {str(e)}")
+        get_tts_loop().submit(self._execute_fetch_all_voices(), limited=False)
+
+    @staticmethod
+    async def _synthesize(text, voice, rate, pitch) -> bytes:
+        """合成一句，返回 mp3 字节"""
+        communicate = edge_tts.Communicate(text, voice, rate=rate or '+0%', pitch=pitch or '+0Hz')
+        chunks = []
+        async for chunk in communicate.stream():
+            if chunk["type"] == "audio":
+                chunks.append(chunk["data"])
+        return b"".join(chunks)
     
     async def _execute_fetch_all_voices(self):
         """获取所有音色的异步实现"""
@@ -715,7 +715,7 @@ class AudioPlayer(QObject):
     def add_play_task(self, mp3_path):
         """
         将MP3文件加入播放队列，自动按顺序播放
-        :param mp3_path: MP3文件路径
+        :param mp3_path: MP3文件路径，缓存命中时就是缓存文件本身
         """
         # 添加到播放队列
         self.play_queue.append(mp3_path)
@@ -1032,7 +1032,7 @@ class EdgeTTSMainSetting(EdgeTTSMainSettingWindow):
         self.load_binding_from_json()
      
     def setup_tts_handler(self):
-        self.tts_handler=EdgeTTSHandler()
+        self.tts_handler=EdgeTTSHandler(cache_root=os.path.join(self.save_path,'cache'))
         self.tts_handler.tts_finished.connect(self.player.add_play_task)
         self.fetched_mark=False#不希望实例化时立刻更新，在打开窗口时再考虑更新。
         self.tts_handler.voice_list_received.connect(self._handle_tts_list_update)
@@ -1138,9 +1138,7 @@ class EdgeTTSMainSetting(EdgeTTSMainSettingWindow):
             voice=voice_type['ShortName']
         elif type(voice_type)==str:
             voice=voice_type
-        result_id=str(random.randint(100000,999999))
-        output_file=os.path.join(self.save_path,result_id+' '+voice+'.mp3')
-        self.tts_handler.run_tts(text=content,voice=voice,output_file=output_file)
+        self.tts_handler.run_tts(text=content,voice=voice)
 
     def send_tts_request(self,name,text):
         voice_type=''
@@ -1257,100 +1255,28 @@ class TTSIncomeMessageHandler:
         """初始化TTS消息处理器
         
         属性:
-        - previous_income: 记录上次已处理的文本内容
-        - TERMINATORS: 句子终止符集合（中英文标点）
-        - result_list: 临时存储提取的句子列表
-        - trans_table: Markdown符号过滤表（替换为空格）
+        - segmenter: 流式分句器，只处理新到的增量
+        - request_id: 当前分句所属的请求，换请求时分句状态清零
         """
-        self.previous_income=''
-        self.TERMINATORS = frozenset({'。', '.', '!', '?', '！', '？'})
-        self.result_list=[]
-        mark_down_symbols = [
-            '*', '#', '>', '-', '`', '|', '=', '[', ']', '(', ')', '!', 
-            '^', '@', '$', '~', ':', '{', '}', ' ', '\n', '_'
-        ]
-        self.trans_table=str.maketrans({c: ' ' for c in mark_down_symbols})
-
-
-    def _find_sentence(self, message: str) -> str:
-        if not message or not isinstance(message, str):
-            return ''
-            
-        prev_len = len(self.previous_income)
-        
-        # 使用字符串方法替代切片比较
-        if prev_len > 0 and not message.startswith(self.previous_income):
-            self.previous_income = ''
-            prev_len = 0
-
-        # 直接遍历原始字符串，避免生成中间切片
-        for i in range(prev_len, len(message)):
-            if message[i] in self.TERMINATORS:
-                end_index = i + 1
-                self.previous_income = message[:end_index]
-                # 直接返回切片，避免多次计算长度
-                return message[prev_len:end_index]
-        
-        return ''
-
-    def patch_sentence(self, message='',target_length=20,force_remain=False,extrat_dialog=False):
-        """消息分句处理（按终止符拆分）
-        
-        参数:
-        - message: 输入文本
-        - target_length: 输出触发长度（默认20字符）
-        - force_remain: 强制返回剩余文本模式
-        
-        返回:
-        - 达到目标长度: 返回拼接的完整句子
-        - 未达目标长度: 返回空字符串
-        - 强制模式: 直接返回剩余文本
-        
-        处理流程:
-        1. 清洗消息（移除Markdown符号）
-        2. 强制模式直接返回未处理内容
-        3. 循环提取完整句子存入result_list
-        4. 结果长度达标后清空缓存并返回
-        """
-        message=self.clean_message(message)
+        self.segmenter=SentenceSegmenter()
+        self.request_id=''
+
+    def feed(self, delta='', request_id='', extrat_dialog=False) -> list:
+        """送入流式增量，返回新完成的句子（每句只返回一次）"""
+        if request_id!=self.request_id:
+            # 上一轮被打断或重发，剩下的半句不再朗读
+            self.segmenter.reset()
+            self.request_id=request_id
+        return self._post_process(self.segmenter.feed(delta),extrat_dialog)
+
+    def flush(self, extrat_dialog=False) -> list:
+        """本轮结束，返回剩下的最后一句"""
+        return self._post_process(self.segmenter.flush(),extrat_dialog)
+
+    def _post_process(self, segments, extrat_dialog):
         if extrat_dialog:
-            message=self.extract_dialogue(message)
-        if force_remain:
-            result=message.replace(self.previous_income,'')
-            self.previous_income=message
-            return result
-        iters=0
-        final=''
-        while iters<20:
-            iters+=1
-            this_round_result=self._find_sentence(message)
-            if this_round_result=="":
-                break
-            else:
-                self.result_list+=[this_round_result]
-            final=''.join(self.result_list)
-        if len(final)>target_length:
-            self.result_list=[]
-            return final
-        else:
-            return ''
-        
-    def clean_message(self,message):
-        """消息清洗器
-        
-        参数:
-        - message: 原始文本
-        
-        返回:
-        - 清洗后的文本（无Markdown符号和空格）
-        
-        处理逻辑:
-        1. 通过转换表替换符号为空格
-        2. 移除所有空格
-        """
-        cleaned = message.translate(self.trans_table)
-        
-        return cleaned.replace(' ','')
+            segments=[self.extract_dialogue(seg) for seg in segments]
+        return [seg for seg in segments if seg]
 
     def extract_dialogue(self,text):
         # 用于存储匹配结果的列表
@@ -1404,8 +1330,6 @@ class TTSAgent(QGroupBox):
         self.generator_selector.currentTextChanged.connect(self.confirm_generator_change)
         self.enable_dialog_extract=False
 
-        self.call_iter=0
-
     
     def confirm_generator_change(self, name):
         if not name in self.function_dict:
@@ -1455,15 +1379,21 @@ class TTSAgent(QGroupBox):
         self.agent_layout.addWidget(self.mini_setting,0,1,3,1)
         self.setting.tts_enabled=True
 
-    def send_tts_request(self,name,text,force_remain=False):
-        self.call_iter+=1
-        if not self.setting.tts_enabled or not text:
-            return
-        if not force_remain and self.call_iter%3!=0:
+    def send_tts_request(self,name,text,force_remain=False,request_id=''):
+        """
+        text 是流式增量，凑成整句就立刻送去合成；
+        空字符串或 force_remain 表示本轮结束，剩下的尾巴也送出去。
+        """
+        if not self.setting.tts_enabled or not getattr(self,'generator',None):
             return
-        text=self.patch_sentence(message=text,force_remain=force_remain)
-        if text:
-            self.generator.send_tts_request(name=name,text=text)
+        segments=self.message_handler.feed(
+            delta=text,
+            request_id=request_id,
+            extrat_dialog=self.enable_dialog_extract)
+        if force_remain or not text:
+            segments+=self.message_handler.flush(extrat_dialog=self.enable_dialog_extract)
+        for segment in segments:
+            self.generator.send_tts_request(name=name,text=segment)
 
     def show_setting(self):
         self.generator.show()
@@ -1471,14 +1401,6 @@ class TTSAgent(QGroupBox):
     def get_mini_setting_window(self):
         return getattr(self,'mini_setting',QLabel('尚未初始化'))
 
-    def patch_sentence(self,message='',target_length=20,force_remain=False):
-        result= self.message_handler.patch_sentence(
-            message=message,
-            target_length=target_length,
-            force_remain=force_remain,
-            extrat_dialog=self.enable_dialog_extract)
-        return result
-
 if __name__ == "__main__":
     app = QApplication(sys.argv)
     window = TTSAgent()
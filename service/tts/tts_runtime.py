@@ -0,0 +1,176 @@
+"""
+TTS 运行时：一个常驻事件循环 + 带缓存、保序的合成入口。
+
+以前 EdgeTTSHandler 每次合成都新建线程和事件循环，CosyVoice 每次请求也开一个线程；
+流式分句后一轮回复会连着发好几句，线程和循环反复创建，完成顺序还是乱的。
+
+    TTSLoop            后台线程里常驻的事件循环，合成任务受并发信号量限制
+    CachedSynthesizer  先查 AudioCache，未命中才调合成函数；结果按提交顺序回调，
+                       保证播放顺序和句子顺序一致（失败、超时的句子跳过，不卡住后面的）
+"""
+import asyncio
+import concurrent.futures
+import threading
+from typing import Awaitable, Callable, Dict, Optional
+
+from service.tts.audio_cache import AudioCache, audio_cache_key
+
+
+class TTSLoop:
+    """常驻后台的事件循环，见 get_tts_loop"""
+
+    def __init__(self, max_concurrency: int = 3):
+        self.max_concurrency = max_concurrency
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._semaphore_size = 0
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name="tts-loop", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_forever()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        return self._loop
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        # 只在循环线程里调用；并发数改了就换新的信号量，已经拿到旧信号量的任务照常结束
+        if self._semaphore is None or self._semaphore_size != self.max_concurrency:
+            self._semaphore = asyncio.Semaphore(max(1, self.max_concurrency))
+            self._semaphore_size = self.max_concurrency
+        return self._semaphore
+
+    async def _limited(self, coro: Awaitable):
+        async with self._get_semaphore():
+            return await coro
+
+    def submit(self, coro: Awaitable, limited: bool = True) -> concurrent.futures.Future:
+        """把协程交给常驻循环，limited 时占用一个并发名额"""
+        if limited:
+            coro = self._limited(coro)
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    def submit_blocking(self, func: Callable, *args, **kwargs) -> concurrent.futures.Future:
+        """阻塞函数（比如同步 HTTP 请求）放进线程池执行，同样受并发限制"""
+        return self.submit(asyncio.to_thread(func, *args, **kwargs))
+
+    def stop(self):
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=2)
+
+
+_TTS_LOOP: Optional[TTSLoop] = None
+_TTS_LOOP_LOCK = threading.Lock()
+
+
+def get_tts_loop(max_concurrency: int = 0) -> TTSLoop:
+    """全局 TTS 事件循环；max_concurrency 非 0 时更新并发上限"""
+    global _TTS_LOOP
+    with _TTS_LOOP_LOCK:
+        if _TTS_LOOP is None:
+            _TTS_LOOP = TTSLoop(max_concurrency or 3)
+        elif max_concurrency:
+            _TTS_LOOP.max_concurrency = max_concurrency
+        return _TTS_LOOP
+
+
+class CachedSynthesizer:
+    """
+    带缓存、保序的合成入口。
+
+    Args:
+        synthesize: async (text, voice, rate, pitch) -> bytes，真正的合成
+        provider: 写进缓存键，不同供应商同样的参数互不命中
+        suffix: 缓存文件后缀
+    """
+
+    def __init__(
+        self,
+        synthesize: Callable[[str, str, str, str], Awaitable[bytes]],
+        cache: AudioCache,
+        loop: TTSLoop,
+        provider: str,
+        suffix: str = "mp3",
+    ):
+        self.synthesize = synthesize
+        self.cache = cache
+        self.loop = loop
+        self.provider = provider
+        self.suffix = suffix
+        self.lookup = True
+        """False 时不查缓存、每次都重新合成；结果仍写进缓存目录供播放，受同样的容量上限"""
+        self.timeout = 30.0
+        """单句合成的超时（秒），0 表示不限；超时的句子走 on_error，不会卡住后面的句子"""
+
+        self._lock = threading.Lock()
+        self._next_seq = 0
+        """下一个提交的序号"""
+        self._emit_seq = 0
+        """下一个该回调的序号"""
+        self._ready: Dict[int, tuple] = {}
+        """已完成、等待前面的句子回调的结果：序号 -> (路径, 错误, on_ready, on_error)"""
+
+        self.hits = 0
+        self.misses = 0
+
+    def request(
+        self,
+        text: str,
+        voice: str,
+        rate: str = "",
+        pitch: str = "",
+        on_ready: Callable[[str], None] = None,
+        on_error: Callable[[str], None] = None,
+    ) -> concurrent.futures.Future:
+        """
+        提交一句合成。命中缓存时不占并发名额、不调合成函数；
+        on_ready(路径) / on_error(信息) 按提交顺序在循环线程里回调。
+        """
+        with self._lock:
+            seq = self._next_seq
+            self._next_seq += 1
+        key = audio_cache_key(text, voice, rate, pitch, self.provider)
+        path = self.cache.get(key) if self.lookup else None
+        if path is not None:
+            self.hits += 1
+            return self.loop.submit(self._deliver(seq, path, None, on_ready, on_error), limited=False)
+        self.misses += 1
+        return self.loop.submit(self._run(seq, key, text, voice, rate, pitch, on_ready, on_error))
+
+    async def _run(self, seq, key, text, voice, rate, pitch, on_ready, on_error):
+        path = error = None
+        try:
+            # 排队期间同样的句子可能已经合成好了
+            path = self.cache.get(key) if self.lookup else None
+            if path is None:
+                if self.timeout > 0:
+                    try:
+                        data = await asyncio.wait_for(self.synthesize(text, voice, rate, pitch), self.timeout)
+                    except asyncio.TimeoutError:
+                        raise TimeoutError(f"合成超时（{self.timeout:g} 秒）") from None
+                else:
+                    data = await self.synthesize(text, voice, rate, pitch)
+                if not data:
+                    raise RuntimeError("合成结果为空")
+                path = await asyncio.to_thread(self.cache.put, key, data, self.suffix)
+        except Exception as e:
+            error = str(e) or type(e).__name__
+        await self._deliver(seq, path, error, on_ready, on_error)
+        return path
+
+    async def _deliver(self, seq, path, error, on_ready, on_error):
+        with self._lock:
+            self._ready[seq] = (path, error, on_ready, on_error)
+            batch = []
+            while self._emit_seq in self._ready:
+                batch.append(self._ready.pop(self._emit_seq))
+                self._emit_seq += 1
+        for path, error, on_ready, on_error in batch:
+            if error is None:
+                if on_ready:
+                    on_ready(path)
+            elif on_error:
+                on_error(error)
+        return path
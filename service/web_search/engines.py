@@ -3,9 +3,9 @@ from __future__ import annotations
 import re
 from typing import List, Protocol
 from urllib.parse import quote
-import requests
 from bs4 import BeautifulSoup
 
+from service.http_pool import get_http_pool
 from .models import SearchHit
 
 class SearchEngine(Protocol):
@@ -27,7 +27,7 @@ class BingSearchEngine:
 
     def search(self, query: str, limit: int) -> List[SearchHit]:
         url = self.SEARCH_URL + quote(query)
-        resp = requests.get(url, headers=self.headers, timeout=self.timeout)
+        resp = get_http_pool().web_session().get(url, headers=self.headers, timeout=self.timeout)
         resp.raise_for_status()
 
         soup = BeautifulSoup(resp.text, "html.parser")
@@ -67,7 +67,7 @@ class BaiduSearchEngine:
 
     def search(self, query: str, limit: int) -> List[SearchHit]:
         url = self.SEARCH_URL + quote(query)
-        resp = requests.get(url, headers=self.headers, timeout=self.timeout)
+        resp = get_http_pool().web_session().get(url, headers=self.headers, timeout=self.timeout)
         resp.raise_for_status()
 
         soup = BeautifulSoup(resp.text, "html.parser")
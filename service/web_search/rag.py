@@ -41,15 +41,13 @@ class RagFilter:
         model: str,
         timeout: float = 60.0,
     ) -> Optional[RagDecision]:
-        from openai import OpenAI
-        if OpenAI is None:
-            raise RuntimeError("openai SDK not available")
+        from service.http_pool import get_http_pool
 
         # 给 RAG 的输入：固定用摘要，避免把正文喂太多
         reference = format_results(results, abstract_only=True)
         user_input = f"{self.prefix}{query}{self.suffix}{reference}"
 
-        client = OpenAI(api_key=provider_key, base_url=provider_url)
+        client = get_http_pool().openai_client(base_url=provider_url, api_key=provider_key)
         resp = client.chat.completions.create(
             model=model,
             messages=[{"role": "user", "content": user_input}],
@@ -1,25 +1,17 @@
 # websearch/core/scraper.py
 from __future__ import annotations
 import re
-import threading
 from typing import Optional
 import requests
-from requests.adapters import HTTPAdapter
 from requests.exceptions import RequestException
 from bs4 import BeautifulSoup
 from lxml import etree
 
-_thread_local = threading.local()
+from service.http_pool import get_http_pool
 
 def _get_session() -> requests.Session:
-    sess = getattr(_thread_local, "session", None)
-    if sess is None:
-        sess = requests.Session()
-        adapter = HTTPAdapter(max_retries=3)
-        sess.mount("http://", adapter)
-        sess.mount("https://", adapter)
-        _thread_local.session = sess
-    return sess
+    # 所有抓取线程共用一个连接池，同站点的后续请求免握手
+    return get_http_pool().web_session()
 
 def decode_html(resp: requests.Response) -> str:
     enc = resp.encoding
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# 项目不是安装包，测试按仓库根目录导入
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,54 @@
+"""
+RepeatProcessor 换成后缀自动机之前的实现，只作为差分测试和基准的对照，不要在程序里使用。
+逐个起点从长到短试 substr in s2，再两两比较去掉被包含的重复项，复杂度是立方级的。
+"""
+import difflib
+
+from core.session.enforce_repeat import RepeatProcessor
+
+
+class CubicRepeatProcessor(RepeatProcessor):
+
+    @classmethod
+    def _check_similarity(cls, last_four):
+        similarity_threshold = 0.4
+        for i in range(len(last_four)):
+            for j in range(i + 1, len(last_four)):
+                ratio = difflib.SequenceMatcher(None, last_four[i], last_four[j]).ratio()
+                if ratio >= similarity_threshold:
+                    return True
+        return False
+
+    @classmethod
+    def _find_repeated_substrings(cls, last_four):
+        repeats = set()
+        for i in range(len(last_four)):
+            for j in range(i + 1, len(last_four)):
+                cls._add_repeats(last_four[i], last_four[j], repeats)
+        return sorted(repeats, key=lambda x: (-len(x), x))
+
+    @classmethod
+    def _add_repeats(cls, s1, s2, repeats):
+        len_s1 = len(s1)
+        for idx in range(len_s1):
+            for l in range(len_s1 - idx, 0, -1):
+                substr = s1[idx:idx + l]
+                if substr in s2:
+                    repeats.add(substr)
+                    break
+
+    @classmethod
+    def _clean_repeats(cls, repeats):
+        symbol_to_remove = [',', '.', '"', "'", '，', '。', '！', '？', '...', '——', '：', '~']
+        clean_output = []
+        repeats_check_list = list(reversed(repeats))
+        for item1 in repeats_check_list:
+            if cls._is_unique_substring(item1, repeats_check_list) and len(item1) > 3:
+                cleaned = cls._remove_symbols(item1, symbol_to_remove)
+                if cleaned:
+                    clean_output.append(cleaned)
+        return clean_output
+
+    @classmethod
+    def _is_unique_substring(cls, item, repeats):
+        return not any(item in item2 and item != item2 for item2 in repeats)
@@ -0,0 +1,108 @@
+"""AsyncRequestEngine：每个供应商的并发上限，configure 对已经出现过的供应商立即生效"""
+import asyncio
+import time
+
+import pytest
+
+pytest.importorskip("httpx")
+
+from service.chat_completion.async_requester import AsyncRequestEngine
+
+URL = "https://api.example.com/v1/chat/completions"
+
+
+@pytest.fixture
+def engine():
+    engine = AsyncRequestEngine(max_concurrency_per_provider=2)
+    yield engine
+    engine.shutdown()
+
+
+class Load:
+    """往引擎里塞一批占着名额不放的请求，记录同时进行的峰值"""
+
+    def __init__(self, engine, url=URL):
+        self.engine = engine
+        self.url = url
+        self.running = 0
+        self.peak = 0
+        self.release = None
+        self.futures = []
+
+    def start(self, count: int):
+        if self.release is None:
+            async def make_event():
+                self.release = asyncio.Event()
+            self.engine.submit(make_event()).result(timeout=2)
+        self.futures += [self.engine.submit(self._hold()) for _ in range(count)]
+
+    async def _hold(self):
+        async with self.engine.limit_for(self.url):
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+            await self.release.wait()
+            self.running -= 1
+
+    def running_after_settle(self) -> int:
+        time.sleep(0.05)
+        return self.engine.submit(asyncio.sleep(0, result=self.running)).result(timeout=2)
+
+    def finish(self):
+        self.engine._loop.call_soon_threadsafe(self.release.set)
+        for future in self.futures:
+            future.result(timeout=2)
+
+
+def test_limit_applies_per_provider(engine):
+    first, second = Load(engine), Load(engine, "https://other.example.com/v1")
+    first.start(5)
+    second.start(5)
+    assert first.running_after_settle() == 2
+    assert second.running_after_settle() == 2
+    first.finish()
+    second.finish()
+    assert (first.peak, second.peak) == (2, 2)
+
+
+def test_configure_raises_limit_of_existing_provider(engine):
+    load = Load(engine)
+    load.start(6)
+    assert load.running_after_settle() == 2
+
+    engine.configure(max_concurrency_per_provider=4)
+    assert load.running_after_settle() == 4
+    load.finish()
+    assert load.peak == 4
+
+
+def test_configure_lowers_limit_without_interrupting_running_requests(engine):
+    load = Load(engine)
+    load.start(2)
+    assert load.running_after_settle() == 2
+
+    engine.configure(max_concurrency_per_provider=1)
+    load.start(3)
+    assert load.running_after_settle() == 2
+    load.finish()
+    assert load.peak == 2
+
+    # 新开的供应商也按新上限
+    other = Load(engine, "https://other.example.com/v1")
+    other.start(3)
+    assert other.running_after_settle() == 1
+    other.finish()
+
+
+def test_cancelled_waiters_do_not_leak_slots(engine):
+    load = Load(engine)
+    load.start(4)
+    assert load.running_after_settle() == 2
+    for future in load.futures[2:]:
+        future.cancel()
+    load.futures = load.futures[:2]
+    load.finish()
+
+    after = Load(engine)
+    after.start(3)
+    assert after.running_after_settle() == 2
+    after.finish()
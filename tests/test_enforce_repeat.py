@@ -0,0 +1,74 @@
+"""RepeatProcessor：后缀自动机版本和原来的立方级实现（repeat_oracle）逐个对比输出"""
+import random
+
+import pytest
+
+from core.session.enforce_repeat import RepeatProcessor, _SuffixAutomaton
+from repeat_oracle import CubicRepeatProcessor
+
+PHRASES = [
+    "她轻轻地笑了笑，", "眼神中闪过一丝狡黠。", "“你真的这么想吗？”", "窗外的雨还在下着，", "他沉默了片刻，",
+    "我会一直陪着你的。", "*握紧了你的手*", "心跳不由得加快了几分……", "The wind howled outside. ",
+    "She smiled softly, ", "“Are you sure?” ", "~", "——",
+]
+FILLER = "的一是了我不人在他有这个上们来到时大地为子中你说生国年着就那和要她出也得里后自以会"
+
+
+def reply(rng, parts):
+    return "".join(
+        rng.choice(PHRASES) if rng.random() < 0.6
+        else "".join(rng.choice(FILLER) for _ in range(rng.randint(3, 15)))
+        for _ in range(parts)
+    )
+
+
+def history(rng, n_msgs, parts):
+    messages = [{"role": "system", "content": "sys"}]
+    for _ in range(n_msgs // 2):
+        messages.append({"role": "user", "content": "继续"})
+        content = reply(rng, parts)
+        if rng.random() < 0.3:
+            content = [{"type": "text", "text": content}]
+        messages.append({"role": "assistant", "content": content})
+    return messages
+
+
+def test_roleplay_histories_match_oracle():
+    rng = random.Random(7)
+    for _ in range(300):
+        messages = history(rng, rng.randint(2, 12), rng.randint(1, 12))
+        assert RepeatProcessor.analyze_repeats(messages) == CubicRepeatProcessor.analyze_repeats(messages)
+
+
+def test_small_alphabet_histories_match_oracle():
+    # 小字母表重复多，包含关系、重叠、空消息这些边界情况都会出现
+    rng = random.Random(11)
+    for _ in range(2000):
+        messages = [
+            {"role": "assistant", "content": "".join(rng.choice("ab.c，") for _ in range(rng.randint(0, 25)))}
+            for _ in range(4)
+        ]
+        assert RepeatProcessor.analyze_repeats(messages) == CubicRepeatProcessor.analyze_repeats(messages)
+
+
+@pytest.mark.parametrize("last_four", [
+    ["", "", "", ""],
+    ["abc", "abc", "abc", "abc"],
+    ["aaaa", "aaaaaa", "aa", "aaaaa"],
+    ["xyz", "uvw", "rst", "opq"],
+])
+def test_find_repeated_substrings_edge_cases(last_four):
+    expected = CubicRepeatProcessor._clean_repeats(CubicRepeatProcessor._find_repeated_substrings(last_four))
+    assert RepeatProcessor._clean_repeats(RepeatProcessor._find_repeated_substrings(last_four)) == expected
+
+
+def test_suffix_automaton_matching_lengths():
+    sam = _SuffixAutomaton("abcab")
+    text = "xabcabz"
+    lengths = sam.matching_lengths(text)
+    # 第 i 位是 text[:i+1] 的后缀里在 "abcab" 中出现过的最长长度
+    for i, length in enumerate(lengths):
+        best = max(l for l in range(i + 2) if text[i + 1 - l:i + 1] in "abcab")
+        assert length == best
+    assert sam.find("cab") != -1
+    assert sam.find("cax") == -1
@@ -0,0 +1,72 @@
+"""Preprocessor._fix_chat_history：窗口开头是孤立的工具结果 / 工具调用时，往前补到最近的 user 消息"""
+import pytest
+
+from core.session.preprocessor import Preprocessor
+
+
+def msg(role: str, msg_id: str, **extra) -> dict:
+    return {"role": role, "content": msg_id, "info": {"id": msg_id}, **extra}
+
+
+SYSTEM = msg("system", "system_prompt")
+LCI = {"role": "system", "content": "之前的对话总结", "info": {"id": "lci_1", "lci": {"end": 2}}}
+HISTORY = [
+    SYSTEM,
+    msg("user", "u1"),
+    msg("assistant", "a1"),
+    LCI,
+    msg("user", "u2"),
+    msg("assistant", "a2", tool_calls=[{"id": "call_1", "type": "function",
+                                        "function": {"name": "f", "arguments": "{}"}}]),
+    msg("tool", "t1", tool_call_id="call_1"),
+    msg("assistant", "a3"),
+    msg("user", "u3"),
+]
+
+
+def ids(messages: list) -> list:
+    return [m["info"]["id"] for m in messages]
+
+
+def fix(window: list) -> list:
+    return Preprocessor()._fix_chat_history(list(window), HISTORY)
+
+
+@pytest.mark.parametrize("start", [5, 6, 7])
+def test_window_cut_inside_tool_call_is_extended_to_user(start):
+    assert ids(fix([SYSTEM] + HISTORY[start:])) == ["system_prompt", "u2", "a2", "t1", "a3", "u3"]
+
+
+@pytest.mark.parametrize("start", [5, 6, 7])
+def test_pinned_lci_summary_does_not_block_the_repair(start):
+    assert ids(fix([SYSTEM, LCI] + HISTORY[start:])) == ["system_prompt", "lci_1", "u2", "a2", "t1", "a3", "u3"]
+
+
+def test_pinned_lci_inside_the_gap_is_not_duplicated():
+    # LCI 总结落在 user 和它的工具调用之间，已经固定在开头了，往前补时不再补一次
+    history = [SYSTEM, HISTORY[4], LCI] + HISTORY[5:]
+    window = [SYSTEM, LCI] + HISTORY[6:]
+    assert ids(Preprocessor()._fix_chat_history(window, history)) == \
+        ["system_prompt", "lci_1", "u2", "a2", "t1", "a3", "u3"]
+
+
+def test_copied_messages_are_located_by_id():
+    window = [dict(m) for m in [SYSTEM, LCI] + HISTORY[6:]]
+    assert ids(fix(window)) == ["system_prompt", "lci_1", "u2", "a2", "t1", "a3", "u3"]
+
+
+@pytest.mark.parametrize("window", [
+    [SYSTEM] + HISTORY[4:],
+    [SYSTEM, LCI] + HISTORY[8:],
+    HISTORY,
+    [SYSTEM],
+    [SYSTEM, LCI],
+])
+def test_windows_starting_with_user_are_unchanged(window):
+    assert fix(window) == window
+
+
+def test_history_is_not_modified():
+    snapshot = [dict(m) for m in HISTORY]
+    fix([SYSTEM, LCI] + HISTORY[6:])
+    assert HISTORY == snapshot
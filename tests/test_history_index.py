@@ -0,0 +1,93 @@
+"""SQLite 历史索引：首次启用时列表只同步解析要显示的存档，其余存档在后台导入"""
+import os
+import threading
+
+import pytest
+
+from core.session.chat_history_manager import ChathistoryFileManager
+from core.session.session_model import ChatSession
+
+
+def write_sessions(folder, count: int) -> list:
+    writer = ChathistoryFileManager(history_path=str(folder))
+    paths = []
+    for i in range(count):
+        session = ChatSession.from_dict({"title": f"会话{i}", "history": [
+            {"role": "system", "content": "sys", "info": {"id": "system_prompt"}},
+            {"role": "user", "content": f"第{i}个", "info": {"id": f"u{i}"}},
+        ]})
+        path = writer.save_chathistory(session, file_path=str(folder / f"chat_{i:03d}.json"))
+        os.utime(path, (1_700_000_000 + i, 1_700_000_000 + i))
+        paths.append(path)
+    return paths
+
+
+@pytest.fixture
+def manager(tmp_path):
+    write_sessions(tmp_path, 30)
+    manager = ChathistoryFileManager(history_path=str(tmp_path), use_index=True)
+    manager.parsed = []
+    manager.release_import = threading.Event()
+    index_file = manager._index_file
+    import_entries = manager._import_entries
+
+    def recording_index_file(index, path, name, mtime):
+        manager.parsed.append(name)
+        return index_file(index, path, name, mtime)
+
+    def gated_import_entries(index, entries):
+        # 后台导入等测试放行，之前记录到的解析都发生在 load_past_chats 里
+        manager.release_import.wait(timeout=10)
+        return import_entries(index, entries)
+
+    manager._index_file = recording_index_file
+    manager._import_entries = gated_import_entries
+    yield manager
+    manager.release_import.set()
+    if manager._index is not None:
+        manager._index.close()
+
+
+def finish_import(manager):
+    manager.release_import.set()
+    manager._import_thread.join(timeout=10)
+    assert not manager._import_thread.is_alive()
+
+
+def test_first_load_parses_only_the_listed_sessions_before_returning(manager):
+    chats = manager.load_past_chats(file_count=10)
+
+    assert [c["title"] for c in chats] == [f"会话{i}" for i in range(29, 19, -1)]
+    assert sorted(manager.parsed) == [f"chat_{i:03d}.json" for i in range(20, 30)]
+
+    manager.parsed.clear()
+    finish_import(manager)
+    assert sorted(manager.parsed) == [f"chat_{i:03d}.json" for i in range(20)]
+    assert len(manager._index.session_mtimes()) == 30
+
+
+def test_import_runs_once_and_later_loads_hit_the_index(manager):
+    manager.load_past_chats(file_count=10)
+    thread = manager._import_thread
+    finish_import(manager)
+    manager.parsed.clear()
+
+    chats = manager.load_past_chats(file_count=30)
+    assert manager._import_thread is thread
+    assert manager.parsed == []
+    assert len(chats) == 30
+
+
+def test_save_updates_session_row_without_parsing(manager, tmp_path):
+    manager.load_past_chats(file_count=10)
+    finish_import(manager)
+    manager.parsed.clear()
+
+    path = str(tmp_path / "chat_000.json")
+    session = manager.load_chathistory(path)
+    session.history.append({"role": "assistant", "content": "新回复", "info": {"id": "a0"}})
+    manager.save_chathistory(session, file_path=path)
+
+    summary = manager.session_summary(path)
+    assert manager.parsed == []
+    assert (summary["chat_id"], summary["message_count"]) == (str(session.chat_id), session.chat_rounds)
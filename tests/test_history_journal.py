@@ -0,0 +1,86 @@
+"""HistoryJournal：增量保存后重新载入，结果要和内存里的会话一致"""
+import json
+
+import pytest
+
+from core.session.chat_history_manager import ChathistoryFileManager
+from core.session.session_model import ChatSession
+
+
+def make_session(count: int = 5) -> ChatSession:
+    history = [{"role": "system", "content": "sys", "info": {"id": "m0"}}]
+    history += [
+        {"role": "user" if i % 2 else "assistant", "content": f"第{i}条消息", "info": {"id": f"m{i}"}}
+        for i in range(1, count)
+    ]
+    return ChatSession.from_dict({"history": history})
+
+
+@pytest.fixture
+def manager(tmp_path):
+    return ChathistoryFileManager(history_path=str(tmp_path))
+
+
+@pytest.fixture
+def saved(manager, tmp_path):
+    """已经压缩过一次、带日志代号的存档，返回 (路径, 追踪中的会话)"""
+    path = str(tmp_path / "chat.json")
+    manager.save_chathistory(make_session(), file_path=path, incremental=True)
+    return path, manager.load_chathistory(path, track=True)
+
+
+def journal_ops(manager, path):
+    with open(manager.journal.journal_path(path), encoding="utf-8") as f:
+        return [json.loads(line)["op"] for line in f]
+
+
+def reload(manager, path):
+    return manager.load_chathistory(path).history
+
+
+def test_append_writes_only_new_messages(manager, saved):
+    path, session = saved
+    session.history.append({"role": "user", "content": "新消息", "info": {"id": "m5"}})
+    manager.save_chathistory(session, file_path=path, incremental=True)
+
+    assert journal_ops(manager, path) == ["base", "add"]
+    assert reload(manager, path) == session.history
+
+
+@pytest.mark.parametrize("mutate", [
+    lambda h: h[2].__setitem__("reasoning_content", "thought"),
+    lambda h: h[3]["info"].__setitem__("token_cache", {"count": 12}),
+    lambda h: h[2].__setitem__("tool_calls", [{"id": "call_1", "function": {"name": "f", "arguments": "{}"}}]),
+    lambda h: h[4].__setitem__("content", [{"type": "text", "text": "列表正文"}]),
+])
+def test_in_place_edits_are_journaled(manager, saved, mutate):
+    path, session = saved
+    mutate(session.history)
+    manager.save_chathistory(session, file_path=path, incremental=True)
+
+    assert journal_ops(manager, path) == ["base", "edit"]
+    assert reload(manager, path) == session.history
+
+    # 同一个列表再原地改一次也要能发现
+    if isinstance(session.history[4]["content"], list):
+        session.history[4]["content"][0]["text"] = "改过的正文"
+        manager.save_chathistory(session, file_path=path, incremental=True)
+        assert reload(manager, path) == session.history
+
+
+def test_unchanged_session_writes_nothing(manager, saved):
+    path, session = saved
+    manager.save_chathistory(session, file_path=path, incremental=True)
+    assert journal_ops(manager, path) == ["base"]
+
+
+def test_untracked_load_forgets_previous_state(manager, saved):
+    path, session = saved
+    # 同一路径按迁移过的存档重新登记：旧状态作废，下一次保存重写快照
+    manager.journal.track(path, session, None)
+    session.history.append({"role": "user", "content": "新消息", "info": {"id": "m5"}})
+    manager.save_chathistory(session, file_path=path, incremental=True)
+
+    assert journal_ops(manager, path) == ["base"]
+    with open(path, encoding="utf-8") as f:
+        assert len(json.load(f)["history"]) == 6
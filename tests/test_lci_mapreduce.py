@@ -0,0 +1,163 @@
+"""LongChatImprove 的 MapReduce 模式：对着本地 OpenAI 替身服务，核对请求次数和分块缓存命中"""
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from config.settings import APP_RUNTIME, APP_SETTINGS, ApiConfig, ProviderConfig
+from core.context.lci import chunk_cache
+from core.context.lci.engine import LongChatImprove
+
+
+class StubOpenAI:
+    """/v1/chat/completions 的非流式替身，记录请求数和同时在处理的最大请求数"""
+
+    def __init__(self, delay: float = 0.05):
+        self.requests = 0
+        self.active = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                with stub._lock:
+                    stub.requests += 1
+                    stub.active += 1
+                    stub.peak = max(stub.peak, stub.active)
+                    n = stub.requests
+                threading.Event().wait(delay)
+                prompt = body["messages"][-1]["content"]
+                kind = "reduce" if "### 片段 1" in prompt else "map"
+                out = json.dumps({
+                    "id": f"stub-{n}", "object": "chat.completion", "created": 0, "model": body["model"],
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": f"{kind} #{n} " + "摘要" * 200}}],
+                }).encode("utf-8")
+                with stub._lock:
+                    stub.active -= 1
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(out)))
+                self.end_headers()
+                self.wfile.write(out)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/v1"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+
+@pytest.fixture
+def stub():
+    server = StubOpenAI()
+    yield server
+    server.server.shutdown()
+
+
+@pytest.fixture
+def engine(stub, tmp_path, monkeypatch):
+    monkeypatch.setattr(APP_RUNTIME.paths, "lci_chunk_cache_path", str(tmp_path / "lci_chunk_cache.json"))
+    monkeypatch.setattr(chunk_cache, "_CACHE", None)
+
+    lci = APP_SETTINGS.lci.model_copy(deep=True)
+    lci.mode = "mapreduce"
+    lci.api_provider = "stub"
+    lci.model = "stub-model"
+    lci.chunk_tokens = 2000
+    lci.max_parallel = 4
+    lci.hint = ""
+
+    eng = LongChatImprove()
+    eng._lci_settings = lci
+    eng._api_settings = ApiConfig(providers={"stub": ProviderConfig(url=stub.url, key="sk-stub")})
+    eng.saved = []
+    eng.on_save_history = lambda items, anchor_id: eng.saved.append((items, anchor_id))
+    return eng
+
+
+def make_history(start: int, count: int, text: str = "这是一段比较长的对话内容，") -> list:
+    return [
+        {"role": "user" if i % 2 == 0 else "assistant",
+         "content": f"第{i}条消息。" + text * 60,
+         "info": {"id": f"m{i}"}}
+        for i in range(start, start + count)
+    ]
+
+
+def run(engine, history):
+    engine.saved.clear()
+    engine._run_thread(history)
+    assert len(engine.saved) == 1, "LCI 没有产出结果"
+    return engine.saved[0]
+
+
+def test_first_run_maps_every_chunk_in_parallel(engine, stub):
+    history = make_history(0, 40)
+    chunks = len(engine._split_chunks(history))
+    items, anchor_id = run(engine, history)
+
+    stats = engine.mapreduce_stats
+    assert stats["chunks"] == chunks > 1
+    assert stats["hits"] == 0
+    # 每块一次 map，至少一次 reduce
+    assert stats["calls"] == stub.requests > chunks
+    assert 1 < stub.peak <= engine._lci_settings.max_parallel
+
+    assert anchor_id == "m39"
+    lci_info = items[0]["info"]["lci"]
+    assert lci_info["mode"] == "mapreduce"
+    assert lci_info["related"] == [f"m{i}" for i in range(40)]
+
+
+def test_unchanged_history_is_served_from_cache(engine, stub):
+    history = make_history(0, 40)
+    run(engine, history)
+    first_calls = stub.requests
+
+    run(engine, history)
+    assert engine.mapreduce_stats["calls"] == 0
+    assert engine.mapreduce_stats["hits"] > 0
+    assert stub.requests == first_calls
+
+
+def test_appended_messages_only_resummarize_changed_chunks(engine, stub):
+    history = make_history(0, 40)
+    items, _ = run(engine, history)
+    old_chunks = engine.mapreduce_stats["chunks"]
+
+    # 上一次的 LCI 总结插在历史里，后面接着新对话
+    grown = history + items + make_history(40, 10, "新的对话内容，")
+    run(engine, grown)
+    stats = engine.mapreduce_stats
+    new_chunks = stats["chunks"] - old_chunks
+
+    assert new_chunks > 0
+    # 旧块全部命中缓存，只有新块和受影响的合并请求真正发出
+    assert stats["hits"] >= old_chunks
+    assert new_chunks < stats["calls"] < stats["chunks"]
+
+
+def test_cache_survives_restart(engine, stub):
+    history = make_history(0, 40)
+    run(engine, history)
+
+    chunk_cache._CACHE = None  # 重新从 json 加载
+    run(engine, history)
+    assert engine.mapreduce_stats["calls"] == 0
+
+
+def test_cache_disabled_always_requests(engine, stub):
+    engine._lci_settings.chunk_cache = False
+    history = make_history(0, 20)
+    run(engine, history)
+    first = engine.mapreduce_stats["calls"]
+    run(engine, history)
+    assert engine.mapreduce_stats["calls"] == first
+    assert engine.mapreduce_stats["hits"] == 0
@@ -0,0 +1,118 @@
+"""ChunkReasoningStateMachine：随机标记碎片、随机切块，和逐字符的 ReasoningStateMachine 逐块对比"""
+import random
+
+import pytest
+
+from service.chat_completion.reasoning_parser import (
+    ChunkReasoningStateMachine,
+    ReasoningState,
+    ReasoningStateMachine,
+    StreamingReasoningParser,
+)
+
+TAGS = [
+    ("<think>", "</think>"),
+    ("<reasoning>", "</reasoning>"),
+    # 首字符在标记里重复出现，逐字符版匹配失败不回头的行为最容易在这里分叉
+    ("<<t>", "<</t>"),
+    ("[T]", "[/T]"),
+]
+
+
+def fragments(start, end):
+    pieces = {start, end, start[0], end[0], end[:2], start[:-1], end[:-1], start[1:], end[1:],
+              start[0] * 2, start + start[0], end[0] + end, ">", "思", "考", "a", "b", "\n", " "}
+    return sorted(pieces)
+
+
+def random_text(rng, start, end, parts):
+    pool = fragments(start, end)
+    return "".join(rng.choice(pool) for _ in range(parts))
+
+
+def random_chunks(rng, text):
+    chunks = []
+    i = 0
+    while i < len(text):
+        step = rng.choice([1, 1, 2, 3, 4, 7, 16, 64])
+        chunks.append(text[i:i + step])
+        i += step
+    return chunks
+
+
+class Recorder:
+    """收集一台状态机的回调，按块分组"""
+
+    def __init__(self, machine_cls, start, end):
+        self.content = []
+        self.reasoning = []
+        self.states = []
+        self.machine = machine_cls(
+            think_start=start,
+            think_end=end,
+            on_content=self.content.append,
+            on_reasoning=self.reasoning.append,
+            on_state_change=lambda old, new: self.states.append((old, new)),
+        )
+
+    def step(self, method, *args):
+        self.content.clear()
+        self.reasoning.clear()
+        result = getattr(self.machine, method)(*args)
+        return (result, "".join(self.content), "".join(self.reasoning), self.machine.state)
+
+
+@pytest.mark.parametrize("start, end", TAGS)
+def test_chunk_machine_matches_per_char_machine(start, end):
+    rng = random.Random(start + end)
+    for _ in range(1500):
+        text = random_text(rng, start, end, rng.randint(0, 40))
+        old = Recorder(ReasoningStateMachine, start, end)
+        new = Recorder(ChunkReasoningStateMachine, start, end)
+        for chunk in random_chunks(rng, text):
+            assert new.step("process", chunk) == old.step("process", chunk), (text, chunk)
+            assert new.states == old.states
+        assert new.step("finalize") == old.step("finalize"), text
+        assert new.states == old.states
+
+
+def test_chunk_machine_fires_one_callback_per_kind_per_chunk():
+    rec = Recorder(ChunkReasoningStateMachine, "<think>", "</think>")
+    rec.step("process", "前言<think>想一想<th</think>正文<")
+    assert rec.content == ["前言正文"]
+    assert rec.reasoning == ["想一想<th"]
+    assert rec.machine.state == ReasoningState.THINK_START_PENDING
+
+
+def test_streaming_parser_deltas_match_per_char_machine():
+    rng = random.Random(42)
+    for _ in range(1000):
+        text = random_text(rng, "<think>", "</think>", rng.randint(0, 40))
+        parser = StreamingReasoningParser()
+        old = Recorder(ReasoningStateMachine, "<think>", "</think>")
+        for chunk in random_chunks(rng, text):
+            out = parser.feed(chunk)
+            result, content, reasoning, _ = old.step("process", chunk)
+            assert out == {
+                "content_delta": content,
+                "reasoning_delta": reasoning,
+                "is_reasoning": result.is_reasoning,
+                "full_content": result.content,
+                "full_reasoning": result.reasoning_content,
+            }
+        assert parser.finalize() == old.machine.finalize()
+
+
+@pytest.mark.parametrize("chunks, content, reasoning", [
+    (["<thi", "nk>abc</th", "ink>done"], "done", "abc"),
+    (["<", "t", "h", "i", "n", "k", ">", "x", "<", "/", "think>", "y"], "y", "x"),
+    (["<<think>x"], "<<think>x", ""),
+    (["<think>a</thinK>b</think>c"], "c", "a</thinK>b"),
+    (["abc<thi"], "abc<thi", ""),
+])
+def test_tags_split_across_chunks(chunks, content, reasoning):
+    parser = StreamingReasoningParser()
+    for chunk in chunks:
+        parser.feed(chunk)
+    result = parser.finalize()
+    assert (result.content, result.reasoning_content) == (content, reasoning)
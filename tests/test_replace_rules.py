@@ -0,0 +1,51 @@
+"""ReplaceRuleSet：互不影响的普通字符串规则走一次交替式替换，结果必须和逐条 str.replace 相同"""
+import random
+
+import pytest
+
+from utils.str_tools import ReplaceRuleSet
+
+
+def sequential(rules, text):
+    for pattern, replacement in rules:
+        text = text.replace(pattern, replacement)
+    return text
+
+
+def test_single_pass_matches_sequential(monkeypatch):
+    monkeypatch.setattr(ReplaceRuleSet, "SINGLE_PASS_MIN_RULES", 1)
+    rng = random.Random(5)
+    checked = 0
+    for _ in range(5000):
+        count = rng.randint(1, 6)
+        patterns = ["".join(rng.choices("abcd", k=rng.randint(1, 3))) for _ in range(count)]
+        targets = ["".join(rng.choices("abcdxy", k=rng.randint(0, 3))) for _ in range(count)]
+        ruleset = ReplaceRuleSet(";".join(patterns), ";".join(targets))
+        if ruleset.single_pass is None:
+            continue
+        checked += 1
+        for _ in range(10):
+            text = "".join(rng.choices("abcdxy", k=rng.randint(0, 40)))
+            assert ruleset.apply(text) == sequential(ruleset.rules, text)
+    assert checked > 500
+
+
+@pytest.mark.parametrize("replace_from, replace_to", [
+    ("ab;bc", "1;2"),      # 模式重叠：abc 里先替换 ab
+    ("ab;abc", "1;2"),     # 模式互相包含
+    ("a;x", "x;y"),        # 前一条的输出被后一条命中
+    ("b;ac", ";1"),        # 删除后两侧拼成后一条的模式
+    ("a;;b", "1;2;3"),     # 空模式
+])
+def test_interacting_rules_stay_sequential(monkeypatch, replace_from, replace_to):
+    monkeypatch.setattr(ReplaceRuleSet, "SINGLE_PASS_MIN_RULES", 1)
+    assert ReplaceRuleSet(replace_from, replace_to).single_pass is None
+
+
+def test_threshold():
+    words = [f"<w{i}>" for i in range(ReplaceRuleSet.SINGLE_PASS_MIN_RULES)]
+    targets = ";".join("x" * len(words))
+    assert ReplaceRuleSet(";".join(words[:-1]), targets).single_pass is None
+    ruleset = ReplaceRuleSet(";".join(words), targets)
+    assert ruleset.single_pass is not None
+    assert ruleset.apply("a<w0>b<w31>c<w") == "axbxc<w"
@@ -0,0 +1,91 @@
+"""SentenceSegmenter：流式喂入的结果必须和一次性 segment() 逐段相同"""
+import random
+
+import pytest
+
+from utils.sentence_segmenter import SentenceSegmenter
+
+# 录制的流式增量：切点故意落在围栏、链接、小数点、引号中间
+RECORDED_STREAMS = [
+    (
+        ["你好！我是", "助手。今天天气不", "错，适合出去走走；不过下午可能会下雨…", "…记得带伞。"],
+        ["你好！ 我是助手。", "今天天气不错，适合出去走走；不过下午可能会下雨……", "记得带伞。"],
+    ),
+    (
+        ["## 建议\n- **带", "伞**：以防万一\n- 穿外套\n\n`", "``python\nprint('hello.", " world!')\n``", "`\n版本号是 3.", "14.2，文件叫 main", ".py。"],
+        ["建议 带伞：以防万一", "穿外套 版本号是 3.14.2，文件叫 main.py。"],
+    ),
+    (
+        ["See [the docs](https://exa", "mple.com/a.b?c=d) for more", ". Pi is about 3", ".14, right?"],
+        ["See the docs for more.", "Pi is about 3.14, right?"],
+    ),
+    (
+        ["他说：“真的吗？", "！", "”然后走了。"],
+        ["他说：“真的吗？！”", "然后走了。"],
+    ),
+    (
+        ["| a | b |\n|-", "--|---|\n| 1 | 2 |"],
+        ["a b 1 2"],
+    ),
+]
+
+SAMPLES = [
+    "".join(deltas) for deltas, _ in RECORDED_STREAMS
+] + [
+    "Hello there! This is a test. Also `inline code` here.\n> quoted line without punctuation\n~~~\ncode. here!\n~~~\nThe end",
+    "一段很长很长的没有任何句号的文字，" * 10 + "最后结束。",
+    "word " * 60 + "done.",
+    "``` unterminated fence\nabc. def!",
+    "短。短。短句。这一句比较长一点。",
+    "",
+]
+
+
+def feed_all(deltas, **kwargs):
+    segmenter = SentenceSegmenter(**kwargs)
+    out = []
+    for delta in deltas:
+        out += segmenter.feed(delta)
+    return out + segmenter.flush()
+
+
+@pytest.mark.parametrize("deltas, expected", RECORDED_STREAMS)
+def test_recorded_streams(deltas, expected):
+    assert feed_all(deltas) == expected
+    assert SentenceSegmenter.segment("".join(deltas)) == expected
+
+
+@pytest.mark.parametrize("text", SAMPLES)
+def test_random_chunking_matches_one_shot(text):
+    rng = random.Random(len(text))
+    reference = SentenceSegmenter.segment(text)
+    for _ in range(200):
+        deltas = []
+        pos = 0
+        while pos < len(text):
+            size = rng.choice((1, 1, 2, 3, 5, 8, 20))
+            deltas.append(text[pos:pos + size])
+            pos += size
+        assert feed_all(deltas) == reference
+
+
+def test_single_character_deltas_with_small_limits():
+    text = SAMPLES[6] + SAMPLES[7]
+    kwargs = dict(min_chars=2, clause_chars=10, max_chars=30)
+    assert feed_all(list(text), **kwargs) == SentenceSegmenter.segment(text, **kwargs)
+
+
+def test_segments_are_emitted_before_the_reply_ends():
+    segmenter = SentenceSegmenter()
+    assert segmenter.feed("第一句已经说完了。第二句") == ["第一句已经说完了。"]
+    assert segmenter.feed("还没完") == []
+    assert segmenter.flush() == ["第二句还没完"]
+
+
+def test_flush_resets_state():
+    segmenter = SentenceSegmenter()
+    segmenter.feed("```\n代码里的句子。")
+    assert segmenter.flush() == []
+    # 句末标点后面可能还跟着右引号，要等下一个字符才能输出
+    assert segmenter.feed("代码块外的新一轮回复。") == []
+    assert segmenter.feed("接着") == ["代码块外的新一轮回复。"]
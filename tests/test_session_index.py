@@ -0,0 +1,66 @@
+"""ChatSession 的 id 索引和前缀和：随机插入 / 删除 / 截断 / 外部修改后与线性扫描对比"""
+import random
+
+from core.session.session_model import ChatSession, _message_length
+
+
+def linear_index(history, msg_id):
+    for i, msg in enumerate(history):
+        if str(msg.get('info', {}).get('id')) == str(msg_id):
+            return i
+    return None
+
+
+def new_message(rng, serial):
+    role = rng.choice(["user", "assistant", "system", "tool"])
+    # 小 id 空间，保证会出现重复 id
+    return {"role": role, "content": "x" * rng.randint(0, 20), "info": {"id": f"id{rng.randint(0, serial)}"}}
+
+
+def check(session, rng):
+    history = session.history
+    ids = sorted({str(m["info"]["id"]) for m in history} | {"missing"})
+    rng.shuffle(ids)
+    for msg_id in ids:
+        expected = linear_index(history, msg_id)
+        try:
+            assert session.get_msg_index(msg_id) == expected
+        except ValueError:
+            assert expected is None
+    if history:
+        start = rng.randrange(len(history))
+        end = rng.randrange(start, len(history))
+        expected = sum(1 for m in history[start:end + 1] if m["role"] in ("user", "assistant"))
+        assert session.dialog_count(start, end) == expected
+        n = rng.randint(0, len(history))
+        assert session.get_last_n_length(n) == sum(map(_message_length, history[len(history) - n if n else 0:]))
+
+
+def test_random_operations_match_linear_scan():
+    rng = random.Random(3)
+    for _ in range(300):
+        session = ChatSession(history=[{"role": "system", "content": "sys", "info": {"id": "system_prompt"}}])
+        serial = 0
+        for _ in range(60):
+            serial += 1
+            op = rng.random()
+            history = session.history
+            if op < 0.35:
+                session.append_message(new_message(rng, serial))
+            elif op < 0.6:
+                index = rng.randint(0, len(history))
+                session.insert_messages(index, [new_message(rng, serial) for _ in range(rng.randint(1, 3))])
+            elif op < 0.7 and len(history) > 1:
+                session.pop_message(rng.randrange(len(history)))
+            elif op < 0.78:
+                session.truncate(rng.randint(1, len(history)))
+            elif op < 0.86 and len(history) > 1:
+                # 绕过 ChatSession 直接改 list；先删后插且中间不读索引时长度和尾部对得上，察觉不到，所以改完就查
+                history.insert(rng.randint(0, len(history)), new_message(rng, serial))
+                check(session, rng)
+            elif op < 0.92 and len(history) > 1:
+                history.pop(rng.randrange(len(history)))
+                check(session, rng)
+            else:
+                check(session, rng)
+        check(session, rng)
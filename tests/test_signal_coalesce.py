@@ -0,0 +1,86 @@
+"""SignalCoalescer：间隔内只送每个 key 的最新值，到点发射共用一个线程，flush / cancel 之后不会重复发"""
+import threading
+import time
+
+from common.signal_bus import SignalCoalescer
+from service.chat_completion.signals import RequesterSignals
+
+INTERVAL = 0.02
+
+
+class Sink:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, *args):
+        self.calls.append(args)
+
+    def wait(self, count: int, timeout: float = 2.0):
+        deadline = time.monotonic() + timeout
+        while len(self.calls) < count and time.monotonic() < deadline:
+            time.sleep(0.002)
+        return self.calls
+
+
+def test_first_value_is_immediate_and_rest_keep_latest_per_key():
+    sink = Sink()
+    coalescer = SignalCoalescer(sink, INTERVAL)
+    coalescer.push("a", "1")
+    assert sink.calls == [("a", "1")]
+
+    for i in range(2, 6):
+        coalescer.push("a", str(i))
+        coalescer.push("b", str(i))
+    assert sink.wait(3) == [("a", "1"), ("a", "5"), ("b", "5")]
+
+
+def test_flush_and_cancel_invalidate_the_scheduled_emit():
+    sink = Sink()
+    coalescer = SignalCoalescer(sink, INTERVAL)
+    coalescer.push("a", "1")
+    coalescer.push("a", "2")
+    coalescer.flush()
+    coalescer.push("a", "3")
+    coalescer.cancel()
+    time.sleep(INTERVAL * 4)
+    assert sink.calls == [("a", "1"), ("a", "2")]
+
+
+def test_timed_emits_do_not_start_a_thread_per_interval(monkeypatch):
+    started = []
+    original_start = threading.Thread.start
+
+    def counting_start(thread):
+        started.append(thread.name)
+        return original_start(thread)
+
+    SignalCoalescer(Sink(), INTERVAL).push("warm", "up")
+    monkeypatch.setattr(threading.Thread, "start", counting_start)
+
+    sinks = [Sink() for _ in range(5)]
+    coalescers = [SignalCoalescer(sink, INTERVAL) for sink in sinks]
+    for round_ in range(20):
+        for coalescer in coalescers:
+            coalescer.push("req", str(round_))
+            coalescer.push("req", f"{round_}+")
+        time.sleep(INTERVAL / 2)
+    for sink in sinks:
+        deadline = time.monotonic() + 2
+        while sink.calls[-1] != ("req", "19+") and time.monotonic() < deadline:
+            time.sleep(0.002)
+        assert sink.calls[-1] == ("req", "19+")
+    assert len(started) <= 1
+
+
+def test_final_text_arrives_before_finished():
+    bus = RequesterSignals()
+    order = []
+    bus.connect_coalesced("full_content", lambda rid, text: order.append(("full", text)), 10.0)
+    bus.finished.connect(lambda rid, result: order.append(("finished", result[0])))
+
+    text = ""
+    for word in ("a", "b", "c"):
+        text += word
+        bus.full_content.emit("req", text)
+    bus.finished.emit("req", [text])
+    assert order == [("full", "a"), ("full", "abc"), ("finished", "abc")]
@@ -0,0 +1,105 @@
+"""StreamReplacer：随机规则、随机切块，逐块和 StrTools.vast_replace 的整段结果对比"""
+import random
+import re
+
+import pytest
+
+from utils.str_tools import StrTools
+from utils.stream_replace import StreamReplacer, _HoldAllStage, _PlainStage, _RegexStage
+
+ALPHABET = "aab b\nc。x"
+
+# 有界宽度、不看上下文：走 _RegexStage
+BOUNDED_REGEX = ["a{1,3}b", "[ab]c", "(x|ab)", "a.b", r"(a)(b?)c", "b\n", "c。", "。"]
+# 无界或依赖上下文：退回 _HoldAllStage
+HOLD_REGEX = ["a+b", "^a", r"b$", r"\bab", "(?<=a)b", "a(?=c)", "x*", r"(a)?(?(1)b|c)"]
+REGEX_REPLACEMENTS = ["", "Z", r"\1", "<>", "\n", "aa"]
+
+
+def random_text(rng, n):
+    return "".join(rng.choice(ALPHABET) for _ in range(n))
+
+
+def random_plain_rules(rng):
+    count = rng.randint(1, 4)
+    patterns = [random_text(rng, rng.randint(0, 4)) for _ in range(count)]
+    targets = [random_text(rng, rng.randint(0, 3)) for _ in range(rng.randint(0, count + 1))]
+    # 分号是规则分隔符，不能出现在模式里
+    return ";".join(patterns), ";".join(targets)
+
+
+def random_regex_rules(rng):
+    count = rng.randint(1, 3)
+    pool = BOUNDED_REGEX * 3 + HOLD_REGEX
+    patterns = [rng.choice(pool) for _ in range(count)]
+    targets = []
+    for pattern in patterns:
+        replacement = rng.choice(REGEX_REPLACEMENTS)
+        if replacement == r"\1" and not re.compile(pattern).groups:
+            replacement = "G"
+        targets.append(replacement)
+    return "re:#" + ";".join(patterns), ";".join(targets)
+
+
+def random_chunks(rng, text):
+    chunks = []
+    i = 0
+    while i < len(text):
+        step = rng.choice([1, 1, 2, 3, 5, 17])
+        chunks.append(text[i:i + step])
+        i += step
+    return chunks
+
+
+def check_stream(replace_from, replace_to, chunks):
+    replacer = StreamReplacer(replace_from, replace_to)
+    seen = ""
+    emitted = ""
+    for chunk in chunks:
+        seen += chunk
+        emitted += replacer.feed(chunk)
+        assert replacer.stable == emitted
+        # 假设原文到此结束时的输出就是对已收到部分做全量替换
+        expected = StrTools.vast_replace(seen, replace_from, replace_to)
+        assert replacer.preview() == expected
+        # 已确定的输出不会被撤回
+        assert expected.startswith(emitted)
+    emitted += replacer.flush()
+    assert emitted == StrTools.vast_replace(seen, replace_from, replace_to)
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_plain_rules_match_vast_replace(seed):
+    rng = random.Random(seed)
+    for _ in range(300):
+        replace_from, replace_to = random_plain_rules(rng)
+        check_stream(replace_from, replace_to, random_chunks(rng, random_text(rng, rng.randint(0, 60))))
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_regex_rules_match_vast_replace(seed):
+    rng = random.Random(100 + seed)
+    for _ in range(300):
+        replace_from, replace_to = random_regex_rules(rng)
+        check_stream(replace_from, replace_to, random_chunks(rng, random_text(rng, rng.randint(0, 60))))
+
+
+def test_stage_selection():
+    replacer = StreamReplacer("re:#" + ";".join(BOUNDED_REGEX + HOLD_REGEX), "")
+    kinds = [type(stage) for stage in replacer._stages]
+    assert kinds == [_RegexStage] * len(BOUNDED_REGEX) + [_HoldAllStage] * len(HOLD_REGEX)
+
+    replacer = StreamReplacer(";ab", "x;y")
+    assert [type(stage) for stage in replacer._stages] == [_HoldAllStage, _PlainStage]
+
+
+def test_bounded_rules_release_output_while_streaming():
+    # 只暂存可能成为匹配的尾巴，其余部分随到随出
+    replacer = StreamReplacer("敏感词", "***")
+    assert replacer.feed("这里有个敏感") == "这里有个"
+    assert replacer.feed("词，还有") == "***，还有"
+    assert replacer.flush() == ""
+
+    replacer = StreamReplacer("re:#a{1,3}b", "X")
+    out = "".join(replacer.feed(c) for c in "cccc" * 10)
+    assert len(out) >= 40 - 3
@@ -0,0 +1,45 @@
+"""ToolRegistry：timeout 为 0/None 的工具不限时，call、call_async、call_batch_from_openai 同一个约定"""
+import time
+
+import pytest
+
+pytest.importorskip("jsonschema")
+
+from core.tool_call.tool_core import Tool, ToolRegistry
+
+
+def slow(seconds: float = 0.2):
+    time.sleep(seconds)
+    return "done"
+
+
+@pytest.fixture
+def registry():
+    registry = ToolRegistry()
+    params = {"type": "object", "properties": {"seconds": {"type": "number"}}}
+    registry.register(Tool(name="unlimited", description="", parameters=params, handler=slow, timeout=0))
+    registry.register(Tool(name="unlimited_none", description="", parameters=params, handler=slow, timeout=None))
+    registry.register(Tool(name="limited", description="", parameters=params, handler=slow, timeout=0.05))
+    yield registry
+    registry.shutdown(wait_executor=False)
+
+
+def openai_call(name: str, seconds: float = 0.2) -> dict:
+    return {"function": {"name": name, "arguments": {"seconds": seconds}}}
+
+
+@pytest.mark.parametrize("name", ["unlimited", "unlimited_none"])
+def test_zero_or_none_timeout_means_no_deadline(registry, name):
+    assert registry.call(name, {"seconds": 0.2})["ok"]
+    assert registry.call_async(name, {"seconds": 0.2}).result(timeout=5)["ok"]
+    assert registry.call_batch_from_openai([openai_call(name)])[0]["ok"]
+
+
+def test_batch_mixes_unlimited_and_limited_tools(registry):
+    results = registry.call_batch_from_openai([
+        openai_call("unlimited"),
+        openai_call("limited"),
+        openai_call("unlimited_none"),
+    ])
+    assert [r["ok"] for r in results] == [True, False, True]
+    assert results[1]["error_type"] == "TimeoutError"
@@ -0,0 +1,108 @@
+"""AudioCache / CachedSynthesizer：假合成函数，验证命中缓存时不再合成、回调保序、超时不卡住后面的句子"""
+import asyncio
+import os
+import threading
+
+import pytest
+
+from service.tts.audio_cache import AudioCache, audio_cache_key
+from service.tts.tts_runtime import CachedSynthesizer, TTSLoop
+
+
+class FakeSynth:
+    """记录调用次数；delays 里给了某句的延迟就按延迟返回"""
+
+    def __init__(self, delays=None):
+        self.calls = []
+        self.delays = delays or {}
+        self._lock = threading.Lock()
+
+    async def __call__(self, text, voice, rate, pitch):
+        with self._lock:
+            self.calls.append(text)
+        await asyncio.sleep(self.delays.get(text, 0))
+        return f"{voice}|{text}".encode("utf-8")
+
+
+@pytest.fixture
+def loop():
+    tts_loop = TTSLoop(max_concurrency=3)
+    yield tts_loop
+    tts_loop.stop()
+
+
+def run_batch(synth, texts, voice="v"):
+    """按顺序提交，返回回调序列 [(kind, 值)]"""
+    events = []
+    futures = [
+        synth.request(text, voice, on_ready=lambda p: events.append(("ready", p)),
+                      on_error=lambda e: events.append(("error", e)))
+        for text in texts
+    ]
+    for future in futures:
+        future.result(timeout=5)
+    return events
+
+
+def test_cache_hit_skips_synthesis(tmp_path, loop):
+    fake = FakeSynth()
+    synth = CachedSynthesizer(fake, AudioCache(str(tmp_path)), loop, provider="fake")
+
+    first = run_batch(synth, ["你好。", "今天天气不错。"])
+    second = run_batch(synth, ["你好。", "今天天气不错。"])
+
+    assert fake.calls == ["你好。", "今天天气不错。"]
+    assert (synth.misses, synth.hits) == (2, 2)
+    assert first == second
+    with open(second[0][1], "rb") as f:
+        assert f.read() == "v|你好。".encode("utf-8")
+
+
+def test_cache_key_covers_voice_and_provider(tmp_path, loop):
+    fake = FakeSynth()
+    cache = AudioCache(str(tmp_path))
+    run_batch(CachedSynthesizer(fake, cache, loop, provider="a"), ["同一句。"], voice="v1")
+    run_batch(CachedSynthesizer(fake, cache, loop, provider="a"), ["同一句。"], voice="v2")
+    run_batch(CachedSynthesizer(fake, cache, loop, provider="b"), ["同一句。"], voice="v1")
+    assert len(fake.calls) == 3
+
+
+def test_lookup_disabled_always_synthesizes(tmp_path, loop):
+    fake = FakeSynth()
+    synth = CachedSynthesizer(fake, AudioCache(str(tmp_path)), loop, provider="fake")
+    synth.lookup = False
+    run_batch(synth, ["一句话。"])
+    run_batch(synth, ["一句话。"])
+    assert len(fake.calls) == 2
+
+
+def test_delivery_follows_submission_order(tmp_path, loop):
+    fake = FakeSynth(delays={"慢的第一句。": 0.3})
+    synth = CachedSynthesizer(fake, AudioCache(str(tmp_path)), loop, provider="fake")
+    events = run_batch(synth, ["慢的第一句。", "快的第二句。", "快的第三句。"])
+    texts = [open(path, "rb").read().decode("utf-8").split("|", 1)[1] for _, path in events]
+    assert texts == ["慢的第一句。", "快的第二句。", "快的第三句。"]
+
+
+def test_stalled_sentence_times_out_without_blocking_later_ones(tmp_path, loop):
+    fake = FakeSynth(delays={"卡住的句子。": 60})
+    synth = CachedSynthesizer(fake, AudioCache(str(tmp_path)), loop, provider="fake")
+    synth.timeout = 0.2
+    events = run_batch(synth, ["卡住的句子。", "后面的句子。"])
+    assert [kind for kind, _ in events] == ["error", "ready"]
+    assert "超时" in events[0][1]
+
+
+def test_persisted_entries_survive_restart_and_evict_lru(tmp_path):
+    cache = AudioCache(str(tmp_path), max_bytes=25)
+    keys = [audio_cache_key(f"句子{i}", "v") for i in range(3)]
+    cache.put(keys[0], b"x" * 10)
+    cache.put(keys[1], b"x" * 10)
+    assert cache.get(keys[0]) is not None  # keys[0] 变成最近使用
+    cache.put(keys[2], b"x" * 10)
+
+    assert cache.get(keys[1]) is None
+    reopened = AudioCache(str(tmp_path), max_bytes=25)
+    assert len(reopened) == 2 and reopened.total_bytes == 20
+    assert os.path.exists(reopened.get(keys[0]))
+    assert reopened.get(keys[2]) is not None
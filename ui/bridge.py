@@ -8,7 +8,12 @@ class QtBaseSignalBridge(QObject):
     Qt 信号桥接基类
     只负责提供跨总线连线/断线的通用方法，不包含具体信号。
     """
-    def bus_connect(self, source, exclude=None, include=None):
+    def bus_connect(self, source, exclude=None, include=None, coalesce: float = 0):
+        """
+        把 psygnal 总线 source 的同名信号转发到本对象的 Qt 信号。
+        coalesce 大于 0 时，source 在 _coalesce 里声明的信号按这个间隔（秒）合并后再转发，
+        避免全量文本信号每个词符都往主线程事件队列里塞一次。
+        """
         def to_set(val):
             if val is None: 
                 return set()
@@ -39,7 +44,10 @@ class QtBaseSignalBridge(QObject):
                 
                 if (callable(getattr(source_attr, 'connect', None)) and 
                     callable(getattr(target_attr, 'emit', None))):
-                    source_attr.connect(target_attr.emit)
+                    if coalesce > 0 and name in getattr(source, '_coalesce', {}):
+                        source.connect_coalesced(name, target_attr.emit, coalesce)
+                    else:
+                        source_attr.connect(target_attr.emit)
 
 
     def disconnect_all(self):
@@ -295,8 +295,8 @@ class ChatHistoryEditor(QWidget):
         """System content 变更"""
         if self._syncing:
             return
-        sys_msg = self._get_system_message()
-        sys_msg["content"] = self.sys_content_edit.toPlainText()
+        self._ensure_system_message()
+        self._session.edit_by_index(0, self.sys_content_edit.toPlainText())
         self._update_json_editor_from_history()
 
     def _on_user_name_changed(self, text: str) -> None:
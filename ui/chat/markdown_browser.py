@@ -1,8 +1,10 @@
 import re
 import textwrap
 import uuid
+from collections import OrderedDict
 from dataclasses import dataclass
-from typing import List, Tuple
+from functools import lru_cache
+from typing import List, Optional, Tuple
 
 import markdown
 import html
@@ -47,7 +49,13 @@ class MarkdownRenderer:
     @staticmethod
     def render(raw_text: str, *, options: MarkdownRenderOptions) -> str:
         raw_text = textwrap.dedent(raw_text)
+        html_content = MarkdownRenderer.render_fragment(raw_text, options=options)
+        return MarkdownRenderer.render_math(html_content)
 
+    @staticmethod
+    def render_fragment(raw_text: str, *, options: MarkdownRenderOptions,
+                        md: Optional[markdown.Markdown] = None) -> str:
+        """代码块抽取 + markdown 转换 + 代码高亮，不做缩进和公式处理"""
         nonce = uuid.uuid4().hex
         code_blocks: List[Tuple[str, str]] = []
 
@@ -61,26 +69,25 @@ class MarkdownRenderer:
 
         temp = MarkdownRenderer._FENCE_RE.sub(take_block, raw_text)
 
-        html_content = markdown.markdown(
-            temp,
-            extensions=list(options.markdown_extensions),
-            output_format="html5"
-        )
-
-        formatter = HtmlFormatter(
-            style=options.code_style,
-            noclasses=True,
-            nobackground=True,
-            linenos=False,
-            nowrap=True,
-        )
+        if md is not None:
+            html_content = md.reset().convert(temp)
+        else:
+            html_content = markdown.markdown(
+                temp,
+                extensions=list(options.markdown_extensions),
+                output_format="html5"
+            )
 
         for i, (lang, code) in enumerate(code_blocks):
             token = f"@@CODEBLOCK_{nonce}_{i}@@"
             html_content = html_content.replace(
-                token, MarkdownRenderer._render_code(lang, code, formatter))
+                token, _highlight_code(lang, code, options.code_style))
+
+        return html_content
 
-        html_content = re.sub(
+    @staticmethod
+    def render_math(html_content: str) -> str:
+        return re.sub(
             r"\$\$(.*?)\$\$",
             lambda m: f'<span class="math-formula">'
                       f'{html.escape(m.group(1))}</span>',
@@ -88,8 +95,6 @@ class MarkdownRenderer:
             flags=re.DOTALL
         )
 
-        return html_content
-
     @staticmethod
     def _render_code(lang: str, code: str, formatter: HtmlFormatter) -> str:
         code = code.rstrip("\n")
@@ -109,6 +114,115 @@ class MarkdownRenderer:
                     f'<code>{html.escape(code)}</code></pre>')
 
 
+@lru_cache(maxsize=8)
+def _code_formatter(code_style: str) -> HtmlFormatter:
+    return HtmlFormatter(
+        style=code_style,
+        noclasses=True,
+        nobackground=True,
+        linenos=False,
+        nowrap=True,
+    )
+
+
+@lru_cache(maxsize=256)
+def _highlight_code(lang: str, code: str, code_style: str) -> str:
+    """pygments 高亮结果按 (语言, 代码, 配色) 缓存，流式时前面已写完的代码块不再重复高亮"""
+    return MarkdownRenderer._render_code(lang, code, _code_formatter(code_style))
+
+
+class IncrementalMarkdownRenderer:
+    """
+    流式渲染用：把文本切成顶层块，已经写完的块的 HTML 缓存起来，
+    每次只重新渲染末尾还在增长的块。输出和 MarkdownRenderer.render 一致。
+
+    切块只在代码块之外的空行处进行，并且下一行是列表项、引用、缩进续行时不切
+    （这些会和前一块合并渲染）。出现引用式链接 / 脚注 / 缩写定义、定义列表、
+    HTML 块或 ~~~ 代码块时，结果依赖全文，退回整篇渲染。
+
+    实例不是线程安全的，一个控件一个，在它自己的单线程渲染池里使用。
+    """
+
+    _MERGE_RE = re.compile(r"[ \t]|[*+-][ \t]|\d+[.)][ \t]|>")
+    _GLOBAL_RE = re.compile(r"(?m)^[ ]{0,3}(?:\*?\[[^\]\n]+\]:|<|~~~|:[ \t])")
+
+    def __init__(self, options: MarkdownRenderOptions, max_blocks: int = 256):
+        self.options = options
+        self.max_blocks = max_blocks
+        self._blocks: "OrderedDict[str, str]" = OrderedDict()
+        self._md = markdown.Markdown(
+            extensions=list(options.markdown_extensions),
+            output_format="html5",
+        )
+        self.hits = 0
+        self.misses = 0
+
+    def split_blocks(self, text: str) -> List[str]:
+        """按顶层块切分，最后一块延伸到文本末尾"""
+        if self._GLOBAL_RE.search(text):
+            return [text]
+
+        fences = [m.span() for m in MarkdownRenderer._FENCE_RE.finditer(text)]
+        fence_index = 0
+
+        blocks = []
+        block_start = 0
+        block_end = None  # 当前块最后一个非空行的结尾；None 表示还没遇到空行
+        pos = 0
+        length = len(text)
+        while pos < length:
+            line_end = text.find("\n", pos)
+            if line_end < 0:
+                line_end = length
+
+            while fence_index < len(fences) and fences[fence_index][1] <= pos:
+                fence_index += 1
+            in_fence = fence_index < len(fences) and fences[fence_index][0] <= pos
+
+            if not in_fence and not text[pos:line_end].strip():
+                if block_end is None:
+                    block_end = pos - 1 if pos > 0 else 0
+            elif block_end is not None:
+                # 空行之后的第一个非空行：决定是否开始新块
+                if not self._MERGE_RE.match(text, pos):
+                    if block_end > block_start:
+                        blocks.append(text[block_start:block_end])
+                    block_start = pos
+                block_end = None
+            pos = line_end + 1
+
+        blocks.append(text[block_start:])
+        return blocks
+
+    def _render_block(self, block: str) -> str:
+        return MarkdownRenderer.render_fragment(block, options=self.options, md=self._md)
+
+    def render(self, raw_text: str) -> str:
+        raw_text = textwrap.dedent(raw_text)
+        blocks = self.split_blocks(raw_text)
+
+        parts = []
+        for block in blocks[:-1]:
+            block_html = self._blocks.get(block)
+            if block_html is None:
+                self.misses += 1
+                block_html = self._blocks[block] = self._render_block(block)
+                if len(self._blocks) > self.max_blocks:
+                    self._blocks.popitem(last=False)
+            else:
+                self.hits += 1
+                self._blocks.move_to_end(block)
+            if block_html:
+                parts.append(block_html)
+
+        # 末尾的块还在增长，不进缓存
+        tail_html = self._render_block(blocks[-1])
+        if tail_html:
+            parts.append(tail_html)
+
+        return MarkdownRenderer.render_math("\n".join(parts))
+
+
 # ----------------------------
 # 异步任务（QThreadPool）
 # ----------------------------
@@ -119,16 +233,15 @@ class _RenderSignals(QObject):
 
 class _MarkdownRenderTask(QRunnable):
     def __init__(self, raw_text: str, request_id: int,
-                 options: MarkdownRenderOptions):
+                 renderer: IncrementalMarkdownRenderer):
         super().__init__()
         self.raw_text = raw_text
         self.request_id = request_id
-        self.options = options
+        self.renderer = renderer
         self.signals = _RenderSignals()
 
     def run(self) -> None:
-        html_result = MarkdownRenderer.render(
-            self.raw_text, options=self.options)
+        html_result = self.renderer.render(self.raw_text)
         self.signals.finished.emit(html_result, self.request_id)
 
 
@@ -143,6 +256,8 @@ class ChatapiTextBrowser(QTextBrowser):
     def __init__(self, parent=None):
         super().__init__(parent)
         self._options = MarkdownRenderOptions(code_style="vs")
+        # 渲染池只有一个线程，增量渲染器的块缓存不需要加锁
+        self._renderer = IncrementalMarkdownRenderer(self._options)
         self._pool = QThreadPool(self)
         self._pool.setMaxThreadCount(1)
         self._current_request_id = 0
@@ -187,7 +302,7 @@ class ChatapiTextBrowser(QTextBrowser):
     def _dispatch_render(self) -> None:
         self.renderStarted.emit()
         task = _MarkdownRenderTask(
-            self._pending_text, self._pending_request_id, self._options)
+            self._pending_text, self._pending_request_id, self._renderer)
         task.signals.finished.connect(
             self.handle_processed_html, Qt.ConnectionType.QueuedConnection)
         self._pool.start(task)
@@ -664,7 +664,8 @@ class MainWindow(MainWindow):
     def connect_bus_signals(self):
         self.BESB
         b=self.BESB
-        b.bus_connect(self.core.signals)
+        # 全量文本信号 50ms 合并一次，最终全文在 finished / failed 之前补发
+        b.bus_connect(self.core.signals, coalesce=0.05)
         b.full_content.connect(self.update_ai_response_text)
         b.full_reasoning.connect(self.update_think_response_text)
         b.full_tool_call.connect(self.update_tool_response_text)
@@ -94,14 +94,20 @@ class LongChatSettingsWidget(QWidget):
         self.rb_mix.setToolTip("增量 + 定期全局整合")
         self.rb_mix.setProperty("mode_id", "mix")
 
+        self.rb_mapreduce = QRadioButton("分块并行 (MapReduce)")
+        self.rb_mapreduce.setToolTip("整段历史分块并行摘要再合并，未改动的块走缓存")
+        self.rb_mapreduce.setProperty("mode_id", "mapreduce")
+
         self.bg_mode = QButtonGroup(self)
         self.bg_mode.addButton(self.rb_single)
         self.bg_mode.addButton(self.rb_dispersed)
         self.bg_mode.addButton(self.rb_mix)
+        self.bg_mode.addButton(self.rb_mapreduce)
 
         mode_layout.addWidget(self.rb_single)
         mode_layout.addWidget(self.rb_dispersed)
         mode_layout.addWidget(self.rb_mix)
+        mode_layout.addWidget(self.rb_mapreduce)
 
         left_layout.addWidget(mode_group)
 
@@ -198,9 +204,22 @@ class LongChatSettingsWidget(QWidget):
 
         p_mix_layout.addWidget(QLabel("<i>* 注: Mix模式的增量阶段复用Dispersed模板</i>"))
 
+        # Stack 3: MapReduce Templates
+        self.page_mapreduce = QWidget()
+        p_mr_layout = QVBoxLayout(self.page_mapreduce)
+        p_mr_layout.addWidget(QLabel("<b>MapReduce模式: 分块摘要模板</b>"))
+        p_mr_layout.addWidget(QLabel("<span style='color:gray'>可用变量: {hint_text}, {new_content}</span>"))
+        self.mapreduce_map_prompt_edit = self._create_code_edit()
+        p_mr_layout.addWidget(self.mapreduce_map_prompt_edit)
+        p_mr_layout.addWidget(QLabel("<b>MapReduce模式: 合并模板</b>"))
+        p_mr_layout.addWidget(QLabel("<span style='color:gray'>可用变量: {hint_text}, {chunk_summaries}</span>"))
+        self.mapreduce_reduce_prompt_edit = self._create_code_edit()
+        p_mr_layout.addWidget(self.mapreduce_reduce_prompt_edit)
+
         self.template_stack.addWidget(self.page_single)
         self.template_stack.addWidget(self.page_dispersed)
         self.template_stack.addWidget(self.page_mix)
+        self.template_stack.addWidget(self.page_mapreduce)
 
         self.right_tabs.addTab(self.template_stack, "当前模式总结模板")
 
@@ -285,6 +304,7 @@ class LongChatSettingsWidget(QWidget):
         if lci.mode == 'single': self.rb_single.setChecked(True)
         elif lci.mode == 'dispersed': self.rb_dispersed.setChecked(True)
         elif lci.mode == 'mix': self.rb_mix.setChecked(True)
+        elif lci.mode == 'mapreduce': self.rb_mapreduce.setChecked(True)
         self._update_template_stack(lci.mode)
 
         # 5. 触发器
@@ -305,6 +325,8 @@ class LongChatSettingsWidget(QWidget):
         self.summary_merge_prompt_and_edit.setText(lci.preset.summary_merge_prompt_and)
         self.dispersed_summary_prompt_edit.setText(lci.preset.dispersed_summary_prompt)
         self.mix_consolidation_prompt_edit.setText(lci.preset.mix_consolidation_prompt)
+        self.mapreduce_map_prompt_edit.setText(lci.preset.mapreduce_map_prompt)
+        self.mapreduce_reduce_prompt_edit.setText(lci.preset.mapreduce_reduce_prompt)
         self.summary_prompt_edit.setText(lci.preset.summary_prompt)
 
     def _toggle_view(self, enabled: bool) -> None:
@@ -389,11 +411,13 @@ class LongChatSettingsWidget(QWidget):
         self._bind_text(self.summary_merge_prompt_and_edit, lambda v: setattr(preset, 'summary_merge_prompt_and', v))
         self._bind_text(self.dispersed_summary_prompt_edit, lambda v: setattr(preset, 'dispersed_summary_prompt', v))
         self._bind_text(self.mix_consolidation_prompt_edit, lambda v: setattr(preset, 'mix_consolidation_prompt', v))
+        self._bind_text(self.mapreduce_map_prompt_edit, lambda v: setattr(preset, 'mapreduce_map_prompt', v))
+        self._bind_text(self.mapreduce_reduce_prompt_edit, lambda v: setattr(preset, 'mapreduce_reduce_prompt', v))
         self._bind_text(self.summary_prompt_edit, lambda v: setattr(preset, 'summary_prompt', v))
 
     def _update_template_stack(self, mode: str) -> None:
         """根据模式切换右侧 Stack 的页面"""
-        idx_map = {"single": 0, "dispersed": 1, "mix": 2}
+        idx_map = {"single": 0, "dispersed": 1, "mix": 2, "mapreduce": 3}
         if mode in idx_map:
             self.template_stack.setCurrentIndex(idx_map[mode])
 
@@ -11,6 +11,8 @@ from PyQt6.QtCore import (
 from PyQt6.QtGui import QStandardItem,QStandardItemModel
 
 from config.settings import LLMUsagePack,ApiConfig,ModelPollSettings
+from config import APP_RUNTIME
+from utils.latency_tracker import get_latency_tracker, pick_model
 
 #随机分发模型请求
 class Ui_random_model_selecter(object):
@@ -40,6 +42,12 @@ class Ui_random_model_selecter(object):
         self.random_radio.setSizePolicy(sizePolicy)
         self.random_radio.setObjectName("random_radio")
         self.gridLayout_4.addWidget(self.random_radio, 1, 0, 1, 1)
+        self.latency_radio = QRadioButton(self.groupBox)
+        self.latency_radio.setObjectName("latency_radio")
+        self.gridLayout_4.addWidget(self.latency_radio, 2, 0, 1, 1)
+        self.weighted_radio = QRadioButton(self.groupBox)
+        self.weighted_radio.setObjectName("weighted_radio")
+        self.gridLayout_4.addWidget(self.weighted_radio, 3, 0, 1, 1)
         self.gridLayout_5.addWidget(self.groupBox, 1, 0, 1, 1)
         self.groupBox_add_model = QGroupBox(random_model_selecter)
         sizePolicy = QSizePolicy(QSizePolicy.Policy.Preferred, QSizePolicy.Policy.Fixed)
@@ -109,6 +117,10 @@ class Ui_random_model_selecter(object):
         self.groupBox.setTitle(_translate("random_model_selecter", "使用模型"))
         self.order_radio.setText(_translate("random_model_selecter", "顺序输出"))
         self.random_radio.setText(_translate("random_model_selecter", "随机选择"))
+        self.latency_radio.setText(_translate("random_model_selecter", "最快优先"))
+        self.latency_radio.setToolTip(_translate("random_model_selecter", "按历史首字延迟和失败率选最快的可用模型，连续失败的模型会暂时熔断"))
+        self.weighted_radio.setText(_translate("random_model_selecter", "按速度加权随机"))
+        self.weighted_radio.setToolTip(_translate("random_model_selecter", "越快越稳定的模型被选中的概率越高，慢的模型偶尔也会被重新测速"))
         self.groupBox_add_model.setTitle(_translate("random_model_selecter", "添加模型"))
         self.groupBox_model_config.setTitle(_translate("random_model_selecter", ""))
         self.model_name_label.setText(_translate("random_model_selecter", "名称"))
@@ -166,6 +178,8 @@ class RandomModelSelecter(QWidget):
         # 2. 模式切换 (顺序/随机) 绑定到配置对象
         self.ui.order_radio.toggled.connect(self._on_mode_changed)
         self.ui.random_radio.toggled.connect(self._on_mode_changed)
+        self.ui.latency_radio.toggled.connect(self._on_mode_changed)
+        self.ui.weighted_radio.toggled.connect(self._on_mode_changed)
 
     def _on_mode_changed(self):
         """
@@ -173,6 +187,10 @@ class RandomModelSelecter(QWidget):
         """
         if self.ui.order_radio.isChecked():
             self.poll_settings.mode = 'order'
+        elif self.ui.latency_radio.isChecked():
+            self.poll_settings.mode = 'latency'
+        elif self.ui.weighted_radio.isChecked():
+            self.poll_settings.mode = 'weighted'
         else:
             self.poll_settings.mode = 'random'
 
@@ -210,6 +228,10 @@ class RandomModelSelecter(QWidget):
         # 根据 poll_settings.mode 设置 UI 状态
         if self.poll_settings.mode == 'order':
             self.ui.order_radio.setChecked(True)
+        elif self.poll_settings.mode == 'latency':
+            self.ui.latency_radio.setChecked(True)
+        elif self.poll_settings.mode == 'weighted':
+            self.ui.weighted_radio.setChecked(True)
         else:
             # 默认为 random 或其他情况
             self.ui.random_radio.setChecked(True)
@@ -281,6 +303,10 @@ class RandomModelSelecter(QWidget):
             self.last_check += 1
             selected_pack = models[self.last_check % len(models)]
             log_prefix = "顺序"
+        elif mode in ('latency', 'weighted'):
+            # 统计由 RequestFlowManager 在每次请求结束时写入
+            selected_pack = pick_model(models, mode, get_latency_tracker(APP_RUNTIME.paths.latency_stats_path))
+            log_prefix = "最快" if mode == 'latency' else "加权"
         else:
             # mode == 'random'
             selected_pack = random.choice(models)
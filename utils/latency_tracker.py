@@ -0,0 +1,268 @@
+"""
+LatencyTracker - 按 (供应商, 模型) 持久化的延迟与错误率统计，给模型轮询 / 聚合做路由。
+
+StatusAnalyzer 每轮都量了首字延迟（TTFT）和输出速率，以前用完就丢；现在每次请求结束时记一笔：
+
+    EndpointStats
+        ├─ ttft_ms / tps      指数滑动平均，新样本权重 EWMA_ALPHA
+        ├─ error_rate         失败记 1、成功记 0 的滑动平均
+        ├─ 熔断               连续失败 FAILURE_THRESHOLD 次后冷却一段时间，每次再失败冷却翻倍
+        └─ 衰减               越久没更新越不可信，按半衰期向先验（其他端点的中位数）回归
+
+选择策略：
+    latency   期望代价（TTFT × 错误惩罚）最低的；从没请求过的端点先各试一次
+    weighted  按 1/代价² 加权随机，慢的端点偶尔也会被选中，统计不会一直停在旧值
+
+统计存成 json，由 get_latency_tracker(path) 取全局实例。
+"""
+import json
+import os
+import random
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+ROUTING_STRATEGIES = ("latency", "weighted")
+"""需要延迟统计的策略，其余（order / random）不看统计"""
+
+
+@dataclass
+class EndpointStats:
+    """单个 (供应商, 模型) 的统计"""
+    ttft_ms: float = 0.0
+    tps: float = 0.0
+    error_rate: float = 0.0
+    samples: int = 0
+    """成功样本数"""
+    failures: int = 0
+    """连续失败次数，成功一次清零"""
+    cooldown: float = 0.0
+    """当前熔断时长（秒）"""
+    open_until: float = 0.0
+    """熔断到期的时间戳，0 表示没有熔断"""
+    updated_at: float = 0.0
+
+
+class LatencyTracker:
+    """线程安全；一个统计文件一个实例，见 get_latency_tracker"""
+
+    EWMA_ALPHA = 0.3
+    """新样本在滑动平均里的权重"""
+
+    HALF_LIFE = 6 * 3600
+    """统计的半衰期（秒），过了这么久可信度减半"""
+
+    DEFAULT_TTFT_MS = 2000.0
+    """没有任何统计时的先验首字延迟"""
+
+    ERROR_PENALTY = 4.0
+    """错误率对代价的放大系数：代价 = TTFT × (1 + ERROR_PENALTY × 错误率)"""
+
+    FAILURE_THRESHOLD = 3
+    """连续失败几次后熔断"""
+
+    BASE_COOLDOWN = 60.0
+    MAX_COOLDOWN = 30 * 60.0
+
+    SAVE_INTERVAL = 30.0
+    """两次写盘的最短间隔（秒）"""
+
+    def __init__(self, path: str = ""):
+        self.path = path
+        self._lock = threading.Lock()
+        self._stats: Dict[str, EndpointStats] = {}
+        self._last_save = 0.0
+        self._dirty = False
+        self._load()
+
+    @staticmethod
+    def key(provider: str, model: str) -> str:
+        return f"{provider}/{model}"
+
+    # ==================== 记录 ====================
+
+    def record_success(self, provider: str, model: str, status: dict, now: Optional[float] = None):
+        """
+        记一次成功的请求。
+
+        Args:
+            status: StatusAnalyzer 的统计包，用到 ttft_ms 和 tps
+        """
+        now = time.time() if now is None else now
+        ttft = float(status.get("ttft_ms") or 0)
+        tps = float(status.get("tps") or 0)
+        with self._lock:
+            stats = self._stats.setdefault(self.key(provider, model), EndpointStats())
+            if stats.samples == 0:
+                stats.ttft_ms, stats.tps = ttft, tps
+            else:
+                # 旧值按时间先衰减再混合，很久没用的端点一次新样本就能把它拉回现实
+                alpha = max(self.EWMA_ALPHA, 1.0 - self._confidence(stats, now))
+                stats.ttft_ms += alpha * (ttft - stats.ttft_ms)
+                stats.tps += alpha * (tps - stats.tps)
+            stats.error_rate *= 1.0 - self.EWMA_ALPHA
+            stats.samples += 1
+            stats.failures = 0
+            stats.cooldown = 0.0
+            stats.open_until = 0.0
+            stats.updated_at = now
+            self._dirty = True
+        self._maybe_save(now)
+
+    def record_failure(self, provider: str, model: str, now: Optional[float] = None):
+        """记一次失败（网络错误、服务端报错），连续失败够次数就熔断"""
+        now = time.time() if now is None else now
+        with self._lock:
+            stats = self._stats.setdefault(self.key(provider, model), EndpointStats())
+            stats.error_rate += self.EWMA_ALPHA * (1.0 - stats.error_rate)
+            stats.failures += 1
+            if stats.failures >= self.FAILURE_THRESHOLD:
+                stats.cooldown = min(self.MAX_COOLDOWN, stats.cooldown * 2 or self.BASE_COOLDOWN)
+                stats.open_until = now + stats.cooldown
+            stats.updated_at = now
+            self._dirty = True
+        self._maybe_save(now)
+
+    # ==================== 查询 ====================
+
+    def _confidence(self, stats: EndpointStats, now: float) -> float:
+        if not stats.updated_at:
+            return 0.0
+        return 0.5 ** (max(0.0, now - stats.updated_at) / self.HALF_LIFE)
+
+    def _prior_ttft(self, now: float) -> float:
+        """先验：还算新鲜的端点 TTFT 的中位数"""
+        values = sorted(
+            s.ttft_ms for s in self._stats.values()
+            if s.samples and self._confidence(s, now) >= 0.5
+        )
+        if not values:
+            return self.DEFAULT_TTFT_MS
+        return values[len(values) // 2]
+
+    def snapshot(self, provider: str, model: str) -> Optional[EndpointStats]:
+        with self._lock:
+            stats = self._stats.get(self.key(provider, model))
+            return EndpointStats(**asdict(stats)) if stats else None
+
+    def is_open(self, provider: str, model: str, now: Optional[float] = None) -> bool:
+        """是否处于熔断中"""
+        now = time.time() if now is None else now
+        with self._lock:
+            stats = self._stats.get(self.key(provider, model))
+            return bool(stats and stats.open_until > now)
+
+    def expected_cost(self, provider: str, model: str, now: Optional[float] = None) -> float:
+        """按衰减后的统计估计的代价（毫秒）；没统计时返回先验"""
+        now = time.time() if now is None else now
+        with self._lock:
+            return self._cost(self._stats.get(self.key(provider, model)), now, self._prior_ttft(now))
+
+    def _cost(self, stats: Optional[EndpointStats], now: float, prior: float) -> float:
+        if stats is None or not stats.samples:
+            ttft, error_rate = prior, (stats.error_rate if stats else 0.0)
+        else:
+            confidence = self._confidence(stats, now)
+            ttft = confidence * stats.ttft_ms + (1.0 - confidence) * prior
+            error_rate = confidence * stats.error_rate
+        return max(ttft, 1.0) * (1.0 + self.ERROR_PENALTY * error_rate)
+
+    # ==================== 选择 ====================
+
+    def choose(self, candidates: Sequence[Tuple[str, str]], strategy: str = "latency",
+               now: Optional[float] = None, rng: Optional[random.Random] = None) -> int:
+        """
+        从 (供应商, 模型) 列表里选一个，返回下标。
+
+        熔断中的端点不参与；全部熔断时选最早恢复的那个。
+        """
+        if not candidates:
+            raise ValueError("no candidates")
+        now = time.time() if now is None else now
+        rng = rng or random
+
+        with self._lock:
+            prior = self._prior_ttft(now)
+            entries = [self._stats.get(self.key(p, m)) for p, m in candidates]
+
+            healthy = [i for i, s in enumerate(entries) if not (s and s.open_until > now)]
+            if not healthy:
+                return min(range(len(entries)), key=lambda i: entries[i].open_until)
+
+            untried = [i for i in healthy if entries[i] is None]
+            if untried and strategy == "latency":
+                return untried[0]
+
+            costs = {i: self._cost(entries[i], now, prior) for i in healthy}
+
+        if strategy == "weighted":
+            weights = [1.0 / costs[i] ** 2 for i in healthy]
+            return rng.choices(healthy, weights=weights, k=1)[0]
+        return min(healthy, key=lambda i: costs[i])
+
+    # ==================== 持久化 ====================
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                raw = json.load(f).get("endpoints", {})
+            fields = set(EndpointStats.__dataclass_fields__)
+            self._stats = {
+                key: EndpointStats(**{k: v for k, v in value.items() if k in fields})
+                for key, value in raw.items()
+            }
+        except (OSError, ValueError, AttributeError, TypeError):
+            self._stats = {}
+
+    def _maybe_save(self, now: float):
+        if self.path and now - self._last_save >= self.SAVE_INTERVAL:
+            self.save()
+
+    def save(self):
+        """立即写盘"""
+        if not self.path:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            data = {"endpoints": {key: asdict(stats) for key, stats in self._stats.items()}}
+            self._dirty = False
+            self._last_save = time.time()
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = f"{self.path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            self._dirty = True
+
+
+_TRACKER: Optional[LatencyTracker] = None
+_TRACKER_LOCK = threading.Lock()
+
+
+def get_latency_tracker(path: str = "") -> LatencyTracker:
+    """全局延迟统计；传入的路径和当前不同时换一个新实例，留空沿用当前的"""
+    global _TRACKER
+    with _TRACKER_LOCK:
+        if _TRACKER is None or (path and os.path.abspath(path) != os.path.abspath(_TRACKER.path or "")):
+            if _TRACKER is not None:
+                _TRACKER.save()
+            _TRACKER = LatencyTracker(path)
+        return _TRACKER
+
+
+def pick_model(models: List, strategy: str, tracker: Optional[LatencyTracker] = None):
+    """
+    按 latency / weighted 策略从 LLMUsagePack 列表里选一个。
+    其他策略不归这里管，返回 None。
+    """
+    if strategy not in ROUTING_STRATEGIES or not models:
+        return None
+    tracker = tracker or get_latency_tracker()
+    index = tracker.choose([(pack.provider, pack.model) for pack in models], strategy)
+    return models[index]
@@ -0,0 +1,219 @@
+"""
+SentenceSegmenter - 流式分句，给 TTS 用。
+
+以前 TTS 每收到一次 full_content 就把整段回复重新清洗、从头找句子，
+工作量和首段音频的等待都随回复长度增长；现在只吃增量：
+
+    feed(delta)   处理新文本，返回已经完整的句子 / 分句，每段只返回一次
+    flush()       回复结束，剩下的不完整尾巴也吐出来
+
+缓冲区只留当下无法判断的一小段尾巴（可能是代码围栏的开头、句号后面是不是数字、
+链接地址还没结束等），所以增量怎么切分，得到的结果都和一次性 segment(text) 逐段相同。
+
+清洗规则：
+    ``` / ~~~ 代码块整块跳过；强调、标题、引用、列表、表格、行内代码等 markdown 符号去掉
+    [文字](链接) 只读文字
+    换行视作句子边界，连续空白压成一个空格
+"""
+from typing import List
+
+SENTENCE_END = frozenset("。！？!?…")
+"""句末标点；英文句号另有判断，见 _is_period"""
+
+CLAUSE_END = frozenset("，,；;：:、")
+"""分句标点，句子够长时也在这里切开"""
+
+CLOSERS = frozenset("”’」』）)】》")
+"""紧跟句末标点、归到前一句的右引号 / 括号"""
+
+MARKDOWN_SYMBOLS = frozenset("*#>`|_~[]")
+
+FENCES = ("```", "~~~")
+
+
+class SentenceSegmenter:
+    """非线程安全，一轮回复一个状态，新一轮前调用 reset"""
+
+    def __init__(self, min_chars: int = 6, clause_chars: int = 40, max_chars: int = 120,
+                 max_link: int = 256):
+        """
+        Args:
+            min_chars: 短于这个长度的句子不单独输出，并进下一句
+            clause_chars: 当前句子达到这个长度后，逗号、分号等分句标点也切开
+            max_chars: 一直没有标点时，达到这个长度后在下一个空白处切开
+            max_link: 链接地址最长等多少字符，超出按普通文本处理
+        """
+        self.min_chars = min_chars
+        self.clause_chars = clause_chars
+        self.max_chars = max_chars
+        self.max_link = max_link
+        self.reset()
+
+    def reset(self):
+        self._buf = ""
+        """还没处理的原始文本"""
+        self._current: List[str] = []
+        """当前句子已清洗的字符"""
+        self._line_start = True
+        self._fence = ""
+        """所在代码块的围栏，空字符串表示不在代码块里"""
+
+    def feed(self, delta: str) -> List[str]:
+        """送入增量，返回新完成的句子"""
+        if not delta:
+            return []
+        self._buf += delta
+        return self._consume(final=False)
+
+    def flush(self) -> List[str]:
+        """回复结束：处理完缓冲区并输出最后一句，然后重置"""
+        segments = self._consume(final=True)
+        self.reset()
+        return segments
+
+    @classmethod
+    def segment(cls, text: str, **kwargs) -> List[str]:
+        """一次性分句"""
+        segmenter = cls(**kwargs)
+        return segmenter.feed(text) + segmenter.flush()
+
+    # ==================== 内部 ====================
+
+    def _end(self, out: List[str], final: bool = False):
+        """当前句子到此为止；太短的留着并进下一句"""
+        text = "".join(self._current).strip()
+        if not any(ch.isalnum() for ch in text):
+            self._current = []
+            return
+        if len(text) < self.min_chars and not final:
+            if self._current[-1] != " ":
+                self._current.append(" ")
+            return
+        out.append(text)
+        self._current = []
+
+    @staticmethod
+    def _is_period(nxt: str) -> bool:
+        """英文句号后面是空白、结尾或标点时才算句末，3.14、file.py 不切"""
+        return not nxt or nxt.isspace() or nxt == "." or nxt in CLOSERS or nxt in SENTENCE_END
+
+    def _consume(self, final: bool) -> List[str]:
+        buf = self._buf
+        n = len(buf)
+        pos = 0
+        out: List[str] = []
+        current = self._current
+
+        while pos < n:
+            if self._line_start:
+                # 行首：先判断是不是代码围栏
+                head = buf[pos:pos + 3]
+                if not final and len(head) < 3 and any(f.startswith(head) for f in FENCES):
+                    break
+                marker = head if head in FENCES else ""
+                if marker and (not self._fence or marker == self._fence):
+                    newline = buf.find("\n", pos)
+                    if newline == -1 and not final:
+                        break
+                    if not self._fence:
+                        self._end(out)
+                        current = self._current
+                    self._fence = "" if self._fence else marker
+                    pos = n if newline == -1 else newline + 1
+                    continue
+                if self._fence:
+                    newline = buf.find("\n", pos)
+                    if newline == -1:
+                        self._line_start = False
+                        pos = n
+                    else:
+                        pos = newline + 1
+                    continue
+                self._line_start = False
+            elif self._fence:
+                # 代码块里半行之后的部分
+                newline = buf.find("\n", pos)
+                if newline == -1:
+                    pos = n
+                else:
+                    self._line_start = True
+                    pos = newline + 1
+                continue
+
+            c = buf[pos]
+
+            if c == "\n":
+                self._end(out)
+                current = self._current
+                self._line_start = True
+                pos += 1
+                continue
+
+            if c.isspace():
+                if current and len(current) >= self.max_chars:
+                    self._end(out)
+                    current = self._current
+                elif current and current[-1] != " ":
+                    current.append(" ")
+                pos += 1
+                continue
+
+            if c == "]":
+                if pos + 1 >= n and not final:
+                    break
+                if buf.startswith("(", pos + 1):
+                    limit = pos + self.max_link
+                    close = buf.find(")", pos + 2, limit)
+                    newline = buf.find("\n", pos + 2, limit)
+                    if close != -1 and (newline == -1 or close < newline):
+                        pos = close + 1
+                        continue
+                    if newline == -1 and n < limit and not final:
+                        break
+                pos += 1
+                continue
+
+            if c in MARKDOWN_SYMBOLS:
+                pos += 1
+                continue
+
+            if c == "-":
+                # 列表符号、分隔线、表格线；连字符 a-b 保留
+                if pos + 1 >= n and not final:
+                    break
+                nxt = buf[pos + 1:pos + 2]
+                if not nxt or nxt.isspace() or nxt == "-" or nxt in MARKDOWN_SYMBOLS:
+                    pos += 1
+                    continue
+
+            if c == ".":
+                if pos + 1 >= n and not final:
+                    break
+                if not self._is_period(buf[pos + 1:pos + 2]):
+                    current.append(c)
+                    pos += 1
+                    continue
+
+            if c == "." or c in SENTENCE_END:
+                # 连续的句末标点和右引号一起归到这一句
+                end = pos + 1
+                while end < n and (buf[end] in SENTENCE_END or buf[end] == "." or buf[end] in CLOSERS):
+                    end += 1
+                if end == n and not final:
+                    break
+                current.extend(buf[pos:end])
+                pos = end
+                self._end(out)
+                current = self._current
+                continue
+
+            current.append(c)
+            pos += 1
+            if c in CLAUSE_END and len(current) >= self.clause_chars:
+                self._end(out)
+                current = self._current
+
+        self._buf = buf[pos:]
+        if final:
+            self._end(out, final=True)
+        return out
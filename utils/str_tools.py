@@ -1,6 +1,90 @@
 import re
+from functools import lru_cache
+from typing import List, Tuple
 
 MEDIA_TYPES = {'image_url', 'image', 'input_audio', 'audio', 'video'}
+
+
+def _overlaps(a: str, b: str) -> bool:
+    """a 和 b 放在同一段文本里时可能共用字符：互相包含，或者一个的后缀是另一个的前缀"""
+    if a in b or b in a:
+        return True
+    for k in range(1, min(len(a), len(b))):
+        if a.endswith(b[:k]) or b.endswith(a[:k]):
+            return True
+    return False
+
+
+class ReplaceRuleSet:
+    """
+    vast_replace 规则的编译结果：分号拆分、目标补齐、正则预编译只做一次。
+    由 StrTools.compile_replace_rules 按 (replace_from, replace_to) 缓存，
+    AutoReplaceSettings 改动后键随之变化，旧条目自然淘汰。
+    """
+    __slots__ = ('is_regex', 'rules', 'patterns', 'single_pass')
+
+    SINGLE_PASS_MIN_RULES = 32
+    """普通字符串规则达到这个条数且互不影响时，合成一条交替式正则一次替换完"""
+
+    def __init__(self, replace_from: str, replace_to: str):
+        self.is_regex = replace_from.startswith('re:#')
+        if self.is_regex:
+            replace_from = replace_from[4:]
+
+        from_list = replace_from.split(';')
+        to_list = replace_to.split(';')
+        to_list = to_list[:len(from_list)] + [''] * (len(from_list) - len(to_list))
+
+        # 空对空是无操作（常见于结尾多写的分号）
+        self.rules: List[Tuple[str, str]] = [
+            (pattern, replacement) for pattern, replacement in zip(from_list, to_list)
+            if pattern or replacement
+        ]
+        # 正则编译失败时直接抛 re.error，和以前每次调用 re.sub 的行为一致
+        self.patterns: List[re.Pattern] = (
+            [re.compile(pattern) for pattern, _ in self.rules] if self.is_regex else []
+        )
+
+        self.single_pass = None
+        if not self.is_regex and len(self.rules) >= self.SINGLE_PASS_MIN_RULES and self._independent(self.rules):
+            table = dict(self.rules)
+            self.single_pass = (re.compile('|'.join(map(re.escape, table))), table)
+
+    @staticmethod
+    def _independent(rules: List[Tuple[str, str]]) -> bool:
+        """
+        顺序逐条替换和一次交替式替换结果相同的充分条件：
+        - 模式两两不重叠，原文里的匹配互不抢字符，同一位置也只可能有一个模式命中
+        - 前面规则的替换结果不会和后面的模式重叠，替换出来的文本不会被后面的规则再命中；
+          替换为空会让两侧文本拼接，后面有长度大于 1 的模式就不安全
+        """
+        for i, (pattern, replacement) in enumerate(rules):
+            if not pattern:
+                return False
+            for later, _ in rules[i + 1:]:
+                if _overlaps(pattern, later):
+                    return False
+                if replacement:
+                    if _overlaps(replacement, later):
+                        return False
+                elif len(later) > 1:
+                    return False
+        return True
+
+    def apply(self, text: str) -> str:
+        if self.is_regex:
+            for compiled, (_, replacement) in zip(self.patterns, self.rules):
+                text = compiled.sub(replacement, text)
+        elif self.single_pass is not None:
+            compiled, table = self.single_pass
+            text = compiled.sub(lambda m: table[m.group()], text)
+        else:
+            # 规则之间可能互相影响（前一条的输出被后一条命中），只能顺序替换；
+            # 规则少时逐条 str.replace 比交替式正则快
+            for pattern, replacement in self.rules:
+                text = text.replace(pattern, replacement)
+        return text
+
 #字符串处理工具
 class StrTools:
     def _for_replace(text, replace_from, replace_to):
@@ -46,6 +130,11 @@ class StrTools:
         return text
 
 
+    @staticmethod
+    @lru_cache(maxsize=64)
+    def compile_replace_rules(replace_from: str, replace_to: str) -> ReplaceRuleSet:
+        return ReplaceRuleSet(replace_from, replace_to)
+
     @staticmethod
     def vast_replace(text, replace_from, replace_to) -> str:
         """
@@ -56,14 +145,7 @@ class StrTools:
 
         - 返回: 替换后的字符串
         """
-        if replace_from.startswith('re:#'):
-            # 如果以 're:#' 开头，则使用正则表达式替换
-            text = StrTools._re_replace(text, replace_from[4:], replace_to)
-        else:
-            # 否则使用普通字符串替换
-            text = StrTools._for_replace(text, replace_from, replace_to)
-        
-        return text
+        return StrTools.compile_replace_rules(replace_from, replace_to).apply(text)
     
     @staticmethod
     def special_block_handler(obj,content,                      #incoming content
@@ -0,0 +1,196 @@
+import re
+
+from utils.str_tools import StrTools
+
+try:
+    from re import _parser as sre_parse, _constants as sre_constants
+except ImportError:  # Python < 3.11
+    import sre_parse
+    import sre_constants
+
+
+class _HoldAllStage:
+    """无法判断何时稳定的规则：全部暂存，只在 flush 时整段替换（等价于旧的全量做法）"""
+
+    def __init__(self, pattern: str, replacement: str, compiled: "re.Pattern" = None):
+        self.pattern = pattern
+        self.replacement = replacement
+        self.compiled = compiled
+        self.buf = ''
+
+    def apply(self, text: str) -> str:
+        if self.compiled is not None:
+            return self.compiled.sub(self.replacement, text)
+        return text.replace(self.pattern, self.replacement)
+
+    def feed(self, text: str) -> str:
+        self.buf += text
+        return ''
+
+
+class _PlainStage:
+    """
+    str.replace 的流式版本。
+    只暂存缓冲区尾部“可能是模式前缀”的最长后缀，其余部分的匹配已经确定。
+    """
+
+    def __init__(self, pattern: str, replacement: str):
+        self.pattern = pattern
+        self.replacement = replacement
+        self.buf = ''
+
+    def apply(self, text: str) -> str:
+        return text.replace(self.pattern, self.replacement)
+
+    def feed(self, text: str) -> str:
+        buf = self.buf + text
+        pattern = self.pattern
+
+        # 从左往右找到的完整匹配都不会再被后续文本影响
+        cut = 0
+        while True:
+            pos = buf.find(pattern, cut)
+            if pos < 0:
+                break
+            cut = pos + len(pattern)
+
+        # 尾部可能与后续文本拼成匹配的部分留下
+        hold = 0
+        for k in range(min(len(pattern) - 1, len(buf) - cut), 0, -1):
+            if buf.endswith(pattern[:k]):
+                hold = k
+                break
+
+        stable_end = len(buf) - hold
+        self.buf = buf[stable_end:]
+        return buf[:stable_end].replace(pattern, self.replacement)
+
+
+class _RegexStage:
+    """
+    re.sub 的流式版本，只用于最大匹配宽度有界、且不看匹配区以外字符的模式。
+    起点 s 满足 s + max_width <= len(buf) 时，s 处是否匹配、匹配到哪里都已确定。
+    """
+
+    def __init__(self, compiled: "re.Pattern", replacement: str, max_width: int):
+        self.compiled = compiled
+        self.replacement = replacement
+        self.max_width = max_width
+        self.buf = ''
+
+    def apply(self, text: str) -> str:
+        return self.compiled.sub(self.replacement, text)
+
+    def feed(self, text: str) -> str:
+        buf = self.buf + text
+        limit = len(buf) - self.max_width
+        if limit < 0:
+            self.buf = buf
+            return ''
+
+        parts = []
+        last = 0
+        for m in self.compiled.finditer(buf):
+            if m.start() > limit:
+                break
+            parts.append(buf[last:m.start()])
+            parts.append(m.expand(self.replacement))
+            last = m.end()
+
+        stable_end = max(last, limit + 1)
+        parts.append(buf[last:stable_end])
+        self.buf = buf[stable_end:]
+        return ''.join(parts)
+
+
+# 依赖匹配区之外上下文的操作码：锚点、\b、前后断言、条件引用
+_CONTEXT_OPS = {
+    sre_constants.AT,
+    sre_constants.ASSERT,
+    sre_constants.ASSERT_NOT,
+    sre_constants.GROUPREF_EXISTS,
+}
+
+
+def _uses_context(node) -> bool:
+    if isinstance(node, sre_parse.SubPattern):
+        for op, av in node:
+            if op in _CONTEXT_OPS or _uses_context(av):
+                return True
+    elif isinstance(node, (tuple, list)):
+        return any(_uses_context(item) for item in node)
+    return False
+
+
+def _make_stage(pattern: str, replacement: str, compiled: "re.Pattern" = None):
+    if compiled is None:
+        if not pattern:
+            # 空模式会在每个字符之间插入替换串，按全量处理
+            return _HoldAllStage(pattern, replacement)
+        return _PlainStage(pattern, replacement)
+
+    parsed = sre_parse.parse(pattern)
+    min_width, max_width = parsed.getwidth()
+
+    if (
+        min_width == 0
+        or max_width > StreamReplacer.MAX_WINDOW
+        or _uses_context(parsed)
+    ):
+        return _HoldAllStage(pattern, replacement, compiled)
+    return _RegexStage(compiled, replacement, max_width)
+
+
+class StreamReplacer:
+    """
+    流式版 StrTools.vast_replace。
+
+    规则按顺序串成多级管道，每一级只重算仍可能匹配的尾部窗口，
+    前一级确定下来的输出才送进下一级。于是：
+    - feed() 返回的新稳定文本永远不会被撤回
+    - stable + preview 的尾部与对整段原文跑 vast_replace 的结果逐字一致
+
+    普通字符串规则只暂存“可能是模式前缀”的尾巴；正则规则要求最大宽度有界且不含锚点、
+    \\b、前后断言，否则该级退回全量暂存，只在 preview/flush 时整体替换。
+    """
+
+    MAX_WINDOW = 1024
+    """正则规则允许的最大匹配宽度，超出的按全量处理"""
+
+    def __init__(self, replace_from: str, replace_to: str):
+        self.key = (replace_from, replace_to)
+        ruleset = StrTools.compile_replace_rules(replace_from, replace_to)
+        compiled = ruleset.patterns or [None] * len(ruleset.rules)
+        self._stages = [
+            _make_stage(p, r, c) for (p, r), c in zip(ruleset.rules, compiled)
+        ]
+        self.stable = ''
+
+    def feed(self, delta: str) -> str:
+        """送入原文增量，返回新确定的输出"""
+        text = delta
+        for stage in self._stages:
+            if not text:
+                break
+            text = stage.feed(text)
+        if text:
+            self.stable += text
+        return text
+
+    def _tail(self) -> str:
+        carry = ''
+        for stage in self._stages:
+            carry = stage.apply(stage.buf + carry)
+        return carry
+
+    def preview(self) -> str:
+        """假设原文到此结束时的完整输出，不改变内部状态"""
+        return self.stable + self._tail()
+
+    def flush(self) -> str:
+        """原文结束，返回剩余的全部输出"""
+        tail = self._tail()
+        for stage in self._stages:
+            stage.buf = ''
+        self.stable += tail
+        return tail